@@ -0,0 +1,138 @@
+# import_time.py
+"""
+Import-Zeit-Benchmark auf Basis von `python -X importtime`.
+
+Aufruf (aus dem Projektordner):
+    python -m benchmarks.import_time                    # Module aus IMPORT_BUDGETS_MS, Top 15 Importe
+    python -m benchmarks.import_time main --top 30
+    python -m benchmarks.import_time --check            # Exit-Code 1 bei Budget-Überschreitung
+
+Jeder Import läuft in einem frischen Interpreter (Arbeitsordner: temporär, damit z.B. die Logdateien von
+main.py nicht im Projekt landen). Gewertet wird das Minimum über --repeat Läufe.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+
+# Budget (kumulierte Import-Zeit in ms) je Modul – großzügig bemessen, damit langsame Rechner nicht scheitern,
+# aber eng genug, dass ein versehentlicher Top-Level-Import von pandas/plotly/yfinance auffällt
+IMPORT_BUDGETS_MS = {
+    "main": 250,
+    "scripts.instrumentation": 100,
+    "scripts.cassette": 100,
+}
+
+# Schwere Bibliotheken, die erst in den Stufen geladen werden dürfen, die sie brauchen
+HEAVY_MODULES = ("pandas", "numpy", "plotly", "plotly.express", "yfinance", "requests", "openpyxl")
+
+
+def parse_importtime(stderr):
+    """
+    Wertet die Ausgabe von `python -X importtime` aus.
+    :return: Dict Modulname → (self_us, cumulative_us); bei Mehrfachnennung gilt der erste Eintrag
+    """
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        imports.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return imports
+
+
+def measure_import(module, repeat=5, python=None):
+    """
+    Misst die Import-Zeit eines Moduls in frischen Interpretern.
+    :param module: Modulname (z.B. 'main', 'scripts.analysis')
+    :param repeat: Anzahl Läufe – ausgewertet wird der schnellste
+    :param python: Interpreter (Default: der laufende)
+    :return: Dict mit 'module', 'total_ms', 'runs_ms' und 'imports' (Name → [self_ms, cumulative_ms], schnellster Lauf)
+    :raises RuntimeError: wenn der Import fehlschlägt
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [PROJECT_ROOT, os.getenv("PYTHONPATH")]))}
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="importtime-") as cwd:
+        for _ in range(repeat):
+            proc = subprocess.run(
+                [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                cwd=cwd,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            imports = parse_importtime(proc.stderr)
+            if proc.returncode != 0 or module not in imports:
+                raise RuntimeError(f"Import von '{module}' fehlgeschlagen:\n{proc.stderr[-2000:]}")
+            runs.append(imports)
+
+    fastest = min(runs, key=lambda imports: imports[module][1])
+    return {
+        "module": module,
+        "total_ms": round(fastest[module][1] / 1000, 2),
+        "runs_ms": [round(r[module][1] / 1000, 2) for r in runs],
+        "imports": {name: [round(s / 1000, 2), round(c / 1000, 2)] for name, (s, c) in fastest.items()},
+    }
+
+
+def heavy_imports(result):
+    """Schwere Bibliotheken (HEAVY_MODULES), die beim Import tatsächlich geladen wurden."""
+    return [m for m in HEAVY_MODULES if m in result["imports"]]
+
+
+def format_result(result, top=15, budget_ms=None):
+    """Textübersicht: Gesamtzeit, Budget und die teuersten Importe nach Eigenzeit."""
+    header = f"{result['module']}: {result['total_ms']:.1f} ms"
+    if budget_ms is not None:
+        header += f" (Budget {budget_ms} ms{' – ÜBERSCHRITTEN' if result['total_ms'] > budget_ms else ''})"
+    lines = [header]
+    heaviest = sorted(result["imports"].items(), key=lambda item: item[1][0], reverse=True)[:top]
+    for name, (self_ms, cumulative_ms) in heaviest:
+        lines.append(f"  {name:<48}{self_ms:>9.1f} ms{cumulative_ms:>11.1f} ms kumuliert")
+    heavy = heavy_imports(result)
+    if heavy:
+        lines.append(f"  geladene schwere Bibliotheken: {', '.join(heavy)}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-Zeiten der Projektmodule (python -X importtime).")
+    parser.add_argument("modules", nargs="*", help=f"Module (Default: {list(IMPORT_BUDGETS_MS)})")
+    parser.add_argument("--repeat", type=int, default=5, help="Läufe je Modul, gewertet wird der schnellste")
+    parser.add_argument("--top", type=int, default=15, help="Anzahl der teuersten Importe in der Ausgabe")
+    parser.add_argument("--output-dir", default=RESULTS_DIR, help="Ordner für die Ergebnis-JSONs ('' = keine)")
+    parser.add_argument("--check", action="store_true", help="Exit-Code 1, wenn ein Modul sein Budget überschreitet")
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in args.modules or list(IMPORT_BUDGETS_MS):
+        result = measure_import(module, repeat=args.repeat)
+        results.append(result)
+        print(format_result(result, args.top, IMPORT_BUDGETS_MS.get(module)))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, f"import-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            report = {"python": platform.python_version(), "platform": platform.platform(), "results": results}
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Ergebnisse gespeichert: {path}")
+
+    over_budget = [
+        r["module"]
+        for r in results
+        if r["module"] in IMPORT_BUDGETS_MS and r["total_ms"] > IMPORT_BUDGETS_MS[r["module"]]
+    ]
+    return 1 if args.check and over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
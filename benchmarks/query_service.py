@@ -0,0 +1,163 @@
+# query_service.py
+"""
+Durchsatz-Benchmark (Anfragen/Sekunde) des Abfrage-Service auf synthetischen Daten.
+
+Aufruf (aus dem Projektordner):
+    python -m benchmarks.query_service                      # Skala m, 2.000 Anfragen je Modus
+    python -m benchmarks.query_service --scale l --requests 5000 --clients 4
+
+Gemessen werden vier Modi über denselben Anfrage-Mix (Depot, Top-Positionen, Wertpapiere, Sektoren, Länder,
+'welche Fonds halten X'):
+    direct-uncached / direct-cached   handle_request im Prozess – Kosten von Abfrage + JSON ohne Netzwerk
+    http-uncached / http-cached       echte HTTP-Anfragen über localhost (Keep-Alive, --clients Verbindungen)
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from benchmarks.run import RESULTS_DIR, SCALES
+from benchmarks.synthetic import generate_depot, generate_universe
+from scripts.analysis import analyze_depot, load_etf_universe
+from scripts.query_service import create_server, create_service, handle_request
+
+MODES = ("direct-uncached", "direct-cached", "http-uncached", "http-cached")
+
+
+def request_mix(service, n_securities=50):
+    """
+    Anfrage-Mix über alle Endpunkte: je Depot Übersicht, Positionen, Sektoren, Länder sowie die größten
+    Wertpapiere (Einzelabfrage und 'welche Fonds halten X').
+    :return: Liste von Request-Targets
+    """
+    targets = ["/portfolios"]
+    for name, index in service["portfolios"].items():
+        base = f"/portfolios/{quote(name)}"
+        targets += [base, f"{base}/positions?top=50", f"{base}/sectors", f"{base}/countries", f"{base}/etfs"]
+        targets += [f"{base}/sectors/{quote(row['Sektor'])}" for row in index["sector_rows"][:5]]
+        for position in index["positions"][:n_securities]:
+            targets.append(f"{base}/securities/{quote(position['Name'])}")
+            if position["Emittententicker"]:
+                targets.append(f"/holders/{quote(position['Emittententicker'])}")
+    return targets
+
+
+def _direct(service, targets, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        handle_request(service, targets[i % len(targets)])
+    return time.perf_counter() - t0
+
+
+def _http(service, targets, n, clients):
+    server = create_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address[:2]
+
+    def _client(offset):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        for i in range(offset, n, clients):
+            conn.request("GET", targets[i % len(targets)])
+            conn.getresponse().read()
+        conn.close()
+
+    try:
+        workers = [threading.Thread(target=_client, args=(c,)) for c in range(clients)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return time.perf_counter() - t0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_service(service_factory, targets, requests=2000, clients=1):
+    """
+    Misst den Durchsatz je Modus. Jeder Modus startet mit einem frischen Service (leerer Cache);
+    'cached' wärmt den Cache mit einem Durchlauf über den Anfrage-Mix vor.
+    :param service_factory: Funktion cache_size → Service (create_service)
+    :return: Dict Modus → {'requests', 'seconds', 'rps'}
+    """
+    results = {}
+    for mode in MODES:
+        cached = mode.endswith("-cached")
+        service = service_factory(len(targets) if cached else 0)
+        if cached:
+            _direct(service, targets, len(targets))
+        if mode.startswith("direct"):
+            seconds = _direct(service, targets, requests)
+        else:
+            seconds = _http(service, targets, requests, clients)
+        results[mode] = {"requests": requests, "seconds": round(seconds, 4), "rps": round(requests / seconds, 1)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Anfragen/Sekunde des Abfrage-Service (synthetische Daten).")
+    parser.add_argument("--scale", default="m", choices=sorted(SCALES), help="Datenskala (siehe benchmarks.run)")
+    parser.add_argument("--portfolios", type=int, default=3, help="Anzahl Depots im Service")
+    parser.add_argument("--requests", type=int, default=2000, help="Anfragen je Modus")
+    parser.add_argument("--clients", type=int, default=1, help="parallele HTTP-Verbindungen")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=RESULTS_DIR, help="Ordner für die Ergebnis-JSONs ('' = keine)")
+    args = parser.parse_args(argv)
+
+    funds, holdings = SCALES[args.scale]
+    with tempfile.TemporaryDirectory(prefix="bench-query-") as work_dir:
+        files = generate_universe(work_dir, funds, holdings, seed=args.seed)
+        etf_data = load_etf_universe(work_dir, files)
+        results = {}
+        for p in range(args.portfolios):
+            depot, prices = generate_depot(files, seed=args.seed + p)
+            results[f"depot_{p + 1}"] = analyze_depot(etf_data, depot, prices)
+
+    t0 = time.perf_counter()
+    service = create_service(results, etf_data)
+    index_s = time.perf_counter() - t0
+    targets = request_mix(service)
+    print(
+        f"Skala {args.scale}: {len(results)} Depots, {len(etf_data)} Fonds-Positionen, {len(targets)} Anfragen im Mix"
+    )
+    print(f"  Indizes aufbauen: {index_s * 1000:.1f} ms")
+
+    report = bench_service(
+        lambda size: create_service(results, etf_data, cache_size=size), targets, args.requests, args.clients
+    )
+    for mode, r in report.items():
+        print(f"  {mode:<16}{r['rps']:>12,.0f} Anfragen/s")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        path = os.path.join(args.output_dir, f"query-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "scale": args.scale,
+                    "portfolios": len(results),
+                    "clients": args.clients,
+                    "index_build_s": round(index_s, 4),
+                    "results": report,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"Ergebnisse gespeichert: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,352 @@
+# run.py
+"""
+Benchmark-Suite der Pipeline auf synthetischen iShares-Daten.
+
+Aufruf (aus dem Projektordner):
+    python -m benchmarks.run                       # Standard-Skalen, Vergleich mit dem letzten Lauf
+    python -m benchmarks.run --scales all --repeat 5
+    python -m benchmarks.run --only read_etf_data,clean_etf_data
+    python -m benchmarks.run --compare benchmarks/results/bench-20250101-120000.json
+
+Jeder Lauf wird als JSON in benchmarks/results/ gespeichert und mit dem vorherigen Lauf verglichen.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+import plotly
+
+from benchmarks.synthetic import generate_depot, generate_universe
+from scripts.analysis import (
+    build_aggregations,
+    build_depot_data,
+    direct_chart_rows,
+    finish_result,
+    prepare_report_sections,
+    price_depot,
+    render_section,
+)
+from scripts.data_processing import calculate_relative_weighting, clean_etf_data
+from scripts.file_handling import read_etf_data
+from scripts.plotting import CHART_PAYLOADS, decode_chart_payload, export_html_report
+from scripts.snapshot import load_snapshot, save_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Skalen: Name → (Anzahl Fonds, Positionen je Fonds). Deckt 1–500 Fonds und 100–100.000 Positionen ab.
+SCALES = {
+    "xs": (1, 100),
+    "s": (5, 1_000),
+    "m": (20, 2_500),
+    "l": (100, 1_000),
+    "xl": (500, 200),
+    "wide": (1, 100_000),
+    "direct": (5, 1_000),
+}
+# Direktpositionen im Depot je Skala: Name → (Einzelaktien, Kryptowährungen). Default: DEFAULT_DIRECT.
+# 'direct' misst Depots mit vielen Direktpositionen (direct_chart_rows, Direktzeilen in build_depot_data)
+DIRECT_POSITIONS = {
+    "direct": (2_000, 500),
+}
+DEFAULT_DIRECT = (10, 2)
+# Standard für schnelle Läufe – alle Skalen mit --scales all (dauert mehrere Minuten)
+DEFAULT_SCALES = ("xs", "s", "m", "direct")
+
+# Gemessene Stufen in Ausführungsreihenfolge; 'figure:<Abschnitt>' wird je Report-Abschnitt ergänzt
+BENCHMARKS = (
+    "read_etf_data",
+    "clean_etf_data",
+    "calculate_relative_weighting",
+    "build_depot_data",
+    "direct_chart_rows",
+    "build_aggregations",
+    "snapshot_save",
+    "snapshot_load",
+    "figures",
+    "export_html_report",
+    "export_html_report:gzip",
+    "first_chart:json",
+    "first_chart:gzip",
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Abweichung (in %) der Median-Laufzeit, ab der ein Vergleich als Regression markiert wird
+REGRESSION_THRESHOLD = 20.0
+
+
+def _measure(fn, repeat):
+    """
+    Führt fn repeat-mal aus und misst die Wall-Zeit.
+    :return: Tuple (Messwerte-Dict, Rückgabewert des letzten Aufrufs)
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    stats = {
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "max_s": round(max(times), 6),
+        "runs": repeat,
+    }
+    return stats, result
+
+
+# Erster Chart-Daten-Tag im Report (Kodierung optional, Inhalt bis </script>)
+_FIRST_CHART = re.compile(
+    r'<script type="application/[a-z-]+"(?: data-encoding="(\w+)")? id="data-[^"]+">([^<]*)</script>'
+)
+
+
+def _first_chart(report_file):
+    """
+    Näherung für die Zeit bis zum ersten Chart im Browser: Report lesen und die Daten des ersten Charts
+    so entpacken wie loadSpec im Report-JavaScript (ohne das Zeichnen durch Plotly, das in beiden Modi gleich ist).
+    """
+    with open(report_file, encoding="utf-8") as f:
+        html = f.read()
+    encoding, payload = _FIRST_CHART.search(html).groups()
+    return decode_chart_payload(payload, encoding or "json")
+
+
+def _selected(name, only):
+    if not only:
+        return True
+    return name in only or (name.startswith("figure:") and "figures" in only)
+
+
+def bench_scale(scale, funds, holdings_per_fund, work_dir, repeat=3, only=None, seed=0, direct=DEFAULT_DIRECT):
+    """
+    Erzeugt die synthetischen Daten einer Skala und misst alle Pipeline-Stufen.
+    Stufen, die nicht gemessen werden sollen (only), laufen trotzdem einmal, damit ihre Nachfolger Eingaben haben.
+    :param scale: Name der Skala (nur für Ordner und Ausgabe)
+    :param funds: Anzahl Fonds
+    :param holdings_per_fund: Positionen je Fonds
+    :param work_dir: Arbeitsordner für CSVs, Depot und Report
+    :param repeat: Wiederholungen je Stufe
+    :param only: optionale Menge von Stufennamen (BENCHMARKS); None = alle
+    :param seed: Seed des Datengenerators
+    :param direct: Tuple (Einzelaktien, Kryptowährungen) im Depot
+    :return: Tuple (Dict Stufe → Messwerte (min_s, median_s, max_s, runs), Dict Report-Kodierung → Dateigröße in Bytes)
+    """
+    data_dir = os.path.join(work_dir, scale)
+    files = generate_universe(data_dir, funds, holdings_per_fund, seed=seed)
+    stocks, crypto = direct
+    depot, prices = generate_depot(
+        files, path=os.path.join(data_dir, "depot.xlsx"), stocks=stocks, crypto=crypto, seed=seed
+    )
+    priced, _ = price_depot(depot, prices)
+    paths = [os.path.join(data_dir, f) for f in files]
+
+    results = {}
+
+    def _step(name, fn):
+        if _selected(name, only):
+            results[name], value = _measure(fn, repeat)
+            return value
+        return fn()
+
+    raw = _step("read_etf_data", lambda: pd.concat([read_etf_data(p) for p in paths], ignore_index=True))
+    etf_data = _step("clean_etf_data", lambda: clean_etf_data(raw))
+    _step("calculate_relative_weighting", lambda: calculate_relative_weighting(etf_data, priced))
+    depot_data, depot_data_chart = _step("build_depot_data", lambda: build_depot_data(etf_data, priced))
+    _step("direct_chart_rows", lambda: direct_chart_rows(priced, depot_data_chart))
+    aggregations = _step("build_aggregations", lambda: build_aggregations(priced, depot_data, depot_data_chart))
+
+    # Snapshot für den Report-Modus: Speichern am Laufende, Laden statt Download + Neuberechnung
+    state = finish_result(priced, depot_data, depot_data_chart, aggregations, True, [])
+    snapshot_dir = os.path.join(data_dir, "snapshots")
+    snapshot = _step("snapshot_save", lambda: save_snapshot(state, snapshot_dir, keep=1))
+    _step("snapshot_load", lambda: load_snapshot(snapshot))
+
+    sections = []
+    for spec in prepare_report_sections(priced, aggregations):
+        rendered = _step(f"figure:{spec['title']}", lambda spec=spec: render_section(spec))
+        sections.append(rendered)
+
+    # Report je Chart-Kodierung: Schreibzeit, Dateigröße und Zeit bis zu den Daten des ersten Charts
+    sizes = {}
+    for payload in CHART_PAYLOADS:
+        name = "export_html_report" if payload == "json" else f"export_html_report:{payload}"
+        report_file = os.path.join(data_dir, f"report-{payload}.html")
+        _step(
+            name,
+            lambda f=report_file, p=payload: export_html_report(sections, f, open_browser=False, chart_payload=p),
+        )
+        _step(f"first_chart:{payload}", lambda f=report_file: _first_chart(f))
+        sizes[payload] = os.path.getsize(report_file)
+    return results, sizes
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=3, only=None, output_dir=RESULTS_DIR, seed=0):
+    """
+    Führt die Benchmarks für die angegebenen Skalen aus und speichert das Ergebnis als JSON.
+    :param scales: Skalennamen aus SCALES
+    :param repeat: Wiederholungen je Stufe (ausgewertet werden Minimum und Median)
+    :param only: optionale Menge von Stufennamen; None = alle
+    :param output_dir: Zielordner der Ergebnisdateien (None = nicht speichern)
+    :param seed: Seed des Datengenerators
+    :return: Tuple (Ergebnis-Dict, Pfad der Ergebnisdatei oder None)
+    :raises ValueError: bei unbekannter Skala
+    """
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        raise ValueError(f"Unbekannte Skala(en): {unknown} – erlaubt: {list(SCALES)}")
+
+    report = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "plotly": plotly.__version__,
+        "repeat": repeat,
+        "seed": seed,
+        "scales": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="depot-bench-") as work_dir:
+        for scale in scales:
+            funds, holdings = SCALES[scale]
+            stocks, crypto = DIRECT_POSITIONS.get(scale, DEFAULT_DIRECT)
+            logger.info(f"Skala '{scale}': {funds} Fonds × {holdings} Positionen, {stocks + crypto} Direktpositionen …")
+            t0 = time.perf_counter()
+            results, sizes = bench_scale(
+                scale, funds, holdings, work_dir, repeat=repeat, only=only, seed=seed, direct=(stocks, crypto)
+            )
+            report["scales"][scale] = {
+                "funds": funds,
+                "holdings_per_fund": holdings,
+                "stocks": stocks,
+                "crypto": crypto,
+                "results": results,
+                "report_bytes": sizes,
+            }
+            logger.info(f"Skala '{scale}' fertig in {time.perf_counter() - t0:.1f} s.")
+
+    path = None
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(output_dir, f"bench-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report, path
+
+
+def latest_result(output_dir=RESULTS_DIR, exclude=None):
+    """
+    Pfad der jüngsten Ergebnisdatei im Ordner.
+    :param exclude: Pfad, der nicht berücksichtigt wird (z.B. der gerade geschriebene Lauf)
+    :return: Pfad oder None
+    """
+    files = sorted(glob.glob(os.path.join(output_dir, "bench-*.json")))
+    if exclude:
+        files = [f for f in files if os.path.abspath(f) != os.path.abspath(exclude)]
+    return files[-1] if files else None
+
+
+def compare_results(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Vergleicht die Median-Laufzeiten zweier Läufe je Skala und Stufe.
+    :param current: Ergebnis-Dict des aktuellen Laufs
+    :param baseline: Ergebnis-Dict des Vergleichslaufs
+    :param threshold: Abweichung in %, ab der eine Stufe als Regression gilt
+    :return: Liste von Dicts (scale, benchmark, baseline_s, current_s, delta_pct, regression) – nur Stufen,
+             die in beiden Läufen gemessen wurden
+    """
+    rows = []
+    for scale, data in current["scales"].items():
+        base_results = baseline.get("scales", {}).get(scale, {}).get("results", {})
+        for name, stats in data["results"].items():
+            if name not in base_results:
+                continue
+            base_s, cur_s = base_results[name]["median_s"], stats["median_s"]
+            delta = (cur_s - base_s) / base_s * 100 if base_s > 0 else 0.0
+            rows.append(
+                {
+                    "scale": scale,
+                    "benchmark": name,
+                    "baseline_s": base_s,
+                    "current_s": cur_s,
+                    "delta_pct": round(delta, 1),
+                    "regression": delta > threshold,
+                }
+            )
+    return rows
+
+
+def format_results(report, comparison=None):
+    """Textübersicht der Ergebnisse (Median je Stufe, optional mit Abweichung zum Vergleichslauf)."""
+    deltas = {(r["scale"], r["benchmark"]): r for r in comparison or []}
+    lines = []
+    for scale, data in report["scales"].items():
+        header = f"Skala '{scale}' ({data['funds']} Fonds × {data['holdings_per_fund']} Positionen"
+        if "stocks" in data:
+            header += f", {data['stocks']} Aktien, {data['crypto']} Krypto"
+        lines.append(header + ")")
+        for name, stats in data["results"].items():
+            line = f"  {name:<48}{stats['median_s'] * 1000:>10.1f} ms  (min {stats['min_s'] * 1000:.1f} ms)"
+            row = deltas.get((scale, name))
+            if row:
+                line += f"  {row['delta_pct']:+.1f} %" + ("  ← REGRESSION" if row["regression"] else "")
+            lines.append(line)
+        for payload, size in data.get("report_bytes", {}).items():
+            lines.append(f"  {'Report-Größe (' + payload + ')':<48}{size / 1024:>10.0f} KB")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks der Depot-Pipeline auf synthetischen iShares-Daten.")
+    parser.add_argument(
+        "--scales", default=",".join(DEFAULT_SCALES), help=f"Skalen, kommagetrennt, oder 'all': {list(SCALES)}"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Wiederholungen je Stufe (Default: 3)")
+    parser.add_argument("--only", default="", help=f"nur diese Stufen messen, kommagetrennt: {list(BENCHMARKS)}")
+    parser.add_argument("--output-dir", default=RESULTS_DIR, help="Ordner für die Ergebnis-JSONs")
+    parser.add_argument("--compare", default=None, help="Vergleichslauf (JSON); Default: jüngster vorheriger Lauf")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Regressionsschwelle in %%")
+    parser.add_argument("--seed", type=int, default=0, help="Seed des Datengenerators")
+    parser.add_argument(
+        "--fail-on-regression", action="store_true", help="Exit-Code 1, wenn eine Stufe die Schwelle überschreitet"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    # Pipeline-Logs während der Messung unterdrücken – sie verfälschen die Zeiten und überfluten die Ausgabe
+    logging.getLogger("scripts").setLevel(logging.ERROR)
+
+    scales = list(SCALES) if args.scales == "all" else [s.strip() for s in args.scales.split(",") if s.strip()]
+    only = {s.strip() for s in args.only.split(",") if s.strip()} or None
+    baseline_path = args.compare or latest_result(args.output_dir)
+
+    report, path = run_benchmarks(scales, repeat=args.repeat, only=only, output_dir=args.output_dir, seed=args.seed)
+
+    comparison = None
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path, encoding="utf-8") as f:
+            comparison = compare_results(report, json.load(f), args.threshold)
+        logger.info(f"Vergleich mit {baseline_path}")
+    print(format_results(report, comparison))
+    if path:
+        logger.info(f"Ergebnisse gespeichert: {path}")
+
+    if args.fail_on_regression and comparison and any(r["regression"] for r in comparison):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+# synthetic.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Sektorverteilung der Einzelpositionen – Originalbezeichnungen wie in den iShares-CSVs
+# (englisch, deutsch und mit Encoding-Artefakten), Gewichte grob nach MSCI World
+SECTOR_DISTRIBUTION = {
+    "Information Technology": 0.18,
+    "IT": 0.05,
+    "Financials": 0.12,
+    "Health Care": 0.08,
+    "Gesundheitsversorgung": 0.03,
+    "Consumer Discretionary": 0.07,
+    "Zyklische Konsumgter": 0.03,
+    "Consumer Staples": 0.05,
+    "Nichtzyklische Konsumgüter": 0.02,
+    "Communication Services": 0.06,
+    "Industrials": 0.10,
+    "Energy": 0.04,
+    "Materials": 0.04,
+    "Materialien": 0.01,
+    "Real Estate": 0.03,
+    "Utilities": 0.03,
+    "Sonstige": 0.01,
+    "Maschinenbau": 0.01,  # nicht im Mapping – bleibt unverändert
+    "Information Technology\xa0": 0.04,  # Encoding-Artefakt: geschütztes Leerzeichen
+}
+
+# Länderverteilung – inkl. Encoding-Varianten, die LOCATION_MAPPING auflösen muss
+LOCATION_DISTRIBUTION = {
+    "Vereinigte Staaten": 0.45,
+    "United States": 0.15,
+    "Japan": 0.06,
+    "Vereinigtes Königreich": 0.03,
+    "Grobritannien": 0.01,
+    "Kanada": 0.03,
+    "Frankreich": 0.03,
+    "Schweiz": 0.03,
+    "Deutschland": 0.03,
+    "Germany": 0.01,
+    "Australien": 0.02,
+    "Niederlande": 0.01,
+    "Dnemark": 0.01,
+    "Schweden": 0.01,
+    "Trkei": 0.01,
+    "Sdafrika": 0.01,
+    "Indien": 0.03,
+    "China": 0.04,
+    "Taiwan": 0.02,
+    "Europische Union": 0.01,
+}
+
+# Anteil der Nicht-Aktien-Zeilen je Fonds (Cash, Derivate, FX) – werden von clean_etf_data entfernt
+_NON_EQUITY_ROWS = [
+    ("EUR CASH", "Cash und/oder Derivate", "Cash", "Europäische Union"),
+    ("USD CASH", "Cash und/oder Derivate", "Cash", "Vereinigte Staaten"),
+    ("S&P500 EMINI DEC 25", "Cash und/oder Derivate", "Futures", "Vereinigte Staaten"),
+    ("FX FORWARD", "Cash und/oder Derivate", "FX", "-"),
+]
+
+
+def _choice(rng, distribution, n):
+    labels = list(distribution)
+    p = np.array(list(distribution.values()), dtype=float)
+    return rng.choice(labels, size=n, p=p / p.sum())
+
+
+def _name_pool(n_names):
+    """Pool eindeutiger Emittenten – mehrere Fonds ziehen aus demselben Pool (realistische Überschneidungen)."""
+    return pd.DataFrame(
+        {
+            "Emittententicker": [f"S{i:06d}" for i in range(n_names)],
+            "Name": [f"Synthetic Holding {i:06d} AG" for i in range(n_names)],
+        }
+    )
+
+
+def generate_fund(
+    holdings,
+    seed=0,
+    name_pool=None,
+    sector_distribution=None,
+    location_distribution=None,
+    artifact_rate=0.02,
+    non_equity_rows=4,
+):
+    """
+    Erzeugt die Positionen eines Fonds im Spaltenformat der iShares-CSVs.
+    :param holdings: Anzahl Aktienpositionen
+    :param seed: Seed des Zufallsgenerators (gleicher Seed → gleiche Daten)
+    :param name_pool: DataFrame mit 'Emittententicker' und 'Name' (Default: eigener Pool)
+    :param sector_distribution: Dict Sektor → Wahrscheinlichkeit (Default: SECTOR_DISTRIBUTION)
+    :param location_distribution: Dict Land → Wahrscheinlichkeit (Default: LOCATION_DISTRIBUTION)
+    :param artifact_rate: Anteil der Namen mit Encoding-Artefakten (geschütztes/Null-Breiten-Leerzeichen)
+    :param non_equity_rows: Anzahl Cash-/Derivate-/FX-Zeilen am Ende des Fonds
+    :return: DataFrame mit Emittententicker, Name, Sektor, Anlageklasse, Marktwert, Gewichtung (%), Standort
+    """
+    rng = np.random.default_rng(seed)
+    if name_pool is None:
+        name_pool = _name_pool(max(holdings * 2, 1))
+    picks = rng.choice(len(name_pool), size=min(holdings, len(name_pool)), replace=False)
+    fund = name_pool.iloc[np.sort(picks)].reset_index(drop=True)
+    n = len(fund)
+
+    # Gewichte: Pareto-verteilt wie bei marktkapitalisierungsgewichteten Indizes, absteigend sortiert
+    raw = rng.pareto(1.2, n) + 1
+    weights = np.sort(raw / raw.sum() * 99.0)[::-1]
+    names = fund["Name"].to_numpy(dtype=object)
+    artifacts = rng.random(n) < artifact_rate
+    names[artifacts] = [f"{name}\xa0" if i % 2 else f"​{name}" for i, name in enumerate(names[artifacts])]
+
+    df = pd.DataFrame(
+        {
+            "Emittententicker": fund["Emittententicker"],
+            "Name": names,
+            "Sektor": _choice(rng, sector_distribution or SECTOR_DISTRIBUTION, n),
+            "Anlageklasse": "Aktien",
+            "Marktwert": np.round(weights * 1_000_000, 2),
+            "Gewichtung (%)": weights,
+            "Standort": _choice(rng, location_distribution or LOCATION_DISTRIBUTION, n),
+        }
+    )
+    extra = [
+        {
+            "Emittententicker": "-",
+            "Name": name,
+            "Sektor": sector,
+            "Anlageklasse": asset_class,
+            "Marktwert": 1000.0,
+            "Gewichtung (%)": 1.0 / max(non_equity_rows, 1),
+            "Standort": location,
+        }
+        for name, sector, asset_class, location in (_NON_EQUITY_ROWS * non_equity_rows)[:non_equity_rows]
+    ]
+    if extra:
+        df = pd.concat([df, pd.DataFrame(extra)], ignore_index=True)
+    return df
+
+
+def write_ishares_csv(df, path, fund_name="Synthetic Fund"):
+    """
+    Schreibt Fondspositionen im iShares-Format: zwei Kopfzeilen, Gewichtung mit Dezimalkomma.
+    Lesbar mit read_etf_data (skip_rows=2).
+    """
+    out = df.copy()
+    out["Gewichtung (%)"] = out["Gewichtung (%)"].map(lambda v: f"{v:.2f}".replace(".", ","))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(f"Fondsname,{fund_name}\n")
+        f.write("Positionen per,01.01.2025\n")
+        out.to_csv(f, index=False)
+
+
+def generate_universe(out_dir, funds, holdings_per_fund, seed=0, overlap=0.5, **fund_kwargs):
+    """
+    Erzeugt mehrere synthetische iShares-CSVs mit überlappenden Positionen.
+    :param out_dir: Zielordner
+    :param funds: Anzahl Fonds
+    :param holdings_per_fund: Aktienpositionen je Fonds
+    :param seed: Basis-Seed
+    :param overlap: 0 = keine gemeinsamen Emittenten, 1 = alle Fonds ziehen aus einem Pool der Fondsgröße
+    :param fund_kwargs: weitere Parameter für generate_fund
+    :return: Liste der CSV-Dateinamen (ohne Pfad, Dateiname = Fondsname)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    pool_size = int(holdings_per_fund * (1 + (1 - overlap) * (funds - 1)))
+    name_pool = _name_pool(max(pool_size, holdings_per_fund))
+    files = []
+    for i in range(funds):
+        fund_name = f"Synthetic ETF {i:03d}"
+        df = generate_fund(holdings_per_fund, seed=seed + i, name_pool=name_pool, **fund_kwargs)
+        filename = f"{fund_name}.csv"
+        write_ishares_csv(df, os.path.join(out_dir, filename), fund_name)
+        files.append(filename)
+    return files
+
+
+def generate_depot(etf_files, path=None, stocks=10, crypto=2, seed=0):
+    """
+    Erzeugt ein Depot zu den synthetischen Fonds und passende Kurse.
+    :param etf_files: Dateinamen aus generate_universe (jeder Fonds wird eine ETF-Position)
+    :param path: optionaler Pfad der Depot-Excel (Format wie example_portfolio.xlsx)
+    :param stocks: Anzahl Einzelaktien
+    :param crypto: Anzahl Kryptowährungen
+    :param seed: Seed für Anteile und Kurse
+    :return: Tuple (Depot-DataFrame, Kurs-DataFrame im Format von download_stock_price)
+    """
+    rng = np.random.default_rng(seed)
+    rows = [
+        {
+            "Ticker": f"E{i:03d}.DE",
+            "Art": "ETF",
+            "Position": os.path.splitext(f)[0],
+            "Sektor": "-",
+            "Standort": "-",
+            "Anteile": int(rng.integers(1, 200)),
+        }
+        for i, f in enumerate(etf_files)
+    ]
+    sectors = ["Technologie", "Finanzen", "Gesundheit", "Industrie", "Energie"]
+    rows += [
+        {
+            "Ticker": f"A{i:03d}",
+            "Art": "Aktie",
+            "Position": f"Direktaktie {i:03d} AG",
+            "Sektor": sectors[i % len(sectors)],
+            "Standort": "Deutschland",
+            "Anteile": int(rng.integers(1, 100)),
+        }
+        for i in range(stocks)
+    ]
+    rows += [
+        {
+            "Ticker": f"K{i:02d}-EUR",
+            "Art": "Krypto",
+            "Position": f"Coin {i:02d}",
+            "Sektor": "Krypto",
+            "Standort": "Krypto",
+            "Anteile": round(float(rng.random()) * 2, 4),
+        }
+        for i in range(crypto)
+    ]
+    rows.append(
+        {"Ticker": "-", "Art": "Cash", "Position": "Cash", "Sektor": "Cash", "Standort": "Cash (Euro)", "Anteile": 5000}
+    )
+    depot = pd.DataFrame(rows)
+
+    clean = depot["Ticker"].str.replace(r"\..*$", "", regex=True)
+    krypto = depot["Art"] == "Krypto"
+    clean[krypto] = depot.loc[krypto, "Ticker"].str.replace(r"\-.*$", "", regex=True)
+    prices = pd.DataFrame({"Ticker": clean, "Kurs": np.round(rng.uniform(10, 500, len(depot)), 2)})
+    prices.loc[prices["Ticker"] == "-", "Kurs"] = 1.0
+
+    if path:
+        depot.to_excel(path, index=False)
+    return depot, prices
@@ -1,31 +1,19 @@
+import argparse
 import logging
 import logging.handlers
 import os
 import sys
 import timeit
+from contextlib import nullcontext
 
-import pandas as pd
 from dotenv import load_dotenv
 
-from scripts.data_download import download_csv_if_old, download_stock_price
-from scripts.data_processing import (
-    EXCL_LOCATIONS,
-    EXCL_SECTORS,
-    calculate_relative_weighting,
-    clean_etf_data,
-)
-from scripts.file_handling import export_to_excel, read_etf_data
-from scripts.plotting import (
-    _de,
-    _eur,
-    _pct,
-    build_bar_chart,
-    build_depot_table,
-    build_heatmap,
-    build_pie_chart,
-    build_treemap,
-    export_html_report,
-)
+# Nur leichtgewichtige Module beim Start laden – pandas, plotly, yfinance & Co. werden erst in den Stufen
+# importiert, die sie brauchen (siehe python -m benchmarks.import_time)
+from scripts.cassette import MODES as CASSETTE_MODES
+from scripts.cassette import use_cassette
+from scripts.deadline import run_budget
+from scripts.instrumentation import span, timed_run
 
 # ---------------------------------------------------------------------------
 # Logging konfigurieren
@@ -80,45 +68,109 @@ def resolve_env_var(var):
     return resolved
 
 
-def main():
-    start = timeit.default_timer()
+def _env_flag(name, default):
+    """Liest eine Ja/Nein-Umgebungsvariable (false/0/nein/no = aus)."""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() not in ("0", "false", "nein", "no")
 
-    # ------------------------------------------------------------------
-    # Umgebungsvariablen laden
-    # ------------------------------------------------------------------
-    load_dotenv()
 
-    DOWNLOAD_PATH = resolve_env_var(os.getenv("DOWNLOAD_PATH"))
-    SAVE_PATH = resolve_env_var(os.getenv("SAVE_PATH"))
-    INPUT_FILE = resolve_env_var(os.getenv("INPUT_FILE"))
-    OUTPUT_FILE = resolve_env_var(os.getenv("OUTPUT_FILE"))
+def load_config():
+    """
+    Lädt und validiert die Konfiguration aus der .env-Datei.
+    Bricht mit sys.exit(1) ab, wenn Pflicht-Variablen fehlen oder Verzeichnisse nicht angelegt werden können.
+    :return: Dict mit den Konfigurationswerten (Schlüssel = Name der Umgebungsvariable)
+    """
+    load_dotenv()
 
-    CSV_URL = [u.strip() for u in os.getenv("CSV_URL", "").split(",")]
-    ETF_CSV_FILE = [f.strip() for f in os.getenv("ETF_CSV_FILE", "").split(",")]
-    STOCK_TICKER_SUFFIXES = [s.strip() for s in os.getenv("STOCK_TICKER_SUFFIXES", "").split(",")]
-    CRYPTO_TICKER_SUFFIXES = [s.strip() for s in os.getenv("CRYPTO_TICKER_SUFFIXES", "").split(",")]
+    config = {
+        "DOWNLOAD_PATH": resolve_env_var(os.getenv("DOWNLOAD_PATH")),
+        "SAVE_PATH": resolve_env_var(os.getenv("SAVE_PATH")),
+        "INPUT_FILE": resolve_env_var(os.getenv("INPUT_FILE")),
+        "OUTPUT_FILE": resolve_env_var(os.getenv("OUTPUT_FILE")),
+        "CSV_URL": [u.strip() for u in os.getenv("CSV_URL", "").split(",")],
+        "ETF_CSV_FILE": [f.strip() for f in os.getenv("ETF_CSV_FILE", "").split(",")],
+        "STOCK_TICKER_SUFFIXES": [s.strip() for s in os.getenv("STOCK_TICKER_SUFFIXES", "").split(",")],
+        "CRYPTO_TICKER_SUFFIXES": [s.strip() for s in os.getenv("CRYPTO_TICKER_SUFFIXES", "").split(",")],
+        # Optional: Artefakt-Cache für das bereinigte ETF-Universum (Default: <DOWNLOAD_PATH>/.cache)
+        "CACHE_PATH": resolve_env_var(os.getenv("CACHE_PATH")),
+        # Optional: ETF-Durchblick und Report-Abschnitte aus dem Cache wiederverwenden (Default: true)
+        "INCREMENTAL": _env_flag("INCREMENTAL", True),
+        # Optional: Stufen-Timing als JSON je Lauf (Default: an, Ordner <SAVE_PATH>/timings)
+        "TIMING_REPORT": _env_flag("TIMING_REPORT", True),
+        "TIMING_PATH": resolve_env_var(os.getenv("TIMING_PATH")),
+        # Optional: Speicher-Peak je Stufe per tracemalloc (langsamer, Default: aus)
+        "TIMING_MEMORY": _env_flag("TIMING_MEMORY", False),
+        # Optional: Profiler für den ganzen Lauf – 'cprofile' oder 'pyinstrument' (Default: aus)
+        "PROFILE": os.getenv("PROFILE", "").strip().lower() or None,
+        # Optional: Netzwerkaufrufe mitschneiden ('record') oder offline abspielen ('replay') (Default: aus)
+        "CASSETTE_MODE": os.getenv("CASSETTE_MODE", "").strip().lower() or None,
+        "CASSETTE_PATH": resolve_env_var(os.getenv("CASSETTE_PATH")),
+        # Optional: simulierte Latenz je abgespieltem Aufruf in Sekunden oder 'recorded' (Default: 0)
+        "CASSETTE_LATENCY": os.getenv("CASSETTE_LATENCY", "").strip().lower() or "0",
+        # Optional: Watch-Modus – Sekunden zwischen Datei-Checks bzw. Kursabrufen (Default: 5 / 300)
+        "WATCH_INTERVAL": os.getenv("WATCH_INTERVAL", "").strip() or "5",
+        "PRICE_INTERVAL": os.getenv("PRICE_INTERVAL", "").strip() or "300",
+        # Optional: Zeitbudget eines Einzel-Laufs in Sekunden – danach Cache-/Fallback-Daten statt Netz (Default: aus)
+        "RUN_BUDGET": os.getenv("RUN_BUDGET", "").strip() or None,
+        # Optional: berechneten Zustand je Lauf als Snapshot speichern (Default: an, Ordner <SAVE_PATH>/snapshots)
+        "SNAPSHOT": _env_flag("SNAPSHOT", True),
+        "SNAPSHOT_PATH": resolve_env_var(os.getenv("SNAPSHOT_PATH")),
+    }
 
     # Pflicht-Konfiguration validieren
-    _missing = [
-        k
-        for k, v in {
-            "DOWNLOAD_PATH": DOWNLOAD_PATH,
-            "SAVE_PATH": SAVE_PATH,
-            "INPUT_FILE": INPUT_FILE,
-            "OUTPUT_FILE": OUTPUT_FILE,
-        }.items()
-        if not v
-    ]
+    _missing = [k for k in ("DOWNLOAD_PATH", "SAVE_PATH", "INPUT_FILE", "OUTPUT_FILE") if not config[k]]
     if _missing:
         logger.error(f"Fehlende Pflicht-Umgebungsvariablen in .env: {_missing}. Abbruch.")
         sys.exit(1)
 
-    if not ETF_CSV_FILE or ETF_CSV_FILE == [""]:
+    if not config["CACHE_PATH"]:
+        config["CACHE_PATH"] = os.path.join(config["DOWNLOAD_PATH"], ".cache")
+    if not config["TIMING_PATH"]:
+        config["TIMING_PATH"] = os.path.join(config["SAVE_PATH"], "timings")
+    if not config["CASSETTE_PATH"]:
+        config["CASSETTE_PATH"] = os.path.join(config["DOWNLOAD_PATH"], "cassette.json")
+    if not config["SNAPSHOT_PATH"]:
+        config["SNAPSHOT_PATH"] = os.path.join(config["SAVE_PATH"], "snapshots")
+
+    if config["CASSETTE_MODE"] and config["CASSETTE_MODE"] not in CASSETTE_MODES:
+        logger.error(f"CASSETTE_MODE '{config['CASSETTE_MODE']}' ungültig – erlaubt: {CASSETTE_MODES}. Abbruch.")
+        sys.exit(1)
+    if config["CASSETTE_LATENCY"] != "recorded":
+        try:
+            config["CASSETTE_LATENCY"] = float(config["CASSETTE_LATENCY"])
+        except ValueError:
+            logger.error(
+                f"CASSETTE_LATENCY '{config['CASSETTE_LATENCY']}' ist keine Zahl und nicht 'recorded'. Abbruch."
+            )
+            sys.exit(1)
+
+    if config["RUN_BUDGET"] is not None:
+        try:
+            config["RUN_BUDGET"] = float(config["RUN_BUDGET"])
+        except ValueError:
+            config["RUN_BUDGET"] = -1.0
+        if config["RUN_BUDGET"] <= 0:
+            logger.error("RUN_BUDGET muss eine positive Zahl (Sekunden) sein. Abbruch.")
+            sys.exit(1)
+
+    for label in ("WATCH_INTERVAL", "PRICE_INTERVAL"):
+        try:
+            config[label] = float(config[label])
+        except ValueError:
+            config[label] = -1.0
+        if config[label] <= 0:
+            logger.error(f"{label} muss eine positive Zahl (Sekunden) sein. Abbruch.")
+            sys.exit(1)
+
+    if not config["ETF_CSV_FILE"] or config["ETF_CSV_FILE"] == [""]:
         logger.error("ETF_CSV_FILE ist leer – keine ETF-Dateien konfiguriert. Abbruch.")
         sys.exit(1)
 
     # Verzeichnisse prüfen
-    for label, path in [("DOWNLOAD_PATH", DOWNLOAD_PATH), ("SAVE_PATH", SAVE_PATH)]:
+    for label in ("DOWNLOAD_PATH", "SAVE_PATH"):
+        path = config[label]
         if not os.path.isdir(path):
             logger.warning(f"{label} '{path}' existiert nicht – wird erstellt.")
             try:
@@ -129,398 +181,591 @@ def main():
 
     logger.info(
         f"Konfiguration geladen:\n"
-        f"  DOWNLOAD_PATH:         {DOWNLOAD_PATH}\n"
-        f"  SAVE_PATH:             {SAVE_PATH}\n"
-        f"  INPUT_FILE:            {INPUT_FILE}\n"
-        f"  OUTPUT_FILE:           {OUTPUT_FILE}\n"
-        f"  ETF_CSV_FILE:          {ETF_CSV_FILE}\n"
-        f"  STOCK_TICKER_SUFFIXES: {STOCK_TICKER_SUFFIXES}\n"
-        f"  CRYPTO_TICKER_SUFFIXES:{CRYPTO_TICKER_SUFFIXES}"
+        f"  DOWNLOAD_PATH:         {config['DOWNLOAD_PATH']}\n"
+        f"  SAVE_PATH:             {config['SAVE_PATH']}\n"
+        f"  INPUT_FILE:            {config['INPUT_FILE']}\n"
+        f"  OUTPUT_FILE:           {config['OUTPUT_FILE']}\n"
+        f"  ETF_CSV_FILE:          {config['ETF_CSV_FILE']}\n"
+        f"  CACHE_PATH:            {config['CACHE_PATH']}\n"
+        f"  INCREMENTAL:           {config['INCREMENTAL']}\n"
+        f"  TIMING_REPORT:         {config['TIMING_PATH'] if config['TIMING_REPORT'] else 'aus'}\n"
+        f"  PROFILE:               {config['PROFILE'] or 'aus'}\n"
+        f"  CASSETTE:              {_cassette_label(config)}\n"
+        f"  RUN_BUDGET:            {_budget_label(config['RUN_BUDGET'])}\n"
+        f"  SNAPSHOT:              {config['SNAPSHOT_PATH'] if config['SNAPSHOT'] else 'aus'}\n"
+        f"  WATCH_INTERVAL:        {config['WATCH_INTERVAL']:g} s (Kurse alle {config['PRICE_INTERVAL']:g} s)\n"
+        f"  STOCK_TICKER_SUFFIXES: {config['STOCK_TICKER_SUFFIXES']}\n"
+        f"  CRYPTO_TICKER_SUFFIXES:{config['CRYPTO_TICKER_SUFFIXES']}"
     )
+    return config
 
-    # ------------------------------------------------------------------
-    # 1. CSV-Daten herunterladen
-    # ------------------------------------------------------------------
-    download_csv_if_old(CSV_URL, DOWNLOAD_PATH, ETF_CSV_FILE)
 
-    # ------------------------------------------------------------------
-    # 2. ETF-Daten einlesen & bereinigen
-    # ------------------------------------------------------------------
-    etf_data_list = [df for f in ETF_CSV_FILE if (df := read_etf_data(os.path.join(DOWNLOAD_PATH, f))) is not None]
+def _budget_label(budget):
+    return f"{budget:g} s" if budget else "aus"
+
+
+def _cassette_label(config):
+    if not config["CASSETTE_MODE"]:
+        return "aus"
+    return f"{config['CASSETTE_MODE']} {config['CASSETTE_PATH']} (Latenz: {config['CASSETTE_LATENCY']})"
+
+
+def _cassette(config):
+    """Mitschnitt bzw. Wiedergabe der Netzwerkaufrufe gemäß Konfiguration (ohne CASSETTE_MODE wirkungslos)."""
+    if not config["CASSETTE_MODE"]:
+        return nullcontext()
+    return use_cassette(config["CASSETTE_PATH"], config["CASSETTE_MODE"], latency=config["CASSETTE_LATENCY"])
 
-    if not etf_data_list:
+
+def _download_csvs(config):
+    from scripts.data_download import download_csv_if_old
+
+    with span("csv_download"):
+        download_csv_if_old(config["CSV_URL"], config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"])
+
+
+def _timed_run(config, name):
+    """Instrumentierung eines Laufs gemäß Konfiguration (Timing-Report, Speicher, Profiler)."""
+    return timed_run(
+        name,
+        report_dir=config["TIMING_PATH"] if config["TIMING_REPORT"] else None,
+        trace_memory=config["TIMING_MEMORY"],
+        profile=config["PROFILE"],
+        # Profile auch ohne Timing-Report in den Timing-Ordner, nie ins Arbeitsverzeichnis
+        profile_dir=config["TIMING_PATH"] or config["SAVE_PATH"],
+    )
+
+
+def _load_universe(config, download=True):
+    """CSV-Download + Einlesen & Bereinigen der ETF-Daten. Bricht ab, wenn keine ETF-Daten verfügbar sind."""
+    from scripts.analysis import load_etf_universe
+
+    if download:
+        _download_csvs(config)
+
+    etf_data = load_etf_universe(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"], cache_dir=config["CACHE_PATH"])
+    if etf_data is None:
         logger.error("Keine ETF-Daten verfügbar. Abbruch.")
         sys.exit(1)
+    return etf_data
 
-    etf_data = clean_etf_data(pd.concat(etf_data_list, ignore_index=True))
-    logger.info(f"ETF-Daten geladen und bereinigt: {len(etf_data)} verwertbare Positionen.")
 
-    # ------------------------------------------------------------------
-    # 3. Depot-Daten einlesen
-    # ------------------------------------------------------------------
-    if not os.path.exists(INPUT_FILE):
-        logger.error(f"Eingabedatei '{INPUT_FILE}' nicht gefunden. Abbruch.")
-        sys.exit(1)
+def _analyze_incremental(config, depot, stock_prices, fallback_used):
+    """
+    Auswertung mit gespeichertem ETF-Durchblick: Das Universum wird nur geladen, wenn sich CSVs, Mappings
+    oder die Depot-Struktur geändert haben – sonst werden nur Gewichte und Aggregationen neu berechnet.
+    """
+    from scripts.analysis import etf_universe_key, load_etf_universe
+    from scripts.incremental import analyze_depot_incremental
 
-    depot = pd.read_excel(INPUT_FILE)
-    logger.info(f"Depot geladen: {depot.shape[0]} Positionen.")
+    def _load():
+        return load_etf_universe(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"], cache_dir=config["CACHE_PATH"])
 
-    _required_cols = {"Art", "Position", "Ticker", "Anteile"}
-    _missing_cols = _required_cols - set(depot.columns)
-    if _missing_cols:
-        logger.error(f"Depot-Excel fehlt Pflicht-Spalten: {_missing_cols}. Abbruch.")
-        sys.exit(1)
+    universe_key = etf_universe_key(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"])
+    return analyze_depot_incremental(config["CACHE_PATH"], universe_key, _load, depot, stock_prices, fallback_used)
 
-    if depot.empty:
-        logger.error("Depot-Excel ist leer. Abbruch.")
-        sys.exit(1)
 
-    # ------------------------------------------------------------------
-    # 4. Aktienkurse herunterladen & Merge
-    # ------------------------------------------------------------------
-    stock_prices, fallback_used = download_stock_price(depot, STOCK_TICKER_SUFFIXES, CRYPTO_TICKER_SUFFIXES)
+# ---------------------------------------------------------------------------
+# Kommandozeile: Stufen wählen bzw. überspringen
+# ---------------------------------------------------------------------------
 
-    if stock_prices is None or stock_prices.empty:
-        logger.error("Kursdownload fehlgeschlagen. Abbruch.")
-        sys.exit(1)
+# Alle Stufen aktiv – entspricht `python main.py` ohne Optionen
+DEFAULT_OPTIONS = {
+    "download": True,
+    "offline": False,
+    "excel": True,
+    "sections": None,
+    "open_browser": True,
+    "plotlyjs": "inline",
+    "chart_payload": "json",
+    "detail": None,
+    "render_workers": 1,
+}
+
+
+def _parse_sections(value):
+    """
+    Wert von --sections: kommagetrennte Kurznamen aus REPORT_SECTIONS, 'all' (alle) oder 'none' (kein Report).
+    :return: None (alle Abschnitte) oder Liste der gewählten Abschnitte
+    :raises argparse.ArgumentTypeError: bei unbekanntem Abschnitt
+    """
+    from scripts.analysis import REPORT_SECTIONS
+
+    value = value.strip().lower()
+    if value == "all":
+        return None
+    if value in ("", "none"):
+        return []
+    sections = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = [s for s in sections if s not in REPORT_SECTIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unbekannte Abschnitte {unknown} – erlaubt: {', '.join(REPORT_SECTIONS)}, all, none"
+        )
+    return sections
 
-    # Originalen Ticker (aus Excel, z.B. '2B7K.DE') sichern – Merge überschreibt Ticker-Spalte
-    depot["Ticker_orig_excel"] = depot["Ticker"]
 
-    # Ticker-Suffix bereinigen für den Merge
-    depot["Ticker_clean"] = depot["Ticker"].str.replace(r"\..*$", "", regex=True)
-    depot.loc[depot["Art"] == "Krypto", "Ticker_clean"] = depot["Ticker"].str.replace(r"\-.*$", "", regex=True)
+def _positive_seconds(value):
+    """Wert von --budget: positive Anzahl Sekunden."""
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = -1.0
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f"'{value}' ist keine positive Zahl (Sekunden)")
+    return seconds
+
+
+def _positive_int(value):
+    """Wert von --detail-top bzw. --render-workers: positive ganze Zahl."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"'{value}' ist keine positive ganze Zahl")
+    return number
+
 
-    stock_prices = stock_prices.drop_duplicates(subset="Ticker", keep="first")
-    depot = depot.merge(
-        stock_prices[["Ticker", "Kurs"]], left_on="Ticker_clean", right_on="Ticker", how="left", suffixes=("_orig", "")
+def _non_negative_percent(value):
+    """Wert von --detail-min-weight: Gewichtung in Prozent (≥ 0)."""
+    try:
+        percent = float(value.replace(",", "."))
+    except ValueError:
+        percent = -1.0
+    if percent < 0:
+        raise argparse.ArgumentTypeError(f"'{value}' ist keine Prozentzahl ≥ 0")
+    return percent
+
+
+def _add_stage_arguments(parser, suppress=False):
+    """
+    Gemeinsame Stufen-Optionen für Einzel- und Batch-Lauf. Im Subcommand (suppress=True) ohne eigene Defaults,
+    damit die Optionen sowohl vor als auch nach 'batch' angegeben werden können.
+    """
+
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    parser.add_argument(
+        "--no-download",
+        dest="download",
+        action="store_false",
+        default=default(True),
+        help="iShares-CSVs nicht herunterladen, vorhandene Dateien verwenden",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        default=default(False),
+        help="kein Netzwerk: vorhandene CSVs, Kurse aus price_fallback.json (impliziert --no-download)",
+    )
+    parser.add_argument(
+        "--no-excel", dest="excel", action="store_false", default=default(True), help="keine Excel-Auswertung"
+    )
+    parser.add_argument(
+        "--no-open",
+        dest="open_browser",
+        action="store_false",
+        default=default(True),
+        help="HTML-Report nicht im Browser öffnen",
+    )
+    parser.add_argument(
+        "--sections",
+        type=_parse_sections,
+        default=default(None),
+        metavar="LISTE",
+        help="Report-Abschnitte, kommagetrennt (tabelle, depot, anlageart, top20, laender, heatmap, sektoren), "
+        "'all' oder 'none' (kein HTML-Report, Plotly wird nicht geladen)",
+    )
+    parser.add_argument(
+        "--plotlyjs",
+        choices=("inline", "shared"),
+        default=default("inline"),
+        help="Plotly.js in jeden Report einbetten (inline, Default) oder einmal als plotly-<hash>.min.js "
+        "neben die Reports legen und verlinken (shared, spart ~4,6 MB je Report)",
+    )
+    parser.add_argument(
+        "--chart-payload",
+        dest="chart_payload",
+        choices=("json", "gzip"),
+        default=default("json"),
+        help="Chart-Daten im Report als Klartext-JSON (Default) oder gzip+base64 – kleinerer Report, "
+        "entpackt erst beim Anzeigen (Browser mit DecompressionStream nötig)",
+    )
+    parser.add_argument(
+        "--detail-top",
+        dest="detail_top",
+        type=_positive_int,
+        default=default(None),
+        metavar="N",
+        help="Länder- und Sektor-Treemap: je Land/Sektor nur die N größten Positionen, der Rest als "
+        "'Sonstige' (Positionen werden beim Klick nachgeladen)",
+    )
+    parser.add_argument(
+        "--detail-min-weight",
+        dest="detail_min_weight",
+        type=_non_negative_percent,
+        default=default(None),
+        metavar="PROZENT",
+        help="Länder- und Sektor-Treemap: Positionen unter PROZENT Depotanteil unter 'Sonstige' zusammenfassen",
+    )
+    parser.add_argument(
+        "--render-workers",
+        dest="render_workers",
+        type=_positive_int,
+        default=default(1),
+        metavar="N",
+        help="Report-Figures in N Worker-Prozessen bauen und serialisieren (Default: 1 = sequentiell; "
+        "im Batch-Modus ohne Wirkung, dort laufen bereits die Depots parallel)",
     )
-    # Merge-Hilfsspalten entfernen, originalen Ticker wiederherstellen
-    depot.drop(columns=["Ticker_orig", "Ticker_clean"], errors="ignore", inplace=True)
-    depot["Ticker"] = depot["Ticker_orig_excel"]
-    depot.drop(columns=["Ticker_orig_excel"], inplace=True)
-
-    depot["Kurs"] = pd.to_numeric(depot["Kurs"], errors="coerce")
-    depot["Anteile"] = pd.to_numeric(depot["Anteile"], errors="coerce")
-    depot["Marktwert"] = depot["Anteile"] * depot["Kurs"]
-
-    missing_kurs = depot[depot["Kurs"].isna()]
-    if not missing_kurs.empty:
-        logger.warning(
-            f"Für {len(missing_kurs)} Position(en) kein Kurs – Gesamtwert UNVOLLSTÄNDIG:\n"
-            + missing_kurs[["Ticker", "Position", "Art"]].to_string(index=False)
-        )
 
-    gesamtwert_vollstaendig = missing_kurs.empty
-    total_marktwert = depot["Marktwert"].sum()
-    if total_marktwert <= 0:
-        logger.error("Gesamtwert des Depots ist 0 oder negativ – kein gültiger Kurs vorhanden. Abbruch.")
-        sys.exit(1)
-    depot["Marktwert (%)"] = depot["Marktwert"] / total_marktwert * 100
-    logger.debug(f"Depot nach Kursberechnung:\n{depot.to_string()}")
-    n_missing = depot["Kurs"].isna().sum()
-    logger.info(
-        f"Depot berechnet: {len(depot)} Positionen, Gesamtwert {total_marktwert:,.2f} €"
-        + (f", {n_missing} ohne Kurs" if n_missing else "")
+
+def build_parser():
+    """Argument-Parser der Kommandozeile (Einzel-Depot und Subcommands batch, watch, serve, report)."""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="ETF-Durchblick und Portfolio-Report für ein Depot (INPUT_FILE aus .env) oder viele Depots.",
     )
+    _add_stage_arguments(parser)
+    parser.add_argument(
+        "--budget",
+        type=_positive_seconds,
+        default=None,
+        metavar="SEKUNDEN",
+        help="Zeitbudget des Einzel- bzw. Batch-Laufs (vor dem Unterbefehl angeben): danach wartet keine Stufe "
+        "mehr auf das Netz, es werden Cache- bzw. Fallback-Daten verwendet und in den KPI-Cards markiert (RUN_BUDGET)",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="{batch,watch,serve,report}")
+    batch = subparsers.add_parser("batch", help="viele Depots parallel gegen ein gemeinsames ETF-Universum")
+    batch.add_argument("inputs", nargs="+", help="Depot-Excel-Dateien und/oder Ordner (alle *.xlsx)")
+    batch.add_argument("--workers", type=int, default=None, help="Anzahl Worker-Prozesse (Default: CPU-Kerne)")
+    _add_stage_arguments(batch, suppress=True)
+    watch = subparsers.add_parser("watch", help="im Speicher bleiben, bei Änderungen nur das Nötige neu berechnen")
+    watch.add_argument("--interval", type=float, default=None, help="Sekunden zwischen Datei-Checks (WATCH_INTERVAL)")
+    watch.add_argument(
+        "--price-interval", type=float, default=None, help="Sekunden zwischen Kursabrufen (PRICE_INTERVAL)"
+    )
+    _add_stage_arguments(watch, suppress=True)
+    serve = subparsers.add_parser("serve", help="lokaler HTTP-Dienst für JSON-Abfragen auf die Auswertung")
+    serve.add_argument("inputs", nargs="*", help="Depot-Excel-Dateien und/oder Ordner (Default: INPUT_FILE)")
+    serve.add_argument("--host", default="127.0.0.1", help="Adresse (Default: nur localhost)")
+    serve.add_argument("--port", type=int, default=8765, help="TCP-Port (Default: 8765)")
+    _add_stage_arguments(serve, suppress=True)
+    report = subparsers.add_parser("report", help="Excel und HTML-Report aus einem Snapshot neu erzeugen")
+    report.add_argument("snapshot", nargs="?", help="Snapshot-Datei (Default: jüngster Snapshot in SNAPSHOT_PATH)")
+    _add_stage_arguments(report, suppress=True)
+    return parser
+
+
+def parse_options(args):
+    """Stufen-Optionen aus dem geparsten Namespace – --offline schließt den CSV-Download aus."""
+    return {
+        "download": args.download and not args.offline,
+        "offline": args.offline,
+        "excel": args.excel,
+        "sections": args.sections,
+        "open_browser": args.open_browser,
+        "plotlyjs": args.plotlyjs,
+        "chart_payload": args.chart_payload,
+        "detail": detail_policy(args.detail_top, args.detail_min_weight),
+        "render_workers": args.render_workers,
+    }
 
-    # Warnung wenn Einzelaktien ohne Sektor oder Standort im Depot sind –
-    # sie erscheinen nicht korrekt in Sektor- und Länderkarten
-    _aktien_ohne_meta = depot[
-        (depot["Art"] == "Aktie")
-        & (
-            depot["Sektor"].isna()
-            | depot["Sektor"].isin(["-", ""])
-            | depot["Standort"].isna()
-            | depot["Standort"].isin(["-", ""])
-        )
-    ]
-    if not _aktien_ohne_meta.empty:
-        logger.warning(
-            f"{len(_aktien_ohne_meta)} Einzelaktie(n) ohne Sektor/Standort – "
-            f"erscheinen nicht vollständig in Sektor- und Länderkarten:\n"
-            + _aktien_ohne_meta[["Ticker", "Position"]].to_string(index=False)
-        )
 
+def detail_policy(top_n=None, min_weight=None):
+    """Detail-Stufe der großen Treemaps (siehe treemap_detail) – None, wenn nichts zusammengefasst wird."""
+    if top_n is None and min_weight is None:
+        return None
+    return {"top_n": top_n, "min_weight": min_weight}
+
+
+def main(argv=None):
+    """
+    Einstiegspunkt der Kommandozeile.
+    :param argv: Argumente ohne Programmnamen (None = sys.argv[1:])
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.budget is not None and args.command in ("watch", "serve", "report"):
+        parser.error(f"--budget gilt nur für Einzel- und Batch-Läufe, nicht für '{args.command}'.")
+    options = parse_options(args)
+    if args.command == "batch":
+        main_batch(args.inputs, max_workers=args.workers, options=options, budget=args.budget)
+        return
+    if args.command == "watch":
+        main_watch(interval=args.interval, price_interval=args.price_interval, options=options)
+        return
+    if args.command == "serve":
+        main_serve(args.inputs, host=args.host, port=args.port, options=options)
+        return
+    if args.command == "report":
+        main_report(args.snapshot, options=options)
+        return
+
+    start = timeit.default_timer()
+    config = load_config()
+    budget = args.budget or config["RUN_BUDGET"]
+    with _timed_run(config, "main"), _cassette(config), run_budget(budget):
+        report_file = _run(config, options)
+
+    logger.info(f"Laufzeit: {timeit.default_timer() - start:.1f} Sekunden")
+    if report_file:
+        logger.info(f"Report: {report_file}")
+
+
+def _load_prices(config, depot, options):
+    """Kurse aus yFinance bzw. im Offline-Modus ausschließlich aus price_fallback.json."""
+    from scripts.data_download import download_stock_price, load_fallback_prices
+
+    if options["offline"]:
+        return load_fallback_prices(depot)
+    return download_stock_price(depot, config["STOCK_TICKER_SUFFIXES"], config["CRYPTO_TICKER_SUFFIXES"])
+
+
+def _run(config, options=None):
+    """
+    Einzel-Depot-Lauf (Schritte 1–9).
+    :param options: Stufen-Optionen (siehe DEFAULT_OPTIONS, None = alle Stufen)
+    :return: Pfad des HTML-Reports oder None, wenn kein Report erstellt wurde
+    """
+    from scripts.analysis import analyze_depot, flag_degraded, load_depot
+    from scripts.deadline import degraded_stages
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if not options["excel"] and options["sections"] == []:
+        logger.warning("Weder Excel-Export noch HTML-Report gewählt – es wird nur ausgewertet.")
+
+    # ------------------------------------------------------------------
+    # 1. CSV-Daten herunterladen, 2. ETF-Daten einlesen & bereinigen
+    #    (inkrementell: erst bei Bedarf in Schritt 5)
     # ------------------------------------------------------------------
-    # 5. Relative Gewichtung berechnen
+    if config["INCREMENTAL"]:
+        if options["download"]:
+            _download_csvs(config)
+    else:
+        etf_data = _load_universe(config, download=options["download"])
+
+    # ------------------------------------------------------------------
+    # 3. Depot-Daten einlesen
     # ------------------------------------------------------------------
     try:
-        etf_data, message = calculate_relative_weighting(etf_data, depot)
-        logger.info(message)
-    except Exception as e:
-        logger.error(f"Fehler bei der Gewichtungsberechnung: {e}")
+        with span("depot_load"):
+            depot = load_depot(config["INPUT_FILE"])
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"{e} Abbruch.")
         sys.exit(1)
 
     # ------------------------------------------------------------------
-    # 6. Assets zusammenführen
+    # 4. Aktienkurse herunterladen
     # ------------------------------------------------------------------
-    assets = (
-        depot[depot["Art"].isin(["Aktie", "Krypto"])][
-            ["Ticker", "Art", "Position", "Sektor", "Standort", "Marktwert (%)"]
-        ]
-        .rename(
-            columns={
-                "Ticker": "Emittententicker",
-                "Position": "Name",
-                "Art": "ETF",
-                "Marktwert (%)": "relative Gewichtung (%)",
-            }
-        )
-        .copy()
-    )
-    depot_data = pd.concat([etf_data, assets], ignore_index=True, sort=False)
-
-    # Chart-DataFrame: nur Zeilen mit echtem Sektor (kein '-', 'nan', Cash-Derivate)
-    # 'Sonstige' bleibt drin – unbekannte Sektoren/Länder werden dort gebündelt
-    depot_data_chart = depot_data[
-        depot_data["Sektor"].notna() & (~depot_data["Sektor"].astype(str).isin(EXCL_SECTORS))
-    ].copy()
-
-    # Krypto & Cash: nur ergänzen wenn sie NICHT bereits über assets in depot_data_chart sind
-    # (Krypto hat Sektor='Krypto' → übersteht den Sektor-Filter bereits, wäre sonst doppelt)
-    bereits_enthalten = set(depot_data_chart["Name"].dropna().unique())
-    extra_rows = []
-    for art in ["Krypto", "Cash"]:
-        positionen = depot[depot["Art"] == art]
-        for _, row in positionen.iterrows():
-            if (
-                pd.notna(row.get("Marktwert (%)"))
-                and row["Marktwert (%)"] > 0
-                and row["Position"] not in bereits_enthalten
-            ):
-                extra_rows.append(
-                    {
-                        "Name": row["Position"],
-                        "ETF": art,
-                        "Sektor": art,
-                        "Standort": art,
-                        "Emittententicker": row.get("Ticker", ""),
-                        "relative Gewichtung (%)": row["Marktwert (%)"],
-                    }
-                )
-    if extra_rows:
-        depot_data_chart = pd.concat([depot_data_chart, pd.DataFrame(extra_rows)], ignore_index=True, sort=False)
+    with span("price_fetch", positions=len(depot)):
+        stock_prices, fallback_used = _load_prices(config, depot, options)
+
+    if stock_prices is None or stock_prices.empty:
+        logger.error("Kursdownload fehlgeschlagen. Abbruch.")
+        sys.exit(1)
 
     # ------------------------------------------------------------------
-    # 7. Auswertungen erstellen
+    # 5.–7. Merge, relative Gewichtung, Auswertungen & KPIs
     # ------------------------------------------------------------------
-    def _agg(df, group_col, value_col, out_col):
-        return (
-            df.groupby(group_col)[value_col]
-            .sum()
-            .reset_index()
-            .rename(columns={value_col: out_col})
-            .sort_values(out_col, ascending=False)
-        )
+    try:
+        if config["INCREMENTAL"]:
+            result = _analyze_incremental(config, depot, stock_prices, fallback_used)
+        else:
+            result = analyze_depot(etf_data, depot, stock_prices, fallback_used)
+    except Exception as e:
+        logger.error(f"Fehler bei der Depotauswertung: {e}")
+        sys.exit(1)
 
-    depot_data_sectors = _agg(depot_data_chart, "Sektor", "relative Gewichtung (%)", "Sektorgewichtung (%)")
+    # Stufen, die wegen des Zeitbudgets auf Cache/Fallback ausgewichen sind, in den KPI-Cards markieren
+    if degraded_stages():
+        flag_degraded(result, degraded_stages())
 
-    # depot_data_etfs: Cash explizit ergänzen – Cash ist weder in etf_data noch in assets
-    depot_data_etfs = _agg(depot_data, "ETF", "relative Gewichtung (%)", "ETF-Gewichtung (%)")
-    cash_pct = depot.loc[depot["Art"] == "Cash", "Marktwert (%)"].sum()
-    if cash_pct > 0:
-        cash_row = pd.DataFrame([{"ETF": "Cash", "ETF-Gewichtung (%)": cash_pct}])
-        depot_data_etfs = pd.concat([depot_data_etfs, cash_row], ignore_index=True).sort_values(
-            "ETF-Gewichtung (%)", ascending=False
-        )
+    if config["SNAPSHOT"]:
+        from scripts.snapshot import save_snapshot
 
-    loc_df = depot_data_chart[
-        depot_data_chart["Standort"].notna() & (~depot_data_chart["Standort"].astype(str).isin(EXCL_LOCATIONS))
-    ]
-    depot_data_locations = _agg(loc_df, "Standort", "relative Gewichtung (%)", "Ländergewichtung (%)")
-
-    depot_data_stocks = (
-        depot_data_chart.groupby("Name")
-        .agg(
-            Emittententicker=("Emittententicker", "first"),
-            Gesamtgewichtung=("relative Gewichtung (%)", "sum"),
-            Sektor=("Sektor", "first"),
-            Standort=("Standort", "first"),
-        )
-        .reset_index()
-        .rename(columns={"Gesamtgewichtung": "Gesamtgewichtung (%)"})
-        .sort_values("Gesamtgewichtung (%)", ascending=False)
-    )
-    # Hinweis: Cash ist bereits über extra_rows in depot_data_chart und
-    # damit automatisch im groupby-Ergebnis enthalten – kein separater Append nötig
+        with span("snapshot_save"):
+            save_snapshot(result, config["SNAPSHOT_PATH"], meta={"input_file": config["INPUT_FILE"]})
 
     # ------------------------------------------------------------------
-    # 8. Excel-Export
+    # 8. Excel-Export, 9. HTML-Report erstellen (nur gewählte Abschnitte)
     # ------------------------------------------------------------------
-    export_to_excel(
-        OUTPUT_FILE, depot, depot_data, depot_data_stocks, depot_data_etfs, depot_data_sectors, depot_data_locations
+    return _export(config, result, options)
+
+
+def _export(config, result, options):
+    """Excel-Export und HTML-Report gemäß Stufen-Optionen. :return: Pfad des HTML-Reports oder None"""
+    from scripts.analysis import export_results
+
+    section_cache = config["CACHE_PATH"] if config["INCREMENTAL"] else None
+    return export_results(
+        result,
+        config["OUTPUT_FILE"] if options["excel"] else None,
+        os.path.join(config["SAVE_PATH"], "portfolio_report.html"),
+        open_browser=options["open_browser"],
+        cache_dir=section_cache,
+        sections=options["sections"],
+        plotlyjs=options["plotlyjs"],
+        chart_payload=options["chart_payload"],
+        detail=options["detail"],
+        render_workers=options["render_workers"],
     )
 
-    # ------------------------------------------------------------------
-    # 9. HTML-Report erstellen
-    # ------------------------------------------------------------------
-    gesamtwert = depot["Marktwert"].sum()
-    gesamtwert_label = _eur(gesamtwert) if gesamtwert_vollstaendig else f"{_eur(gesamtwert)} ⚠️ (unvollständig)"
-
-    # HHI-Diversifikations-Score
-    # Basis: depot_data_stocks – ETF-Durchblick, jede Einzelposition mit anteiligem Gewicht.
-    # Formel (FTC/DoJ Merger Guidelines 2023): HHI = Σ s_i²  (s_i = Marktanteil in %)
-    #   Skala 0–10.000: < 1.000 → nicht konzentriert
-    #                   1.000–1.800 → mäßig konzentriert
-    #                   > 1.800 → hoch konzentriert
-    # Für Anzeige auf 0–100 skaliert (÷ 100), Schwellenwerte entsprechend: 10 / 18
-    weights = depot_data_stocks["Gesamtgewichtung (%)"].dropna()
-    weights = weights[weights > 0]
-    weights_pct = weights / weights.sum() * 100  # s_i in %, Summe = 100
-    hhi_raw = (weights_pct**2).sum()  # Standard-HHI: 0–10.000
-    hhi_score = hhi_raw / 100  # Skaliert auf 0–100
-    logger.debug(
-        f"HHI-Berechnung: {len(weights_pct)} Positionen, "
-        f"Top-5 Gewichte: {weights_pct.nlargest(5).round(2).to_dict()}, "
-        f"HHI (0-100) = {hhi_score:.1f}"
-    )
-    n_positionen = len(depot_data_stocks)
-    n_sektoren = depot_data_chart["Sektor"].nunique()
-    n_laender = depot_data_chart[
-        depot_data_chart["Standort"].notna() & (~depot_data_chart["Standort"].astype(str).isin(EXCL_LOCATIONS))
-    ]["Standort"].nunique()
-    if hhi_score < 10:
-        hhi_stufe = "Nicht konzentriert"
-    elif hhi_score < 18:
-        hhi_stufe = "Mäßig konzentriert"
-    else:
-        hhi_stufe = "Hoch konzentriert"
-    hhi_label = (
-        f"{hhi_stufe}<br>"
-        f"<small>HHI {hhi_score:.1f} / 100 · "
-        f"{n_positionen} Positionen · "
-        f"{n_sektoren} Sektoren · "
-        f"{n_laender} Länder</small>"
-    )
 
-    # Top-5-Konzentrationsrisiko (ETF-Durchblick)
-    # Anteil der 5 größten Einzelpositionen am Gesamtdepot
-    top5_series = weights_pct.nlargest(5)
-    top5_pct = top5_series.sum()  # bereits in % (normalisiert auf 100)
-    top5_names = depot_data_stocks["Name"].iloc[:5].tolist()
-    top5_warning = top5_pct > 40
-    top5_label = (
-        f"{_de(top5_pct, 1, '%')}{'  ⚠️' if top5_warning else ''}<br>"
-        f"<small>{' · '.join(top5_names[:3])}{'  …' if len(top5_names) > 3 else ''}</small>"
-    )
+def _collect_inputs(inputs):
+    """Depot-Excel-Dateien aus Dateien und/oder Ordnern (daraus alle *.xlsx außer Excel-Sperrdateien)."""
+    input_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            input_files += sorted(
+                os.path.join(item, f)
+                for f in os.listdir(item)
+                if f.lower().endswith(".xlsx") and not f.startswith("~$")
+            )
+        else:
+            input_files.append(item)
+    return input_files
+
+
+def main_batch(inputs, max_workers=None, options=None, budget=None):
+    """
+    Batch-Modus: bereinigt das ETF-Universum einmal und wertet viele Depots parallel dagegen aus.
+    :param inputs: Depot-Excel-Dateien und/oder Ordner (daraus werden alle *.xlsx verwendet)
+    :param max_workers: Anzahl Worker-Prozesse (Default: Anzahl CPU-Kerne)
+    :param options: Stufen-Optionen (siehe DEFAULT_OPTIONS, None = alle Stufen; Reports öffnen nie den Browser)
+    :param budget: Zeitbudget in Sekunden für CSV-Download und Kursabruf (Default: RUN_BUDGET, None = unbegrenzt)
+    """
+    from scripts.batch import run_batch
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    start = timeit.default_timer()
+    config = load_config()
 
-    # Anzahl je Assetklasse für Positionen-Card
-    art_counts = depot["Art"].value_counts()
-
-    # KPI-Cards – gruppiert: Depot | Assetklassen | Qualität
-    depot_summary = {
-        # --- Depot-Übersicht ---
-        "Gesamtwert": gesamtwert_label,
-        "Positionen": " / ".join(f"{art_counts.get(a, 0)} {a}s" for a in ["ETF", "Aktie", "Krypto"])
-        + f" + {art_counts.get('Cash', 0)} Cash",
-        # --- Assetklassen-Anteile ---
-        "ETF-Anteil": _pct(depot.loc[depot["Art"] == "ETF", "Marktwert (%)"].sum()),
-        "Aktien-Anteil": _pct(depot.loc[depot["Art"] == "Aktie", "Marktwert (%)"].sum()),
-        "Krypto-Anteil": _pct(depot.loc[depot["Art"] == "Krypto", "Marktwert (%)"].sum()),
-        "Cash-Anteil": _pct(depot.loc[depot["Art"] == "Cash", "Marktwert (%)"].sum()),
-        # --- Qualität ---
-        "Diversifikation": hhi_label,
-        "Top-5-Konzentration": top5_label,
-    }
-    if fallback_used:
-        depot_summary["⚠️ Fallback-Kurse"] = f"{', '.join(fallback_used)} – kein Live-Kurs, historischen Wert verwendet"
-
-    # Sektor-Heatmap: Gewichtung je Sektor × ETF/Quelle
-    # Spalten = ETF-Name oder 'Aktie'/'Krypto', Zeilen = Sektor
-    heatmap_df = depot_data_chart.copy()
-    heatmap_df["Quelle"] = heatmap_df["ETF"]
-    sector_pivot = (
-        heatmap_df.groupby(["Sektor", "Quelle"])["relative Gewichtung (%)"].sum().unstack(fill_value=0).round(2)
-    )
-    # Sektoren absteigend nach Gesamtgewichtung sortieren
-    sector_pivot = sector_pivot.loc[sector_pivot.sum(axis=1).sort_values(ascending=False).index]
-
-    # Treemap Anlageart → Position (Depot-Ebene, kein ETF-Durchblick)
-    treemap_art_df = depot[depot["Marktwert (%)"] > 0][["Art", "Position", "Marktwert (%)"]].copy()
-
-    # Warnung wenn Positionen ohne Marktwert im Depot sind – sie erscheinen nicht im Pie-Chart
-    _no_value = depot[depot["Marktwert (%)"].isna() | (depot["Marktwert (%)"] <= 0)]
-    if not _no_value.empty:
-        logger.warning(
-            f"{len(_no_value)} Position(en) ohne Marktwert – nicht im Übersichts-Chart:\n"
-            + _no_value[["Ticker", "Position", "Art"]].to_string(index=False)
-        )
+    input_files = _collect_inputs(inputs)
+    if not input_files:
+        logger.error("Batch-Modus: keine Depot-Dateien angegeben. Abbruch.")
+        sys.exit(1)
 
-    report_sections = [
-        {
-            "title": "Depotübersicht",
-            "html": build_depot_table(depot),
-            "description": "Alle Positionen mit aktuellem Kurs, Marktwert und Depotanteil.",
-        },
-        {
-            "title": "Übersicht nach Depot",
-            "fig": build_pie_chart(depot, "Marktwert (%)", "Position", "Übersicht nach Depot"),
-            "description": "Marktwertsanteil jeder Depotposition.",
-        },
-        {
-            "title": "Kapitalverteilung: Anlageart → Position",
-            "fig": build_treemap(
-                treemap_art_df, ["Art", "Position"], "Marktwert (%)", "Kapitalverteilung: Anlageart → Position"
-            ),
-            "description": "Kapitalverteilung auf Depot-Ebene nach Anlageart und Position – ersetzt den einfachen Anlageart-Pie.",
-        },
-        {
-            "title": "Top 20 Positionen – Balken",
-            "fig": build_bar_chart(depot_data_stocks, "Gesamtgewichtung (%)", "Name", "Top 20 Positionen", top_n=20),
-            "description": "Die 20 größten Einzelpositionen nach Gesamtgewichtung (inkl. ETF-Durchblick).",
-        },
-        {
-            "title": "Länder – Treemap",
-            "fig": build_treemap(
-                depot_data_chart[
-                    depot_data_chart["Standort"].notna()
-                    & (~depot_data_chart["Standort"].astype(str).isin(EXCL_LOCATIONS))
-                    & (depot_data_chart["relative Gewichtung (%)"] > 0)
-                ]
-                .dropna(subset=["Standort", "Name"])
-                .groupby(["Standort", "Name"], as_index=False)["relative Gewichtung (%)"]
-                .sum(),
-                ["Standort", "Name"],
-                "relative Gewichtung (%)",
-                "Ländergewichtung",
-            ),
-            "description": "Geografische Gewichtung inkl. ETF-Durchblick – Fläche entspricht der Gewichtung, Unterebene zeigt Einzelpositionen.",
-        },
-        {
-            "title": "Sektor-Heatmap: ETF-Überschneidungen",
-            "fig": build_heatmap(sector_pivot, "Sektorgewichtung (%) je ETF / Assetklasse", colorscale="Blues"),
-            "description": (
-                "Zeigt wie stark jeder Sektor in jedem ETF / jeder Assetklasse gewichtet ist (in %). "
-                "Überschneidungen zeigen Klumpenrisiken."
-            ),
-        },
-    ]
-
-    if {"Sektor", "Name", "relative Gewichtung (%)"}.issubset(depot_data_chart.columns):
-        # Auf Name-Ebene aggregieren → identische Gewichtungen wie Top-20-Balken
-        treemap_data = (
-            depot_data_chart[depot_data_chart["relative Gewichtung (%)"] > 0]
-            .dropna(subset=["Sektor", "Name"])
-            .groupby(["Sektor", "Name"], as_index=False)["relative Gewichtung (%)"]
-            .sum()
+    output_dir = os.path.join(config["SAVE_PATH"], "batch")
+    with _timed_run(config, "batch"), _cassette(config), run_budget(budget or config["RUN_BUDGET"]):
+        etf_data = _load_universe(config, download=options["download"])
+        run_batch(
+            input_files,
+            etf_data,
+            output_dir,
+            config["STOCK_TICKER_SUFFIXES"],
+            config["CRYPTO_TICKER_SUFFIXES"],
+            max_workers=max_workers,
+            excel=options["excel"],
+            sections=options["sections"],
+            plotlyjs=options["plotlyjs"],
+            chart_payload=options["chart_payload"],
+            detail=options["detail"],
+            offline=options["offline"],
         )
-        report_sections.append(
-            {
-                "title": "Treemap: Sektor → Position",
-                "fig": build_treemap(
-                    treemap_data, ["Sektor", "Name"], "relative Gewichtung (%)", "Treemap: Sektor → Position"
-                ),
-                "description": "Hierarchische Ansicht aller Positionen inkl. ETF-Durchblick – Fläche entspricht der Gewichtung.",
-            }
+
+    logger.info(f"Laufzeit: {timeit.default_timer() - start:.1f} Sekunden")
+    logger.info(f"Batch-Ausgabe: {output_dir}")
+
+
+def _ignore_budget(config, mode):
+    """Warnt, wenn RUN_BUDGET gesetzt ist, der Modus aber kein Zeitbudget kennt."""
+    if config["RUN_BUDGET"]:
+        logger.warning(f"RUN_BUDGET gilt nur für Einzel- und Batch-Läufe – wird im Modus '{mode}' ignoriert.")
+
+
+def main_watch(interval=None, price_interval=None, options=None):
+    """
+    Watch-Modus: hält bereinigtes Universum, Durchblick, Kurs-Cache und Report-Abschnitte im Speicher und
+    rechnet bei Änderungen an INPUT_FILE, den ETF-CSVs oder den Kursen nur das Nötige neu.
+    :param interval: Sekunden zwischen Datei-Checks (Default: WATCH_INTERVAL)
+    :param price_interval: Sekunden zwischen Kursabrufen (Default: PRICE_INTERVAL)
+    :param options: Stufen-Optionen (siehe DEFAULT_OPTIONS); der Browser öffnet sich nur beim ersten Report
+    """
+    from scripts.watch import run_watch
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    config = load_config()
+    _ignore_budget(config, "watch")
+    with _cassette(config):
+        run_watch(
+            config,
+            options,
+            load_prices=lambda depot: _load_prices(config, depot, options),
+            interval=interval or config["WATCH_INTERVAL"],
+            price_interval=price_interval or config["PRICE_INTERVAL"],
+            download_csvs=(lambda: _download_csvs(config)) if options["download"] else None,
+            run_context=lambda: _timed_run(config, "watch"),
         )
 
-    report_file = os.path.join(SAVE_PATH, "portfolio_report.html")
-    export_html_report(report_sections, report_file, depot_summary=depot_summary)
+
+def main_serve(inputs=None, host="127.0.0.1", port=8765, options=None):
+    """
+    Abfrage-Service: wertet die Depots einmal aus und beantwortet danach JSON-Abfragen aus dem Speicher.
+    :param inputs: Depot-Excel-Dateien und/oder Ordner (Default: INPUT_FILE)
+    :param host: Adresse des Servers (Default: nur localhost)
+    :param port: TCP-Port
+    :param options: Stufen-Optionen (siehe DEFAULT_OPTIONS; relevant sind 'download' und 'offline')
+    """
+    from scripts.query_service import create_service, load_portfolios, serve
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    config = load_config()
+    _ignore_budget(config, "serve")
+    input_files = _collect_inputs(inputs or [config["INPUT_FILE"]])
+
+    with _timed_run(config, "serve"), _cassette(config):
+        etf_data = _load_universe(config, download=options["download"])
+        with span("analysis", portfolios=len(input_files)):
+            results = load_portfolios(input_files, etf_data, lambda depot: _load_prices(config, depot, options))
+        if not results:
+            logger.error("Abfrage-Service: kein Depot konnte ausgewertet werden. Abbruch.")
+            sys.exit(1)
+        with span("index_build"):
+            service = create_service(results, etf_data)
+    serve(service, host, port)
+
+
+def main_report(snapshot=None, options=None):
+    """
+    Report-Modus: erzeugt Excel und HTML-Report direkt aus einem Snapshot – ohne Download, Einlesen oder
+    Neuberechnung (z.B. nach Layout-Änderungen oder für den Report eines älteren Laufs).
+    :param snapshot: Snapshot-Datei (Default: jüngster Snapshot in SNAPSHOT_PATH)
+    :param options: Stufen-Optionen (siehe DEFAULT_OPTIONS; relevant sind 'excel', 'sections', 'open_browser')
+    """
+    from scripts.snapshot import SnapshotError, latest_snapshot, load_snapshot
+
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    start = timeit.default_timer()
+    config = load_config()
+    _ignore_budget(config, "report")
+
+    path = snapshot or latest_snapshot(config["SNAPSHOT_PATH"])
+    if path is None:
+        logger.error(f"Kein Snapshot in '{config['SNAPSHOT_PATH']}' – zuerst einen normalen Lauf starten. Abbruch.")
+        sys.exit(1)
+
+    with _timed_run(config, "report"):
+        try:
+            with span("snapshot_load"):
+                payload = load_snapshot(path)
+        except SnapshotError as e:
+            logger.error(f"{e} Abbruch.")
+            sys.exit(1)
+        logger.info(f"Snapshot vom {payload['created']} geladen: {path}")
+        report_file = _export(config, payload["result"], options)
 
     logger.info(f"Laufzeit: {timeit.default_timer() - start:.1f} Sekunden")
-    logger.info(f"Report: {report_file}")
+    if report_file:
+        logger.info(f"Report: {report_file}")
 
 
 if __name__ == "__main__":
+    # python main.py [Optionen]                          → Einzel-Depot aus INPUT_FILE
+    # python main.py batch <depot.xlsx|ordner> … [Optionen] → Batch-Modus über viele Depots
+    # python main.py watch [--interval S] [Optionen]     → bleibt im Speicher, reagiert auf Änderungen
+    # python main.py serve [depot.xlsx …] [--port P]     → lokaler JSON-Abfrage-Service
+    # python main.py report [snapshot.pkl] [Optionen]    → Excel/HTML aus dem letzten Snapshot neu erzeugen
+    # python main.py --help                              → alle Optionen
     main()
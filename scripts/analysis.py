@@ -0,0 +1,862 @@
+# analysis.py
+
+import hashlib
+import inspect
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts.artifact_cache import artifact_key, cached_artifact, file_digest, load_artifact, store_artifact
+from scripts.data_processing import (
+    EXCL_LOCATIONS,
+    EXCL_SECTORS,
+    calculate_relative_weighting,
+    clean_etf_data,
+    cleaning_fingerprint,
+)
+from scripts.file_handling import export_to_excel, read_etf_data
+from scripts.formatting import _de, _eur, _pct
+from scripts.instrumentation import span
+
+# scripts.plotting (und damit Plotly) wird erst beim Bauen des HTML-Reports importiert –
+# Läufe ohne Report (z.B. nur Excel) laden Plotly gar nicht
+
+logger = logging.getLogger(__name__)
+
+# Pflicht-Spalten der Depot-Excel
+REQUIRED_DEPOT_COLUMNS = {"Art", "Position", "Ticker", "Anteile"}
+
+# Version der gecachten Report-Abschnitte – erhöhen, wenn sich Hilfsfunktionen der Builder ändern
+# (der Quelltext der Builder selbst fließt bereits in den Fingerprint ein)
+SECTION_CACHE_VERSION = 3
+# Anzahl gecachter Report-Abschnitte (mehrere Läufe × 7 Abschnitte)
+_SECTION_CACHE_SIZE = 50
+
+# Kurznamen der Report-Abschnitte in Report-Reihenfolge (Auswahl per --sections)
+REPORT_SECTIONS = ("tabelle", "depot", "anlageart", "top20", "laender", "heatmap", "sektoren")
+
+
+# ---------------------------------------------------------------------------
+# Einlesen: ETF-Universum & Depot
+# ---------------------------------------------------------------------------
+
+
+def etf_universe_key(download_path, etf_csv_files):
+    """
+    Inhaltsbasierter Cache-Schlüssel des ETF-Universums: Hashes aller CSVs + Fingerprint der Mappings/Ausschlüsse.
+    Ändert sich weder eine CSV noch ein Mapping, bleibt der Schlüssel gleich.
+    """
+    parts = [cleaning_fingerprint()]
+    for f in etf_csv_files:
+        parts += [f, file_digest(os.path.join(download_path, f))]
+    return artifact_key(*parts)
+
+
+def load_etf_universe(download_path, etf_csv_files, cache_dir=None):
+    """
+    Liest alle konfigurierten iShares-CSVs ein und bereinigt sie zu einem gemeinsamen Holdings-Universum.
+    :param download_path: Ordner, in dem die CSV-Dateien liegen
+    :param etf_csv_files: Liste der CSV-Dateinamen
+    :param cache_dir: Verzeichnis des Artefakt-Caches. Bei unveränderten CSVs und Mappings wird das bereinigte
+                      Universum von dort geladen und Einlesen + Bereinigung übersprungen. None = kein Cache
+    :return: bereinigtes ETF-DataFrame oder None, wenn keine CSV gelesen werden konnte
+    """
+
+    def _build():
+        with span("ingest", files=len(etf_csv_files)):
+            etf_data_list = [
+                df for f in etf_csv_files if (df := read_etf_data(os.path.join(download_path, f))) is not None
+            ]
+            if not etf_data_list:
+                return None
+            raw = pd.concat(etf_data_list, ignore_index=True)
+        with span("clean", rows=len(raw)):
+            return clean_etf_data(raw)
+
+    with span("etf_universe"):
+        key = etf_universe_key(download_path, etf_csv_files) if cache_dir else None
+        etf_data = cached_artifact(cache_dir, "etf_universe", key, _build)
+    if etf_data is not None:
+        logger.info(f"ETF-Daten geladen und bereinigt: {len(etf_data)} verwertbare Positionen.")
+    return etf_data
+
+
+def load_depot(input_file):
+    """
+    Liest die Depot-Excel ein und prüft die Pflicht-Spalten.
+    :param input_file: Pfad zur Depot-Excel
+    :return: Depot-DataFrame
+    :raises FileNotFoundError: wenn die Datei nicht existiert
+    :raises ValueError: wenn Pflicht-Spalten fehlen oder das Depot leer ist
+    """
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Eingabedatei '{input_file}' nicht gefunden.")
+
+    depot = pd.read_excel(input_file)
+    logger.info(f"Depot geladen: {depot.shape[0]} Positionen.")
+
+    missing_cols = REQUIRED_DEPOT_COLUMNS - set(depot.columns)
+    if missing_cols:
+        raise ValueError(f"Depot-Excel fehlt Pflicht-Spalten: {missing_cols}.")
+    if depot.empty:
+        raise ValueError("Depot-Excel ist leer.")
+    return depot
+
+
+# ---------------------------------------------------------------------------
+# Kurse & Depotgewichte
+# ---------------------------------------------------------------------------
+
+
+def price_depot(depot, stock_prices):
+    """
+    Ergänzt das Depot um Kurs, Marktwert und Marktwert (%).
+    :param depot: Depot-DataFrame aus load_depot
+    :param stock_prices: DataFrame mit Spalten 'Ticker' und 'Kurs' (aus download_stock_price)
+    :return: Tuple (bewertetes Depot, True wenn für alle Positionen ein Kurs vorliegt)
+    :raises ValueError: wenn der Gesamtwert des Depots 0 oder negativ ist
+    """
+    depot = depot.copy()
+
+    # Originalen Ticker (aus Excel, z.B. '2B7K.DE') sichern – Merge überschreibt Ticker-Spalte
+    depot["Ticker_orig_excel"] = depot["Ticker"]
+
+    # Ticker-Suffix bereinigen für den Merge
+    depot["Ticker_clean"] = depot["Ticker"].str.replace(r"\..*$", "", regex=True)
+    depot.loc[depot["Art"] == "Krypto", "Ticker_clean"] = depot["Ticker"].str.replace(r"\-.*$", "", regex=True)
+
+    stock_prices = stock_prices.drop_duplicates(subset="Ticker", keep="first")
+    depot = depot.merge(
+        stock_prices[["Ticker", "Kurs"]], left_on="Ticker_clean", right_on="Ticker", how="left", suffixes=("_orig", "")
+    )
+    # Merge-Hilfsspalten entfernen, originalen Ticker wiederherstellen
+    depot.drop(columns=["Ticker_orig", "Ticker_clean"], errors="ignore", inplace=True)
+    depot["Ticker"] = depot["Ticker_orig_excel"]
+    depot.drop(columns=["Ticker_orig_excel"], inplace=True)
+
+    depot["Kurs"] = pd.to_numeric(depot["Kurs"], errors="coerce")
+    depot["Anteile"] = pd.to_numeric(depot["Anteile"], errors="coerce")
+    depot["Marktwert"] = depot["Anteile"] * depot["Kurs"]
+
+    missing_kurs = depot[depot["Kurs"].isna()]
+    if not missing_kurs.empty:
+        logger.warning(
+            f"Für {len(missing_kurs)} Position(en) kein Kurs – Gesamtwert UNVOLLSTÄNDIG:\n"
+            + missing_kurs[["Ticker", "Position", "Art"]].to_string(index=False)
+        )
+
+    gesamtwert_vollstaendig = missing_kurs.empty
+    total_marktwert = depot["Marktwert"].sum()
+    if total_marktwert <= 0:
+        raise ValueError("Gesamtwert des Depots ist 0 oder negativ – kein gültiger Kurs vorhanden.")
+    depot["Marktwert (%)"] = depot["Marktwert"] / total_marktwert * 100
+    logger.debug(f"Depot nach Kursberechnung:\n{depot.to_string()}")
+    n_missing = depot["Kurs"].isna().sum()
+    logger.info(
+        f"Depot berechnet: {len(depot)} Positionen, Gesamtwert {total_marktwert:,.2f} €"
+        + (f", {n_missing} ohne Kurs" if n_missing else "")
+    )
+
+    # Warnung wenn Einzelaktien ohne Sektor oder Standort im Depot sind –
+    # sie erscheinen nicht korrekt in Sektor- und Länderkarten
+    if {"Sektor", "Standort"}.issubset(depot.columns):
+        aktien_ohne_meta = depot[
+            (depot["Art"] == "Aktie")
+            & (
+                depot["Sektor"].isna()
+                | depot["Sektor"].isin(["-", ""])
+                | depot["Standort"].isna()
+                | depot["Standort"].isin(["-", ""])
+            )
+        ]
+        if not aktien_ohne_meta.empty:
+            logger.warning(
+                f"{len(aktien_ohne_meta)} Einzelaktie(n) ohne Sektor/Standort – "
+                f"erscheinen nicht vollständig in Sektor- und Länderkarten:\n"
+                + aktien_ohne_meta[["Ticker", "Position"]].to_string(index=False)
+            )
+
+    return depot, gesamtwert_vollstaendig
+
+
+def clean_depot_tickers(depot):
+    """Gibt die für den Kursabgleich bereinigten Ticker des Depots zurück (ohne Börsen-/Währungssuffix)."""
+    tickers = depot["Ticker"].astype(str).str.replace(r"\..*$", "", regex=True)
+    krypto = depot["Art"] == "Krypto"
+    tickers[krypto] = depot.loc[krypto, "Ticker"].astype(str).str.replace(r"\-.*$", "", regex=True)
+    return set(tickers)
+
+
+# ---------------------------------------------------------------------------
+# ETF-Durchblick & Auswertungen
+# ---------------------------------------------------------------------------
+
+
+# Direktpositionen, die im Chart eine eigene Zeile bekommen (Reihenfolge = Reihenfolge im Chart)
+_CHART_DIRECT_ARTS = ["Krypto", "Cash"]
+
+
+def direct_chart_rows(depot, depot_data_chart):
+    """
+    Krypto- und Cash-Positionen als Chart-Zeilen, die noch nicht in depot_data_chart enthalten sind.
+    Anti-Join über den Positionsnamen (Schlüssel der Positions-Auswertung) – ohne Gewichtsfilter.
+    :param depot: bewertetes Depot (price_depot)
+    :param depot_data_chart: Chart-DataFrame nach Sektor-Filter
+    :return: DataFrame im Spaltenformat von depot_data_chart; Index = Index der Depotzeile
+    """
+    direct = depot[depot["Art"].isin(_CHART_DIRECT_ARTS)]
+    order = direct["Art"].map({art: i for i, art in enumerate(_CHART_DIRECT_ARTS)}).to_numpy()
+    direct = direct.iloc[np.argsort(order, kind="stable")]
+    direct = direct[~direct["Position"].isin(depot_data_chart["Name"].dropna().unique())]
+    return pd.DataFrame(
+        {
+            "Name": direct["Position"],
+            "ETF": direct["Art"],
+            "Sektor": direct["Art"],
+            "Standort": direct["Art"],
+            "Emittententicker": direct["Ticker"],
+            "relative Gewichtung (%)": direct["Marktwert (%)"],
+        }
+    )
+
+
+def build_depot_data(etf_data, depot):
+    """
+    Verrechnet ETF-Positionen mit den Depotgewichten und ergänzt Direktpositionen.
+    :param etf_data: bereinigtes ETF-Universum (clean_etf_data)
+    :param depot: bewertetes Depot (price_depot)
+    :return: Tuple (depot_data, depot_data_chart)
+    """
+    etf_data, message = calculate_relative_weighting(etf_data, depot)
+    logger.info(message)
+
+    assets = (
+        depot[depot["Art"].isin(["Aktie", "Krypto"])][
+            ["Ticker", "Art", "Position", "Sektor", "Standort", "Marktwert (%)"]
+        ]
+        .rename(
+            columns={
+                "Ticker": "Emittententicker",
+                "Position": "Name",
+                "Art": "ETF",
+                "Marktwert (%)": "relative Gewichtung (%)",
+            }
+        )
+        .copy()
+    )
+    depot_data = pd.concat([etf_data, assets], ignore_index=True, sort=False)
+
+    # Chart-DataFrame: nur Zeilen mit echtem Sektor (kein '-', 'nan', Cash-Derivate)
+    # 'Sonstige' bleibt drin – unbekannte Sektoren/Länder werden dort gebündelt
+    depot_data_chart = depot_data[
+        depot_data["Sektor"].notna() & (~depot_data["Sektor"].astype(str).isin(EXCL_SECTORS))
+    ].copy()
+
+    # Krypto & Cash: nur ergänzen wenn sie NICHT bereits über assets in depot_data_chart sind
+    # (Krypto hat Sektor='Krypto' → übersteht den Sektor-Filter bereits, wäre sonst doppelt)
+    extra_rows = direct_chart_rows(depot, depot_data_chart)
+    weights = extra_rows["relative Gewichtung (%)"]
+    extra_rows = extra_rows[weights.notna() & (weights > 0)]
+    if not extra_rows.empty:
+        depot_data_chart = pd.concat([depot_data_chart, extra_rows], ignore_index=True, sort=False)
+
+    return depot_data, depot_data_chart
+
+
+def _agg(df, group_col, value_col, out_col):
+    return (
+        df.groupby(group_col)[value_col]
+        .sum()
+        .reset_index()
+        .rename(columns={value_col: out_col})
+        .sort_values(out_col, ascending=False)
+    )
+
+
+# Schlüssel des Aggregations-Würfels: Wertpapier (Name + Ticker), Sektor, Land, Quelle (ETF / Anlageart)
+CUBE_KEYS = ["Name", "Emittententicker", "Sektor", "Standort", "ETF"]
+
+
+def build_aggregation_cube(depot_data_chart):
+    """
+    Verdichtet depot_data_chart in einem einzigen Durchlauf zu einem Würfel über CUBE_KEYS.
+    Alle Chart-Auswertungen (Sektoren, Länder, Positionen, Heatmap, Treemaps) sind Roll-ups dieses Würfels.
+    Die Schlüssel werden einmal faktorisiert und als sortierte Kategorien abgelegt – Roll-ups gruppieren
+    dadurch über Integer-Codes statt erneut Strings zu hashen.
+    :return: DataFrame mit CUBE_KEYS (kategorial, Zeilen in Reihenfolge des ersten Auftretens) und den Spalten
+             'Gewichtung' (Summe aller Zeilen), 'Gewichtung positiv' (Summe der Zeilen > 0) und
+             'Land gültig' (Standort gesetzt und nicht in EXCL_LOCATIONS)
+    """
+    codes, categories = {}, {}
+    for key in CUBE_KEYS:
+        # sort=True → Kategorien alphabetisch, Roll-ups liefern dieselbe Gruppenreihenfolge wie groupby auf Strings
+        codes[key], categories[key] = pd.factorize(depot_data_chart[key], sort=True)
+
+    weights = depot_data_chart["relative Gewichtung (%)"].to_numpy(dtype=float)
+    grouped = pd.DataFrame(
+        {
+            **codes,
+            "Gewichtung": weights,
+            "Gewichtung positiv": np.where(weights > 0, weights, 0.0),
+        }
+    )
+    cube = grouped.groupby(CUBE_KEYS, sort=False).sum().reset_index()
+
+    for key in CUBE_KEYS:
+        cube[key] = pd.Categorical.from_codes(cube[key].to_numpy(), categories=categories[key], validate=False)
+
+    # Länder-Filter einmal je Land auswerten – gilt für Länder-Auswertung, Länder-Treemap und KPI
+    valid_locations = ~categories["Standort"].astype(str).isin(EXCL_LOCATIONS)
+    location_codes = cube["Standort"].cat.codes.to_numpy()
+    cube["Land gültig"] = (location_codes >= 0) & valid_locations[location_codes]
+    return cube
+
+
+def _decategorize(df):
+    """Wandelt kategoriale Würfel-Schlüssel in einem Roll-up-Ergebnis zurück in ihren ursprünglichen Typ."""
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+def _rollup(cube, group_col, value_col, out_col):
+    """Wie _agg, aber über einen kategorialen Würfel-Schlüssel (nur beobachtete Kategorien)."""
+    return _decategorize(
+        cube.groupby(group_col, observed=True)[value_col]
+        .sum()
+        .reset_index()
+        .rename(columns={value_col: out_col})
+        .sort_values(out_col, ascending=False)
+    )
+
+
+def build_aggregations(depot, depot_data, depot_data_chart):
+    """
+    Erstellt die Auswertungen nach Sektor, ETF, Land und Einzelposition sowie die Chart-Eingaben.
+    Chart-bezogene Auswertungen sind Roll-ups des Aggregations-Würfels (build_aggregation_cube).
+    :return: Dict mit den Schlüsseln 'depot_data_cube', 'depot_data_sectors', 'depot_data_etfs',
+             'depot_data_locations', 'depot_data_stocks', 'sector_pivot', 'country_treemap_data'
+             und 'sector_treemap_data'
+    """
+    cube = build_aggregation_cube(depot_data_chart)
+
+    depot_data_sectors = _rollup(cube, "Sektor", "Gewichtung", "Sektorgewichtung (%)")
+
+    # depot_data_etfs: ungefilterter Durchblick (inkl. Cash/Derivate innerhalb der ETFs) – daher nicht aus dem
+    # Chart-Würfel. Cash explizit ergänzen – Cash ist weder in etf_data noch in assets
+    depot_data_etfs = _agg(depot_data, "ETF", "relative Gewichtung (%)", "ETF-Gewichtung (%)")
+    cash_pct = depot.loc[depot["Art"] == "Cash", "Marktwert (%)"].sum()
+    if cash_pct > 0:
+        cash_row = pd.DataFrame([{"ETF": "Cash", "ETF-Gewichtung (%)": cash_pct}])
+        depot_data_etfs = pd.concat([depot_data_etfs, cash_row], ignore_index=True).sort_values(
+            "ETF-Gewichtung (%)", ascending=False
+        )
+
+    depot_data_locations = _rollup(cube[cube["Land gültig"]], "Standort", "Gewichtung", "Ländergewichtung (%)")
+
+    # "first" je Name entspricht der Zeilenreihenfolge in depot_data_chart, da der Würfel nach erstem Auftreten
+    # sortiert ist und alle "first"-Spalten Würfel-Schlüssel sind
+    depot_data_stocks = _decategorize(
+        cube.groupby("Name", observed=True)
+        .agg(
+            Emittententicker=("Emittententicker", "first"),
+            Gesamtgewichtung=("Gewichtung", "sum"),
+            Sektor=("Sektor", "first"),
+            Standort=("Standort", "first"),
+        )
+        .reset_index()
+        .rename(columns={"Gesamtgewichtung": "Gesamtgewichtung (%)"})
+        .sort_values("Gesamtgewichtung (%)", ascending=False)
+    )
+    # Hinweis: Cash ist bereits über extra_rows in depot_data_chart und
+    # damit automatisch im groupby-Ergebnis enthalten – kein separater Append nötig
+
+    # Sektor-Heatmap: Gewichtung je Sektor × ETF/Quelle
+    # Spalten = ETF-Name oder 'Aktie'/'Krypto', Zeilen = Sektor
+    sector_pivot = (
+        _decategorize(cube.rename(columns={"ETF": "Quelle"})[["Sektor", "Quelle", "Gewichtung"]])
+        .groupby(["Sektor", "Quelle"])["Gewichtung"]
+        .sum()
+        .unstack(fill_value=0)
+        .round(2)
+    )
+    # Sektoren absteigend nach Gesamtgewichtung sortieren
+    sector_pivot = sector_pivot.loc[sector_pivot.sum(axis=1).sort_values(ascending=False).index]
+
+    # Treemaps: nur Zeilen mit Gewichtung > 0, auf Name-Ebene aggregiert → identisch zum Top-20-Balken
+    positive = cube[cube["Gewichtung positiv"] > 0]
+
+    def _treemap_data(df, parent_col):
+        return _decategorize(
+            df.dropna(subset=[parent_col, "Name"])
+            .groupby([parent_col, "Name"], as_index=False, observed=True)["Gewichtung positiv"]
+            .sum()
+            .rename(columns={"Gewichtung positiv": "relative Gewichtung (%)"})
+        )
+
+    return {
+        "depot_data_cube": cube,
+        "depot_data_sectors": depot_data_sectors,
+        "depot_data_etfs": depot_data_etfs,
+        "depot_data_locations": depot_data_locations,
+        "depot_data_stocks": depot_data_stocks,
+        "sector_pivot": sector_pivot,
+        "country_treemap_data": _treemap_data(positive[positive["Land gültig"]], "Standort"),
+        "sector_treemap_data": _treemap_data(positive, "Sektor"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Kennzahlen & KPI-Cards
+# ---------------------------------------------------------------------------
+
+
+def compute_kpis(depot, aggregations):
+    """
+    Berechnet die numerischen Depot-Kennzahlen (Gesamtwert, Assetklassen-Anteile, HHI, Top-5).
+    :return: Dict mit Roh-Kennzahlen – Grundlage für KPI-Cards und Batch-Zusammenfassung
+    """
+    depot_data_stocks = aggregations["depot_data_stocks"]
+    cube = aggregations["depot_data_cube"]
+
+    # HHI-Diversifikations-Score
+    # Basis: depot_data_stocks – ETF-Durchblick, jede Einzelposition mit anteiligem Gewicht.
+    # Formel (FTC/DoJ Merger Guidelines 2023): HHI = Σ s_i²  (s_i = Marktanteil in %)
+    #   Skala 0–10.000: < 1.000 → nicht konzentriert
+    #                   1.000–1.800 → mäßig konzentriert
+    #                   > 1.800 → hoch konzentriert
+    # Für Anzeige auf 0–100 skaliert (÷ 100), Schwellenwerte entsprechend: 10 / 18
+    weights = depot_data_stocks["Gesamtgewichtung (%)"].dropna()
+    weights = weights[weights > 0]
+    weights_pct = weights / weights.sum() * 100  # s_i in %, Summe = 100
+    hhi_raw = (weights_pct**2).sum()  # Standard-HHI: 0–10.000
+    hhi_score = hhi_raw / 100  # Skaliert auf 0–100
+    logger.debug(
+        f"HHI-Berechnung: {len(weights_pct)} Positionen, "
+        f"Top-5 Gewichte: {weights_pct.nlargest(5).round(2).to_dict()}, "
+        f"HHI (0-100) = {hhi_score:.1f}"
+    )
+
+    # Top-5-Konzentrationsrisiko (ETF-Durchblick)
+    # Anteil der 5 größten Einzelpositionen am Gesamtdepot
+    top5_pct = weights_pct.nlargest(5).sum()  # bereits in % (normalisiert auf 100)
+
+    art_pct = depot.groupby("Art")["Marktwert (%)"].sum()
+    return {
+        "gesamtwert": depot["Marktwert"].sum(),
+        "art_counts": depot["Art"].value_counts().to_dict(),
+        "etf_pct": art_pct.get("ETF", 0.0),
+        "aktien_pct": art_pct.get("Aktie", 0.0),
+        "krypto_pct": art_pct.get("Krypto", 0.0),
+        "cash_pct": art_pct.get("Cash", 0.0),
+        "hhi_score": hhi_score,
+        "n_positionen": len(depot_data_stocks),
+        "n_sektoren": cube["Sektor"].nunique(),
+        "n_laender": cube.loc[cube["Land gültig"], "Standort"].nunique(),
+        "top5_pct": top5_pct,
+        "top5_names": depot_data_stocks["Name"].iloc[:5].tolist(),
+    }
+
+
+def hhi_stufe(hhi_score):
+    """Qualitätsstufe des HHI-Scores (Skala 0–100) nach FTC/DoJ-Schwellenwerten."""
+    if hhi_score < 10:
+        return "Nicht konzentriert"
+    if hhi_score < 18:
+        return "Mäßig konzentriert"
+    return "Hoch konzentriert"
+
+
+def build_depot_summary(kpis, gesamtwert_vollstaendig=True, fallback_used=None):
+    """
+    Erstellt die KPI-Cards für den Kopfbereich des HTML-Reports.
+    :param kpis: Kennzahlen aus compute_kpis
+    :param gesamtwert_vollstaendig: False, wenn mindestens eine Position ohne Kurs ist
+    :param fallback_used: Ticker, für die ein Fallback-Kurs verwendet wurde
+    :return: Dict Label → formatierter Wert
+    """
+    gesamtwert = kpis["gesamtwert"]
+    gesamtwert_label = _eur(gesamtwert) if gesamtwert_vollstaendig else f"{_eur(gesamtwert)} ⚠️ (unvollständig)"
+
+    hhi_label = (
+        f"{hhi_stufe(kpis['hhi_score'])}<br>"
+        f"<small>HHI {kpis['hhi_score']:.1f} / 100 · "
+        f"{kpis['n_positionen']} Positionen · "
+        f"{kpis['n_sektoren']} Sektoren · "
+        f"{kpis['n_laender']} Länder</small>"
+    )
+
+    top5_names = kpis["top5_names"]
+    top5_warning = kpis["top5_pct"] > 40
+    top5_label = (
+        f"{_de(kpis['top5_pct'], 1, '%')}{'  ⚠️' if top5_warning else ''}<br>"
+        f"<small>{' · '.join(top5_names[:3])}{'  …' if len(top5_names) > 3 else ''}</small>"
+    )
+
+    art_counts = kpis["art_counts"]
+
+    # KPI-Cards – gruppiert: Depot | Assetklassen | Qualität
+    depot_summary = {
+        # --- Depot-Übersicht ---
+        "Gesamtwert": gesamtwert_label,
+        "Positionen": " / ".join(f"{art_counts.get(a, 0)} {a}s" for a in ["ETF", "Aktie", "Krypto"])
+        + f" + {art_counts.get('Cash', 0)} Cash",
+        # --- Assetklassen-Anteile ---
+        "ETF-Anteil": _pct(kpis["etf_pct"]),
+        "Aktien-Anteil": _pct(kpis["aktien_pct"]),
+        "Krypto-Anteil": _pct(kpis["krypto_pct"]),
+        "Cash-Anteil": _pct(kpis["cash_pct"]),
+        # --- Qualität ---
+        "Diversifikation": hhi_label,
+        "Top-5-Konzentration": top5_label,
+    }
+    if fallback_used:
+        depot_summary["⚠️ Fallback-Kurse"] = f"{', '.join(fallback_used)} – kein Live-Kurs, historischen Wert verwendet"
+    return depot_summary
+
+
+def flag_degraded(result, stages):
+    """
+    Markiert Stufen, die wegen des Zeitbudgets auf Cache- bzw. Fallback-Daten ausgewichen sind, in den KPI-Cards
+    (wie die Fallback-Kurse). Betroffene Ticker stehen zusätzlich unter '⚠️ Fallback-Kurse'.
+    :param result: Ergebnis-Dict aus analyze_depot (wird verändert)
+    :param stages: Namen der betroffenen Stufen (z.B. ['Kursabruf'])
+    :return: result
+    """
+    if stages:
+        result["depot_summary"]["⚠️ Zeitbudget"] = (
+            f"{', '.join(stages)} – Zeitbudget überschritten, Cache- bzw. Fallback-Daten verwendet"
+        )
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Report-Abschnitte
+# ---------------------------------------------------------------------------
+
+
+def prepare_report_sections(depot, aggregations, sections=None, detail=None):
+    """
+    Bereitet alle Abschnitte des HTML-Reports vor, ohne die Figures zu bauen.
+    Jeder Abschnitt enthält den Builder und seine (bereits aggregierten) Eingaben – gebaut wird mit render_section.
+    :param depot: bewertetes Depot
+    :param aggregations: Auswertungen aus build_aggregations (Roll-ups des Aggregations-Würfels)
+    :param sections: optionale Auswahl aus REPORT_SECTIONS (None = alle). Nicht gewählte Abschnitte werden
+                     weder vorbereitet noch gebaut
+    :param detail: optionale Detail-Stufe der Länder- und Sektor-Treemap ({'top_n', 'min_weight'}, siehe
+                   treemap_detail) – kleine Positionen je Land/Sektor werden zu 'Sonstige' zusammengefasst
+    :return: Liste von Section-Specs mit den Schlüsseln 'key', 'title', 'description', 'kind' ('fig'/'html'),
+             'builder', 'args' und 'kwargs'
+    :raises ValueError: bei unbekanntem Abschnitt
+    """
+    from scripts.plotting import bar_chart_spec, build_depot_table, build_heatmap, pie_chart_spec, treemap_spec
+
+    unknown = set(sections or ()) - set(REPORT_SECTIONS)
+    if unknown:
+        raise ValueError(f"Unbekannte Report-Abschnitte: {sorted(unknown)} – erlaubt: {list(REPORT_SECTIONS)}")
+
+    # Treemap Anlageart → Position (Depot-Ebene, kein ETF-Durchblick)
+    treemap_art_df = depot[depot["Marktwert (%)"] > 0][["Art", "Position", "Marktwert (%)"]].copy()
+
+    # Warnung wenn Positionen ohne Marktwert im Depot sind – sie erscheinen nicht im Pie-Chart
+    no_value = depot[depot["Marktwert (%)"].isna() | (depot["Marktwert (%)"] <= 0)]
+    if not no_value.empty:
+        logger.warning(
+            f"{len(no_value)} Position(en) ohne Marktwert – nicht im Übersichts-Chart:\n"
+            + no_value[["Ticker", "Position", "Art"]].to_string(index=False)
+        )
+
+    specs = [
+        {
+            "key": "tabelle",
+            "title": "Depotübersicht",
+            "kind": "html",
+            "builder": build_depot_table,
+            "args": (depot,),
+            "description": "Alle Positionen mit aktuellem Kurs, Marktwert und Depotanteil.",
+        },
+        {
+            "key": "depot",
+            "title": "Übersicht nach Depot",
+            "builder": pie_chart_spec,
+            "args": (depot, "Marktwert (%)", "Position", "Übersicht nach Depot"),
+            "description": "Marktwertsanteil jeder Depotposition.",
+        },
+        {
+            "key": "anlageart",
+            "title": "Kapitalverteilung: Anlageart → Position",
+            "builder": treemap_spec,
+            "args": (treemap_art_df, ["Art", "Position"], "Marktwert (%)", "Kapitalverteilung: Anlageart → Position"),
+            "description": "Kapitalverteilung auf Depot-Ebene nach Anlageart und Position – ersetzt den einfachen Anlageart-Pie.",
+        },
+        {
+            "key": "top20",
+            "title": "Top 20 Positionen – Balken",
+            "builder": bar_chart_spec,
+            "args": (aggregations["depot_data_stocks"], "Gesamtgewichtung (%)", "Name", "Top 20 Positionen"),
+            "kwargs": {"top_n": 20},
+            "description": "Die 20 größten Einzelpositionen nach Gesamtgewichtung (inkl. ETF-Durchblick).",
+        },
+        {
+            "key": "laender",
+            "title": "Länder – Treemap",
+            "builder": treemap_spec,
+            "args": (
+                aggregations["country_treemap_data"],
+                ["Standort", "Name"],
+                "relative Gewichtung (%)",
+                "Ländergewichtung",
+            ),
+            "kwargs": {"detail": detail},
+            "description": "Geografische Gewichtung inkl. ETF-Durchblick – Fläche entspricht der Gewichtung, Unterebene zeigt Einzelpositionen.",
+        },
+        {
+            "key": "heatmap",
+            "title": "Sektor-Heatmap: ETF-Überschneidungen",
+            "builder": build_heatmap,
+            "args": (aggregations["sector_pivot"], "Sektorgewichtung (%) je ETF / Assetklasse"),
+            "kwargs": {"colorscale": "Blues"},
+            "description": (
+                "Zeigt wie stark jeder Sektor in jedem ETF / jeder Assetklasse gewichtet ist (in %). "
+                "Überschneidungen zeigen Klumpenrisiken."
+            ),
+        },
+        {
+            "key": "sektoren",
+            "title": "Treemap: Sektor → Position",
+            "builder": treemap_spec,
+            "args": (
+                aggregations["sector_treemap_data"],
+                ["Sektor", "Name"],
+                "relative Gewichtung (%)",
+                "Treemap: Sektor → Position",
+            ),
+            "kwargs": {"detail": detail},
+            "description": "Hierarchische Ansicht aller Positionen inkl. ETF-Durchblick – Fläche entspricht der Gewichtung.",
+        },
+    ]
+
+    if sections is not None:
+        specs = [spec for spec in specs if spec["key"] in sections]
+    for spec in specs:
+        spec.setdefault("kind", "fig")
+        spec.setdefault("kwargs", {})
+    return specs
+
+
+def _hash_value(h, value):
+    """Schreibt einen Builder-Parameter deterministisch in den Hash h (DataFrames über ihren Inhalt)."""
+    if isinstance(value, pd.DataFrame):
+        h.update(repr((list(value.columns), list(map(str, value.dtypes)), list(value.index.names))).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        h.update(pd.util.hash_pandas_object(pd.Series(value.columns.astype(str)), index=False).to_numpy().tobytes())
+    else:
+        h.update(repr(value).encode("utf-8"))
+    h.update(b"\0")
+
+
+def section_fingerprint(spec):
+    """
+    Inhalts-Fingerprint eines Report-Abschnitts: Builder (Name + Quelltext), Eingabedaten, Titel, Beschreibung
+    und Plotly-Version. Gleicher Fingerprint → identischer gerenderter Abschnitt.
+    """
+    import plotly
+
+    builder = spec["builder"]
+    h = hashlib.sha256()
+    h.update(f"{SECTION_CACHE_VERSION}|{plotly.__version__}|{builder.__module__}.{builder.__qualname__}".encode())
+    h.update(inspect.getsource(builder).encode("utf-8"))
+    for value in (spec["title"], spec.get("description"), spec["kind"], *spec["args"], sorted(spec["kwargs"].items())):
+        _hash_value(h, value)
+    return h.hexdigest()
+
+
+def render_section(spec):
+    """Baut einen vorbereiteten Abschnitt (Figure oder HTML) zum Section-Dict für export_html_report."""
+    section = {"title": spec["title"], spec["kind"]: spec["builder"](*spec["args"], **spec["kwargs"])}
+    if spec.get("description"):
+        section["description"] = spec["description"]
+    return section
+
+
+def render_serialized(spec):
+    """
+    Baut einen Abschnitt wie render_section und serialisiert seine Figure gleich mit (siehe serialize_figure).
+    Läuft auch in Worker-Prozessen – zurück kommen nur Strings statt großer Figure-Objekte. 'digest' ist der
+    Inhalts-Hash des serialisierten Abschnitts, über den export_html_report Report-Fragmente wiederverwendet.
+    """
+    from scripts.plotting import section_digest, serialize_figure
+
+    section = render_section(spec)
+    if "fig" in section:
+        section.update(serialize_figure(section.pop("fig")))
+    section["digest"] = section_digest(section)
+    return section
+
+
+def _render_sections(specs, render_workers=None, serialize=False):
+    """
+    Baut vorbereitete Abschnitte – sequentiell oder in einem Prozess-Pool.
+    Im Pool werden die Figures in den Workern gebaut und serialisiert, die Reihenfolge bleibt die der Specs.
+    :param render_workers: Anzahl Worker-Prozesse (None/1 = sequentiell im eigenen Prozess)
+    :param serialize: Figures auch sequentiell serialisieren (im Pool immer)
+    :return: Liste von Section-Dicts (serialisiert mit 'fig_json' statt 'fig')
+    """
+    workers = min(render_workers or 1, len(specs))
+    if workers <= 1:
+        return [render_serialized(spec) if serialize else render_section(spec) for spec in specs]
+    from concurrent.futures import ProcessPoolExecutor
+
+    logger.info(f"Report-Abschnitte: {len(specs)} Figure(s) mit {workers} Worker-Prozessen.")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_serialized, specs))
+
+
+def build_report_sections(depot, aggregations, cache_dir=None, sections=None, detail=None, render_workers=None):
+    """
+    Erstellt alle Abschnitte des HTML-Reports (Tabelle + Plotly-Figures).
+    :param cache_dir: optionaler Artefakt-Cache – Abschnitte mit unverändertem Fingerprint werden von dort
+                      wiederverwendet statt neu gebaut. Figures liegen dann bereits serialisiert unter 'fig_json'
+    :param sections: optionale Auswahl aus REPORT_SECTIONS (None = alle)
+    :param detail: optionale Detail-Stufe der großen Treemaps (siehe prepare_report_sections)
+    :param render_workers: Anzahl Worker-Prozesse für das Bauen und Serialisieren der Figures
+                           (None/1 = sequentiell). Nur nicht gecachte Abschnitte gehen in den Pool
+    :return: Liste von Section-Dicts für export_html_report
+    """
+    specs = prepare_report_sections(depot, aggregations, sections, detail)
+    if cache_dir is None:
+        return _render_sections(specs, render_workers)
+
+    keys = [section_fingerprint(spec) for spec in specs]
+    report_sections = [load_artifact(cache_dir, "section", key) for key in keys]
+    missing = [i for i, section in enumerate(report_sections) if section is None]
+    # Figures serialisiert ablegen – spart beim Wiederverwenden auch die Serialisierung
+    rendered = _render_sections([specs[i] for i in missing], render_workers, serialize=True)
+    for i, section in zip(missing, rendered, strict=True):
+        store_artifact(cache_dir, "section", keys[i], section, keep=_SECTION_CACHE_SIZE)
+        report_sections[i] = section
+    reused = len(specs) - len(missing)
+    logger.info(f"Report-Abschnitte: {reused}/{len(report_sections)} unverändert aus dem Cache übernommen.")
+    return report_sections
+
+
+# ---------------------------------------------------------------------------
+# Gesamtlauf für ein Depot
+# ---------------------------------------------------------------------------
+
+
+def analyze_depot(etf_data, depot, stock_prices, fallback_used=None):
+    """
+    Führt die komplette Auswertung eines Depots gegen ein bereits bereinigtes ETF-Universum durch.
+    :param etf_data: bereinigtes ETF-Universum (load_etf_universe)
+    :param depot: unbewertetes Depot (load_depot)
+    :param stock_prices: Kursliste aus download_stock_price
+    :param fallback_used: Ticker mit Fallback-Kurs – nur die Ticker dieses Depots erscheinen in den KPI-Cards
+    :return: Dict mit depot, depot_data, depot_data_chart, den Aggregationen, kpis, fallback_used und depot_summary
+    """
+    with span("merge"):
+        depot, gesamtwert_vollstaendig = price_depot(depot, stock_prices)
+    with span("weighting"):
+        depot_data, depot_data_chart = build_depot_data(etf_data, depot)
+    with span("aggregation"):
+        aggregations = build_aggregations(depot, depot_data, depot_data_chart)
+        return finish_result(depot, depot_data, depot_data_chart, aggregations, gesamtwert_vollstaendig, fallback_used)
+
+
+def finish_result(depot, depot_data, depot_data_chart, aggregations, gesamtwert_vollstaendig, fallback_used):
+    """Ergänzt Kennzahlen und KPI-Cards und fasst alles zum Ergebnis-Dict zusammen (siehe analyze_depot)."""
+    kpis = compute_kpis(depot, aggregations)
+
+    depot_tickers = clean_depot_tickers(depot)
+    fallback_used = [t for t in (fallback_used or []) if t in depot_tickers]
+    depot_summary = build_depot_summary(kpis, gesamtwert_vollstaendig, fallback_used)
+
+    return {
+        "depot": depot,
+        "depot_data": depot_data,
+        "depot_data_chart": depot_data_chart,
+        **aggregations,
+        "kpis": kpis,
+        "fallback_used": fallback_used,
+        "depot_summary": depot_summary,
+    }
+
+
+def export_excel(result, output_file):
+    """Schreibt die Excel-Auswertung (6 Sheets) für ein Analyse-Ergebnis aus analyze_depot."""
+    with span("excel_export"):
+        export_to_excel(
+            output_file,
+            result["depot"],
+            result["depot_data"],
+            result["depot_data_stocks"],
+            result["depot_data_etfs"],
+            result["depot_data_sectors"],
+            result["depot_data_locations"],
+        )
+
+
+def export_results(
+    result,
+    output_file,
+    report_file,
+    open_browser=True,
+    cache_dir=None,
+    sections=None,
+    plotlyjs="inline",
+    asset_dir=None,
+    chart_payload="json",
+    detail=None,
+    render_workers=None,
+):
+    """
+    Schreibt Excel-Auswertung und HTML-Report für ein Analyse-Ergebnis aus analyze_depot.
+    :param result: Ergebnis-Dict aus analyze_depot
+    :param output_file: Pfad der Excel-Ausgabe (None = kein Excel-Export)
+    :param report_file: Pfad des HTML-Reports (None = kein Report)
+    :param open_browser: Report nach dem Schreiben im Browser öffnen
+    :param cache_dir: optionaler Artefakt-Cache für unveränderte Report-Abschnitte und ihre HTML-Fragmente
+    :param sections: optionale Auswahl aus REPORT_SECTIONS (None = alle). Leere Auswahl = kein Report –
+                     dann werden weder Figures gebaut noch Plotly importiert
+    :param plotlyjs: 'inline' (self-contained) oder 'shared' (gemeinsame plotly-<hash>.min.js, siehe export_html_report)
+    :param asset_dir: Ordner der gemeinsamen Plotly.js-Datei (Default: Ordner des Reports)
+    :param chart_payload: 'json' oder 'gzip' (Chart-Daten komprimiert, siehe export_html_report)
+    :param detail: optionale Detail-Stufe der großen Treemaps (siehe prepare_report_sections)
+    :param render_workers: Worker-Prozesse für Figures (None/1 = sequentiell, siehe build_report_sections)
+    :return: Pfad des geschriebenen HTML-Reports oder None
+    """
+    if output_file:
+        export_excel(result, output_file)
+    else:
+        logger.info("Excel-Export übersprungen.")
+
+    if not report_file or (sections is not None and not sections):
+        logger.info("HTML-Report übersprungen.")
+        return None
+
+    from scripts.plotting import export_html_report
+
+    with span("figure_build"):
+        report_sections = build_report_sections(
+            result["depot"],
+            result,
+            cache_dir=cache_dir,
+            sections=sections,
+            detail=detail,
+            render_workers=render_workers,
+        )
+    with span("html_write"):
+        export_html_report(
+            report_sections,
+            report_file,
+            depot_summary=result["depot_summary"],
+            open_browser=open_browser,
+            plotlyjs=plotlyjs,
+            asset_dir=asset_dir,
+            chart_payload=chart_payload,
+            cache_dir=cache_dir,
+        )
+    return report_file
@@ -0,0 +1,116 @@
+# artifact_cache.py
+
+import glob
+import hashlib
+import logging
+import os
+from contextlib import suppress
+
+import pandas as pd
+
+from scripts.file_lock import atomic_writer, file_lock
+
+logger = logging.getLogger(__name__)
+
+# Anzahl Artefakte je Präfix, die beim Aufräumen behalten werden (neueste zuerst)
+_KEEP_PER_PREFIX = 5
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """
+    SHA-256 des Dateiinhalts.
+    :param path: Pfad zur Datei
+    :param chunk_size: Lesegröße in Bytes
+    :return: Hexdigest oder 'missing', wenn die Datei nicht existiert
+    """
+    if not os.path.exists(path):
+        return "missing"
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def artifact_key(*parts):
+    """Kombiniert beliebige String-Bestandteile (Datei-Hashes, Fingerprints, Namen) zu einem Cache-Schlüssel."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _artifact_path(cache_dir, prefix, key):
+    return os.path.join(cache_dir, f"{prefix}-{key[:24]}.pkl")
+
+
+def load_artifact(cache_dir, prefix, key):
+    """
+    Lädt ein gecachtes Artefakt.
+    :return: gespeichertes Objekt oder None bei Cache-Miss bzw. unlesbarer Datei
+    """
+    path = _artifact_path(cache_dir, prefix, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        obj = pd.read_pickle(path)
+        # Zugriffszeit aktualisieren – _prune behält die zuletzt genutzten Artefakte
+        os.utime(path)
+        return obj
+    except Exception as e:
+        logger.warning(f"Cache-Artefakt '{path}' nicht lesbar – wird neu erstellt: {e}")
+        return None
+
+
+def store_artifact(cache_dir, prefix, key, obj, keep=None):
+    """
+    Speichert ein Artefakt atomar (temporäre Datei + os.replace) und räumt alte Artefakte auf.
+    :param keep: Anzahl Artefakte dieses Präfixes, die behalten werden (zuletzt genutzte zuerst). Default: _KEEP_PER_PREFIX
+    """
+    path = _artifact_path(cache_dir, prefix, key)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with atomic_writer(path, encoding=None) as f:
+            pd.to_pickle(obj, f)
+        logger.debug(f"Cache-Artefakt gespeichert: {path}")
+    except Exception as e:
+        logger.warning(f"Cache-Artefakt '{path}' konnte nicht gespeichert werden: {e}")
+        return
+    _prune(cache_dir, prefix, keep)
+
+
+def _prune(cache_dir, prefix, keep=None):
+    keep = _KEEP_PER_PREFIX if keep is None else keep
+    files = sorted(glob.glob(os.path.join(cache_dir, f"{prefix}-*.pkl")), key=os.path.getmtime, reverse=True)
+    for old in files[keep:]:
+        with suppress(OSError):
+            os.remove(old)
+
+
+def cached_artifact(cache_dir, prefix, key, build, keep=None):
+    """
+    Gibt das Artefakt zu key zurück; bei Cache-Miss wird es mit build() erzeugt und gespeichert.
+    Ist cache_dir None, wird immer build() aufgerufen. None-Ergebnisse werden nicht gecacht.
+    Single-Flight: Bei einem Miss baut nur ein Lauf (Sperre je Präfix), parallele Läufe warten und
+    übernehmen danach das gespeicherte Artefakt.
+    :param cache_dir: Cache-Verzeichnis oder None
+    :param prefix: Artefakt-Typ (Dateinamen-Präfix)
+    :param key: inhaltsbasierter Schlüssel (artifact_key)
+    :param build: Funktion ohne Argumente, die das Artefakt erzeugt
+    :param keep: Anzahl Artefakte dieses Präfixes, die behalten werden
+    """
+    if cache_dir is None:
+        return build()
+    obj = load_artifact(cache_dir, prefix, key)
+    if obj is None:
+        with file_lock(os.path.join(cache_dir, f"{prefix}.lock")):
+            # Erneut prüfen: ein paralleler Lauf kann das Artefakt gebaut haben, während dieser gewartet hat
+            obj = load_artifact(cache_dir, prefix, key)
+            if obj is None:
+                obj = build()
+                if obj is not None:
+                    store_artifact(cache_dir, prefix, key, obj, keep)
+                return obj
+    logger.info(f"Cache-Treffer für '{prefix}' ({key[:12]}) – Neuberechnung übersprungen.")
+    return obj
@@ -0,0 +1,274 @@
+# batch.py
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import pandas as pd
+
+from scripts.analysis import analyze_depot, export_results, flag_degraded, hhi_stufe, load_depot
+from scripts.data_download import download_stock_price, load_fallback_prices
+from scripts.deadline import degraded_stages
+from scripts.shared_universe import attach_universe, shared_universe
+
+logger = logging.getLogger(__name__)
+
+# Bereinigtes ETF-Universum im Worker-Prozess – wird einmal pro Worker per Initializer gesetzt,
+# nicht pro Depot übertragen
+_UNIVERSE = None
+# Shared-Memory-Block des Universums – muss referenziert bleiben, solange _UNIVERSE Views darauf hält
+_UNIVERSE_SHM = None
+
+
+def _init_worker(etf_data):
+    global _UNIVERSE
+    _UNIVERSE = etf_data
+
+
+def _init_shared_worker(handle):
+    """Initializer im Shared-Memory-Modus: verbindet sich ohne Kopie mit dem veröffentlichten Universum."""
+    global _UNIVERSE, _UNIVERSE_SHM
+    _UNIVERSE_SHM, _UNIVERSE = attach_universe(handle)
+
+
+def _load_depot_job(input_file):
+    """Liest ein Depot ein; Fehler werden als String zurückgegeben statt geworfen."""
+    try:
+        return load_depot(input_file), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _analyze_job(
+    name,
+    depot,
+    stock_prices,
+    fallback_used,
+    output_dir,
+    excel=True,
+    sections=None,
+    plotlyjs="inline",
+    chart_payload="json",
+    detail=None,
+    degraded=None,
+):
+    """
+    Wertet ein Depot gegen das Universum des Workers aus und schreibt Excel + HTML-Report.
+    Im Plotly.js-Modus 'shared' verweisen alle Reports auf eine gemeinsame Datei in output_dir.
+    Stufen in degraded (Zeitbudget im Elternprozess überschritten) werden in den KPI-Cards markiert.
+    """
+    result = flag_degraded(analyze_depot(_UNIVERSE, depot, stock_prices, fallback_used), degraded)
+    portfolio_dir = os.path.join(output_dir, name)
+    os.makedirs(portfolio_dir, exist_ok=True)
+    export_results(
+        result,
+        os.path.join(portfolio_dir, f"{name}.xlsx") if excel else None,
+        os.path.join(portfolio_dir, "portfolio_report.html"),
+        open_browser=False,
+        sections=sections,
+        plotlyjs=plotlyjs,
+        asset_dir=output_dir,
+        chart_payload=chart_payload,
+        detail=detail,
+    )
+    return result["kpis"], result["fallback_used"]
+
+
+def portfolio_names(input_files):
+    """Eindeutige Depot-Namen aus den Dateinamen (bei Namensgleichheit mit Zähler)."""
+    names, seen = [], {}
+    for f in input_files:
+        stem = os.path.splitext(os.path.basename(f))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        names.append(stem if seen[stem] == 1 else f"{stem}_{seen[stem]}")
+    return names
+
+
+def _summary_row(name, input_file, kpis=None, fallback_used=None, error=None):
+    row = {"Depot": name, "Datei": input_file, "Status": "Fehler" if error else "OK"}
+    if kpis is not None:
+        row.update(
+            {
+                "Gesamtwert (€)": kpis["gesamtwert"],
+                "Positionen": sum(kpis["art_counts"].values()),
+                "ETF-Anteil (%)": kpis["etf_pct"],
+                "Aktien-Anteil (%)": kpis["aktien_pct"],
+                "Krypto-Anteil (%)": kpis["krypto_pct"],
+                "Cash-Anteil (%)": kpis["cash_pct"],
+                "HHI (0–100)": kpis["hhi_score"],
+                "Diversifikation": hhi_stufe(kpis["hhi_score"]),
+                "Top-5-Konzentration (%)": kpis["top5_pct"],
+                "Fallback-Kurse": ", ".join(fallback_used or []),
+            }
+        )
+    row["Fehler"] = error or ""
+    return row
+
+
+def _run_jobs(executor, fn, jobs):
+    """Führt fn(*args) je Job aus – im Pool oder sequentiell. Ergebnis: name → (Rückgabewert, Fehlertext)."""
+    outcomes = {}
+    if executor:
+        futures = {name: executor.submit(fn, *args) for name, args in jobs.items()}
+        for name, future in futures.items():
+            try:
+                outcomes[name] = (future.result(), None)
+            except Exception as e:
+                outcomes[name] = (None, str(e))
+    else:
+        for name, args in jobs.items():
+            try:
+                outcomes[name] = (fn(*args), None)
+            except Exception as e:
+                outcomes[name] = (None, str(e))
+    return outcomes
+
+
+def run_batch(
+    input_files,
+    etf_data,
+    output_dir,
+    stock_ticker_suffixes=None,
+    crypto_ticker_suffixes=None,
+    max_workers=None,
+    use_shared_memory=True,
+    excel=True,
+    sections=None,
+    plotlyjs="inline",
+    chart_payload="json",
+    detail=None,
+    offline=False,
+):
+    """
+    Wertet viele Depots gegen ein einmal bereinigtes ETF-Universum aus.
+    Kurse werden einmal für die Vereinigung aller Depot-Ticker geladen; die Auswertung läuft parallel
+    in einem Prozess-Pool. Je Depot entsteht ein Unterordner mit Excel und HTML-Report.
+    :param input_files: Liste der Depot-Excel-Dateien
+    :param etf_data: bereinigtes ETF-Universum (load_etf_universe)
+    :param output_dir: Zielordner für die Depot-Ordner und die Zusammenfassung
+    :param stock_ticker_suffixes: Suffixe für Aktien/ETFs (siehe download_stock_price)
+    :param crypto_ticker_suffixes: Suffixe für Krypto (siehe download_stock_price)
+    :param max_workers: Anzahl Worker-Prozesse. Default: Anzahl CPU-Kerne. 1 = sequentiell im eigenen Prozess
+    :param use_shared_memory: Universum in Shared Memory veröffentlichen statt es jedem Worker als Pickle-Kopie
+                              zu übergeben – der Speicherbedarf bleibt bei mehr Workern konstant
+    :param excel: Excel-Auswertung je Depot schreiben
+    :param sections: Auswahl der Report-Abschnitte (siehe REPORT_SECTIONS, None = alle, leer = kein Report)
+    :param plotlyjs: 'inline' (Plotly.js je Report eingebettet) oder 'shared' (eine plotly-<hash>.min.js in output_dir)
+    :param chart_payload: 'json' oder 'gzip' (Chart-Daten komprimiert, siehe export_html_report)
+    :param detail: optionale Detail-Stufe der großen Treemaps ({'top_n', 'min_weight'}, siehe treemap_detail)
+    :param offline: Kurse nur aus price_fallback.json statt aus yFinance
+    :return: DataFrame mit einer Zeile je Depot (auch als batch_summary.xlsx gespeichert)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    names = portfolio_names(input_files)
+    max_workers = max_workers or os.cpu_count() or 1
+    logger.info(f"Batch-Lauf: {len(input_files)} Depot(s), {max_workers} Worker.")
+
+    parallel = max_workers > 1
+    with shared_universe(etf_data) if parallel and use_shared_memory else nullcontext() as handle:
+        if not parallel:
+            executor = None
+            _init_worker(etf_data)
+        elif handle is not None:
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_shared_worker, initargs=(handle,))
+        else:
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(etf_data,))
+        prices = _price_loader(stock_ticker_suffixes, crypto_ticker_suffixes, offline)
+        export_options = {
+            "excel": excel,
+            "sections": sections,
+            "plotlyjs": plotlyjs,
+            "chart_payload": chart_payload,
+            "detail": detail,
+        }
+        try:
+            return _run_batch(executor, input_files, names, output_dir, prices, export_options)
+        finally:
+            if not parallel:
+                # Sequentiell war der Elternprozess selbst der Worker – Universum nicht über den Lauf hinaus halten
+                _init_worker(None)
+
+
+def _price_loader(stock_ticker_suffixes, crypto_ticker_suffixes, offline):
+    """Kursquelle für den Batch-Lauf: yFinance oder offline aus price_fallback.json."""
+    if offline:
+        return load_fallback_prices
+    return lambda positions: download_stock_price(positions, stock_ticker_suffixes, crypto_ticker_suffixes)
+
+
+def _run_batch(executor, input_files, names, output_dir, load_prices, export_options):
+    try:
+        # 1. Depots einlesen (parallel)
+        if executor:
+            loaded = list(executor.map(_load_depot_job, input_files))
+        else:
+            loaded = [_load_depot_job(f) for f in input_files]
+
+        rows = {}
+        depots = {}
+        for name, input_file, (depot, error) in zip(names, input_files, loaded, strict=True):
+            if error:
+                logger.error(f"Depot '{name}' übersprungen: {error}")
+                rows[name] = _summary_row(name, input_file, error=error)
+            else:
+                depots[name] = depot
+
+        if not depots:
+            logger.error("Batch-Lauf: kein Depot konnte eingelesen werden.")
+            summary = pd.DataFrame([rows[n] for n in names])
+            _write_summary(summary, output_dir)
+            return summary
+
+        # 2. Kurse einmal für alle Depots laden
+        all_positions = pd.concat([d[["Art", "Ticker"]] for d in depots.values()], ignore_index=True)
+        all_positions = all_positions.drop_duplicates()
+        stock_prices, fallback_used = load_prices(all_positions)
+        # Stufen, die wegen RUN_BUDGET ausgewichen sind – die Worker kennen das Budget des Elternprozesses nicht
+        degraded = degraded_stages()
+
+        # 3. Depots auswerten (parallel)
+        input_by_name = dict(zip(names, input_files, strict=True))
+        jobs = {
+            name: (
+                name,
+                depot,
+                stock_prices,
+                fallback_used,
+                output_dir,
+                export_options["excel"],
+                export_options["sections"],
+                export_options["plotlyjs"],
+                export_options["chart_payload"],
+                export_options["detail"],
+                degraded,
+            )
+            for name, depot in depots.items()
+        }
+        outcomes = _run_jobs(executor, _analyze_job, jobs)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    for name, (outcome, error) in outcomes.items():
+        if error:
+            logger.error(f"Auswertung von Depot '{name}' fehlgeschlagen: {error}")
+            rows[name] = _summary_row(name, input_by_name[name], error=error)
+        else:
+            kpis, depot_fallbacks = outcome
+            rows[name] = _summary_row(name, input_by_name[name], kpis, depot_fallbacks)
+
+    summary = pd.DataFrame([rows[n] for n in names])
+    _write_summary(summary, output_dir)
+    n_ok = (summary["Status"] == "OK").sum()
+    logger.info(f"Batch-Lauf abgeschlossen: {n_ok}/{len(summary)} Depot(s) erfolgreich ausgewertet.")
+    return summary
+
+
+def _write_summary(summary, output_dir):
+    summary_file = os.path.join(output_dir, "batch_summary.xlsx")
+    try:
+        summary.to_excel(summary_file, sheet_name="Zusammenfassung", index=False)
+        logger.info(f"Batch-Zusammenfassung gespeichert: {summary_file}")
+    except Exception as e:
+        logger.error(f"Fehler beim Schreiben der Batch-Zusammenfassung: {e}")
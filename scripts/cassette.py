@@ -0,0 +1,202 @@
+# cassette.py
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from scripts.file_lock import atomic_writer, file_lock
+
+logger = logging.getLogger(__name__)
+
+# Aktive Kassette (use_cassette) – None = alle Aufrufe gehen direkt ans Netz
+_CASSETTE = None
+
+# 'record': echte Aufrufe ausführen und mitschneiden, 'replay': nur aus der Kassette bedienen (kein Netz)
+MODES = ("record", "replay")
+
+# Format-Version der Kassettendatei
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(LookupError):
+    """Im Replay-Modus fehlt der angefragte Aufruf in der Kassette."""
+
+
+class _ReplayResponse:
+    """Minimaler Ersatz für requests.Response (nur was download_csv_if_old nutzt)."""
+
+    def __init__(self, url, status_code, text):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+
+            raise requests.HTTPError(f"{self.status_code} (aus Kassette) für URL: {self.url}", response=self)
+
+
+def _frame_to_dict(df):
+    """Serialisiert ein yfinance-Ergebnis (DatetimeIndex, ggf. MultiIndex-Spalten) verlustfrei als JSON-Dict."""
+    import pandas as pd
+
+    return {
+        "columns": [list(c) if isinstance(c, tuple) else c for c in df.columns],
+        "column_names": list(df.columns.names),
+        "index": [pd.Timestamp(ts).isoformat() for ts in df.index],
+        "index_name": df.index.name,
+        "data": [[None if pd.isna(v) else float(v) for v in row] for row in df.to_numpy(dtype=object)],
+    }
+
+
+def _frame_from_dict(data):
+    import pandas as pd
+
+    columns = data["columns"]
+    if columns and isinstance(columns[0], list):
+        columns = pd.MultiIndex.from_tuples([tuple(c) for c in columns], names=data["column_names"])
+    else:
+        columns = pd.Index(columns, name=data["column_names"][0])
+    index = pd.DatetimeIndex(pd.to_datetime(data["index"]), name=data["index_name"])
+    return pd.DataFrame(data["data"], index=index, columns=columns, dtype=float)
+
+
+def _yf_key(tickers):
+    """Schlüssel eines yfinance-Aufrufs: nur die Ticker – Datumsgrenzen ändern sich täglich und bleiben außen vor."""
+    if isinstance(tickers, str):
+        return tickers
+    return ",".join(tickers)
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {"version": CASSETTE_VERSION, "http": {}, "yfinance": {}}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != CASSETTE_VERSION:
+        raise ValueError(f"Kassette '{path}' hat Version {data.get('version')}, erwartet {CASSETTE_VERSION}.")
+    return data
+
+
+def _save(cassette):
+    """
+    Schreibt die Kassette atomar unter Sperre. Mitschnitte, die ein paralleler Record-Lauf inzwischen gespeichert
+    hat, werden vorher eingelesen und bleiben erhalten (eigene Mitschnitte gewinnen bei gleichem Schlüssel).
+    """
+    path = cassette["path"]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with file_lock(f"{path}.lock"):
+        data = _load(path)
+        for kind in ("http", "yfinance"):
+            data[kind].update(cassette["data"][kind])
+        with atomic_writer(path) as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def _replay(cassette, kind, key):
+    entry = cassette["data"][kind].get(key)
+    if entry is None:
+        cassette["misses"] += 1
+        raise CassetteMiss(f"Kein Mitschnitt für {kind} '{key}' in Kassette '{cassette['path']}'.")
+    cassette["hits"] += 1
+    latency = cassette["latency"]
+    delay = entry.get("elapsed_s", 0.0) if latency == "recorded" else latency
+    if delay:
+        time.sleep(delay)
+    return entry
+
+
+@contextmanager
+def use_cassette(path, mode="replay", latency=0.0):
+    """
+    Schneidet Netzwerkaufrufe (iShares-CSV-Download, yfinance-Kurse) mit oder spielt sie ab.
+    Im Replay-Modus wird kein einziger Netzwerkaufruf ausgeführt – fehlende Mitschnitte lösen CassetteMiss aus,
+    die von den Download-Funktionen wie ein Netzwerkfehler behandelt wird (Fallback-Kurse, vorhandene CSVs).
+    :param path: Kassettendatei (JSON). Im Record-Modus werden neue Mitschnitte an eine bestehende Datei angefügt.
+    :param mode: 'record' oder 'replay'
+    :param latency: simulierte Latenz je abgespieltem Aufruf in Sekunden oder 'recorded' (gemessene Dauer)
+    :return: Dict mit 'hits', 'misses' und 'recorded' (Zähler, nach dem Block aktuell)
+    :raises ValueError: bei unbekanntem Modus oder inkompatibler Kassette
+    """
+    global _CASSETTE
+    if mode not in MODES:
+        raise ValueError(f"Unbekannter Kassetten-Modus '{mode}' – erlaubt: {MODES}")
+    if mode == "replay" and not os.path.exists(path):
+        logger.warning(f"Kassette '{path}' existiert nicht – alle Netzwerkaufrufe schlagen im Replay-Modus fehl.")
+
+    cassette = {
+        "path": path,
+        "mode": mode,
+        "latency": latency,
+        "data": _load(path),
+        "hits": 0,
+        "misses": 0,
+        "recorded": 0,
+    }
+    previous, _CASSETTE = _CASSETTE, cassette
+    stats = {}
+    try:
+        yield stats
+    finally:
+        _CASSETTE = previous
+        if mode == "record" and cassette["recorded"]:
+            _save(cassette)
+        stats.update(hits=cassette["hits"], misses=cassette["misses"], recorded=cassette["recorded"])
+        logger.info(
+            f"Kassette '{path}' ({mode}): {cassette['hits']} abgespielt, {cassette['misses']} fehlend, "
+            f"{cassette['recorded']} aufgenommen."
+        )
+
+
+def active_mode():
+    """Modus der aktiven Kassette ('record'/'replay') oder None."""
+    return _CASSETTE["mode"] if _CASSETTE is not None else None
+
+
+def http_get(session, url, **kwargs):
+    """
+    session.get(url) mit Kassetten-Unterstützung.
+    :raises CassetteMiss: im Replay-Modus, wenn die URL nicht mitgeschnitten wurde
+    """
+    cassette = _CASSETTE
+    if cassette is None:
+        return session.get(url, **kwargs)
+    if cassette["mode"] == "replay":
+        entry = _replay(cassette, "http", url)
+        return _ReplayResponse(url, entry["status_code"], entry["text"])
+
+    t0 = time.perf_counter()
+    response = session.get(url, **kwargs)
+    cassette["data"]["http"][url] = {
+        "status_code": response.status_code,
+        "text": response.text,
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    cassette["recorded"] += 1
+    return response
+
+
+def yf_download(download, tickers, **kwargs):
+    """
+    yfinance.download(tickers, **kwargs) mit Kassetten-Unterstützung.
+    :param download: die eigentliche Download-Funktion (yf.download)
+    :raises CassetteMiss: im Replay-Modus, wenn die Ticker-Kombination nicht mitgeschnitten wurde
+    """
+    cassette = _CASSETTE
+    if cassette is None:
+        return download(tickers, **kwargs)
+    key = _yf_key(tickers)
+    if cassette["mode"] == "replay":
+        return _frame_from_dict(_replay(cassette, "yfinance", key)["frame"])
+
+    t0 = time.perf_counter()
+    df = download(tickers, **kwargs)
+    cassette["data"]["yfinance"][key] = {
+        "frame": _frame_to_dict(df),
+        "elapsed_s": round(time.perf_counter() - t0, 3),
+    }
+    cassette["recorded"] += 1
+    return df
@@ -3,12 +3,19 @@
 import json
 import logging
 import os
+import time
+import zlib
+from contextlib import ExitStack
 
 import pandas as pd
-import requests
-import yfinance as yf
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from scripts.cassette import active_mode, http_get, yf_download
+from scripts.deadline import mark_degraded, remaining, within_budget
+from scripts.file_lock import LockTimeout, atomic_write_text, file_lock
+from scripts.lazy_import import lazy_module
+
+# yfinance erst bei der ersten Kursabfrage laden (Import dauert mehrere hundert Millisekunden)
+yf = lazy_module("yfinance")
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +27,33 @@ _DEFAULT_FALLBACKS = {
     "MATIC": 0.10,
 }
 
+# Live-Kurse paralleler Läufe (price_recent.json) werden so lange aufbewahrt (Sekunden)
+_RECENT_MAX_AGE = 3600
+
+
+# Anzahl Sperren für den Kursabruf: jeder Ticker gehört über einen stabilen Hash zu genau einer davon –
+# Läufe mit disjunkten Tickern rufen (meist) gleichzeitig ab, die Zahl offener Lock-Dateien bleibt begrenzt
+_PRICE_LOCK_STRIPES = 64
+
+
+def _price_lock_path():
+    """Sperre für price_fallback.json und price_recent.json (kurzes Lesen-Ändern-Schreiben ohne Netz)."""
+    return os.path.splitext(_FALLBACK_JSON)[0] + ".lock"
+
+
+def _ticker_lock_paths(tickers):
+    """
+    Sperren für den Kursabruf der Ticker (in price_locks/ neben der Fallback-JSON).
+    Sortiert – alle Läufe sperren in derselben Reihenfolge, damit sich überlappende Ticker-Mengen nicht verklemmen.
+    """
+    folder = os.path.join(os.path.dirname(_FALLBACK_JSON), "price_locks")
+    stripes = sorted({zlib.crc32(t.encode("utf-8")) % _PRICE_LOCK_STRIPES for t in tickers})
+    return [os.path.join(folder, f"price-{stripe:02d}.lock") for stripe in stripes]
+
+
+def _recent_prices_path():
+    return os.path.join(os.path.dirname(_FALLBACK_JSON), "price_recent.json")
+
 
 def _load_fallback() -> dict:
     """Lädt die Fallback-Kurse aus der JSON-Datei. Erstellt sie bei Bedarf."""
@@ -37,17 +71,52 @@ def _load_fallback() -> dict:
 
 
 def _save_fallback(fallback: dict) -> None:
-    """Speichert die aktuellen Fallback-Kurse in die JSON-Datei."""
+    """Speichert die aktuellen Fallback-Kurse atomar in die JSON-Datei (parallele Leser sehen nie halbe Dateien)."""
     try:
-        with open(_FALLBACK_JSON, "w", encoding="utf-8") as f:
-            json.dump(fallback, f, indent=2, ensure_ascii=False)
+        atomic_write_text(_FALLBACK_JSON, json.dumps(fallback, indent=2, ensure_ascii=False))
         logger.debug(f"Fallback-JSON gespeichert: {_FALLBACK_JSON}")
     except Exception as e:
         logger.warning(f"Fallback-JSON konnte nicht gespeichert werden: {e}")
 
 
+def _load_recent(since):
+    """
+    Live-Kurse, die ein paralleler Lauf seit `since` geladen hat (Single-Flight: wer auf die Sperre gewartet hat,
+    übernimmt sie, statt dieselben Ticker erneut abzurufen).
+    :param since: Zeitstempel (time.time()) – ältere Kurse werden ignoriert
+    :return: Dict Ticker → Kurs
+    """
+    try:
+        with open(_recent_prices_path(), encoding="utf-8") as f:
+            recent = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {t: entry["Kurs"] for t, entry in recent.items() if entry.get("ts", 0) >= since}
+
+
+def _publish_recent(prices):
+    """Ergänzt price_recent.json um frisch geladene Live-Kurse (Ticker → Kurs); alte Einträge fallen heraus."""
+    now = time.time()
+    path = _recent_prices_path()
+    try:
+        with open(path, encoding="utf-8") as f:
+            recent = json.load(f)
+    except (OSError, ValueError):
+        recent = {}
+    recent = {t: e for t, e in recent.items() if e.get("ts", 0) >= now - _RECENT_MAX_AGE}
+    recent.update({t: {"Kurs": kurs, "ts": now} for t, kurs in prices.items()})
+    try:
+        atomic_write_text(path, json.dumps(recent, ensure_ascii=False))
+    except OSError as e:
+        logger.warning(f"Live-Kurse für parallele Läufe konnten nicht gespeichert werden: {e}")
+
+
 def _create_retry_session(retries=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504)):
     """Erstellt eine requests-Session mit automatischem Retry bei Netzwerkfehlern."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
     session = requests.Session()
     retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=status_forcelist)
     session.mount("https://", HTTPAdapter(max_retries=retry))
@@ -77,20 +146,70 @@ def download_csv_if_old(urls, folder_path, filenames, max_age_days=30):
         return
     for url, filename in zip(urls, filenames, strict=False):  # Längenprüfung erfolgt explizit oben
         csv_file_path = os.path.join(folder_path, filename)
-        if os.path.exists(csv_file_path):
-            modification_time = os.path.getmtime(csv_file_path)
-            last_modified_date = pd.Timestamp.fromtimestamp(modification_time)
-            if (pd.Timestamp.now() - last_modified_date).days < max_age_days:
-                logger.info(f"CSV-Datei '{filename}' ist aktuell (< {max_age_days} Tage). Download übersprungen.")
-                continue
+        # Sperre je Datei: parallele Läufe warten auf einen Download und finden danach eine aktuelle Datei vor
         try:
-            response = session.get(url, timeout=30)
-            response.raise_for_status()
-            with open(csv_file_path, "w", encoding="utf-8") as f:
-                f.write(response.text)
-            logger.info(f"CSV-Datei '{filename}' erfolgreich heruntergeladen.")
-        except Exception as e:
-            logger.error(f"Fehler beim Download von '{filename}': {e}")
+            with file_lock(f"{csv_file_path}.lock", timeout=remaining()):
+                _download_csv(session, url, csv_file_path, filename, max_age_days)
+        except LockTimeout:
+            mark_degraded("CSV-Download")
+            logger.warning(
+                f"CSV-Datei '{filename}' wird noch von einem anderen Lauf geladen – vorhandene Datei verwendet."
+            )
+
+
+def _download_csv(session, url, csv_file_path, filename, max_age_days):
+    """Lädt eine CSV-Datei, wenn sie fehlt oder veraltet ist, und ersetzt sie atomar (Aufruf unter Sperre)."""
+    # Mit aktiver Kassette immer laden: die Aufnahme enthält alle CSVs, die Wiedergabe liefert exakt den Mitschnitt
+    if os.path.exists(csv_file_path) and active_mode() is None:
+        modification_time = os.path.getmtime(csv_file_path)
+        last_modified_date = pd.Timestamp.fromtimestamp(modification_time)
+        if (pd.Timestamp.now() - last_modified_date).days < max_age_days:
+            logger.info(f"CSV-Datei '{filename}' ist aktuell (< {max_age_days} Tage). Download übersprungen.")
+            return
+    try:
+        # Zeitbudget abgelaufen → vorhandene (ggf. ältere) Datei weiterverwenden
+        response = within_budget("CSV-Download", http_get, session, url, timeout=30)
+        if response is None:
+            logger.warning(f"CSV-Datei '{filename}' nicht aktualisiert (Zeitbudget) – vorhandene Datei verwendet.")
+            return
+        response.raise_for_status()
+        atomic_write_text(csv_file_path, response.text)
+        logger.info(f"CSV-Datei '{filename}' erfolgreich heruntergeladen.")
+    except Exception as e:
+        logger.error(f"Fehler beim Download von '{filename}': {e}")
+
+
+def _price_tickers(df):
+    """Aktien/ETF- und Krypto-Ticker des Depots ohne Börsen- bzw. Währungssuffix."""
+    stock_tickers = df[df["Art"].isin(["Aktie", "ETF"])]["Ticker"].str.replace(r"\..*$", "", regex=True).tolist()
+    crypto_tickers = df[df["Art"] == "Krypto"]["Ticker"].str.replace(r"\-.*$", "", regex=True).tolist()
+    return stock_tickers, crypto_tickers
+
+
+def load_fallback_prices(df):
+    """
+    Offline-Kursliste ohne Netzwerkzugriff: alle Kurse aus price_fallback.json.
+    Alle gefundenen Ticker werden als Fallback gemeldet und erscheinen so in den KPI-Cards.
+    :param df: DataFrame mit 'Ticker' und 'Art' (wie download_stock_price)
+    :return: Tuple (DataFrame mit 'Ticker' und 'Kurs', Liste der Ticker mit Fallback-Kurs)
+    """
+    stock_tickers, crypto_tickers = _price_tickers(df)
+    fallback = _load_fallback()
+    price_list, fallback_used = [], []
+    for ticker in dict.fromkeys(stock_tickers + crypto_tickers):
+        if ticker in fallback:
+            price_list.append({"Ticker": ticker, "Kurs": fallback[ticker]})
+            fallback_used.append(ticker)
+        else:
+            logger.warning(f"Offline: kein Fallback-Kurs für '{ticker}' – bleibt NaN.")
+            price_list.append({"Ticker": ticker, "Kurs": None})
+
+    prices = pd.concat(
+        [pd.DataFrame(price_list, columns=["Ticker", "Kurs"]), pd.DataFrame({"Ticker": ["-"], "Kurs": [1.0]})],
+        ignore_index=True,
+    )
+    logger.info(f"Offline-Kurse aus {_FALLBACK_JSON}: {len(fallback_used)}/{len(price_list)} Ticker mit Fallback-Kurs.")
+    return prices, fallback_used
 
 
 def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=None):
@@ -109,17 +228,39 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
     if crypto_ticker_suffixes is None:
         crypto_ticker_suffixes = ["-EUR"]
 
+    # Sperren je Ticker-Gruppe: parallele Läufe mit gemeinsamen Tickern warten auf den laufenden Abruf und
+    # übernehmen dessen Live-Kurse, statt dieselben Ticker erneut bei Yahoo anzufragen; Läufe mit anderen
+    # Tickern rufen gleichzeitig ab
+    started = time.time()
+    stock_tickers, crypto_tickers = _price_tickers(df)
+    try:
+        with ExitStack() as locks:
+            for path in _ticker_lock_paths(stock_tickers + crypto_tickers):
+                locks.enter_context(file_lock(path, timeout=remaining()))
+            return _download_stock_price(df, stock_ticker_suffixes, crypto_ticker_suffixes, started)
+    except LockTimeout:
+        mark_degraded("Kursabruf")
+        logger.warning("Kursabruf eines anderen Laufs dauert an – alle Kurse aus der Fallback-JSON.")
+        return load_fallback_prices(df)
+
+
+def _download_stock_price(df, stock_ticker_suffixes, crypto_ticker_suffixes, started):
+    """Kursabruf unter Sperre (siehe download_stock_price); started = Beginn des Wartens auf die Sperre."""
     today = pd.Timestamp.today()
     last_working_day = today - pd.offsets.BDay(1)
     logger.info(f"Letzter Handelstag: {last_working_day.date()}")
 
-    # Process stock and ETF tickers – strip any existing suffix first
-    stock_tickers = df[df["Art"].isin(["Aktie", "ETF"])]["Ticker"].str.replace(r"\..*$", "", regex=True).tolist()
-    crypto_tickers = df[df["Art"] == "Krypto"]["Ticker"].str.replace(r"\-.*$", "", regex=True).tolist()
+    stock_tickers, crypto_tickers = _price_tickers(df)
     logger.debug(f"Aktien/ETF-Ticker: {stock_tickers}")
     logger.debug(f"Krypto-Ticker: {crypto_tickers}")
 
-    price_list = []
+    # Kurse, die ein paralleler Lauf geladen hat, während dieser Lauf auf die Sperre gewartet hat
+    shared = _load_recent(since=started)
+    price_list = [
+        {"Ticker": t, "Kurs": shared[t]} for t in dict.fromkeys(stock_tickers + crypto_tickers) if t in shared
+    ]
+    if price_list:
+        logger.info(f"{len(price_list)} Kurse von parallelem Lauf übernommen.")
 
     def _fetch_prices(tickers, suffixes, asset_type):
         """Versucht Batch-Download; fällt bei Bedarf auf Einzel-Download zurück."""
@@ -127,16 +268,24 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
         for suffix in suffixes:
             # Nur Ticker herunterladen, für die noch kein Kurs vorliegt
             already_found = {entry["Ticker"] for entry in price_list}
-            remaining = [t for t in tickers if t not in already_found]
-            if not remaining:
+            pending = [t for t in tickers if t not in already_found]
+            if not pending:
                 break
-            modified_tickers = [t + suffix for t in remaining]
+            modified_tickers = [t + suffix for t in pending]
             logger.debug(f"Batch-Download für {asset_type} mit Suffix '{suffix}': {modified_tickers}")
             try:
-                batch = yf.download(
-                    modified_tickers, start=last_working_day, end=today, progress=False, auto_adjust=True
+                batch = within_budget(
+                    "Kursabruf",
+                    yf_download,
+                    yf.download,
+                    modified_tickers,
+                    start=last_working_day,
+                    end=today,
+                    progress=False,
+                    auto_adjust=True,
                 )
-                if batch.empty:
+                # None = Zeitbudget abgelaufen → fehlende Kurse unten aus dem Fallback
+                if batch is None or batch.empty:
                     continue
 
                 close = batch["Close"] if "Close" in batch.columns else batch
@@ -144,7 +293,7 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
                 if isinstance(close, pd.Series):
                     close = close.to_frame(name=modified_tickers[0])
 
-                for orig_ticker, mod_ticker in zip(remaining, modified_tickers, strict=True):
+                for orig_ticker, mod_ticker in zip(pending, modified_tickers, strict=True):
                     if mod_ticker in close.columns:
                         val = close[mod_ticker].dropna()
                         if not val.empty:
@@ -162,10 +311,17 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
                 modified_ticker = ticker + suffix
                 logger.debug(f"Einzel-Fallback: {modified_ticker}")
                 try:
-                    data = yf.download(
-                        modified_ticker, start=last_working_day, end=today, progress=False, auto_adjust=True
+                    data = within_budget(
+                        "Kursabruf",
+                        yf_download,
+                        yf.download,
+                        modified_ticker,
+                        start=last_working_day,
+                        end=today,
+                        progress=False,
+                        auto_adjust=True,
                     )
-                    if not data.empty and "Close" in data.columns:
+                    if data is not None and not data.empty and "Close" in data.columns:
                         val = data["Close"].dropna()
                         if not val.empty:
                             kurs = float(val.iloc[-1].item()) if hasattr(val.iloc[-1], "item") else float(val.iloc[-1])
@@ -184,10 +340,34 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
     if crypto_tickers:
         _fetch_prices(crypto_tickers, crypto_ticker_suffixes, "Krypto")
 
-    # ------------------------------------------------------------------
-    # Fallback-JSON: erfolgreich geladene Kurse speichern;
-    # fehlende Kurse (None) aus dem Fallback ersetzen
-    # ------------------------------------------------------------------
+    # Fallback-JSON und price_recent.json teilen sich alle Läufe – Lesen-Ändern-Schreiben unter eigener Sperre
+    with file_lock(_price_lock_path()):
+        fallback_used = _merge_fallback(price_list, shared)
+
+    # Cash-Eintrag
+    cash = pd.DataFrame({"Ticker": ["-"], "Kurs": [1.0]})
+    prices = pd.DataFrame(price_list)
+    prices = pd.concat([prices, cash], ignore_index=True)
+    logger.debug(f"Preisliste:\n{prices.to_string()}")
+    # Kompakte INFO-Zusammenfassung
+    found_count = prices["Kurs"].notna().sum()
+    logger.info(f"Kurse geladen: {found_count}/{len(prices)} Positionen. Fallbacks: {fallback_used or 'keine'}")
+    return prices, fallback_used
+
+
+def _merge_fallback(price_list, shared):
+    """
+    Fallback-JSON: erfolgreich geladene Kurse speichern, fehlende Kurse (None) aus dem Fallback ersetzen
+    (Aufruf unter _price_lock_path()).
+    :param price_list: Liste von {'Ticker', 'Kurs'} (wird verändert)
+    :param shared: von parallelen Läufen übernommene Kurse – werden nicht erneut veröffentlicht
+    :return: Ticker, für die der Fallback-Kurs eingesetzt wurde
+    """
+    # Frisch geladene Live-Kurse für wartende parallele Läufe veröffentlichen
+    live = {e["Ticker"]: e["Kurs"] for e in price_list if e["Kurs"] is not None and e["Ticker"] not in shared}
+    if live:
+        _publish_recent(live)
+
     fallback = _load_fallback()
     fallback_updated = False
     fallback_used = []  # Ticker, für die der Fallback-Kurs eingesetzt wurde
@@ -215,13 +395,4 @@ def download_stock_price(df, stock_ticker_suffixes=None, crypto_ticker_suffixes=
     if fallback_updated:
         _save_fallback(fallback)
         logger.info(f"Fallback-JSON aktualisiert: {_FALLBACK_JSON}")
-
-    # Cash-Eintrag
-    cash = pd.DataFrame({"Ticker": ["-"], "Kurs": [1.0]})
-    prices = pd.DataFrame(price_list)
-    prices = pd.concat([prices, cash], ignore_index=True)
-    logger.debug(f"Preisliste:\n{prices.to_string()}")
-    # Kompakte INFO-Zusammenfassung
-    found_count = prices["Kurs"].notna().sum()
-    logger.info(f"Kurse geladen: {found_count}/{len(prices)} Positionen. Fallbacks: {fallback_used or 'keine'}")
-    return prices, fallback_used
+    return fallback_used
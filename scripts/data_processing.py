@@ -1,5 +1,7 @@
 # data_processing.py
 
+import hashlib
+import json
 import logging
 import os
 import unicodedata
@@ -83,6 +85,28 @@ _EXCLUDED_SECTORS = {"Cash und/oder Derivate", "Cash and/or Derivatives", "FX"}
 EXCL_SECTORS = {"-", "nan", "Cash und/oder Derivate", "Cash and/or Derivatives"}
 EXCL_LOCATIONS = {"-", "nan", "Krypto", "Cash", "Cash (Euro)"}
 
+# Version der Bereinigungslogik in clean_etf_data – bei Änderungen an der Logik erhöhen,
+# damit gecachte Bereinigungsergebnisse (artifact_cache) ungültig werden
+CLEANING_VERSION = 1
+
+
+def cleaning_fingerprint():
+    """
+    Fingerprint aller Eingaben der Bereinigung außer den CSVs selbst:
+    SECTOR_MAPPING, LOCATION_MAPPING, Ausschluss-Sets und CLEANING_VERSION.
+    :return: SHA-256-Hexdigest
+    """
+    payload = {
+        "version": CLEANING_VERSION,
+        "sector_mapping": SECTOR_MAPPING,
+        "location_mapping": LOCATION_MAPPING,
+        "excluded_asset_classes": sorted(_EXCLUDED_ASSET_CLASSES),
+        "excluded_sectors": sorted(_EXCLUDED_SECTORS),
+        "excl_sectors": sorted(EXCL_SECTORS),
+        "excl_locations": sorted(EXCL_LOCATIONS),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
 
 def clean_etf_data(df):
     """
@@ -0,0 +1,88 @@
+# deadline.py
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Aktives Zeitbudget (run_budget) – deadline None = unbegrenzt; degraded = Stufen, die auf Cache/Fallback ausweichen
+_BUDGET = {"deadline": None, "seconds": None, "degraded": []}
+
+
+@contextmanager
+def run_budget(seconds):
+    """
+    Globales Zeitbudget für einen Lauf. Netzwerkaufrufe über within_budget warten höchstens bis zum Ablauf;
+    danach liefern sie ihren Default, und der Lauf arbeitet mit Cache- bzw. Fallback-Daten weiter.
+    :param seconds: Budget in Sekunden ab jetzt (None = kein Budget, alle Aufrufe laufen unbegrenzt)
+    """
+    previous = dict(_BUDGET)
+    _BUDGET.update(
+        deadline=None if seconds is None else time.monotonic() + seconds,
+        seconds=seconds,
+        degraded=[],
+    )
+    try:
+        yield
+    finally:
+        _BUDGET.update(previous)
+
+
+def remaining():
+    """:return: verbleibende Sekunden des aktiven Budgets (≤ 0 = abgelaufen) oder None ohne Budget"""
+    if _BUDGET["deadline"] is None:
+        return None
+    return _BUDGET["deadline"] - time.monotonic()
+
+
+def degraded_stages():
+    """:return: Stufen, die im aktiven Budget wegen Zeitüberschreitung auf Cache/Fallback ausgewichen sind"""
+    return list(_BUDGET["degraded"])
+
+
+def mark_degraded(stage):
+    """Meldet, dass eine Stufe wegen des Zeitbudgets auf Cache- bzw. Fallback-Daten ausweicht (einmal je Stufe)."""
+    if stage not in _BUDGET["degraded"]:
+        _BUDGET["degraded"].append(stage)
+        logger.warning(
+            f"Zeitbudget ({_BUDGET['seconds']:g} s) abgelaufen – '{stage}' wartet nicht länger auf das Netz, "
+            f"es werden Cache- bzw. Fallback-Daten verwendet."
+        )
+
+
+def within_budget(stage, fn, *args, default=None, **kwargs):
+    """
+    Führt fn(*args, **kwargs) aus und wartet höchstens bis zum Ablauf des aktiven Budgets.
+    Ohne Budget wird fn direkt aufgerufen. Bei Zeitüberschreitung läuft fn in einem Daemon-Thread weiter,
+    sein Ergebnis wird verworfen – fn darf deshalb keine geteilten Dateien schreiben.
+    :param stage: Name der Stufe für Log und KPI-Cards (z.B. 'Kursabruf')
+    :param default: Rückgabewert bei abgelaufenem Budget
+    :return: Ergebnis von fn oder default
+    :raises: Exceptions aus fn werden im aufrufenden Thread weitergereicht
+    """
+    timeout = remaining()
+    if timeout is None:
+        return fn(*args, **kwargs)
+    if timeout <= 0:
+        mark_degraded(stage)
+        return default
+
+    outcome = {}
+
+    def _target():
+        try:
+            outcome["value"] = fn(*args, **kwargs)
+        except BaseException as e:  # wird im aufrufenden Thread erneut ausgelöst
+            outcome["error"] = e
+
+    thread = threading.Thread(target=_target, name=f"budget-{stage}", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        mark_degraded(stage)
+        return default
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
@@ -0,0 +1,97 @@
+# file_lock.py
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:  # POSIX
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Abstand zwischen zwei Versuchen, eine belegte Sperre zu bekommen (Sekunden)
+_POLL_INTERVAL = 0.05
+
+
+class LockTimeout(TimeoutError):
+    """Die Sperre wurde nicht innerhalb des Timeouts frei (anderer Lauf hält sie noch)."""
+
+
+def _try_lock(fd):
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout=None):
+    """
+    Exklusive, prozessübergreifende Sperre über eine Lock-Datei (flock bzw. msvcrt.locking).
+    Wirkt auch zwischen Threads eines Prozesses, da jeder Aufruf die Datei neu öffnet. Die Lock-Datei bleibt
+    liegen – Löschen würde zwei Läufen erlauben, verschiedene Dateien gleichen Namens zu sperren.
+    :param path: Pfad der Lock-Datei (wird bei Bedarf samt Ordner angelegt)
+    :param timeout: maximale Wartezeit in Sekunden (None = unbegrenzt, ≤ 0 = nur ein Versuch)
+    :raises LockTimeout: wenn die Sperre nicht rechtzeitig frei wird
+    """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not _try_lock(fd):
+            logger.info(f"Warte auf Sperre '{path}' – ein anderer Lauf arbeitet gerade daran.")
+            while not _try_lock(fd):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise LockTimeout(f"Sperre '{path}' nicht innerhalb von {timeout:g} s frei geworden.")
+                time.sleep(_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_writer(path, encoding="utf-8"):
+    """
+    Datei atomar schreiben, auch in Teilen (temporäre Datei + os.replace beim Verlassen des Blocks):
+    parallele Leser sehen immer entweder die alte oder die neue Datei, nie eine halb geschriebene.
+    Bei einer Exception bleibt die alte Datei stehen und die temporäre wird entfernt.
+    :param encoding: Text-Encoding; None = Binärdatei (z.B. für pd.to_pickle)
+    :return: Datei-Handle zum Schreiben
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w" if encoding else "wb", encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    """Schreibt eine Textdatei atomar in einem Stück (siehe atomic_writer)."""
+    with atomic_writer(path, encoding) as f:
+        f.write(text)
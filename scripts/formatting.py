@@ -0,0 +1,127 @@
+# formatting.py
+
+import numpy as np
+import pandas as pd
+
+# Deutsche Zahlenformate für KPI-Cards, Tabellen und Hover-Texte.
+# Eigenes Modul ohne Plotly-Abhängigkeit – die KPI-Berechnung (analysis.py) braucht sie auch ohne Report.
+
+
+def _de(val, decimals=2, unit=""):
+    """Formatiert Zahlen im deutschen Format (Punkt = Tausender, Komma = Dezimal)."""
+    if not isinstance(val, (int, float)) or pd.isna(val):
+        return "–"
+    formatted = f"{val:,.{decimals}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"{formatted}{(' ' + unit) if unit else ''}"
+
+
+def _eur(val):
+    """Formatiert Euro-Beträge im deutschen Format: 1.234,56 €"""
+    return _de(val, 2, "€")
+
+
+def _pct(val, decimals=1):
+    """Formatiert Prozentwerte – bei sehr kleinen Werten mehr Nachkommastellen."""
+    if not isinstance(val, (int, float)) or pd.isna(val):
+        return "–"
+    if abs(val) < 0.1:
+        return _de(val, 2, "%")
+    return _de(val, decimals, "%")
+
+
+# ---------------------------------------------------------------------------
+# Vektorisierte Varianten – ganze Series, Arrays und Matrizen in einem Durchgang
+# ---------------------------------------------------------------------------
+
+
+def _numeric_values(values):
+    """
+    Werte als float-Array plus Maske der Einträge, die _de formatiert (int/float, nicht NaN).
+    :return: Tuple (Original-Array, float-Array, Maske)
+    """
+    raw = np.asarray(values)
+    if raw.dtype == object:
+        numeric = np.fromiter((isinstance(v, (int, float)) for v in raw.flat), dtype=bool, count=raw.size)
+        numeric = numeric.reshape(raw.shape)
+        floats = np.zeros(raw.shape)
+        floats[numeric] = raw[numeric].astype(float)
+    elif raw.dtype.kind in "biuf":
+        floats = raw.astype(float)
+        numeric = np.ones(raw.shape, dtype=bool)
+    else:  # Strings, Datumswerte, … – wie _de: kein Zahlenwert
+        floats = np.zeros(raw.shape)
+        numeric = np.zeros(raw.shape, dtype=bool)
+    return raw, floats, numeric & ~np.isnan(floats)
+
+
+def _de_array(values, decimals=2, unit=""):
+    """
+    Formatiert alle Werte einer Series, eines Arrays oder einer Matrix wie _de – gleiche Ausgabe je Element.
+    Ziffern, Tausenderpunkte, Komma und Vorzeichen entstehen als Zeichen-Matrix in numpy. Werte, deren
+    Rundung in float nicht eindeutig ist (knapp an der Mitte zwischen zwei Stellen, sehr groß, unendlich),
+    formatiert _de einzeln.
+    :param values: Series, ndarray (beliebige Form) oder Liste
+    :return: object-ndarray gleicher Form mit Strings ('–' für fehlende und nicht-numerische Werte)
+    """
+    raw, floats, valid = _numeric_values(values)
+    out = np.full(raw.shape, "–", dtype=object)
+    x = floats[valid]
+    if not len(x):
+        return out
+
+    scaled = np.abs(x) * 10.0**decimals
+    with np.errstate(invalid="ignore"):
+        exact = (np.abs(scaled - np.floor(scaled) - 0.5) > scaled * 1e-15) & (scaled < 2.0**50)
+    rounded = np.rint(np.where(exact, scaled, 0.0)).astype(np.int64)  # wie Python: halbe Stellen zur geraden
+    integer, fraction = np.divmod(rounded, 10**decimals)
+
+    digits = len(str(integer.max()))
+    int_width = digits + (digits - 1) // 3
+    width = 1 + int_width + (decimals + 1 if decimals else 0)  # Vorzeichen + Ganzzahlteil + Komma/Nachkomma
+    chars = np.full((len(x), width), ord(" "), dtype=np.uint8)
+    col = width - 1
+    for _ in range(decimals):
+        chars[:, col] = ord("0") + fraction % 10
+        fraction //= 10
+        col -= 1
+    if decimals:
+        chars[:, col] = ord(",")
+        col -= 1
+    length = np.ones(len(x), dtype=np.int64)  # Zeichen des Ganzzahlteils inkl. Punkten
+    for p in range(digits):
+        present = integer >= 10**p if p else np.ones(len(x), dtype=bool)
+        pos = col - p - p // 3
+        if p and p % 3 == 0:
+            chars[:, pos + 1] = np.where(present, ord("."), ord(" "))
+        chars[:, pos] = np.where(present, ord("0") + integer // 10**p % 10, ord(" "))
+        length[present] = p + p // 3 + 1
+    negative = np.flatnonzero(np.signbit(x))
+    chars[negative, col - length[negative]] = ord("-")
+
+    text = np.strings.lstrip(chars.view(f"S{width}").ravel().astype(f"U{width}"))
+    if unit:
+        text = np.strings.add(text, f" {unit}")
+    formatted = text.astype(object)
+    fallback = np.flatnonzero(~exact)
+    if len(fallback):
+        formatted[fallback] = [_de(v, decimals, unit) for v in raw[valid][fallback].tolist()]
+    out[valid] = formatted
+    return out
+
+
+def _eur_array(values):
+    """Euro-Beträge einer Series bzw. eines Arrays wie _eur: 1.234,56 €"""
+    return _de_array(values, 2, "€")
+
+
+def _pct_array(values, decimals=1, small_decimals=2):
+    """
+    Prozentwerte einer Series bzw. eines Arrays wie _pct – Werte unter 0,1 mit small_decimals Nachkommastellen.
+    :param small_decimals: Nachkommastellen für |Wert| < 0,1 (wie _pct: 2)
+    """
+    raw, floats, valid = _numeric_values(values)
+    out = np.full(raw.shape, "–", dtype=object)
+    small = valid & (np.abs(floats) < 0.1)
+    out[small] = _de_array(raw[small], small_decimals, "%")
+    out[valid & ~small] = _de_array(raw[valid & ~small], decimals, "%")
+    return out
@@ -0,0 +1,140 @@
+# incremental.py
+
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+from scripts.analysis import build_aggregations, build_depot_data, direct_chart_rows, finish_result, price_depot
+from scripts.artifact_cache import artifact_key, cached_artifact
+from scripts.data_processing import EXCL_SECTORS
+from scripts.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Version des gecachten Durchblick-Modells – erhöhen, wenn sich build_depot_data strukturell ändert
+LOOK_THROUGH_VERSION = 1
+
+# Spalten, die sich bei einem reinen Kurs-Update ändern dürfen – alles andere ist Depot-Struktur
+_PRICE_COLUMNS = {"Anteile"}
+
+
+def depot_structure_digest(depot):
+    """
+    Fingerprint der Depot-Struktur (Positionen, Art, Ticker, Sektor, Standort, …) ohne Anteile.
+    Gleicher Fingerprint → der ETF-Durchblick kann wiederverwendet werden, nur die Gewichte ändern sich.
+    :param depot: unbewertetes Depot (load_depot)
+    """
+    structure = depot[[c for c in depot.columns if c not in _PRICE_COLUMNS]]
+    h = hashlib.sha256()
+    h.update(repr([str(c) for c in structure.columns]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(structure.astype(str), index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def build_look_through(etf_data, depot):
+    """
+    Berechnet den ETF-Durchblick einmal vollständig und hält fest, welche Depotposition jede Zeile gewichtet.
+    :param etf_data: bereinigtes ETF-Universum (load_etf_universe)
+    :param depot: bewertetes Depot (price_depot) – die Kurse spielen für das Modell keine Rolle
+    :return: Dict mit dem Durchblick-Gerüst und den Quell-Indizes für apply_look_through
+    """
+    depot_data, _ = build_depot_data(etf_data, depot)
+
+    # ETF-Zeilen: Gewicht der ersten Depotzeile mit gleicher Position (wie calculate_relative_weighting),
+    # -1 = ETF nicht im Depot → Gewichtung bleibt wie im Universum (0)
+    n_etf = len(etf_data)
+    depot_etfs = set(depot.loc[depot["Art"] == "ETF", "Position"])
+    first_row = {}
+    for i, position in enumerate(depot["Position"]):
+        if position in depot_etfs:
+            first_row.setdefault(position, i)
+    etf_src = etf_data["ETF"].map(first_row).fillna(-1).to_numpy(dtype=np.int64)
+
+    # Direktpositionen (Aktie/Krypto) in depot_data hinter den ETF-Zeilen
+    asset_src = np.flatnonzero(depot["Art"].isin(["Aktie", "Krypto"]).to_numpy())
+
+    # Chart-Filter hängt nur vom Sektor ab – einmal auswerten
+    chart_mask = depot_data["Sektor"].notna() & (~depot_data["Sektor"].astype(str).isin(EXCL_SECTORS))
+
+    # Krypto/Cash-Kandidaten, die nicht bereits über den Sektor-Filter im Chart sind;
+    # ob sie erscheinen, entscheidet pro Lauf ihr Marktwert (%) > 0
+    extra_rows = direct_chart_rows(depot, depot_data[chart_mask])
+    extra_src = depot.index.get_indexer(extra_rows.index)
+
+    base_weights = depot_data["relative Gewichtung (%)"].to_numpy(dtype=float, copy=True)
+    base_weights[:n_etf][etf_src >= 0] = np.nan
+    base_weights[n_etf:] = np.nan
+    return {
+        "depot_data": depot_data,
+        "n_etf": n_etf,
+        "gewichtung": etf_data["Gewichtung (%)"].to_numpy(dtype=float),
+        "base_weights": base_weights,
+        "etf_src": etf_src,
+        "asset_src": asset_src,
+        "chart_mask": chart_mask.to_numpy(),
+        "extra_src": extra_src,
+        "extra_rows": extra_rows,
+    }
+
+
+def apply_look_through(model, depot):
+    """
+    Überträgt die aktuellen Depotgewichte auf ein gespeichertes Durchblick-Modell.
+    Liefert dieselben Tabellen wie build_depot_data, ohne das ETF-Universum erneut zu durchlaufen.
+    :param model: Modell aus build_look_through (gleiche Depot-Struktur)
+    :param depot: bewertetes Depot (price_depot)
+    :return: Tuple (depot_data, depot_data_chart)
+    """
+    w = depot["Marktwert (%)"].to_numpy(dtype=float)
+    etf_src, n_etf = model["etf_src"], model["n_etf"]
+
+    weights = model["base_weights"].copy()
+    in_depot = etf_src >= 0
+    weights[:n_etf][in_depot] = model["gewichtung"][in_depot] * w[etf_src[in_depot]] / 100
+    weights[n_etf:] = w[model["asset_src"]]
+
+    depot_data = model["depot_data"].copy()
+    depot_data["relative Gewichtung (%)"] = weights
+    depot_data_chart = depot_data[model["chart_mask"]].copy()
+
+    extra_weights = w[model["extra_src"]]
+    include = ~np.isnan(extra_weights) & (extra_weights > 0)
+    if include.any():
+        extra_rows = model["extra_rows"][include].assign(**{"relative Gewichtung (%)": extra_weights[include]})
+        depot_data_chart = pd.concat([depot_data_chart, extra_rows], ignore_index=True, sort=False)
+
+    return depot_data, depot_data_chart
+
+
+def analyze_depot_incremental(cache_dir, universe_key, load_universe, depot, stock_prices, fallback_used=None):
+    """
+    Wie analyze_depot, aber mit gespeichertem ETF-Durchblick: Bei unverändertem Universum und unveränderter
+    Depot-Struktur werden nur Kurse, Depotgewichte und die linearen Aggregationen neu berechnet.
+    :param cache_dir: Verzeichnis des Artefakt-Caches (None = immer vollständig rechnen)
+    :param universe_key: Cache-Schlüssel des ETF-Universums (etf_universe_key)
+    :param load_universe: Funktion ohne Argumente, die das bereinigte Universum liefert – wird nur bei
+                          Cache-Miss aufgerufen
+    :param depot: unbewertetes Depot (load_depot)
+    :param stock_prices: Kursliste aus download_stock_price
+    :param fallback_used: Ticker mit Fallback-Kurs
+    :return: Ergebnis-Dict wie analyze_depot
+    :raises ValueError: wenn das Universum nicht geladen werden kann oder der Depot-Gesamtwert ≤ 0 ist
+    """
+    with span("merge"):
+        priced, gesamtwert_vollstaendig = price_depot(depot, stock_prices)
+
+    def _build():
+        etf_data = load_universe()
+        if etf_data is None:
+            raise ValueError("ETF-Universum konnte nicht geladen werden.")
+        return build_look_through(etf_data, priced)
+
+    with span("weighting"):
+        key = artifact_key(LOOK_THROUGH_VERSION, universe_key, depot_structure_digest(depot))
+        model = cached_artifact(cache_dir, "lookthrough", key, _build)
+        depot_data, depot_data_chart = apply_look_through(model, priced)
+    with span("aggregation"):
+        aggregations = build_aggregations(priced, depot_data, depot_data_chart)
+        return finish_result(priced, depot_data, depot_data_chart, aggregations, gesamtwert_vollstaendig, fallback_used)
@@ -0,0 +1,251 @@
+# instrumentation.py
+
+import glob
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, suppress
+from datetime import datetime
+
+try:
+    import resource  # nur Unix – unter Windows bleibt max_rss_mb leer
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Aktiver Lauf (timed_run) – None = Instrumentierung aus, span() kostet dann praktisch nichts
+_RUN = None
+
+# Unterstützte Profiler für timed_run(profile=...)
+PROFILERS = ("cprofile", "pyinstrument")
+
+# Anzahl Timing-Reports je Lauf-Name, die beim Aufräumen behalten werden (neueste zuerst) –
+# der Watch-Modus schreibt je Neuberechnung einen Report
+TIMING_KEEP = 20
+
+
+def _max_rss_mb():
+    """Höchststand des Arbeitsspeichers des Prozesses in MB (ru_maxrss: Linux KB, macOS Bytes)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def start_run(name, trace_memory=False):
+    """
+    Startet die Aufzeichnung eines Laufs. Danach gemessene span()-Blöcke landen im Timing-Report.
+    :param name: Name des Laufs (z.B. 'main', 'batch')
+    :param trace_memory: Speicher-Peak je Stufe per tracemalloc messen (genauer, aber spürbar langsamer)
+    """
+    global _RUN
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _RUN = {
+        "name": name,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "t0": time.perf_counter(),
+        "cpu0": time.process_time(),
+        "trace_memory": trace_memory,
+        "started_tracing": started_tracing,
+        "spans": [],
+        "stack": [],
+    }
+
+
+def finish_run():
+    """
+    Beendet die Aufzeichnung.
+    :return: Timing-Report als Dict (JSON-serialisierbar) oder None, wenn kein Lauf aktiv war
+    """
+    global _RUN
+    run, _RUN = _RUN, None
+    if run is None:
+        return None
+    if run["started_tracing"]:
+        tracemalloc.stop()
+    return {
+        "run": run["name"],
+        "started": run["started"],
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "wall_s": round(time.perf_counter() - run["t0"], 6),
+        "cpu_s": round(time.process_time() - run["cpu0"], 6),
+        "max_rss_mb": _max_rss_mb(),
+        "spans": run["spans"],
+    }
+
+
+@contextmanager
+def span(name, **meta):
+    """
+    Misst Wall-Zeit, CPU-Zeit und Speicher-Peak eines Pipeline-Abschnitts. Verschachtelte Spans sind erlaubt.
+    Ohne aktiven Lauf (start_run/timed_run) wird nichts aufgezeichnet.
+    :param name: Name der Stufe (z.B. 'csv_download', 'clean', 'html_write')
+    :param meta: zusätzliche Angaben für den Report (z.B. Zeilenzahl)
+    """
+    run = _RUN
+    if run is None:
+        yield meta
+        return
+
+    parent = run["stack"][-1] if run["stack"] else None
+    if run["trace_memory"]:
+        # Bisherigen Peak an den Eltern-Span weitergeben, dann für diesen Span neu messen
+        peak = tracemalloc.get_traced_memory()[1]
+        if parent is not None:
+            parent["_peak"] = max(parent["_peak"], peak)
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+
+    record = {
+        "name": name,
+        "parent": parent["name"] if parent else None,
+        "depth": len(run["stack"]),
+        "start_s": round(time.perf_counter() - run["t0"], 6),
+        "_peak": 0,
+    }
+    run["stack"].append(record)
+    t0, cpu0 = time.perf_counter(), time.process_time()
+    try:
+        yield meta
+    finally:
+        record["wall_s"] = round(time.perf_counter() - t0, 6)
+        record["cpu_s"] = round(time.process_time() - cpu0, 6)
+        record["peak_mb"] = record["peak_increase_mb"] = None
+        if run["trace_memory"]:
+            peak = max(record["_peak"], tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent["_peak"] = max(parent["_peak"], peak)
+            # peak_mb: höchster Python-Speicher während der Stufe, peak_increase_mb: davon in der Stufe hinzugekommen
+            record["peak_mb"] = round(peak / 1024 / 1024, 3)
+            record["peak_increase_mb"] = round(max(peak - mem_start, 0) / 1024 / 1024, 3)
+        del record["_peak"]
+        record["max_rss_mb"] = _max_rss_mb()
+        if meta:
+            record["meta"] = meta
+        run["stack"].pop()
+        run["spans"].append(record)
+
+
+def write_timing_report(report, report_dir, keep=TIMING_KEEP):
+    """
+    Schreibt den Timing-Report als JSON (timing-<Lauf>-<Zeitstempel>.json) und räumt ältere Reports
+    desselben Lauf-Namens auf.
+    :param keep: Anzahl Reports je Lauf-Name, die behalten werden (0 = unbegrenzt)
+    :return: Pfad der geschriebenen Datei
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(report_dir, f"timing-{report['run']}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _prune(report_dir, report["run"], keep)
+    return path
+
+
+def _prune(report_dir, name, keep):
+    # Zeitstempel im Dateinamen sortieren chronologisch; '[0-9]' trennt z.B. 'main' von 'main-x'
+    reports = sorted(glob.glob(os.path.join(glob.escape(report_dir), f"timing-{glob.escape(name)}-[0-9]*.json")))
+    for old in reports[:-keep] if keep > 0 else []:
+        with suppress(OSError):
+            os.remove(old)
+
+
+def format_timing_report(report):
+    """Kompakte Textübersicht der Stufen (für das Log)."""
+    lines = [f"{'Stufe':<28}{'Wall (s)':>10}{'CPU (s)':>10}{'Peak (MB)':>11}{'+MB':>9}"]
+    for s in sorted(report["spans"], key=lambda s: s["start_s"]):
+        peak = f"{s['peak_mb']:.1f}" if s["peak_mb"] is not None else "–"
+        increase = f"{s['peak_increase_mb']:.1f}" if s["peak_increase_mb"] is not None else "–"
+        label = "  " * s["depth"] + s["name"]
+        lines.append(f"{label:<28}{s['wall_s']:>10.3f}{s['cpu_s']:>10.3f}{peak:>11}{increase:>9}")
+    lines.append(f"{'Gesamt':<28}{report['wall_s']:>10.3f}{report['cpu_s']:>10.3f}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def _profiled(profile, profile_dir, name):
+    """Optionaler Profiler um den gesamten Lauf (cProfile → .prof + .txt, pyinstrument → .html)."""
+    if not profile:
+        yield
+        return
+    if profile not in PROFILERS:
+        logger.warning(f"Unbekannter Profiler '{profile}' – erlaubt: {PROFILERS}. Profiling deaktiviert.")
+        yield
+        return
+
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(profile_dir, f"profile-{name}-{stamp}")
+
+    if profile == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("pyinstrument ist nicht installiert (pip install pyinstrument) – Profiling deaktiviert.")
+            yield
+            return
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(f"{base}.html", "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            logger.info(f"Profil gespeichert: {base}.html")
+        return
+
+    # Profiler-Module erst bei Bedarf laden – sie kosten beim Programmstart spürbar Zeit
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(f"{base}.prof")
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        logger.info(f"Profil gespeichert: {base}.prof (Top 40 in {base}.txt)")
+
+
+@contextmanager
+def timed_run(name, report_dir=None, trace_memory=False, profile=None, profile_dir=None):
+    """
+    Instrumentiert einen kompletten Lauf: sammelt alle span()-Messungen, schreibt den JSON-Timing-Report
+    nach report_dir und startet optional einen Profiler.
+    :param name: Name des Laufs (Teil des Dateinamens)
+    :param report_dir: Zielordner für den Timing-Report. None = kein Report
+    :param trace_memory: Speicher-Peak je Stufe per tracemalloc messen
+    :param profile: None, 'cprofile' oder 'pyinstrument'
+    :param profile_dir: Zielordner der Profile (Default: report_dir, ohne beide das Arbeitsverzeichnis)
+    :return: Dict, in dem nach dem Block 'report' (Timing-Report) und 'path' (Datei) stehen
+    """
+    result = {}
+    start_run(name, trace_memory=trace_memory)
+    try:
+        with _profiled(profile, profile_dir or report_dir or ".", name):
+            yield result
+    finally:
+        report = finish_run()
+        result["report"] = report
+        logger.info(f"Stufen-Laufzeiten:\n{format_timing_report(report)}")
+        if report_dir:
+            try:
+                result["path"] = write_timing_report(report, report_dir)
+                logger.info(f"Timing-Report gespeichert: {result['path']}")
+            except OSError as e:
+                logger.warning(f"Timing-Report konnte nicht gespeichert werden: {e}")
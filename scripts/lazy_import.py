@@ -0,0 +1,26 @@
+# lazy_import.py
+
+import importlib.util
+import sys
+
+
+def lazy_module(name):
+    """
+    Importiert ein Modul verzögert: Der eigentliche Import läuft erst beim ersten Attributzugriff.
+    So kosten schwere Bibliotheken (yfinance, plotly.express) beim Programmstart nichts, bleiben aber als
+    Modul-Attribut erreichbar (z.B. für unittest.mock.patch('scripts.data_download.yf.download')).
+    :param name: vollständiger Modulname
+    :return: bereits geladenes Modul oder Lazy-Modul
+    :raises ModuleNotFoundError: wenn das Modul nicht installiert ist
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -1,44 +1,27 @@
 # plotting.py
 
+import base64
+import gzip
+import hashlib
 import json
 import logging
+import os
+import string
 import webbrowser
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly
-import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 
-logger = logging.getLogger(__name__)
-
-
-# ---------------------------------------------------------------------------
-# Hilfsfunktionen
-# ---------------------------------------------------------------------------
-
-
-def _de(val, decimals=2, unit=""):
-    """Formatiert Zahlen im deutschen Format (Punkt = Tausender, Komma = Dezimal)."""
-    if not isinstance(val, (int, float)) or pd.isna(val):
-        return "–"
-    formatted = f"{val:,.{decimals}f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    return f"{formatted}{(' ' + unit) if unit else ''}"
-
-
-def _eur(val):
-    """Formatiert Euro-Beträge im deutschen Format: 1.234,56 €"""
-    return _de(val, 2, "€")
+from scripts.file_lock import atomic_write_text, atomic_writer
+from scripts.formatting import _de, _de_array, _eur, _pct, _pct_array  # noqa: F401  (_de/_eur/_pct: Re-Export)
 
-
-def _pct(val, decimals=1):
-    """Formatiert Prozentwerte – bei sehr kleinen Werten mehr Nachkommastellen."""
-    if not isinstance(val, (int, float)) or pd.isna(val):
-        return "–"
-    if abs(val) < 0.1:
-        return _de(val, 2, "%")
-    return _de(val, decimals, "%")
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
@@ -78,16 +61,14 @@ def build_depot_table(depot_df):
         if col in df.columns:
             raw_values[col] = df[col].tolist()
 
-    # Formatierung der Anzeige – deutsches Zahlenformat
+    # Formatierung der Anzeige – deutsches Zahlenformat, spaltenweise vektorisiert
     for col in ["Kurs (€)", "Marktwert (€)"]:
         if col in df.columns:
-            df[col] = df[col].apply(lambda x: _de(x, 2) if pd.notna(x) else "–")
+            df[col] = _de_array(df[col], 2)
     if "Anteile" in df.columns:
-        df["Anteile"] = df["Anteile"].apply(lambda x: _de(x, 4) if pd.notna(x) else "–")
+        df["Anteile"] = _de_array(df["Anteile"], 4)
     if "Anteil (%)" in df.columns:
-        df["Anteil (%)"] = df["Anteil (%)"].apply(
-            lambda x: (_de(x, 4, "%") if abs(x) < 0.1 else _de(x, 2, "%")) if pd.notna(x) else "–"
-        )
+        df["Anteil (%)"] = _pct_array(df["Anteil (%)"], decimals=2, small_decimals=4)
 
     # Header mit Sortier-Pfeilen
     cols = list(df.columns)
@@ -129,121 +110,320 @@ def build_depot_table(depot_df):
     </div>"""
 
 
-def build_pie_chart(df, values, names, title):
-    """Erstellt eine Pie-Chart-Figure.
-    Zeigt den echten Depotwert in % als Beschriftung statt des relativen Chart-Anteils.
-    """
-    df = df.copy().dropna(subset=[values, names])
-    df = df[df[values] > 0].reset_index(drop=True)
-
-    fig = px.pie(df, values=values, names=names, title=title)
-    fig.update_traces(
-        customdata=df[values].apply(lambda v: _de(v, 2, "%")),
-        texttemplate="%{label}<br>%{customdata}",
-        textposition="inside",
-        hovertemplate="<b>%{label}</b><br>Depotanteil: %{customdata}<extra></extra>",
-    )
-    fig.update_layout(
-        showlegend=True, title_font_size=18, height=650, width=900, margin={"t": 60, "b": 20, "l": 20, "r": 20}
-    )
-    return fig
+# ---------------------------------------------------------------------------
+# Figure-Specs – Trace- und Layout-Dicts direkt aus den Daten, ohne plotly.express
+# ---------------------------------------------------------------------------
 
 
-def build_bar_chart(df, x, y, title, top_n=20):
-    """Erstellt eine horizontale Balken-Chart-Figure (Top-N).
-    Passt den linken Margin dynamisch an die längste Y-Beschriftung an.
+@lru_cache(maxsize=4)
+def _layout_template(name):
+    """Layout-Template als Dict (wie px es in jede Figure schreibt) – einmal je Template-Name aufgebaut."""
+    return pio.templates[name].to_plotly_json()
+
+
+def _spec_layout(title, **layout):
+    """Gemeinsames Layout der Spec-Builder: Default-Template, Titel in Größe 18, Legende wie bei plotly.express."""
+    return {
+        "template": _layout_template(pio.templates.default),
+        "legend": {"tracegroupgap": 0},
+        "title": {"text": title, "font": {"size": 18}},
+        **layout,
+    }
+
+
+def _object_array(series):
+    """Series → object-Array, fehlende Werte als None (→ null im JSON, wie plotly.io.to_json)."""
+    values = series.to_numpy(dtype=object, copy=True)
+    values[series.isna().to_numpy()] = None
+    return values
+
+
+def pie_chart_spec(df, values, names, title):
+    """
+    Figure-Spec (Dict mit 'data' und 'layout') des Pie-Charts – gleiche Figure wie build_pie_chart, aber ohne
+    Plotly-Objekte. Beschriftung ist der echte Depotwert in %, nicht der relative Chart-Anteil.
+    """
+    df = df.dropna(subset=[values, names])
+    df = df[df[values] > 0]
+    trace = {
+        "type": "pie",
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "labels": _object_array(df[names]),
+        "values": df[values].to_numpy(),
+        "customdata": _de_array(df[values], 2, "%"),
+        "legendgroup": "",
+        "name": "",
+        "showlegend": True,
+        "textposition": "inside",
+        "texttemplate": "%{label}<br>%{customdata}",
+        "hovertemplate": "<b>%{label}</b><br>Depotanteil: %{customdata}<extra></extra>",
+    }
+    layout = _spec_layout(title, showlegend=True, height=650, width=900, margin={"t": 60, "b": 20, "l": 20, "r": 20})
+    return {"data": [trace], "layout": layout}
+
+
+def bar_chart_spec(df, x, y, title, top_n=20):
+    """
+    Figure-Spec der horizontalen Top-N-Balken – gleiche Figure wie build_bar_chart, ohne Plotly-Objekte.
+    Der linke Margin richtet sich nach der längsten Y-Beschriftung.
     """
-    df_top = df.nlargest(top_n, x).copy()
-    df_top["_label"] = df_top[x].apply(lambda v: _de(v, 2, "%"))
+    df_top = df.nlargest(top_n, x)
+    labels = _de_array(df_top[x], 2, "%")
 
     max_label_len = df_top[y].astype(str).str.len().max() if not df_top.empty else 20
     left_margin = min(max(int(max_label_len * 7), 120), 400)
 
-    fig = px.bar(df_top, x=x, y=y, orientation="h", title=title, text="_label", hover_data={x: ":.2f", "_label": False})
-    fig.update_traces(
-        textposition="outside",
-        hovertemplate="<b>%{y}</b><br>Gewichtung: %{text}<extra></extra>",
-    )
-    fig.update_layout(
+    template = _layout_template(pio.templates.default)
+    trace = {
+        "type": "bar",
+        "orientation": "h",
+        "x": df_top[x].to_numpy(),
+        "y": _object_array(df_top[y]),
+        "text": labels,
+        "customdata": labels[:, None],
+        "marker": {"color": template["layout"]["colorway"][0], "pattern": {"shape": ""}},
+        "legendgroup": "",
+        "name": "",
+        "showlegend": False,
+        "xaxis": "x",
+        "yaxis": "y",
+        "textposition": "outside",
+        "hovertemplate": "<b>%{y}</b><br>Gewichtung: %{text}<extra></extra>",
+    }
+    layout = _spec_layout(
+        title,
+        xaxis={"anchor": "y", "domain": [0.0, 1.0], "title": {"text": x}, "ticksuffix": " %"},
         yaxis={
+            "anchor": "x",
+            "domain": [0.0, 1.0],
+            "title": {"text": y},
             "categoryorder": "total ascending",
             "tickmode": "linear",
             "automargin": True,
             "tickfont": {"size": 12},
         },
-        xaxis={"ticksuffix": " %"},
+        barmode="relative",
         margin={"l": left_margin, "r": 80, "t": 60, "b": 40},
-        title_font_size=18,
         height=max(400, top_n * 28),
     )
-    return fig
+    return {"data": [trace], "layout": layout}
 
 
-def build_treemap(df, path_cols, values, title):
-    """Erstellt eine Treemap-Figure.
+def treemap_hierarchy(df, path_cols, values):
+    """
+    Knoten einer Treemap beliebiger Tiefe – vollständig vektorisiert (je Ebene ein groupby, keine Schleife
+    über Knoten). Reihenfolge wie bei plotly.express: Blätter zuerst, dann jede höhere Ebene; innerhalb einer
+    Ebene nach erstem Auftreten. Gruppen mit fehlendem Schlüssel entfallen, ihre Werte zählen aber für die
+    Elternknoten.
+    :param df: DataFrame mit den Pfad-Spalten und der Werte-Spalte
+    :param path_cols: Pfad von der Wurzel zum Blatt, z.B. ['Standort', 'Name']
+    :param values: Werte-Spalte (NaN zählt als 0)
+    :return: Dict mit numpy-Arrays je Knoten: 'ids' ('Eltern/Label'), 'parents' ('' = Wurzel), 'labels',
+             'values' (Summe des Teilbaums), 'parent_index' (Position des Elternknotens, -1 = Wurzel),
+             'depth' (1 = Wurzel), 'is_leaf' (ohne Kinder) und 'share' (Anteil am Elternknoten in %,
+             NaN bei Wurzeln und Eltern ohne Wert)
+    :raises ValueError: wenn ein fehlender Pfad-Eintrag nicht-leere Unterebenen hat
+    """
+    factorized = [pd.factorize(df[col].to_numpy()) for col in path_cols]  # Codes je Pfad-Spalte, -1 = fehlt
+    missing = np.column_stack([codes < 0 for codes, _ in factorized])
+    if (missing[:, :-1] & ~missing[:, 1:]).any():
+        raise ValueError("None entries cannot have not-None children")
+
+    weights = df[values].astype(float).to_numpy()
+    rows = np.arange(len(df))  # Zeilen, deren Pfad bis zur aktuellen Ebene vollständig ist
+    row_group = np.zeros(len(df), dtype=np.int64)  # Knoten der höheren Ebene je Zeile
+    levels = []  # von der Wurzel abwärts: (ids, labels, values, parent_index innerhalb der höheren Ebene)
+    for depth, (all_codes, uniques) in enumerate(factorized, start=1):
+        codes = all_codes[rows]
+        complete = codes >= 0
+        rows, codes, parent_group = rows[complete], codes[complete], row_group[complete]
+        # Knoten = (Elternknoten, Wert) in Reihenfolge des ersten Auftretens; first = erste Zeile je Knoten
+        row_group = pd.factorize(parent_group * len(uniques) + codes)[0]
+        first = np.unique(row_group, return_index=True)[1]
+        labels = np.asarray(uniques.astype(str), dtype=object)[codes[first]]
+        if depth == 1:
+            parent_index = np.full(len(first), -1, dtype=np.int64)
+            ids = labels
+        else:
+            parent_index = parent_group[first]
+            ids = levels[-1][0][parent_index] + "/" + labels
+        sums = pd.Series(weights[rows]).groupby(row_group).sum().to_numpy()
+        levels.append((ids, labels, sums, parent_index))
+
+    # Blätter zuerst: offsets[d] = Position der Ebene d (0 = Wurzel) im Gesamt-Array
+    sizes = np.array([len(level[0]) for level in levels])
+    offsets = sizes[::-1].cumsum()[::-1] - sizes
+    order = range(len(levels) - 1, -1, -1)
+    ids = np.concatenate([levels[d][0] for d in order])
+    labels = np.concatenate([levels[d][1] for d in order])
+    node_values = np.concatenate([levels[d][2] for d in order])
+    parent_index = np.concatenate([levels[d][3] + offsets[d - 1] if d else levels[d][3] for d in order])
+    depth = np.repeat(np.arange(len(levels), 0, -1), sizes[::-1])
+
+    has_parent = parent_index >= 0
+    parents = np.full(len(ids), "", dtype=object)
+    parents[has_parent] = ids[parent_index[has_parent]]
+    is_leaf = np.ones(len(ids), dtype=bool)
+    is_leaf[parent_index[has_parent]] = False
+    parent_values = np.where(has_parent, node_values[np.where(has_parent, parent_index, 0)], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        share = np.where(parent_values > 0, node_values / parent_values * 100, np.nan)
+    return {
+        "ids": ids,
+        "parents": parents,
+        "labels": labels,
+        "values": node_values,
+        "parent_index": parent_index,
+        "depth": depth,
+        "is_leaf": is_leaf,
+        "share": share,
+    }
 
-    Zeigt für jeden Knoten (Blatt und Eltern) den korrekten Depot-Anteil aus
-    den Original-Daten – nicht Plotlys interne percentRoot/percentParent.
+
+# Level of Detail: je Elternknoten bleiben nur die größten Blätter, der Rest wird zu einem Sammelknoten
+DETAIL_OTHERS = "Sonstige"
+
+
+def treemap_detail(tree, top_n=None, min_weight=None):
+    """
+    Reduziert eine Treemap-Hierarchie: je Elternknoten bleiben die top_n größten Blätter bzw. die Blätter ab
+    min_weight, alle übrigen Blätter werden zu einem Sammelknoten 'Sonstige (n weitere)' mit ihrer Summe.
+    Ein einzelnes übriges Blatt bleibt stehen – ein Sammelknoten für nur ein Blatt spart nichts.
+    :param tree: Dict aus treemap_hierarchy
+    :param top_n: maximale Anzahl Blätter je Elternknoten (None = keine Grenze)
+    :param min_weight: Mindestwert eines Blatts (in der Einheit der Werte-Spalte, None = keine Grenze)
+    :return: Tuple (reduzierte Hierarchie im Format von treemap_hierarchy – Sammelknoten am Ende,
+             Dict Sammelknoten-ID → Positionen seiner Blätter in tree)
     """
-    fig = px.treemap(df, path=path_cols, values=values, title=title, custom_data=[values])
+    n = len(tree["ids"])
+    leaves = np.flatnonzero(tree["is_leaf"] & (tree["parent_index"] >= 0))
+    parent, values = tree["parent_index"][leaves], tree["values"][leaves]
+
+    # Rang je Elternknoten (0 = größtes Blatt, bei Gleichstand zählt die Reihenfolge)
+    order = np.lexsort((-values, parent))
+    starts = np.flatnonzero(np.r_[True, np.diff(parent[order]) != 0]) if len(order) else order
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+    fold = np.zeros(len(leaves), dtype=bool)
+    if top_n is not None:
+        fold |= rank >= top_n
+    if min_weight is not None:
+        fold |= values < min_weight
+    fold &= np.bincount(parent[fold], minlength=n)[parent] >= 2
+    if not fold.any():
+        return tree, {}
+
+    folded = leaves[fold]
+    counts = np.bincount(parent[fold], minlength=n)
+    owners = np.flatnonzero(counts)  # Elternknoten mit Sammelknoten
+    other_values = np.bincount(parent[fold], weights=values[fold], minlength=n)[owners]
+    other_labels = np.array([f"{DETAIL_OTHERS} ({k} weitere)" for k in counts[owners].tolist()], dtype=object)
+    other_ids = tree["ids"][owners] + "/" + other_labels
+
+    keep = np.ones(n, dtype=bool)
+    keep[folded] = False
+    position = np.cumsum(keep) - 1  # neue Position der behaltenen Knoten
+    parent_index = tree["parent_index"][keep]
+    parent_index = np.where(parent_index >= 0, position[parent_index], -1)
+    owner_values = tree["values"][owners]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        other_share = np.where(owner_values > 0, other_values / owner_values * 100, np.nan)
+
+    reduced = {
+        "ids": np.concatenate([tree["ids"][keep], other_ids]),
+        "parents": np.concatenate([tree["parents"][keep], tree["ids"][owners]]),
+        "labels": np.concatenate([tree["labels"][keep], other_labels]),
+        "values": np.concatenate([tree["values"][keep], other_values]),
+        "parent_index": np.concatenate([parent_index, position[owners]]),
+        "depth": np.concatenate([tree["depth"][keep], tree["depth"][owners] + 1]),
+        "is_leaf": np.concatenate([tree["is_leaf"][keep], np.ones(len(owners), dtype=bool)]),
+        "share": np.concatenate([tree["share"][keep], other_share]),
+    }
+    by_owner = folded[np.argsort(tree["parent_index"][folded], kind="stable")]
+    tails = np.split(by_owner, np.cumsum(counts[owners])[:-1])
+    return reduced, dict(zip(other_ids.tolist(), tails, strict=True))
 
-    # Eltern-Knoten bekommen von px.treemap kein customdata – manuell befüllen.
-    # fig.data[0].ids enthält alle Knoten-IDs (z.B. "Technologie", "Technologie/Apple").
-    # fig.data[0].customdata hat für Eltern-Knoten NaN → mit Summe der Kinder ersetzen.
-    trace = fig.data[0]
-    ids = list(trace.ids)
-    parents = list(trace.parents)
-    customdata = list(trace.customdata)  # shape: (n, 1)
 
-    # Summe je Eltern-Knoten aus Kinder-customdata aufbauen
-    parent_sums: dict[str, float] = {}
-    for i, _node_id in enumerate(parents):
-        if _node_id == "":
-            continue
-        val = customdata[i][0] if customdata[i][0] == customdata[i][0] else 0.0
-        parent_sums[_node_id] = parent_sums.get(_node_id, 0.0) + val
+def _treemap_customdata(values, share, show_share):
+    """customdata der Treemap: [Depot-Anteil, Kategorie-Anteil als Text ('–' wo nicht angezeigt)]."""
+    customdata = np.empty((len(values), 2), dtype=object)
+    customdata[:, 0] = values
+    customdata[:, 1] = "–"
+    customdata[show_share, 1] = [f"{v:.2f} %" for v in share[show_share].tolist()]  # schneller als np.char.mod
+    return customdata
 
-    # customdata der Eltern-Knoten setzen
-    for i, node_id in enumerate(ids):
-        if node_id in parent_sums and (
-            customdata[i][0] != customdata[i][0]  # ist NaN
-            or customdata[i][0] == 0.0
-        ):
-            customdata[i] = [parent_sums[node_id]]
 
-    # Kategorie-Anteil: nur für Blatt-Knoten sinnvoll (Eltern-Knoten sind selbst Kategorien)
-    # Blatt-Knoten = Knoten der NICHT in parent_sums vorkommt (hat keine Kinder)
-    parent_val_map = {node_id: customdata[i][0] for i, node_id in enumerate(ids)}
-    is_parent = set(parent_sums.keys())  # alle Knoten die mindestens ein Kind haben
-
-    cd_cat = []
-    for i, _node_id in enumerate(ids):
-        pid = parents[i]
-        node_val = customdata[i][0] if customdata[i][0] == customdata[i][0] else 0.0
-        parent_val = parent_val_map.get(pid, 0.0) if pid else 0.0
-
-        if _node_id not in is_parent and parent_val > 0:
-            # Blatt-Knoten: Kategorie-Anteil berechnen, als formatierter String
-            pct_str = f"{node_val / parent_val * 100:.2f} %"
-        else:
-            # Eltern/Root: kein Kategorie-Anteil anzeigen
-            pct_str = "–"
+def treemap_spec(df, path_cols, values, title, detail=None):
+    """
+    Figure-Spec der Treemap – gleiche Figure wie build_treemap, ohne Plotly-Objekte. Pfad beliebiger Tiefe.
 
-        cd_cat.append([customdata[i][0], pct_str])
+    Zeigt für jeden Knoten (Blatt und Eltern) den korrekten Depot-Anteil aus
+    den Original-Daten – nicht Plotlys interne percentRoot/percentParent.
 
-    trace.customdata = cd_cat
+    Mit detail werden kleine Blätter je Elternknoten zu 'Sonstige' zusammengefasst (treemap_detail). Ihre
+    Daten stehen dann unter spec['drilldown'] (Sammelknoten-ID → labels/values/customdata) und werden im
+    Report erst beim Klick auf den Sammelknoten nachgeladen. Solche Specs sind für den Report gedacht –
+    go.Figure kennt den Schlüssel 'drilldown' nicht.
+    :param detail: optionale Detail-Stufe {'top_n': int|None, 'min_weight': float|None}, None = alle Blätter
+    """
+    full = treemap_hierarchy(df, path_cols, values)
+    tree, tails = treemap_detail(full, **detail) if detail else (full, {})
 
-    fig.update_traces(
-        texttemplate="%{label}<br>%{customdata[0]:.2f} %",
-        hovertemplate=(
+    # Kategorie-Anteil: nur für Blatt-Knoten sinnvoll (Eltern-Knoten sind selbst Kategorien)
+    customdata = _treemap_customdata(tree["values"], tree["share"], tree["is_leaf"] & ~np.isnan(tree["share"]))
+
+    trace = {
+        "type": "treemap",
+        "branchvalues": "total",
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "ids": tree["ids"],
+        "parents": tree["parents"],
+        "labels": tree["labels"],
+        "values": tree["values"],
+        "customdata": customdata,
+        "name": "",
+        "texttemplate": "%{label}<br>%{customdata[0]:.2f} %",
+        "hovertemplate": (
             "<b>%{label}</b><br>"
             "Anteil Depot: %{customdata[0]:.2f} %<br>"
             "Anteil Kategorie: %{customdata[1]}"
             "<extra></extra>"
         ),
-    )
-    fig.update_layout(title_font_size=18, height=700, margin={"t": 60, "b": 10, "l": 10, "r": 10})
-    return fig
+    }
+    layout = _spec_layout(title, height=700, margin={"t": 60, "b": 10, "l": 10, "r": 10})
+    spec = {"data": [trace], "layout": layout}
+    if tails:
+        trace["meta"] = {"drilldown": list(tails)}  # Sammelknoten, deren Blätter der Report nachlädt
+        spec["drilldown"] = {}
+        for node_id, tail in tails.items():
+            tail_values, tail_share = full["values"][tail], full["share"][tail]
+            spec["drilldown"][node_id] = {
+                "labels": full["labels"][tail],
+                "values": tail_values,
+                "customdata": _treemap_customdata(tail_values, tail_share, ~np.isnan(tail_share)),
+            }
+    return spec
+
+
+# ---------------------------------------------------------------------------
+# Plotly-Figures – aus den Specs bzw. direkt mit graph_objects (Heatmap)
+# ---------------------------------------------------------------------------
+
+
+def build_pie_chart(df, values, names, title):
+    """Erstellt eine Pie-Chart-Figure (siehe pie_chart_spec)."""
+    return go.Figure(pie_chart_spec(df, values, names, title))
+
+
+def build_bar_chart(df, x, y, title, top_n=20):
+    """Erstellt eine horizontale Balken-Chart-Figure (Top-N, siehe bar_chart_spec)."""
+    return go.Figure(bar_chart_spec(df, x, y, title, top_n=top_n))
+
+
+def build_treemap(df, path_cols, values, title):
+    """Erstellt eine Treemap-Figure (siehe treemap_spec)."""
+    return go.Figure(treemap_spec(df, path_cols, values, title))
 
 
 def build_heatmap(pivot_df, title, colorscale="Blues"):
@@ -256,7 +436,7 @@ def build_heatmap(pivot_df, title, colorscale="Blues"):
     y = pivot_df.index.tolist()
 
     # Annotationstext: deutsches Format mit %-Zeichen, leer bei 0
-    text = [[(_de(v, 2, "%") if v > 0 else "") for v in row] for row in z]
+    text = np.where(z > 0, _de_array(z, 2, "%"), "").tolist()
 
     fig = go.Figure(
         go.Heatmap(
@@ -282,106 +462,308 @@ def build_heatmap(pivot_df, title, colorscale="Blues"):
 
 
 # ---------------------------------------------------------------------------
-# HTML-Report-Export
+# Plotly.js – einmal je Prozess gelesen, inline oder als gemeinsame Datei
 # ---------------------------------------------------------------------------
 
+# 'inline': Report ist self-contained (Default) · 'shared': Reports verweisen auf eine gemeinsame plotly-<hash>.min.js
+PLOTLYJS_MODES = ("inline", "shared")
+
+_PLOTLYJS_PATH = Path(plotly.__file__).parent / "package_data" / "plotly.min.js"
+_PLOTLYJS_CDN = "https://cdn.plot.ly/plotly-2.35.2.min.js"
 
-def export_html_report(sections, output_file, depot_summary=None):
+
+@lru_cache(maxsize=1)
+def plotlyjs_source():
+    """
+    Inhalt von plotly.min.js (~4 MB) – wird nur beim ersten Report eines Prozesses von der Platte gelesen.
+    :return: Text oder None, wenn die Datei im Plotly-Paket fehlt
     """
-    Erstellt einen vollständigen, selbst-enthaltenden HTML-Report mit allen Charts.
+    if not _PLOTLYJS_PATH.exists():
+        return None
+    return _PLOTLYJS_PATH.read_text(encoding="utf-8")
 
-    :param sections: Liste von Dicts mit Schlüsseln:
-                     - 'title': Abschnittstitel (str)
-                     - 'fig':   Plotly-Figure
-                     - 'description': optionaler Erläuterungstext (str)
-    :param output_file: Pfad zur Ausgabe-HTML-Datei (str)
-    :param depot_summary: optionaler dict mit Kennzahlen für den Kopfbereich,
-                          z. B. {'Gesamtwert (€)': 12345.67, 'Positionen': 15}
+
+@lru_cache(maxsize=1)
+def plotlyjs_asset_name():
+    """Dateiname der gemeinsamen Plotly.js-Datei mit Inhalts-Hash, z. B. 'plotly-3f2a9c1b7d4e.min.js'."""
+    digest = hashlib.sha256(plotlyjs_source().encode("utf-8")).hexdigest()[:12]
+    return f"plotly-{digest}.min.js"
+
+
+def write_plotlyjs_asset(asset_dir):
     """
-    now = datetime.now().strftime("%d.%m.%Y %H:%M Uhr")
+    Schreibt plotly-<hash>.min.js einmal nach asset_dir. Existiert die Datei schon, bleibt sie unverändert –
+    der Hash im Namen garantiert, dass ihr Inhalt zur installierten Plotly-Version passt.
+    :return: Pfad der Datei
+    """
+    path = os.path.join(asset_dir, plotlyjs_asset_name())
+    if not os.path.exists(path):
+        os.makedirs(asset_dir, exist_ok=True)
+        atomic_write_text(path, plotlyjs_source())
+        logger.info(f"Plotly.js als gemeinsame Datei gespeichert: {path}")
+    return path
+
+
+def _plotlyjs_tag(output_file, mode="inline", asset_dir=None):
+    """<script>-Tag für Plotly.js: inline, als relativer Verweis auf die gemeinsame Datei oder per CDN-Fallback."""
+    if mode not in PLOTLYJS_MODES:
+        raise ValueError(f"Unbekannter Plotly.js-Modus '{mode}' – erlaubt: {PLOTLYJS_MODES}")
+    source = plotlyjs_source()
+    if source is None:
+        logger.warning(
+            f"Lokale plotly.min.js nicht gefunden ({_PLOTLYJS_PATH}) – "
+            f"CDN-Fallback wird verwendet. Report benötigt Internetverbindung!"
+        )
+        return f'<script src="{_PLOTLYJS_CDN}"></script>'
+    if mode == "inline":
+        return f"<script>{source}</script>"
 
-    # Navigationsmenü-Einträge
-    nav_items = "".join(f'<li><a href="#section-{i}">{s["title"]}</a></li>' for i, s in enumerate(sections))
+    report_dir = os.path.dirname(os.path.abspath(output_file))
+    asset = write_plotlyjs_asset(asset_dir or report_dir)
+    return f'<script src="{Path(os.path.relpath(asset, report_dir)).as_posix()}"></script>'
 
-    # Kennzahlen-Karten im Header – in drei Gruppen aufgeteilt
-    summary_html = ""
-    if depot_summary:
-        # Gruppen: Depot-Übersicht | Assetklassen | Qualität & Warnungen
-        group_keys = {
-            "depot": ["Gesamtwert", "Positionen"],
-            "assets": ["ETF-Anteil", "Aktien-Anteil", "Krypto-Anteil", "Cash-Anteil"],
-            "quality": ["Diversifikation", "Top-5-Konzentration"],
-        }
-        # Alle Keys die keiner Gruppe zugeordnet sind (z.B. Fallback-Warnung) → extra
-        assigned = {k for keys in group_keys.values() for k in keys}
-        extra_keys = [k for k in depot_summary if k not in assigned]
 
-        # Schlüssel deren Wert im Datenschutz-Modus ausgeblendet wird
-        _private_keys = {"Gesamtwert"}
+# ---------------------------------------------------------------------------
+# Kompakte Figure-Serialisierung – Typed Arrays statt Zahlen-Text, Beschriftungen dedupliziert
+# ---------------------------------------------------------------------------
 
-        def _card(k, v):
-            is_warning = "⚠️" in str(k) or "⚠️" in str(v)
-            cls      = "kpi-card kpi-warning" if is_warning else "kpi-card"
-            val_cls  = "kpi-value private" if k in _private_keys else "kpi-value"
-            return f'<div class="{cls}"><div class="{val_cls}">{v}</div><div class="kpi-label">{k}</div></div>'
+# Arrays ab dieser Länge werden kompakt kodiert – kürzere sind als JSON-Liste kleiner
+_COMPACT_MIN_LEN = 16
 
-        groups_html = ""
-        for _gname, keys in group_keys.items():
-            cards = "".join(_card(k, depot_summary[k]) for k in keys if k in depot_summary)
-            if cards:
-                groups_html += f'<div class="kpi-group">{cards}</div>'
+# Ganzzahl-Typen für Typed Arrays, kleinster passender zuerst (Plotly-dtype-Namen, Little Endian)
+_INT_DTYPES = (("u1", "<u1"), ("i1", "<i1"), ("u2", "<u2"), ("i2", "<i2"), ("u4", "<u4"), ("i4", "<i4"))
 
-        if extra_keys:
-            cards = "".join(_card(k, depot_summary[k]) for k in extra_keys)
-            groups_html += f'<div class="kpi-group kpi-group-wide">{cards}</div>'
 
-        summary_html = f'<div class="kpi-row">{groups_html}</div>'
+def _typed_array(values):
+    """Zahlenliste → Plotly-Typed-Array {'dtype', 'bdata'} – ganzzahlige Werte im kleinsten verlustfreien Typ."""
+    arr = np.asarray(values, dtype="<f8")
+    name, dtype = "f8", "<f8"
+    if arr.size and (arr == np.trunc(arr)).all():
+        lo, hi = arr.min(), arr.max()
+        name, dtype = next(
+            ((n, d) for n, d in _INT_DTYPES if np.iinfo(d).min <= lo and hi <= np.iinfo(d).max), (name, dtype)
+        )
+    return {"dtype": name, "bdata": base64.b64encode(arr.astype(dtype).tobytes()).decode("ascii")}
 
-    sections_html = ""
-    plotlyjs_tag = ""
-    chart_payloads = []  # [(div_id, fig_json)]
 
-    # Plotly.js einmalig inline einbetten (kein CDN, keine file://-Probleme)
-    _plotlyjs_path = Path(plotly.__file__).parent / "package_data" / "plotly.min.js"
-    if _plotlyjs_path.exists():
-        plotlyjs_tag = f"<script>{_plotlyjs_path.read_text(encoding='utf-8')}</script>"
-        logger.debug(f"Plotly.js lokal eingebettet: {_plotlyjs_path}")
-    else:
-        plotlyjs_tag = '<script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>'
-        logger.warning(
-            f"Lokale plotly.min.js nicht gefunden ({_plotlyjs_path}) – "
-            f"CDN-Fallback wird verwendet. Report benötigt Internetverbindung!"
+def _compact_array(values):
+    """
+    Kodiert eine 1D-Liste: Zahlen → Typed Array, sich wiederholende Strings → Wörterbuch + Index-Array
+    ({'$dict': [eindeutige Werte], 'codes': Typed Array}). Alles andere bleibt unverändert.
+    """
+    if len(values) < _COMPACT_MIN_LEN:
+        return values
+    if all(type(v) in (int, float) for v in values):  # ohne bool/None (None = Lücke im Chart)
+        return _typed_array(values)
+    if all(type(v) is str for v in values):
+        uniques = dict.fromkeys(values)
+        if len(uniques) <= len(values) // 2:
+            codes = {v: i for i, v in enumerate(uniques)}
+            return {"$dict": list(uniques), "codes": _typed_array([codes[v] for v in values])}
+    return values
+
+
+def _compact_rows(rows):
+    """Kodiert eine 2D-Liste (z.B. customdata) spaltenweise: {'$columns': [Spalte, …]} – sonst unverändert."""
+    width = len(rows[0]) if rows and isinstance(rows[0], list) else 0
+    if len(rows) < _COMPACT_MIN_LEN or not width or any(not isinstance(r, list) or len(r) != width for r in rows):
+        return rows
+    columns = [_compact_array([r[c] for r in rows]) for c in range(width)]
+    if all(isinstance(c, list) for c in columns):
+        return rows
+    return {"$columns": columns}
+
+
+def _array_key(value):
+    """Inhalts-Schlüssel eines kodierten Arrays für die Deduplizierung (None = nicht deduplizierbar)."""
+    if isinstance(value, dict) and "bdata" in value and "shape" not in value:
+        return ("typed", value["dtype"], value["bdata"])
+    if isinstance(value, dict) and "$dict" in value:
+        return ("dict", tuple(value["$dict"]), value["codes"]["bdata"])
+    if isinstance(value, list) and len(value) >= _COMPACT_MIN_LEN and all(type(v) is str for v in value):
+        return ("list", tuple(value))
+    return None
+
+
+def _plain_value(value):
+    """numpy-Array aus einer Figure-Spec → Typed Array (Zahlen, 1D) bzw. Liste – wie plotly.io.to_json."""
+    if not isinstance(value, np.ndarray):
+        return value
+    if value.ndim == 1 and value.dtype.kind in "iuf":
+        return _typed_array(value)
+    return value.tolist()
+
+
+def _compact_trace(trace):
+    """
+    Kodiert alle Arrays eines Traces (auch in verschachtelten Attributen wie marker) kompakt. Gleiche Arrays
+    (z.B. customdata-Spalte = values) stehen nur einmal im Trace, weitere Vorkommen als {'$ref': Attribut}.
+    Der übergebene Trace bleibt unverändert.
+    :return: neues Trace-Dict
+    """
+    trace = {key: _plain_value(value) for key, value in trace.items()}
+    # Treemap/Sunburst: ids = parents + '/' + labels – wird im Browser aus beiden zusammengesetzt
+    ids, parents, labels = trace.get("ids"), trace.get("parents"), trace.get("labels")
+    if (
+        isinstance(ids, list)
+        and isinstance(parents, list)
+        and isinstance(labels, list)
+        and len(ids) == len(parents) == len(labels) >= _COMPACT_MIN_LEN
+        and all(
+            node_id == (f"{parent}/{label}" if parent else label)
+            for node_id, parent, label in zip(ids, parents, labels, strict=True)
         )
+    ):
+        trace["ids"] = {"$join": "/"}
+    seen = {}  # Inhalts-Schlüssel → erstes Attribut mit diesem Array
+    for key, value in trace.items():
+        if isinstance(value, dict) and "bdata" in value and "shape" not in value:
+            # Typed Arrays von Plotly (numpy) im kleinsten Typ neu kodieren – dann greift auch die Deduplizierung
+            trace[key] = _typed_array(_inflate(value))
+        elif isinstance(value, dict):
+            if "$join" not in value:
+                trace[key] = _compact_trace(value)
+        elif isinstance(value, list) and value:
+            trace[key] = _compact_rows(value) if isinstance(value[0], list) else _compact_array(value)
+        array_key = _array_key(trace[key])
+        if array_key is not None:
+            if array_key in seen:
+                trace[key] = {"$ref": seen[array_key]}
+            else:
+                seen[array_key] = key
+    for value in trace.values():
+        if isinstance(value, dict) and "$columns" in value:
+            value["$columns"] = [
+                {"$ref": seen[k]} if (k := _array_key(c)) in seen else c for c in value["$columns"]
+            ]
+    return trace
+
+
+def figure_json(fig):
+    """
+    Serialisiert eine Figure kompakt für den Report: Zahlen-Arrays als base64-Typed-Arrays (von Plotly.js
+    direkt gelesen), wiederholte Beschriftungen als Wörterbuch, Treemap-ids aus parents + labels.
+    Das Report-JavaScript (inflateTrace) stellt daraus exakt die Arrays von fig.to_json() wieder her.
+    Figure-Specs (Dicts aus den *_spec-Buildern) werden direkt kodiert – ohne Plotly-Validierung und
+    ohne den Umweg über fig.to_json().
+    :param fig: Plotly-Figure oder Figure-Spec ({'data': [...], 'layout': {...}})
+    :return: JSON-String
+    """
+    spec = {k: v for k, v in fig.items() if k != "drilldown"} if isinstance(fig, dict) else json.loads(fig.to_json())
+    spec["data"] = [_compact_trace(trace) for trace in spec.get("data", [])]
+    return _dumps(spec)
 
-    for i, section in enumerate(sections):
-        desc_html = f'<p class="section-desc">{section["description"]}</p>' if section.get("description") else ""
 
-        if "fig" in section and section["fig"] is not None:
-            div_id = f"plotly-chart-{i}"
-            chart_payloads.append((div_id, section["fig"].to_json()))
-            content_html = (
-                f'<div id="{div_id}" class="plotly-lazy"><div class="chart-placeholder">⏳ Wird geladen…</div></div>'
-            )
+def _dumps(obj):
+    # '<' und '>' maskieren wie plotly.io.to_json – kein '</script>' im eingebetteten JSON
+    text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return text.replace("<", "\\u003c").replace(">", "\\u003e")
 
-        elif "html" in section:
-            content_html = section["html"]
-        else:
-            content_html = "<p><em>Kein Inhalt verfügbar.</em></p>"
 
-        sections_html += (
-            f'<section id="section-{i}" class="chart-section">'
-            f"<h2>{section['title']}</h2>{desc_html}"
-            f'<div class="chart-container">{content_html}</div>'
-            f"</section>\n"
-        )
+def drilldown_json(fig):
+    """
+    Nachladbare Blätter der Sammelknoten einer Treemap-Spec (spec['drilldown'], siehe treemap_spec),
+    kompakt kodiert wie figure_json.
+    :return: JSON-String oder None, wenn die Figure keinen Drill-down hat
+    """
+    drilldown = fig.get("drilldown") if isinstance(fig, dict) else None
+    if not drilldown:
+        return None
+    return _dumps({node_id: _compact_trace(part) for node_id, part in drilldown.items()})
 
-    # Chart-JSON als type=application/json – Browser parst kein JS, blockiert keinen Paint
-    chart_data_tags = "\n    ".join(
-        f'<script type="application/json" id="data-{did}">{fjson}</script>' for did, fjson in chart_payloads
-    )
-    chart_div_ids = json.dumps([did for did, _ in chart_payloads])
 
-    html = f"""<!DOCTYPE html>
+def serialize_figure(fig):
+    """
+    Serialisiert eine Figure bzw. Figure-Spec für den Report und den Section-Cache.
+    :return: Dict mit 'fig_json' und – bei Treemaps mit Sammelknoten – 'drill_json'
+    """
+    serialized = {"fig_json": figure_json(fig)}
+    drill_json = drilldown_json(fig)
+    if drill_json is not None:
+        serialized["drill_json"] = drill_json
+    return serialized
+
+
+def _inflate(value, context=None):
+    """Wandelt kodierte Arrays zurück; context = Trace (bzw. Attribut-Dict), auf dessen Arrays $ref verweist."""
+    if isinstance(value, list):
+        return [_inflate(v, context) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "$ref" in value:
+        return _inflate(context[value["$ref"]], context)
+    if "bdata" in value:
+        arr = np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.dtype(value["dtype"]).newbyteorder("<"))
+        if "shape" in value:
+            arr = arr.reshape([int(n) for n in str(value["shape"]).split(",")])
+        return arr.tolist()
+    if "$dict" in value:
+        return [value["$dict"][c] for c in _inflate(value["codes"])]
+    if "$columns" in value:
+        return [list(row) for row in zip(*(_inflate(c, context) for c in value["$columns"]), strict=True)]
+    inflated = {k: _inflate(v, value) for k, v in value.items() if k != "ids"}
+    if "ids" in value:
+        ids = value["ids"]
+        if isinstance(ids, dict) and "$join" in ids:
+            sep = ids["$join"]
+            parents, labels = inflated["parents"], inflated["labels"]
+            ids = [f"{parent}{sep}{label}" if parent else label for parent, label in zip(parents, labels, strict=True)]
+        inflated["ids"] = _inflate(ids, value)
+    return inflated
+
+
+def inflate_figure(spec):
+    """
+    Gegenstück zu figure_json (wie inflateTrace im Report-JavaScript plus Plotly.js): alle kompakten und
+    Typed Arrays als Listen. Für Tests und Benchmarks – im Report passiert das im Browser.
+    :param spec: Figure-Dict aus json.loads(figure_json(fig)) oder json.loads(fig.to_json())
+    :return: Figure-Dict ohne kodierte Arrays
+    """
+    return _inflate(spec)
+
+
+# ---------------------------------------------------------------------------
+# Chart-Daten im Report – Klartext-JSON oder gzip+base64 (entpackt im Browser)
+# ---------------------------------------------------------------------------
+
+# 'json': Figure-JSON im Klartext (Default) · 'gzip': gzip+base64, entpackt per DecompressionStream beim Anzeigen
+CHART_PAYLOADS = ("json", "gzip")
+
+# Kleinere Charts bleiben auch im Modus 'gzip' Klartext – base64 (+33 %) frisst die Ersparnis auf
+_GZIP_MIN_CHARS = 2048
+
+
+def encode_chart_payload(fig_json, mode="json"):
+    """
+    Kodiert das Figure-JSON eines Charts für den <script>-Tag im Report.
+    :param fig_json: serialisierte Figure (fig.to_json())
+    :param mode: 'json' oder 'gzip' (siehe CHART_PAYLOADS)
+    :return: Tuple (Inhalt des Tags, tatsächliche Kodierung 'json' oder 'gzip')
+    :raises ValueError: bei unbekanntem Modus
+    """
+    if mode not in CHART_PAYLOADS:
+        raise ValueError(f"Unbekannte Chart-Kodierung '{mode}' – erlaubt: {CHART_PAYLOADS}")
+    if mode == "json" or len(fig_json) < _GZIP_MIN_CHARS:
+        return fig_json, "json"
+    # mtime=0: gleicher Chart → gleiche Bytes (reproduzierbare Reports)
+    packed = gzip.compress(fig_json.encode("utf-8"), compresslevel=6, mtime=0)
+    return base64.b64encode(packed).decode("ascii"), "gzip"
+
+
+def decode_chart_payload(payload, encoding="json"):
+    """Gegenstück zu encode_chart_payload (wie loadSpec im Report-JavaScript). :return: Figure-Dict"""
+    if encoding == "gzip":
+        payload = gzip.decompress(base64.b64decode(payload)).decode("utf-8")
+    return json.loads(payload)
+
+
+# ---------------------------------------------------------------------------
+# HTML-Report-Export
+# ---------------------------------------------------------------------------
+
+
+# Report-Gerüst mit Platzhaltern (str.format-Syntax) – wird beim Schreiben Stück für Stück gestreamt (_write_report)
+_REPORT_TEMPLATE = """<!DOCTYPE html>
 <html lang="de" style="background:#f4f6f9;color:#333;">
 <head>
     <meta name="color-scheme" content="light">
@@ -518,7 +900,7 @@ def export_html_report(sections, output_file, depot_summary=None):
         <footer>Automatisch generiert · {now}</footer>
     </main>
 
-    <!-- Chart-JSON: type=application/json → kein JS-Parsing beim Seitenload -->
+    <!-- Chart-Daten: JSON bzw. gzip+base64 → kein JS-Parsing beim Seitenload, entpackt erst beim Anzeigen -->
     {chart_data_tags}
 
     <!-- Kritische Funktionen VOR Plotly.js: toggleNav und setPrivacy müssen sofort verfügbar sein -->
@@ -557,7 +939,7 @@ def export_html_report(sections, output_file, depot_summary=None):
     }});
     </script>
 
-    <!-- Plotly.js inline (kein CDN, keine Netzwerkabhängigkeit) -->
+    <!-- Plotly.js inline bzw. als gemeinsame lokale Datei (kein CDN, keine Netzwerkabhängigkeit) -->
     {plotlyjs_tag}
 
     <!-- Chart-Rendering: Lazy-Loading via IntersectionObserver (rootMargin 200px = lädt kurz vor Sichtbarkeit) -->
@@ -566,20 +948,124 @@ def export_html_report(sections, output_file, depot_summary=None):
         var _divIds = {chart_div_ids};
         var _rendered = new Set();
 
+        // Kompakte Arrays aus figure_json() zurückwandeln; base64-Arrays werden zu echten Typed Arrays
+        // (mehrdimensionale mit 'shape' liest Plotly.js selbst)
+        var _TYPED = {{u1: Uint8Array, i1: Int8Array, u2: Uint16Array, i2: Int16Array,
+                      u4: Uint32Array, i4: Int32Array, f4: Float32Array, f8: Float64Array}};
+        function typedArray(t) {{
+            var bin = atob(t.bdata), bytes = new Uint8Array(bin.length);
+            for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+            return new _TYPED[t.dtype](bytes.buffer);
+        }}
+        function inflateArray(v, obj) {{
+            if (v.$ref !== undefined) return inflateArray(obj[v.$ref], obj);
+            if (v.bdata !== undefined) return typedArray(v);
+            // Schleifen statt Array.from/map: bei zehntausenden Treemap-Knoten spürbar schneller
+            var out, i, j;
+            if (v.$dict !== undefined) {{
+                var codes = typedArray(v.codes);
+                out = new Array(codes.length);
+                for (i = 0; i < codes.length; i++) out[i] = v.$dict[codes[i]];
+                return out;
+            }}
+            if (v.$columns !== undefined) {{
+                var cols = v.$columns.map(function(c) {{ return inflateArray(c, obj); }});
+                out = new Array(cols[0].length);
+                for (i = 0; i < out.length; i++) {{
+                    var row = new Array(cols.length);
+                    for (j = 0; j < cols.length; j++) row[j] = cols[j][i];
+                    out[i] = row;
+                }}
+                return out;
+            }}
+            return v;
+        }}
+        function inflateTrace(obj) {{
+            Object.keys(obj).forEach(function(k) {{
+                var v = obj[k];
+                if (!v || typeof v !== 'object' || Array.isArray(v)) return;
+                if (v.bdata !== undefined) {{
+                    if (v.shape === undefined) obj[k] = typedArray(v);
+                }} else if (v.$dict !== undefined || v.$columns !== undefined || v.$ref !== undefined) {{
+                    obj[k] = inflateArray(v, obj);
+                }}
+                else if (v.$join === undefined) inflateTrace(v);
+            }});
+            if (obj.ids && obj.ids.$join !== undefined) {{
+                var sep = obj.ids.$join, ids = new Array(obj.labels.length);
+                for (var i = 0; i < ids.length; i++) {{
+                    ids[i] = obj.parents[i] ? obj.parents[i] + sep + obj.labels[i] : obj.labels[i];
+                }}
+                obj.ids = ids;
+            }}
+            return obj;
+        }}
+
+        // Figure aus dem Daten-Tag: Klartext-JSON oder gzip+base64 (entpackt per DecompressionStream)
+        function loadSpec(dataEl) {{
+            if (dataEl.dataset.encoding !== 'gzip') {{
+                return Promise.resolve().then(function() {{ return JSON.parse(dataEl.textContent); }});
+            }}
+            if (typeof DecompressionStream === 'undefined') {{
+                return Promise.reject(new Error('Browser ohne DecompressionStream – Report mit --chart-payload json erzeugen'));
+            }}
+            var bin = atob(dataEl.textContent.trim());
+            var bytes = new Uint8Array(bin.length);
+            for (var i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+            var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            return new Response(stream).text().then(JSON.parse);
+        }}
+
+        // Treemap-Sammelknoten 'Sonstige': Blätter als Kinder einhängen und hineinzoomen (level)
+        function expandNode(trace, id, part) {{
+            var t = Object.assign({{}}, trace);
+            ['ids', 'parents', 'labels', 'values', 'customdata'].forEach(function(k) {{
+                t[k] = Array.prototype.slice.call(trace[k]);
+            }});
+            for (var i = 0; i < part.labels.length; i++) {{
+                t.ids.push(id + '/' + part.labels[i]);
+                t.parents.push(id);
+                t.labels.push(part.labels[i]);
+                t.values.push(part.values[i]);
+                t.customdata.push(part.customdata[i]);
+            }}
+            t.meta = {{drilldown: trace.meta.drilldown.filter(function(d) {{ return d !== id; }})}};
+            t.level = id;
+            return t;
+        }}
+        function enableDrilldown(el, drillEl) {{
+            var parts = null, loading = {{}};  // Drill-down-Daten werden erst beim ersten Klick geparst
+            el.on('plotly_treemapclick', function(ev) {{
+                var id = ev.points[0].id;
+                if (el.data[0].meta.drilldown.indexOf(id) < 0) return true;
+                if (!loading[id]) {{
+                    loading[id] = true;
+                    parts = parts || loadSpec(drillEl);
+                    parts.then(function(all) {{
+                        return Plotly.react(el, [expandNode(el.data[0], id, inflateTrace(all[id]))], el.layout);
+                    }});
+                }}
+                return false;  // Standard-Zoom unterdrücken – expandNode zoomt nach dem Nachladen
+            }});
+        }}
+
         function renderChart(id) {{
             if (_rendered.has(id)) return;
             _rendered.add(id);
             var el = document.getElementById(id);
             var dataEl = document.getElementById('data-' + id);
             if (!el || !dataEl) return;
-            try {{
-                var spec = JSON.parse(dataEl.textContent);
+            loadSpec(dataEl).then(function(spec) {{
+                spec.data.forEach(inflateTrace);
                 el.innerHTML = '';
-                Plotly.newPlot(el, spec.data, spec.layout,
+                return Plotly.newPlot(el, spec.data, spec.layout,
                     {{displayModeBar: true, scrollZoom: false, responsive: true}});
-            }} catch(err) {{
+            }}).then(function() {{
+                var drillEl = document.getElementById('drill-' + id);
+                if (drillEl) enableDrilldown(el, drillEl);
+            }}).catch(function(err) {{
                 el.innerHTML = '<p style="color:#c00;padding:1rem">Fehler: ' + err + '</p>';
-            }}
+            }});
         }}
 
         var observer = new IntersectionObserver(function(entries) {{
@@ -636,12 +1122,227 @@ def export_html_report(sections, output_file, depot_summary=None):
 </body>
 </html>"""
 
+
+# Version der gecachten Report-Fragmente – erhöhen, wenn sich das HTML eines Abschnitts oder seiner Daten-Tags ändert
+REPORT_FRAGMENT_VERSION = 1
+# Anzahl gecachter Report-Fragmente (mehrere Läufe × 7 Abschnitte × Kodierungen)
+_FRAGMENT_CACHE_SIZE = 50
+
+
+def section_digest(section):
+    """
+    Inhalts-Hash eines serialisierten Abschnitts: Titel, Beschreibung und Figure-/Drill-down-JSON bzw. HTML.
+    Gleicher Hash → gleiches Report-Fragment (bei gleicher Position und Kodierung).
+    """
+    h = hashlib.sha256()
+    for key in ("title", "description", "fig_json", "drill_json", "html"):
+        value = section.get(key)
+        h.update(f"{key}:{-1 if value is None else len(value)}:".encode())
+        if value is not None:
+            h.update(value.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _section_fragment(i, section, chart_payload):
+    """
+    HTML eines serialisierten Abschnitts und die Daten-Tags seines Charts.
+    :return: Dict mit 'html', 'data_tags' (Liste) und 'div_id' (None ohne Chart)
+    """
+    desc_html = f'<p class="section-desc">{section["description"]}</p>' if section.get("description") else ""
+    fig_json = section.get("fig_json")
+    div_id, data_tags = None, []
+    if fig_json is not None:
+        div_id = f"plotly-chart-{i}"
+        content_html = (
+            f'<div id="{div_id}" class="plotly-lazy"><div class="chart-placeholder">⏳ Wird geladen…</div></div>'
+        )
+        # Drill-down-Daten der Sammelknoten ('Sonstige') stehen in einem eigenen Tag und werden erst beim Klick geparst
+        for prefix, text in (("data", fig_json), ("drill", section.get("drill_json"))):
+            if text is None:
+                continue
+            payload, encoding = encode_chart_payload(text, chart_payload)
+            if encoding == "gzip":
+                data_tags.append(
+                    f'<script type="application/octet-stream" data-encoding="gzip" id="{prefix}-{div_id}">'
+                    f"{payload}</script>"
+                )
+            else:
+                data_tags.append(f'<script type="application/json" id="{prefix}-{div_id}">{payload}</script>')
+    elif "html" in section:
+        content_html = section["html"]
+    else:
+        content_html = "<p><em>Kein Inhalt verfügbar.</em></p>"
+
+    html = (
+        f'<section id="section-{i}" class="chart-section">'
+        f"<h2>{section['title']}</h2>{desc_html}"
+        f'<div class="chart-container">{content_html}</div>'
+        f"</section>\n"
+    )
+    return {"html": html, "data_tags": data_tags, "div_id": div_id}
+
+
+def _report_fragments(sections, chart_payload, cache_dir=None):
+    """
+    Report-Fragmente aller Abschnitte. Mit cache_dir werden Fragmente über den Inhalts-Hash des Abschnitts
+    (section_digest), seine Position und die Kodierung wiederverwendet – neu kodiert werden nur geänderte.
+    Im Modus 'json' ist ein Fragment nur Verkettung vorhandener Strings, dort wird nicht gecacht.
+    """
+    if chart_payload == "json":
+        cache_dir = None
+    fragments, reused = [], 0
+    for i, section in enumerate(sections):
+        if section.get("fig_json") is None and section.get("fig") is not None:
+            section = {**section, **serialize_figure(section["fig"])}
+        if cache_dir is None:
+            fragments.append(_section_fragment(i, section, chart_payload))
+            continue
+        from scripts.artifact_cache import artifact_key, load_artifact, store_artifact
+
+        digest = section.get("digest") or section_digest(section)
+        key = artifact_key(str(REPORT_FRAGMENT_VERSION), digest, str(i), chart_payload)
+        fragment = load_artifact(cache_dir, "fragment", key)
+        if fragment is None:
+            fragment = _section_fragment(i, section, chart_payload)
+            store_artifact(cache_dir, "fragment", key, fragment, keep=_FRAGMENT_CACHE_SIZE)
+        else:
+            reused += 1
+        fragments.append(fragment)
+    if cache_dir is not None:
+        logger.info(f"Report-Fragmente: {reused}/{len(fragments)} unverändert aus dem Cache übernommen.")
+    return fragments
+
+
+@lru_cache(maxsize=1)
+def _report_parts():
+    """Report-Gerüst zerlegt in (Text, Platzhalter) – einmal je Prozess, Text zwischen zwei Platzhaltern am Stück."""
+    parts, literal = [], ""
+    for text, field, _, _ in string.Formatter().parse(_REPORT_TEMPLATE):
+        literal += text
+        if field is not None:
+            parts.append((literal, field))
+            literal = ""
+    parts.append((literal, None))
+    return parts
+
+
+def _write_report(f, fields):
+    """
+    Schreibt das Report-Gerüst nach f. Platzhalter-Werte sind Strings oder Iterables von Strings – sie werden
+    Stück für Stück geschrieben, der Report entsteht nie als ein großer String im Speicher.
+    """
+    for literal, field in _report_parts():
+        f.write(literal)
+        if field is None:
+            continue
+        value = fields[field]
+        if isinstance(value, str):
+            f.write(value)
+        else:
+            for chunk in value:
+                f.write(chunk)
+
+
+def _joined(chunks, sep):
+    """Wie sep.join(chunks), aber als Generator."""
+    for n, chunk in enumerate(chunks):
+        if n:
+            yield sep
+        yield chunk
+
+
+def export_html_report(
+    sections,
+    output_file,
+    depot_summary=None,
+    open_browser=True,
+    plotlyjs="inline",
+    asset_dir=None,
+    chart_payload="json",
+    cache_dir=None,
+):
+    """
+    Erstellt einen vollständigen HTML-Report mit allen Charts – self-contained oder mit gemeinsamer Plotly.js-Datei.
+
+    :param sections: Liste von Dicts mit Schlüsseln:
+                     - 'title': Abschnittstitel (str)
+                     - 'fig':   Plotly-Figure oder Figure-Spec (Dict aus den *_spec-Buildern)
+                     - 'fig_json': alternativ bereits serialisierte Figure (str, z. B. aus dem Section-Cache)
+                     - 'drill_json': optional, nachladbare Blätter der Treemap-Sammelknoten (zu 'fig_json')
+                     - 'description': optionaler Erläuterungstext (str)
+    :param output_file: Pfad zur Ausgabe-HTML-Datei (str)
+    :param depot_summary: optionaler dict mit Kennzahlen für den Kopfbereich,
+                          z. B. {'Gesamtwert (€)': 12345.67, 'Positionen': 15}
+    :param open_browser: Report nach dem Schreiben im Browser öffnen (False für Batch-/Serverläufe)
+    :param plotlyjs: 'inline' (Plotly.js eingebettet, Default) oder 'shared' (Verweis auf plotly-<hash>.min.js)
+    :param asset_dir: Ordner der gemeinsamen Plotly.js-Datei im Modus 'shared' (Default: Ordner des Reports)
+    :param chart_payload: 'json' (Chart-Daten im Klartext, Default) oder 'gzip' (gzip+base64, kleinerer Report;
+                          Browser braucht DecompressionStream)
+    :param cache_dir: optionaler Artefakt-Cache für Report-Fragmente – unveränderte Abschnitte (gleicher
+                      section_digest) werden nicht neu kodiert (nur 'gzip'). Der Report wird in jedem Fall in
+                      Teilen und atomar geschrieben
+    """
+    now = datetime.now().strftime("%d.%m.%Y %H:%M Uhr")
+
+    # Navigationsmenü-Einträge
+    nav_items = "".join(f'<li><a href="#section-{i}">{s["title"]}</a></li>' for i, s in enumerate(sections))
+
+    # Kennzahlen-Karten im Header – in drei Gruppen aufgeteilt
+    summary_html = ""
+    if depot_summary:
+        # Gruppen: Depot-Übersicht | Assetklassen | Qualität & Warnungen
+        group_keys = {
+            "depot": ["Gesamtwert", "Positionen"],
+            "assets": ["ETF-Anteil", "Aktien-Anteil", "Krypto-Anteil", "Cash-Anteil"],
+            "quality": ["Diversifikation", "Top-5-Konzentration"],
+        }
+        # Alle Keys die keiner Gruppe zugeordnet sind (z.B. Fallback-Warnung) → extra
+        assigned = {k for keys in group_keys.values() for k in keys}
+        extra_keys = [k for k in depot_summary if k not in assigned]
+
+        # Schlüssel deren Wert im Datenschutz-Modus ausgeblendet wird
+        _private_keys = {"Gesamtwert"}
+
+        def _card(k, v):
+            is_warning = "⚠️" in str(k) or "⚠️" in str(v)
+            cls      = "kpi-card kpi-warning" if is_warning else "kpi-card"
+            val_cls  = "kpi-value private" if k in _private_keys else "kpi-value"
+            return f'<div class="{cls}"><div class="{val_cls}">{v}</div><div class="kpi-label">{k}</div></div>'
+
+        groups_html = ""
+        for _gname, keys in group_keys.items():
+            cards = "".join(_card(k, depot_summary[k]) for k in keys if k in depot_summary)
+            if cards:
+                groups_html += f'<div class="kpi-group">{cards}</div>'
+
+        if extra_keys:
+            cards = "".join(_card(k, depot_summary[k]) for k in extra_keys)
+            groups_html += f'<div class="kpi-group kpi-group-wide">{cards}</div>'
+
+        summary_html = f'<div class="kpi-row">{groups_html}</div>'
+
+    # Plotly.js lokal (kein CDN, keine file://-Probleme): eingebettet oder als gemeinsame Datei neben dem Report
+    plotlyjs_tag = _plotlyjs_tag(output_file, plotlyjs, asset_dir)
+
+    fragments = _report_fragments(sections, chart_payload, cache_dir)
+    # Chart-Daten als type=application/json bzw. octet-stream – Browser parst kein JS, blockiert keinen Paint
+    fields = {
+        "now": now,
+        "nav_items": nav_items,
+        "summary_html": summary_html,
+        "sections_html": (fragment["html"] for fragment in fragments),
+        "chart_data_tags": _joined((tag for fragment in fragments for tag in fragment["data_tags"]), "\n    "),
+        "plotlyjs_tag": plotlyjs_tag,
+        "chart_div_ids": json.dumps([fragment["div_id"] for fragment in fragments if fragment["div_id"]]),
+    }
+
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(html)
+        with atomic_writer(output_file) as f:
+            _write_report(f, fields)
         logger.info(f"HTML-Report gespeichert: {output_file}")
-        webbrowser.open(Path(output_file).resolve().as_uri())
-        logger.info("HTML-Report im Browser geöffnet.")
+        if open_browser:
+            webbrowser.open(Path(output_file).resolve().as_uri())
+            logger.info("HTML-Report im Browser geöffnet.")
     except Exception as e:
         logger.error(f"Fehler beim Schreiben des HTML-Reports: {e}")
         raise
@@ -0,0 +1,382 @@
+# query_service.py
+
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from scripts.analysis import analyze_depot, hhi_stufe, load_depot
+from scripts.batch import portfolio_names
+
+logger = logging.getLogger(__name__)
+
+# Anzahl gecachter Antworten (Pfad + Query → fertig kodiertes JSON)
+QUERY_CACHE_SIZE = 1024
+
+# Default-Anzahl der Positionen bei /positions und in der Depot-Übersicht
+DEFAULT_TOP = 20
+
+# Quellen in depot_data, die keine Fonds sind (Direktpositionen)
+_DIRECT_SOURCES = {"Aktie", "Krypto"}
+
+
+# ---------------------------------------------------------------------------
+# Zustand laden & Indizes aufbauen
+# ---------------------------------------------------------------------------
+
+
+def load_portfolios(input_files, etf_data, load_prices):
+    """
+    Wertet alle Depots einmal gegen das bereinigte ETF-Universum aus (Kurse einmal für alle Depots).
+    :param input_files: Depot-Excel-Dateien
+    :param etf_data: bereinigtes ETF-Universum (load_etf_universe)
+    :param load_prices: Funktion Depot-Positionen → (Kursliste, Fallback-Ticker), z.B. download_stock_price
+    :return: Dict Depot-Name → Ergebnis-Dict aus analyze_depot (unlesbare bzw. nicht auswertbare Depots werden
+             übersprungen)
+    """
+    depots = {}
+    for name, input_file in zip(portfolio_names(input_files), input_files, strict=True):
+        try:
+            depots[name] = load_depot(input_file)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"Depot '{name}' übersprungen: {e}")
+    if not depots:
+        return {}
+
+    positions = pd.concat([d[["Art", "Ticker"]] for d in depots.values()], ignore_index=True).drop_duplicates()
+    stock_prices, fallback_used = load_prices(positions)
+    results = {}
+    for name, depot in depots.items():
+        try:
+            results[name] = analyze_depot(etf_data, depot, stock_prices, fallback_used)
+        except (ValueError, KeyError) as e:
+            # z.B. Depot ohne gültigen Kurs (Gesamtwert 0) – die übrigen Depots bleiben abfragbar
+            logger.error(f"Depot '{name}' übersprungen: {e}")
+    return results
+
+
+def _clean(value):
+    """JSON-taugliche Werte: numpy-Skalare → Python, NaN → None, Floats auf 6 Stellen gerundet."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, 6)
+    return value
+
+
+def _records(df):
+    return [{col: _clean(v) for col, v in row.items()} for row in df.to_dict("records")]
+
+
+def _norm(key):
+    """Suchschlüssel für Ticker, Namen, Sektoren und Länder (Groß-/Kleinschreibung egal)."""
+    return str(key).strip().casefold()
+
+
+def build_index(name, result):
+    """
+    Baut die In-Memory-Indizes eines Depots für schnelle Abfragen – einmal beim Laden, nicht je Anfrage.
+    :param name: Depot-Name
+    :param result: Ergebnis-Dict aus analyze_depot
+    :return: Dict mit 'summary', 'positions', 'securities', 'sectors', 'countries' und 'holdings'
+    """
+    kpis = result["kpis"]
+    positions = _records(result["depot_data_stocks"])
+    for rank, position in enumerate(positions, start=1):
+        position["Rang"] = rank
+
+    # Wertpapier-Index: Ticker und Name zeigen auf dieselbe Position
+    securities = {}
+    for position in positions:
+        for key in (position.get("Name"), position.get("Emittententicker")):
+            if key is not None:
+                securities.setdefault(_norm(key), position)
+
+    # Durchblick je Wertpapier: aus welchen Fonds bzw. Direktpositionen stammt das Gewicht
+    depot_data = result["depot_data"]
+    held = depot_data[depot_data["relative Gewichtung (%)"].fillna(0) != 0]
+    holdings = {}
+    for row in held[["Name", "Emittententicker", "ETF", "Gewichtung (%)", "relative Gewichtung (%)"]].itertuples(
+        index=False
+    ):
+        entry = {"Quelle": row[2], "Gewichtung im Fonds (%)": _clean(row[3]), "Depotanteil (%)": _clean(row[4])}
+        holdings.setdefault(_norm(row[0]), []).append(entry)
+
+    def _group(df, key_col):
+        rows = _records(df)
+        members = {}
+        for position in positions:
+            if (position["Gesamtgewichtung (%)"] or 0) > 0:  # Fonds-Bestände ohne Depotanteil ausblenden
+                members.setdefault(_norm(position.get(key_col)), []).append(position)
+        return {
+            _norm(row[key_col]): {**row, "Positionen": members.get(_norm(row[key_col]), [])}
+            for row in rows
+            if row[key_col] is not None
+        }, rows
+
+    sectors, sector_rows = _group(result["depot_data_sectors"], "Sektor")
+    countries, country_rows = _group(result["depot_data_locations"], "Standort")
+
+    summary = {
+        "Depot": name,
+        "Gesamtwert (€)": _clean(kpis["gesamtwert"]),
+        "Positionen (Durchblick)": kpis["n_positionen"],
+        "ETF-Anteil (%)": _clean(kpis["etf_pct"]),
+        "Aktien-Anteil (%)": _clean(kpis["aktien_pct"]),
+        "Krypto-Anteil (%)": _clean(kpis["krypto_pct"]),
+        "Cash-Anteil (%)": _clean(kpis["cash_pct"]),
+        "HHI (0–100)": _clean(kpis["hhi_score"]),
+        "Diversifikation": hhi_stufe(kpis["hhi_score"]),
+        "Top-5-Konzentration (%)": _clean(kpis["top5_pct"]),
+        "Fallback-Kurse": result["fallback_used"],
+        "KPI-Cards": result["depot_summary"],
+    }
+    return {
+        "summary": summary,
+        "positions": positions,
+        "securities": securities,
+        "holdings": holdings,
+        "sectors": sectors,
+        "sector_rows": sector_rows,
+        "countries": countries,
+        "country_rows": country_rows,
+        "etfs": _records(result["depot_data_etfs"]),
+    }
+
+
+def build_fund_index(etf_data):
+    """
+    Index 'welche Fonds halten X' über das gesamte ETF-Universum (unabhängig vom Depot).
+    :return: Dict normierter Name/Ticker → Liste {'ETF', 'Name', 'Emittententicker', 'Gewichtung (%)'}
+    """
+    funds = {}
+    columns = ["ETF", "Name", "Emittententicker", "Gewichtung (%)"]
+    for etf, security, ticker, weight in etf_data[columns].itertuples(index=False):
+        entry = {"ETF": etf, "Name": security, "Emittententicker": _clean(ticker), "Gewichtung (%)": _clean(weight)}
+        for key in {_norm(security), _norm(ticker)}:
+            if key not in ("", "nan", "-"):
+                funds.setdefault(key, []).append(entry)
+    for entries in funds.values():
+        entries.sort(key=lambda e: -(e["Gewichtung (%)"] or 0))
+    return funds
+
+
+def create_service(results, etf_data=None, cache_size=QUERY_CACHE_SIZE):
+    """
+    Erstellt den Service-Zustand: Indizes je Depot, Fonds-Index und Antwort-Cache.
+    :param results: Dict Depot-Name → Ergebnis-Dict aus analyze_depot (z.B. aus load_portfolios)
+    :param etf_data: optionales bereinigtes Universum für /holders (sonst aus dem Durchblick der Depots)
+    :param cache_size: maximale Anzahl gecachter Antworten (0 = kein Cache)
+    """
+    if etf_data is None and results:
+        etf_data = next(iter(results.values()))["depot_data"]
+        etf_data = etf_data[~etf_data["ETF"].isin(_DIRECT_SOURCES)]
+    return {
+        "portfolios": {name: build_index(name, result) for name, result in results.items()},
+        "funds": build_fund_index(etf_data) if etf_data is not None else {},
+        "cache": OrderedDict(),
+        "cache_size": cache_size,
+        "cache_lock": threading.Lock(),
+        "stats": {"requests": 0, "hits": 0, "misses": 0},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Abfragen
+# ---------------------------------------------------------------------------
+
+
+class QueryError(LookupError):
+    """Abfrage nicht beantwortbar – trägt den HTTP-Status (404 unbekannt, 400 ungültig)."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _portfolio(service, name):
+    index = service["portfolios"].get(name)
+    if index is None:
+        raise QueryError(404, f"Unbekanntes Depot '{name}' – verfügbar: {sorted(service['portfolios'])}")
+    return index
+
+
+def _lookup(mapping, key, what):
+    entry = mapping.get(_norm(key))
+    if entry is None:
+        needle = _norm(key)
+        candidates = sorted({k for k in mapping if needle in k})[:10]
+        raise QueryError(404, f"{what} '{key}' nicht gefunden." + (f" Meinten Sie: {candidates}" if candidates else ""))
+    return entry
+
+
+def _top(params):
+    try:
+        top = int(params.get("top", [DEFAULT_TOP])[0])
+    except ValueError:
+        raise QueryError(400, "Parameter 'top' muss eine ganze Zahl sein.") from None
+    if top < 1:
+        raise QueryError(400, "Parameter 'top' muss ≥ 1 sein.")
+    return top
+
+
+def _group_detail(groups, key, what, params):
+    """Sektor bzw. Land mit seinen größten Positionen (?top=N) – große Gruppen haben Tausende Positionen."""
+    group = _lookup(groups, key, what)
+    return {**group, "Anzahl Positionen": len(group["Positionen"]), "Positionen": group["Positionen"][: _top(params)]}
+
+
+def _holders(service, key):
+    funds = _lookup(service["funds"], key, "Wertpapier")
+    exposure = {}
+    for name, index in service["portfolios"].items():
+        position = index["securities"].get(_norm(key))
+        if position is not None:
+            exposure[name] = position["Gesamtgewichtung (%)"]
+    return {"Wertpapier": key, "Fonds": funds, "Depotanteil (%) je Depot": exposure}
+
+
+def query(service, path, params=None):
+    """
+    Beantwortet eine Abfrage aus den In-Memory-Indizes.
+    Pfade:
+      /portfolios                                  Depots mit Gesamtwert und HHI
+      /portfolios/<depot>                          Kennzahlen, KPI-Cards, Top-Positionen
+      /portfolios/<depot>/positions?top=N          größte Positionen nach Gesamtgewichtung (ETF-Durchblick)
+      /portfolios/<depot>/securities/<name|ticker> Gewicht eines Wertpapiers inkl. Herkunft je Fonds
+      /portfolios/<depot>/sectors[/<sektor>?top=N] Sektorgewichte bzw. ein Sektor mit seinen größten Positionen
+      /portfolios/<depot>/countries[/<land>?top=N] Ländergewichte bzw. ein Land mit seinen größten Positionen
+      /portfolios/<depot>/etfs                     Gewicht je ETF / Anlageart
+      /holders/<name|ticker>                       welche Fonds halten X (Universum) und Anteil je Depot
+    :param path: URL-Pfad (bereits dekodiert)
+    :param params: Query-Parameter wie von urllib.parse.parse_qs
+    :return: JSON-serialisierbares Objekt
+    :raises QueryError: bei unbekanntem Pfad, Depot oder Schlüssel
+    """
+    params = params or {}
+    parts = [p for p in path.split("/") if p]
+    if parts == ["portfolios"]:
+        return [
+            {k: index["summary"][k] for k in ("Depot", "Gesamtwert (€)", "HHI (0–100)", "Diversifikation")}
+            for index in service["portfolios"].values()
+        ]
+    if len(parts) == 2 and parts[0] == "holders":
+        return _holders(service, parts[1])
+    if len(parts) < 2 or parts[0] != "portfolios":
+        raise QueryError(404, f"Unbekannter Pfad '{path}'.")
+
+    index = _portfolio(service, parts[1])
+    resource, key = (parts[2:] + [None, None])[:2]
+    if len(parts) > 4:
+        raise QueryError(404, f"Unbekannter Pfad '{path}'.")
+    if resource is None:
+        return {**index["summary"], "Top-Positionen": index["positions"][: _top(params)]}
+    if resource == "positions" and key is None:
+        return index["positions"][: _top(params)]
+    if resource == "securities" and key is not None:
+        position = _lookup(index["securities"], key, "Wertpapier")
+        return {**position, "Herkunft": index["holdings"].get(_norm(position["Name"]), [])}
+    if resource == "sectors":
+        return index["sector_rows"] if key is None else _group_detail(index["sectors"], key, "Sektor", params)
+    if resource == "countries":
+        return index["country_rows"] if key is None else _group_detail(index["countries"], key, "Land", params)
+    if resource == "etfs" and key is None:
+        return index["etfs"]
+    raise QueryError(404, f"Unbekannter Pfad '{path}'.")
+
+
+def handle_request(service, target):
+    """
+    Beantwortet eine Anfrage (Pfad inkl. Query-String) mit Antwort-Cache.
+    Die Indizes ändern sich nach dem Laden nicht – gleiche Anfrage, gleiche Antwort.
+    :param target: Request-Target, z.B. '/portfolios/depot/positions?top=5'
+    :return: Tuple (HTTP-Status, JSON-Body als Bytes)
+    """
+    stats = service["stats"]
+    with service["cache_lock"]:
+        stats["requests"] += 1
+        cached = service["cache"].get(target)
+        if cached is not None:
+            service["cache"].move_to_end(target)
+            stats["hits"] += 1
+            return cached
+        stats["misses"] += 1
+
+    url = urlsplit(target)
+    path = unquote(url.path)
+    if path.rstrip("/") == "/health":
+        # Zähler ändern sich mit jeder Anfrage – nie cachen
+        return 200, json.dumps({"status": "ok", **stats}).encode("utf-8")
+    try:
+        status, body = 200, query(service, path, parse_qs(url.query))
+    except QueryError as e:
+        status, body = e.status, {"error": str(e)}
+    except Exception as e:
+        # Unerwarteter Fehler: JSON-Antwort statt abgebrochener Keep-Alive-Verbindung – nicht cachen
+        logger.exception(f"Fehler bei Anfrage '{target}'")
+        return 500, json.dumps({"error": f"Interner Fehler: {e}"}, ensure_ascii=False).encode("utf-8")
+    response = status, json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+    if service["cache_size"]:
+        with service["cache_lock"]:
+            service["cache"][target] = response
+            if len(service["cache"]) > service["cache_size"]:
+                service["cache"].popitem(last=False)
+    return response
+
+
+# ---------------------------------------------------------------------------
+# HTTP-Server (nur localhost)
+# ---------------------------------------------------------------------------
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    # Keep-Alive: Clients können mehrere Anfragen über eine Verbindung schicken
+    protocol_version = "HTTP/1.1"
+    # TCP_NODELAY: Header und Body gehen als getrennte Writes raus – mit Nagle + Delayed ACK kostet das
+    # sonst ~40 ms je Anfrage (Keep-Alive-Durchsatz ~25 statt mehrerer tausend Anfragen/s)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, body = handle_request(self.server.service, self.path)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(service, host="127.0.0.1", port=8765):
+    """
+    HTTP-Server für den Service (ein Thread je Verbindung). Port 0 = freier Port (siehe server.server_address).
+    :return: ThreadingHTTPServer – starten mit serve_forever(), beenden mit shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), _QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(service, host="127.0.0.1", port=8765):
+    """Startet den Abfrage-Service und blockiert bis Strg+C."""
+    server = create_server(service, host, port)
+    host, port = server.server_address[:2]
+    logger.info(
+        f"Abfrage-Service läuft auf http://{host}:{port}/ – {len(service['portfolios'])} Depot(s): "
+        f"{', '.join(service['portfolios'])}. Beenden mit Strg+C."
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Abfrage-Service beendet.")
+    finally:
+        server.server_close()
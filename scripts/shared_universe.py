@@ -0,0 +1,121 @@
+# shared_universe.py
+
+import logging
+import sys
+from contextlib import contextmanager, suppress
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Ausrichtung der Arrays im Shared-Memory-Block (Bytes) – hält float64/int64-Zugriffe aligned
+_ALIGN = 8
+
+
+def _codes_dtype(n_categories):
+    """Kleinster Integer-Typ für Kategorie-Codes – entspricht der Wahl von pandas (keine Kopie bei from_codes)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _encode_columns(df):
+    """
+    Zerlegt ein DataFrame in Arrays für den Shared-Memory-Block.
+    Numerische Spalten bleiben numerisch, alle übrigen werden zu Integer-Codes + Kategorie-Dictionary.
+    :return: Liste von (Spalten-Meta, numpy-Array)
+    """
+    encoded = []
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in "biuf":
+            values = series.to_numpy()
+            encoded.append(({"name": col, "kind": "num"}, values))
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            categories = list(uniques)
+            values = codes.astype(_codes_dtype(len(categories)), copy=False)
+            encoded.append(({"name": col, "kind": "cat", "categories": categories}, values))
+    return encoded
+
+
+def publish_universe(etf_data):
+    """
+    Legt das bereinigte ETF-Universum in einem Shared-Memory-Block ab.
+    :param etf_data: bereinigtes ETF-DataFrame (clean_etf_data)
+    :return: Tuple (Shared-Memory-Objekt, Handle). Das Handle ist ein kleines, picklebares Dict,
+             mit dem Worker per attach_universe ohne Kopie auf die Daten zugreifen.
+    """
+    encoded = _encode_columns(etf_data)
+
+    offset, layout = 0, []
+    for meta, values in encoded:
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout.append((meta, values, offset))
+        offset += values.nbytes
+    size = max(offset, 1)
+
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    columns = []
+    for meta, values, col_offset in layout:
+        view = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=col_offset)
+        view[:] = values
+        del view  # keine exportierten Buffer-Pointer offen lassen, sonst schlägt close() fehl
+        columns.append({**meta, "dtype": values.dtype.str, "offset": col_offset})
+
+    handle = {"name": shm.name, "nrows": len(etf_data), "columns": columns}
+    logger.info(
+        f"ETF-Universum in Shared Memory veröffentlicht: {len(etf_data)} Zeilen, "
+        f"{len(columns)} Spalten, {size / 1024 / 1024:.1f} MB ('{shm.name}')."
+    )
+    return shm, handle
+
+
+def attach_universe(handle):
+    """
+    Verbindet sich mit einem veröffentlichten ETF-Universum (ohne Kopie der Arrays).
+    Numerische Spalten sind schreibgeschützte Views auf den Block, Text-Spalten Kategorien über den Codes.
+    :param handle: Handle aus publish_universe
+    :return: Tuple (Shared-Memory-Objekt, DataFrame). Das Shared-Memory-Objekt muss so lange referenziert
+             bleiben, wie das DataFrame verwendet wird.
+    """
+    if sys.version_info >= (3, 13):
+        # Worker registrieren den Block nicht beim resource_tracker – Freigabe macht der Erzeuger
+        shm = shared_memory.SharedMemory(name=handle["name"], track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=handle["name"])
+
+    n = handle["nrows"]
+    data = {}
+    for col in handle["columns"]:
+        values = np.ndarray((n,), dtype=np.dtype(col["dtype"]), buffer=shm.buf, offset=col["offset"])
+        values.flags.writeable = False
+        if col["kind"] == "num":
+            data[col["name"]] = values
+        else:
+            data[col["name"]] = pd.Categorical.from_codes(values, categories=col["categories"], validate=False)
+    return shm, pd.DataFrame(data, copy=False)
+
+
+def release_universe(shm):
+    """Gibt einen mit publish_universe erzeugten Block frei (close + unlink)."""
+    shm.close()
+    with suppress(FileNotFoundError):
+        shm.unlink()
+
+
+@contextmanager
+def shared_universe(etf_data):
+    """
+    Context-Manager: veröffentlicht das ETF-Universum für die Dauer des Blocks und gibt es danach frei.
+    :param etf_data: bereinigtes ETF-DataFrame
+    :return: Handle für attach_universe
+    """
+    shm, handle = publish_universe(etf_data)
+    try:
+        yield handle
+    finally:
+        release_universe(shm)
@@ -0,0 +1,119 @@
+# snapshot.py
+
+import glob
+import logging
+import os
+from contextlib import suppress
+from datetime import datetime
+
+import pandas as pd
+
+from scripts.file_lock import atomic_writer
+
+logger = logging.getLogger(__name__)
+
+# Version des Snapshot-Formats – erhöhen, wenn sich das Ergebnis-Dict aus analyze_depot strukturell ändert
+SNAPSHOT_VERSION = 1
+
+# Anzahl Snapshots, die beim Aufräumen behalten werden (neueste zuerst)
+SNAPSHOT_KEEP = 10
+
+# Schlüssel des Ergebnis-Dicts, ohne die Excel und HTML-Report nicht neu erzeugt werden können –
+# alle Schlüssel, die analyze_depot liefert (export_results / prepare_report_sections lesen davon fast alle)
+SNAPSHOT_KEYS = (
+    "depot",
+    "depot_data",
+    "depot_data_chart",
+    "depot_data_cube",
+    "depot_data_stocks",
+    "depot_data_etfs",
+    "depot_data_sectors",
+    "depot_data_locations",
+    "sector_pivot",
+    "country_treemap_data",
+    "sector_treemap_data",
+    "kpis",
+    "fallback_used",
+    "depot_summary",
+)
+
+
+class SnapshotError(ValueError):
+    """Snapshot fehlt, ist unlesbar oder hat eine andere Format-Version."""
+
+
+def snapshot_file(snapshot_dir, now=None):
+    """Pfad eines neuen Snapshots: <snapshot_dir>/snapshot-<Zeitstempel>.pkl"""
+    stamp = (now or datetime.now()).strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(snapshot_dir, f"snapshot-{stamp}.pkl")
+
+
+def save_snapshot(result, snapshot_dir, meta=None, keep=SNAPSHOT_KEEP):
+    """
+    Speichert den kompletten berechneten Zustand eines Laufs atomar (temporäre Datei + os.replace)
+    und räumt alte Snapshots auf.
+    :param result: Ergebnis-Dict aus analyze_depot (depot, depot_data, depot_data_chart, Aggregationen, …)
+    :param snapshot_dir: Zielordner
+    :param meta: optionale Zusatzinfos (z.B. Eingabedatei), werden unverändert mitgespeichert
+    :param keep: Anzahl Snapshots, die behalten werden
+    :return: Pfad des Snapshots oder None, wenn das Speichern fehlgeschlagen ist
+    """
+    path = snapshot_file(snapshot_dir)
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "meta": meta or {},
+        "result": result,
+    }
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with atomic_writer(path, encoding=None) as f:
+            pd.to_pickle(payload, f)
+    except Exception as e:
+        logger.warning(f"Snapshot '{path}' konnte nicht gespeichert werden: {e}")
+        return None
+    logger.info(f"Snapshot gespeichert: {path}")
+    _prune(snapshot_dir, keep)
+    return path
+
+
+def _snapshots(snapshot_dir):
+    return sorted(glob.glob(os.path.join(snapshot_dir, "snapshot-*.pkl")))
+
+
+def _prune(snapshot_dir, keep):
+    for old in _snapshots(snapshot_dir)[:-keep] if keep > 0 else []:
+        with suppress(OSError):
+            os.remove(old)
+
+
+def latest_snapshot(snapshot_dir):
+    """:return: Pfad des jüngsten Snapshots in snapshot_dir oder None"""
+    snapshots = _snapshots(snapshot_dir) if os.path.isdir(snapshot_dir) else []
+    return snapshots[-1] if snapshots else None
+
+
+def load_snapshot(path):
+    """
+    Lädt einen Snapshot und prüft Format-Version und Vollständigkeit.
+    Die Datei wird per pickle geladen und kann dabei beliebigen Code ausführen – nur selbst erzeugte bzw.
+    vertrauenswürdige Snapshots laden (main.py report akzeptiert jeden Pfad).
+    :param path: Pfad zur Snapshot-Datei
+    :return: Dict mit 'version', 'created', 'meta' und 'result' (Ergebnis-Dict wie aus analyze_depot)
+    :raises SnapshotError: wenn die Datei fehlt, unlesbar ist, eine andere Version hat oder Schlüssel fehlen
+    """
+    if not os.path.exists(path):
+        raise SnapshotError(f"Snapshot '{path}' nicht gefunden.")
+    try:
+        payload = pd.read_pickle(path)
+    except Exception as e:
+        raise SnapshotError(f"Snapshot '{path}' nicht lesbar: {e}") from e
+    if not isinstance(payload, dict) or payload.get("version") != SNAPSHOT_VERSION:
+        version = payload.get("version") if isinstance(payload, dict) else None
+        raise SnapshotError(
+            f"Snapshot '{path}' hat Format-Version {version}, erwartet {SNAPSHOT_VERSION} – bitte neu berechnen."
+        )
+    missing = [k for k in SNAPSHOT_KEYS if k not in payload["result"]]
+    if missing:
+        raise SnapshotError(f"Snapshot '{path}' unvollständig, es fehlen: {missing}")
+    return payload
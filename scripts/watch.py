@@ -0,0 +1,304 @@
+# watch.py
+
+import logging
+import os
+import time
+from contextlib import nullcontext
+
+from scripts.analysis import (
+    build_aggregations,
+    etf_universe_key,
+    export_excel,
+    finish_result,
+    load_depot,
+    load_etf_universe,
+    prepare_report_sections,
+    price_depot,
+    render_serialized,
+    section_fingerprint,
+)
+from scripts.artifact_cache import artifact_key, cached_artifact
+from scripts.incremental import LOOK_THROUGH_VERSION, apply_look_through, build_look_through, depot_structure_digest
+from scripts.instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+
+def new_state():
+    """
+    Leerer Zustand des Watch-Modus. Alles, was ein einzelner Lauf jedes Mal neu berechnet, bleibt hier im
+    Speicher und wird nur ersetzt, wenn sich seine Eingaben ändern.
+    """
+    return {
+        "csv_signature": None,  # (mtime_ns, Größe) der ETF-CSVs
+        "universe_key": None,  # Inhalts-Schlüssel des Universums (etf_universe_key)
+        "etf_data": None,  # bereinigtes ETF-Universum – erst geladen, wenn ein Durchblick gebaut werden muss
+        "depot_signature": None,  # (mtime_ns, Größe) von INPUT_FILE
+        "depot": None,  # unbewertetes Depot (load_depot)
+        "structure": None,  # depot_structure_digest des Depots
+        "model": None,  # Durchblick-Modell (build_look_through) für Universum + Depot-Struktur
+        "prices": None,  # Kurs-Cache (Ticker, Kurs)
+        "fallback_used": None,
+        "prices_at": None,  # Zeitpunkt des letzten Kursabrufs (time.monotonic)
+        "result": None,  # letztes Analyse-Ergebnis
+        "sections": {},  # Fingerprint → gerenderter Report-Abschnitt (Figures serialisiert)
+        "depot_summary": None,  # KPI-Cards des zuletzt geschriebenen Reports
+        "reports": 0,  # Anzahl geschriebener Reports (Browser nur beim ersten öffnen)
+        "dirty": False,  # Änderungen erkannt, aber noch nicht erfolgreich ausgegeben
+    }
+
+
+def file_signature(paths):
+    """
+    Günstiger Änderungs-Check ohne Dateiinhalt: (mtime_ns, Größe) je Datei, None für fehlende Dateien.
+    :param paths: Liste von Dateipfaden
+    :return: Tuple in der Reihenfolge von paths
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+# ---------------------------------------------------------------------------
+# Änderungen erkennen
+# ---------------------------------------------------------------------------
+
+
+def _check_universe(state, config):
+    """
+    Prüft die ETF-CSVs in DOWNLOAD_PATH. Nur wenn sich Zeitstempel/Größe und danach auch der Inhalt geändert
+    haben, werden Universum und Durchblick-Modell verworfen.
+    :return: True, wenn sich das Universum geändert hat
+    """
+    paths = [os.path.join(config["DOWNLOAD_PATH"], f) for f in config["ETF_CSV_FILE"]]
+    signature = file_signature(paths)
+    if signature == state["csv_signature"]:
+        return False
+    state["csv_signature"] = signature
+    universe_key = etf_universe_key(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"])
+    if universe_key == state["universe_key"]:
+        return False
+    if state["universe_key"] is not None:
+        logger.info("ETF-CSVs geändert – ETF-Universum und Durchblick werden neu aufgebaut.")
+    state.update(universe_key=universe_key, etf_data=None, model=None)
+    return True
+
+
+def _check_depot(state, config):
+    """
+    Prüft INPUT_FILE. Ein unlesbares Depot (z.B. während Excel noch speichert) wird beim nächsten Zyklus erneut
+    versucht; bis dahin bleibt das letzte Depot aktiv.
+    :return: Tuple (Depot geändert, Depot-Struktur geändert)
+    """
+    signature = file_signature([config["INPUT_FILE"]])
+    if signature == state["depot_signature"]:
+        return False, False
+    try:
+        depot = load_depot(config["INPUT_FILE"])
+    except (FileNotFoundError, ValueError, OSError) as e:
+        logger.warning(f"Depot nicht lesbar – nächster Versuch im nächsten Zyklus: {e}")
+        return False, False
+    state["depot_signature"] = signature
+    if state["depot"] is not None and depot.equals(state["depot"]):
+        return False, False
+
+    structure = depot_structure_digest(depot)
+    structure_changed = structure != state["structure"]
+    if state["depot"] is not None:
+        logger.info(f"Depot geändert{' (neue Struktur)' if structure_changed else ' (nur Anteile)'}.")
+    state.update(depot=depot, structure=structure)
+    if structure_changed:
+        state["model"] = None
+    return True, structure_changed
+
+
+def _refresh_prices(state, load_prices, now):
+    """
+    Lädt die Kurse neu und vergleicht sie mit dem Kurs-Cache.
+    :return: True, wenn sich Kurse oder Fallback-Ticker geändert haben
+    """
+    with span("price_fetch", positions=len(state["depot"])):
+        prices, fallback_used = load_prices(state["depot"])
+    state["prices_at"] = now
+    if prices is None or prices.empty:
+        logger.warning("Kursabruf ohne Ergebnis – letzte Kurse bleiben aktiv.")
+        return False
+    if state["prices"] is not None and prices.equals(state["prices"]) and fallback_used == state["fallback_used"]:
+        logger.info("Kurse unverändert.")
+        return False
+    state.update(prices=prices, fallback_used=fallback_used)
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Neu berechnen & ausgeben
+# ---------------------------------------------------------------------------
+
+
+def _look_through_model(state, config, priced):
+    """Durchblick-Modell für Universum + Depot-Struktur; bei INCREMENTAL auch aus dem Artefakt-Cache."""
+
+    def _build():
+        if state["etf_data"] is None:
+            state["etf_data"] = load_etf_universe(
+                config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"], cache_dir=config["CACHE_PATH"]
+            )
+        if state["etf_data"] is None:
+            raise ValueError("ETF-Universum konnte nicht geladen werden.")
+        return build_look_through(state["etf_data"], priced)
+
+    cache_dir = config["CACHE_PATH"] if config["INCREMENTAL"] else None
+    key = artifact_key(LOOK_THROUGH_VERSION, state["universe_key"], state["structure"])
+    return cached_artifact(cache_dir, "lookthrough", key, _build)
+
+
+def _recompute(state, config):
+    """Kurse → Depotgewichte → Durchblick → Aggregationen. Der Durchblick wird nur bei Bedarf neu gebaut."""
+    with span("merge"):
+        priced, gesamtwert_vollstaendig = price_depot(state["depot"], state["prices"])
+    with span("weighting"):
+        if state["model"] is None:
+            state["model"] = _look_through_model(state, config, priced)
+        depot_data, depot_data_chart = apply_look_through(state["model"], priced)
+    with span("aggregation"):
+        aggregations = build_aggregations(priced, depot_data, depot_data_chart)
+        state["result"] = finish_result(
+            priced, depot_data, depot_data_chart, aggregations, gesamtwert_vollstaendig, state["fallback_used"]
+        )
+
+
+def _render_report(state, sections, detail=None):
+    """
+    Baut nur die Report-Abschnitte neu, deren Inhalts-Fingerprint sich geändert hat – der Rest kommt aus dem
+    Speicher.
+    :return: Tuple (Section-Dicts für export_html_report, Anzahl neu gebauter Abschnitte)
+    """
+    result = state["result"]
+    rendered, cache, built = [], {}, 0
+    for spec in prepare_report_sections(result["depot"], result, sections, detail):
+        key = section_fingerprint(spec)
+        section = state["sections"].get(key)
+        if section is None:
+            section = render_serialized(spec)
+            built += 1
+        cache[key] = section
+        rendered.append(section)
+    state["sections"] = cache
+    return rendered, built
+
+
+def _export(state, config, options):
+    """Schreibt Excel und – nur wenn sich Abschnitte oder KPI-Cards geändert haben – den HTML-Report."""
+    result = state["result"]
+    if options["excel"]:
+        export_excel(result, config["OUTPUT_FILE"])
+    if options["sections"] is not None and not options["sections"]:
+        return None
+
+    from scripts.plotting import export_html_report
+
+    with span("figure_build"):
+        report_sections, built = _render_report(state, options["sections"], options["detail"])
+    if not built and result["depot_summary"] == state["depot_summary"] and state["reports"]:
+        logger.info("Report unverändert – HTML wird nicht neu geschrieben.")
+        return None
+
+    report_file = os.path.join(config["SAVE_PATH"], "portfolio_report.html")
+    with span("html_write"):
+        export_html_report(
+            report_sections,
+            report_file,
+            depot_summary=result["depot_summary"],
+            open_browser=options["open_browser"] and not state["reports"],
+            plotlyjs=options["plotlyjs"],
+            chart_payload=options["chart_payload"],
+            cache_dir=config["CACHE_PATH"] if config["INCREMENTAL"] else None,
+        )
+    logger.info(f"Report aktualisiert ({built}/{len(report_sections)} Abschnitte neu gebaut): {report_file}")
+    state.update(depot_summary=result["depot_summary"], reports=state["reports"] + 1)
+    return report_file
+
+
+def watch_cycle(state, config, options, load_prices, price_interval, download_csvs=None, run_context=None, now=None):
+    """
+    Ein Zyklus des Watch-Modus: Änderungen erkennen und nur das Nötige neu berechnen und ausgeben.
+    - ETF-CSVs geändert → Universum + Durchblick neu, Depot-Struktur geändert → Durchblick + Kurse neu
+    - nur Anteile oder Kurse geändert → Gewichte, Aggregationen und betroffene Report-Abschnitte neu
+    :param state: Zustand aus new_state (wird aktualisiert)
+    :param config: Konfiguration aus load_config
+    :param options: Stufen-Optionen ('excel', 'sections', 'open_browser', 'plotlyjs', 'chart_payload')
+    :param load_prices: Funktion Depot → (Kursliste, Fallback-Ticker), z.B. download_stock_price
+    :param price_interval: Sekunden zwischen zwei Kursabrufen
+    :param download_csvs: optionale Funktion ohne Argumente für den CSV-Download (läuft mit jedem Kursabruf)
+    :param run_context: optionale Funktion, die einen Kontext um die Neuberechnung liefert (z.B. timed_run)
+    :param now: aktueller Zeitpunkt (time.monotonic), Default: jetzt
+    :return: Dict mit den erkannten Änderungen ('universe', 'depot', 'prices') und 'report' (Pfad oder None)
+    """
+    now = time.monotonic() if now is None else now
+    prices_due = state["prices_at"] is None or now - state["prices_at"] >= price_interval
+    if prices_due and download_csvs is not None:
+        download_csvs()
+
+    changes = {"universe": _check_universe(state, config), "depot": False, "prices": False, "report": None}
+    changes["depot"], structure_changed = _check_depot(state, config)
+    if state["depot"] is None:
+        return changes
+    if prices_due or structure_changed:
+        changes["prices"] = _refresh_prices(state, load_prices, now)
+    # dirty bleibt gesetzt, bis Neuberechnung und Ausgabe durchgelaufen sind – ein Fehler wird so im nächsten
+    # Zyklus erneut versucht, auch wenn sich bis dahin nichts weiter ändert
+    state["dirty"] = state["dirty"] or changes["universe"] or changes["depot"] or changes["prices"]
+    if state["prices"] is None or not state["dirty"]:
+        return changes
+
+    with (run_context or nullcontext)():
+        _recompute(state, config)
+        changes["report"] = _export(state, config, options)
+    state["dirty"] = False
+    return changes
+
+
+def run_watch(
+    config,
+    options,
+    load_prices,
+    interval,
+    price_interval,
+    download_csvs=None,
+    run_context=None,
+    max_cycles=None,
+    sleep=time.sleep,
+):
+    """
+    Watch-Modus: bleibt im Speicher, überwacht INPUT_FILE und die ETF-CSVs in DOWNLOAD_PATH und ruft die Kurse
+    im Takt von price_interval ab. Fehler in einem Zyklus beenden den Modus nicht; Abbruch mit Strg+C.
+    :param interval: Sekunden zwischen zwei Zyklen (Datei-Checks)
+    :param max_cycles: Anzahl Zyklen (None = bis zum Abbruch)
+    :param sleep: Wartefunktion (für Tests austauschbar)
+    :return: Zustand nach dem letzten Zyklus
+    (weitere Parameter siehe watch_cycle)
+    """
+    logger.info(
+        f"Watch-Modus: Dateien alle {interval:g} s, Kurse alle {price_interval:g} s – beenden mit Strg+C. "
+        f"Überwacht: {config['INPUT_FILE']}, {config['DOWNLOAD_PATH']}"
+    )
+    state = new_state()
+    cycles = 0
+    try:
+        while max_cycles is None or cycles < max_cycles:
+            try:
+                watch_cycle(state, config, options, load_prices, price_interval, download_csvs, run_context)
+            except Exception as e:
+                logger.error(f"Watch-Zyklus fehlgeschlagen – nächster Versuch in {interval:g} s: {e}")
+            cycles += 1
+            if max_cycles is None or cycles < max_cycles:
+                sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("Watch-Modus beendet.")
+    return state
@@ -0,0 +1,407 @@
+# tests/test_analysis.py
+"""
+Unit Tests für scripts/analysis.py
+
+Getestet werden:
+- load_depot: Pflicht-Spalten, fehlende Datei, leeres Depot
+- price_depot: Kurs-Merge, Marktwert (%), Abbruch bei Gesamtwert 0
+- build_depot_data / direct_chart_rows: ETF-Durchblick, Krypto/Cash-Zeilen ohne Duplikate (Anti-Join)
+- build_aggregation_cube: Roll-ups identisch zu direkten groupbys auf depot_data_chart
+- build_aggregations / compute_kpis / build_depot_summary / flag_degraded: Kennzahlen und KPI-Cards
+- build_report_sections: Section-Cache über Inhalts-Fingerprints, Auswahl einzelner Abschnitte, Detail-Stufe,
+  Figures im Prozess-Pool
+- export_results: Excel/HTML überspringen, ohne Figures zu bauen oder Plotly zu importieren
+- analyze_depot: Gesamtlauf, Fallback-Ticker je Depot
+"""
+
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from scripts.analysis import (
+    REPORT_SECTIONS,
+    analyze_depot,
+    build_aggregation_cube,
+    build_aggregations,
+    build_depot_data,
+    build_depot_summary,
+    build_report_sections,
+    compute_kpis,
+    direct_chart_rows,
+    export_results,
+    flag_degraded,
+    load_depot,
+    prepare_report_sections,
+    price_depot,
+    render_serialized,
+    section_fingerprint,
+)
+from scripts.plotting import figure_json
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _etf_data():
+    """Bereits bereinigtes ETF-Universum mit einem ETF."""
+    return pd.DataFrame(
+        {
+            "ETF": ["Test ETF", "Test ETF"],
+            "Emittententicker": ["AAPL", "MSFT"],
+            "Name": ["Apple Inc.", "Microsoft Corp."],
+            "Gewichtung (%)": [60.0, 40.0],
+            "Sektor": ["Technologie", "Technologie"],
+            "Standort": ["USA", "USA"],
+        }
+    )
+
+
+def _depot():
+    return pd.DataFrame(
+        {
+            "Ticker": ["TST.DE", "SAP", "BTC", "-"],
+            "Art": ["ETF", "Aktie", "Krypto", "Cash"],
+            "Position": ["Test ETF", "SAP SE", "Bitcoin", "Cash"],
+            "Sektor": ["-", "Technologie", "Krypto", "Cash und/oder Derivate"],
+            "Standort": ["-", "Deutschland", "Krypto", "Cash (Euro)"],
+            "Anteile": [10, 1, 1, 100],
+        }
+    )
+
+
+def _prices():
+    return pd.DataFrame({"Ticker": ["TST", "SAP", "BTC", "-"], "Kurs": [50.0, 200.0, 200.0, 1.0]})
+
+
+# ---------------------------------------------------------------------------
+# Tests: load_depot
+# ---------------------------------------------------------------------------
+
+
+class TestLoadDepot:
+    def test_fehlende_datei_wirft_fehler(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            load_depot(str(tmp_path / "fehlt.xlsx"))
+
+    def test_fehlende_pflichtspalte_wirft_fehler(self, tmp_path):
+        path = tmp_path / "depot.xlsx"
+        _depot().drop(columns=["Anteile"]).to_excel(path, index=False)
+        with pytest.raises(ValueError, match="Pflicht-Spalten"):
+            load_depot(str(path))
+
+    def test_liest_gueltiges_depot(self, tmp_path):
+        path = tmp_path / "depot.xlsx"
+        _depot().to_excel(path, index=False)
+        assert len(load_depot(str(path))) == 4
+
+
+# ---------------------------------------------------------------------------
+# Tests: price_depot
+# ---------------------------------------------------------------------------
+
+
+class TestPriceDepot:
+    def test_marktwert_prozent_summiert_auf_100(self):
+        depot, vollstaendig = price_depot(_depot(), _prices())
+        assert vollstaendig
+        assert depot["Marktwert (%)"].sum() == pytest.approx(100.0)
+        # Originaler Ticker (mit Suffix) bleibt erhalten
+        assert depot.loc[depot["Art"] == "ETF", "Ticker"].iloc[0] == "TST.DE"
+
+    def test_fehlender_kurs_markiert_unvollstaendig(self):
+        prices = _prices()[_prices()["Ticker"] != "SAP"]
+        depot, vollstaendig = price_depot(_depot(), prices)
+        assert not vollstaendig
+        assert depot.loc[depot["Position"] == "SAP SE", "Kurs"].isna().all()
+
+    def test_gesamtwert_null_wirft_fehler(self):
+        prices = _prices().assign(Kurs=0.0)
+        with pytest.raises(ValueError, match="Gesamtwert"):
+            price_depot(_depot(), prices)
+
+    def test_uebergebenes_depot_bleibt_unveraendert(self):
+        depot = _depot()
+        price_depot(depot, _prices())
+        assert "Kurs" not in depot.columns
+
+
+# ---------------------------------------------------------------------------
+# Tests: build_depot_data & Auswertungen
+# ---------------------------------------------------------------------------
+
+
+class TestBuildDepotData:
+    def test_etf_durchblick_und_direktpositionen(self):
+        depot, _ = price_depot(_depot(), _prices())
+        depot_data, depot_data_chart = build_depot_data(_etf_data(), depot)
+        # ETF: 500 € von 1000 € → 50 %; Apple 60 % davon → 30 %
+        apple = depot_data.loc[depot_data["Name"] == "Apple Inc.", "relative Gewichtung (%)"].iloc[0]
+        assert apple == pytest.approx(30.0)
+        assert "SAP SE" in depot_data["Name"].values
+
+    def test_krypto_und_cash_genau_einmal_im_chart(self):
+        depot, _ = price_depot(_depot(), _prices())
+        _, depot_data_chart = build_depot_data(_etf_data(), depot)
+        assert (depot_data_chart["Name"] == "Bitcoin").sum() == 1
+        assert (depot_data_chart["Name"] == "Cash").sum() == 1
+        assert depot_data_chart["relative Gewichtung (%)"].sum() == pytest.approx(100.0)
+
+
+class TestDirectChartRows:
+    def test_krypto_vor_cash_und_anti_join_ueber_namen(self):
+        depot = pd.DataFrame(
+            {
+                "Ticker": ["-", "BTC", "ETH", "-"],
+                "Art": ["Cash", "Krypto", "Krypto", "Cash"],
+                "Position": ["Konto A", "Bitcoin", "Ethereum", "Konto B"],
+                "Marktwert (%)": [10.0, 40.0, 0.0, 50.0],
+            }
+        )
+        chart = pd.DataFrame({"Name": ["Bitcoin", None], "relative Gewichtung (%)": [40.0, 1.0]})
+        rows = direct_chart_rows(depot, chart)
+        assert list(rows["Name"]) == ["Ethereum", "Konto A", "Konto B"]
+        assert list(rows.index) == [2, 0, 3]  # Index = Depotzeile
+        assert list(rows["Sektor"]) == ["Krypto", "Cash", "Cash"]
+
+    def test_viele_direktpositionen(self):
+        n = 500
+        depot = pd.DataFrame(
+            {
+                "Ticker": [f"C{i}" for i in range(n)] + ["-"],
+                "Art": ["Krypto"] * n + ["Cash"],
+                "Position": [f"Coin {i}" for i in range(n)] + ["Cash"],
+                "Sektor": ["Sonstige"] * n + ["Cash"],
+                "Standort": ["Krypto"] * n + ["Cash"],
+                "Anteile": [1] * (n + 1),
+            }
+        )
+        prices = pd.DataFrame({"Ticker": [f"C{i}" for i in range(n)] + ["-"], "Kurs": [1.0] * (n + 1)})
+        depot, _ = price_depot(depot, prices)
+        _, depot_data_chart = build_depot_data(_etf_data(), depot)
+        assert depot_data_chart["Name"].is_unique
+        assert len(depot_data_chart) == len(_etf_data()) + n + 1
+
+
+class TestAggregationCube:
+    def _chart(self):
+        depot, _ = price_depot(_depot(), _prices())
+        etf = pd.concat(
+            [
+                _etf_data(),
+                pd.DataFrame(
+                    {
+                        "ETF": ["Test ETF", "Test ETF"],
+                        "Emittententicker": ["AAPL", "XOM"],
+                        "Name": ["Apple Inc.", "Exxon Mobil"],
+                        "Gewichtung (%)": [5.0, -2.0],
+                        "Sektor": ["Technologie", "Energie"],
+                        "Standort": ["USA", None],
+                    }
+                ),
+            ],
+            ignore_index=True,
+        )
+        depot_data, depot_data_chart = build_depot_data(etf, depot)
+        return depot, depot_data, depot_data_chart
+
+    def test_doppelte_schluessel_werden_verdichtet(self):
+        _, _, depot_data_chart = self._chart()
+        cube = build_aggregation_cube(depot_data_chart)
+        assert len(cube) == len(depot_data_chart) - 1  # Apple zweimal im selben ETF
+        assert cube["Gewichtung"].sum() == pytest.approx(depot_data_chart["relative Gewichtung (%)"].sum())
+        # Negative Gewichtung zählt nicht in 'Gewichtung positiv'
+        exxon = cube[cube["Name"] == "Exxon Mobil"].iloc[0]
+        assert exxon["Gewichtung positiv"] == 0.0
+        assert not exxon["Land gültig"]
+
+    def test_rollups_wie_direkte_groupbys(self):
+        depot, depot_data, chart = self._chart()
+        aggs = build_aggregations(depot, depot_data, chart)
+
+        sectors = chart.groupby("Sektor")["relative Gewichtung (%)"].sum()
+        pd.testing.assert_series_equal(
+            aggs["depot_data_sectors"].set_index("Sektor")["Sektorgewichtung (%)"].sort_index(),
+            sectors.rename("Sektorgewichtung (%)"),
+        )
+        stocks = chart.groupby("Name").agg(Emittententicker=("Emittententicker", "first"), Sektor=("Sektor", "first"))
+        pd.testing.assert_frame_equal(
+            aggs["depot_data_stocks"].set_index("Name")[["Emittententicker", "Sektor"]].sort_index(), stocks
+        )
+        positive = chart[chart["relative Gewichtung (%)"] > 0]
+        treemap = positive.groupby(["Sektor", "Name"], as_index=False)["relative Gewichtung (%)"].sum()
+        pd.testing.assert_frame_equal(aggs["sector_treemap_data"], treemap)
+        assert "Exxon Mobil" not in set(aggs["country_treemap_data"]["Name"])
+
+    def test_heatmap_pivot(self):
+        depot, depot_data, chart = self._chart()
+        pivot = build_aggregations(depot, depot_data, chart)["sector_pivot"]
+        assert pivot.index[0] == "Technologie"
+        assert pivot.loc["Technologie", "Test ETF"] == pytest.approx(52.5)  # (60 + 40 + 5) % × 50 %
+        assert pivot.loc["Krypto", "Krypto"] == pytest.approx(20.0)
+
+
+class TestAggregationenUndKpis:
+    def _result(self):
+        depot, _ = price_depot(_depot(), _prices())
+        depot_data, depot_data_chart = build_depot_data(_etf_data(), depot)
+        return depot, depot_data, depot_data_chart, build_aggregations(depot, depot_data, depot_data_chart)
+
+    def test_cash_erscheint_in_etf_auswertung(self):
+        _, _, _, aggs = self._result()
+        etfs = aggs["depot_data_etfs"].set_index("ETF")["ETF-Gewichtung (%)"]
+        assert etfs["Cash"] == pytest.approx(10.0)
+        assert etfs["Test ETF"] == pytest.approx(50.0)
+
+    def test_laender_ohne_krypto_und_cash(self):
+        _, _, _, aggs = self._result()
+        assert set(aggs["depot_data_locations"]["Standort"]) == {"USA", "Deutschland"}
+
+    def test_kpis_assetklassen_und_hhi(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        kpis = compute_kpis(depot, aggs)
+        assert kpis["etf_pct"] == pytest.approx(50.0)
+        assert kpis["cash_pct"] == pytest.approx(10.0)
+        # Gewichte 30/20/20/20/10 → HHI = 900+400+400+400+100 = 2200 → 22,0
+        assert kpis["hhi_score"] == pytest.approx(22.0)
+        assert kpis["top5_pct"] == pytest.approx(100.0)
+
+    def test_summary_enthaelt_alle_kpi_cards(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        summary = build_depot_summary(compute_kpis(depot, aggs))
+        assert summary["Gesamtwert"] == "1.000,00 €"
+        assert summary["Diversifikation"].startswith("Hoch konzentriert")
+        assert "⚠️ Fallback-Kurse" not in summary
+
+    def test_summary_markiert_unvollstaendigen_gesamtwert(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        summary = build_depot_summary(compute_kpis(depot, aggs), False, ["BTC"])
+        assert "unvollständig" in summary["Gesamtwert"]
+        assert "BTC" in summary["⚠️ Fallback-Kurse"]
+
+    def test_zeitbudget_wird_in_kpi_cards_markiert(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        result = {"depot_summary": build_depot_summary(compute_kpis(depot, aggs))}
+        assert "⚠️ Zeitbudget" not in flag_degraded(result, [])["depot_summary"]
+        flag_degraded(result, ["CSV-Download", "Kursabruf"])
+        assert result["depot_summary"]["⚠️ Zeitbudget"].startswith("CSV-Download, Kursabruf")
+
+    def test_report_sections_vollstaendig(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        sections = build_report_sections(depot, aggs)
+        assert [s["title"] for s in sections][0] == "Depotübersicht"
+        assert len(sections) == 7
+
+    def test_section_cache_liefert_gleiche_figures(self, tmp_path):
+        depot, _, depot_data_chart, aggs = self._result()
+        sections = build_report_sections(depot, aggs)
+        first = build_report_sections(depot, aggs, cache_dir=str(tmp_path))
+        second = build_report_sections(depot, aggs, cache_dir=str(tmp_path))
+        assert len(list(tmp_path.glob("section-*.pkl"))) == 7
+        for plain, cached in zip(sections, second, strict=True):
+            if "fig" in plain:
+                assert cached["fig_json"] == figure_json(plain["fig"])
+            else:
+                assert cached["html"] == plain["html"]
+        assert first == second
+
+    def test_figures_im_prozess_pool_in_report_reihenfolge(self, tmp_path):
+        depot, _, depot_data_chart, aggs = self._result()
+        sequential = [render_serialized(spec) for spec in prepare_report_sections(depot, aggs)]
+        assert build_report_sections(depot, aggs, render_workers=2) == sequential
+        cached = build_report_sections(depot, aggs, cache_dir=str(tmp_path), render_workers=2)
+        assert cached == sequential
+        assert len(list(tmp_path.glob("section-*.pkl"))) == 7
+
+    def test_fingerprint_haengt_von_den_daten_ab(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        before = [section_fingerprint(s) for s in prepare_report_sections(depot, aggs)]
+        depot.loc[0, "Marktwert (%)"] += 1.0
+        after = [section_fingerprint(s) for s in prepare_report_sections(depot, aggs)]
+        assert before[0] != after[0]  # Depotübersicht
+        assert before[-1] == after[-1]  # Sektor-Treemap nutzt nur den Durchblick
+
+    def test_detail_stufe_der_treemaps_im_cache(self, tmp_path):
+        depot, _, depot_data_chart, aggs = self._result()
+        detail = {"top_n": 1, "min_weight": None}
+        plain = [section_fingerprint(s) for s in prepare_report_sections(depot, aggs, ["sektoren"])]
+        assert plain != [section_fingerprint(s) for s in prepare_report_sections(depot, aggs, ["sektoren"], detail)]
+        (section,) = build_report_sections(depot, aggs, cache_dir=str(tmp_path), sections=["sektoren"], detail=detail)
+        assert "Sonstige" in section["fig_json"]
+        assert "Microsoft Corp." in section["drill_json"]
+
+    def test_auswahl_einzelner_abschnitte(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        specs = prepare_report_sections(depot, aggs, sections=["sektoren", "tabelle"])
+        assert [s["key"] for s in specs] == ["tabelle", "sektoren"]  # Report-Reihenfolge bleibt
+        assert [s["key"] for s in prepare_report_sections(depot, aggs)] == list(REPORT_SECTIONS)
+
+    def test_unbekannter_abschnitt(self):
+        depot, _, depot_data_chart, aggs = self._result()
+        with pytest.raises(ValueError, match="Unbekannte Report-Abschnitte"):
+            prepare_report_sections(depot, aggs, sections=["tabelle", "kuchen"])
+
+
+# ---------------------------------------------------------------------------
+# Tests: analyze_depot
+# ---------------------------------------------------------------------------
+
+
+class TestAnalyzeDepot:
+    def test_fallback_nur_fuer_eigene_ticker(self):
+        result = analyze_depot(_etf_data(), _depot(), _prices(), fallback_used=["BTC", "ETH"])
+        assert result["fallback_used"] == ["BTC"]
+        assert "ETH" not in result["depot_summary"]["⚠️ Fallback-Kurse"]
+
+    def test_ergebnis_enthaelt_alle_auswertungen(self):
+        result = analyze_depot(_etf_data(), _depot(), _prices())
+        for key in (
+            "depot",
+            "depot_data",
+            "depot_data_chart",
+            "depot_data_stocks",
+            "depot_data_etfs",
+            "depot_data_sectors",
+            "depot_data_locations",
+            "depot_summary",
+        ):
+            assert key in result
+
+
+# ---------------------------------------------------------------------------
+# Tests: export_results – Stufen überspringen
+# ---------------------------------------------------------------------------
+
+
+class TestExportResults:
+    def test_nur_excel_baut_keine_figures(self, tmp_path):
+        result = analyze_depot(_etf_data(), _depot(), _prices())
+        with (
+            patch("scripts.analysis.export_to_excel") as excel,
+            patch("scripts.analysis.build_report_sections") as sections,
+        ):
+            report = export_results(result, str(tmp_path / "out.xlsx"), str(tmp_path / "r.html"), sections=[])
+        assert report is None
+        excel.assert_called_once()
+        sections.assert_not_called()
+        assert not (tmp_path / "r.html").exists()
+
+    def test_ohne_excel_nur_gewaehlte_abschnitte(self, tmp_path):
+        result = analyze_depot(_etf_data(), _depot(), _prices())
+        report_file = str(tmp_path / "r.html")
+        with (
+            patch("scripts.analysis.export_to_excel") as excel,
+            patch("scripts.plotting.export_html_report") as html,
+        ):
+            report = export_results(result, None, report_file, open_browser=False, sections=["top20"])
+        assert report == report_file
+        excel.assert_not_called()
+        assert [s["title"] for s in html.call_args.args[0]] == ["Top 20 Positionen – Balken"]
+
+    def test_analysis_import_laedt_kein_plotly(self):
+        code = "import sys, scripts.analysis; print(any(m.startswith('plotly') for m in sys.modules))"
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert proc.stdout.strip() == "False"
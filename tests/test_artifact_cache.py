@@ -0,0 +1,162 @@
+# tests/test_artifact_cache.py
+"""
+Unit Tests für scripts/artifact_cache.py und den gecachten ETF-Universum-Aufbau
+
+Getestet werden:
+- file_digest / artifact_key: inhaltsbasierte Schlüssel
+- cached_artifact: Treffer, Miss, korrupte Datei, Aufräumen alter Artefakte, Single-Flight paralleler Läufe
+- load_etf_universe mit cache_dir: Überspringen der Bereinigung, Invalidierung durch CSV- und Mapping-Änderungen
+"""
+
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pandas as pd
+
+from scripts import artifact_cache
+from scripts.analysis import load_etf_universe
+from scripts.artifact_cache import artifact_key, cached_artifact, file_digest
+from scripts.data_processing import cleaning_fingerprint
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+_CSV = (
+    "Fondsname\n"
+    "Datum\n"
+    "Emittententicker,Name,Sektor,Anlageklasse,Gewichtung (%),Standort\n"
+    'AAPL,Apple Inc.,Information Technology,Aktien,"5,0",United States\n'
+    'MSFT,Microsoft Corp.,Information Technology,Aktien,"3,0",United States\n'
+)
+
+
+def _write_csv(folder, name="Test ETF.csv", content=_CSV):
+    (folder / name).write_text(content, encoding="utf-8")
+    return name
+
+
+# ---------------------------------------------------------------------------
+# Tests: Schlüssel
+# ---------------------------------------------------------------------------
+
+
+class TestSchluessel:
+    def test_file_digest_abhaengig_vom_inhalt(self, tmp_path):
+        a = tmp_path / "a.csv"
+        a.write_text("x", encoding="utf-8")
+        d1 = file_digest(str(a))
+        a.write_text("y", encoding="utf-8")
+        assert file_digest(str(a)) != d1
+
+    def test_file_digest_fehlende_datei(self, tmp_path):
+        assert file_digest(str(tmp_path / "fehlt.csv")) == "missing"
+
+    def test_artifact_key_trennt_bestandteile(self):
+        assert artifact_key("ab", "c") != artifact_key("a", "bc")
+
+    def test_cleaning_fingerprint_reagiert_auf_mapping(self):
+        before = cleaning_fingerprint()
+        with patch.dict("scripts.data_processing.SECTOR_MAPPING", {"Neu": "Technologie"}):
+            assert cleaning_fingerprint() != before
+        assert cleaning_fingerprint() == before
+
+
+# ---------------------------------------------------------------------------
+# Tests: cached_artifact
+# ---------------------------------------------------------------------------
+
+
+class TestCachedArtifact:
+    def test_treffer_ruft_build_nicht_erneut_auf(self, tmp_path):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return pd.DataFrame({"a": [1]})
+
+        cached_artifact(str(tmp_path), "test", "k1", build)
+        result = cached_artifact(str(tmp_path), "test", "k1", build)
+        assert len(calls) == 1
+        assert result["a"].tolist() == [1]
+
+    def test_ohne_cache_dir_immer_build(self, tmp_path):
+        calls = []
+        for _ in range(2):
+            cached_artifact(None, "test", None, lambda: calls.append(1) or "x")
+        assert len(calls) == 2
+
+    def test_korrupte_datei_wird_neu_erstellt(self, tmp_path):
+        cached_artifact(str(tmp_path), "test", "k1", lambda: "alt")
+        (path,) = tmp_path.glob("test-*.pkl")
+        path.write_bytes(b"kaputt")
+        assert cached_artifact(str(tmp_path), "test", "k1", lambda: "neu") == "neu"
+
+    def test_none_wird_nicht_gecacht(self, tmp_path):
+        cached_artifact(str(tmp_path), "test", "k1", lambda: None)
+        assert not list(tmp_path.glob("test-*.pkl"))
+
+    def test_alte_artefakte_werden_aufgeraeumt(self, tmp_path):
+        with patch.object(artifact_cache, "_KEEP_PER_PREFIX", 2):
+            for i in range(4):
+                cached_artifact(str(tmp_path), "test", f"k{i}", lambda i=i: i)
+                path = artifact_cache._artifact_path(str(tmp_path), "test", f"k{i}")
+                os.utime(path, (i, i))
+        assert len(list(tmp_path.glob("test-*.pkl"))) == 2
+
+    def test_parallele_laeufe_bauen_nur_einmal(self, tmp_path):
+        calls, results = [], []
+
+        def _build():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"universum": 1}
+
+        threads = [
+            threading.Thread(target=lambda: results.append(cached_artifact(str(tmp_path), "test", "k", _build)))
+            for _ in range(3)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert results == [{"universum": 1}] * 3
+
+
+# ---------------------------------------------------------------------------
+# Tests: load_etf_universe mit Cache
+# ---------------------------------------------------------------------------
+
+
+class TestLoadEtfUniverseCache:
+    def test_zweiter_lauf_ueberspringt_bereinigung(self, tmp_path):
+        name = _write_csv(tmp_path)
+        cache = str(tmp_path / ".cache")
+        first = load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        with (
+            patch("scripts.analysis.clean_etf_data") as mock_clean,
+            patch("scripts.analysis.read_etf_data") as mock_read,
+        ):
+            second = load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        mock_clean.assert_not_called()
+        mock_read.assert_not_called()
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_geaenderte_csv_invalidiert_cache(self, tmp_path):
+        name = _write_csv(tmp_path)
+        cache = str(tmp_path / ".cache")
+        load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        _write_csv(tmp_path, content=_CSV.replace('"5,0"', '"7,0"'))
+        result = load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        assert result["Gewichtung (%)"].max() == 7.0
+
+    def test_geaendertes_mapping_invalidiert_cache(self, tmp_path):
+        name = _write_csv(tmp_path)
+        cache = str(tmp_path / ".cache")
+        load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        with patch.dict("scripts.data_processing.LOCATION_MAPPING", {"United States": "Vereinigte Staaten"}):
+            result = load_etf_universe(str(tmp_path), [name], cache_dir=cache)
+        assert set(result["Standort"]) == {"Vereinigte Staaten"}
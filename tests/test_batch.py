@@ -0,0 +1,134 @@
+# tests/test_batch.py
+"""
+Unit Tests für scripts/batch.py
+
+Getestet werden:
+- run_batch: Ausgaben je Depot, Zusammenfassung, fehlerhafte Depots, einmaliger Kursdownload, gemeinsame Plotly.js-Datei,
+  Zeitbudget-Markierung, Freigabe des Universums nach sequentiellem Lauf
+- portfolio_names: eindeutige Depot-Namen
+"""
+
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from scripts import batch
+from scripts.batch import portfolio_names, run_batch
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _etf_data():
+    return pd.DataFrame(
+        {
+            "ETF": ["Test ETF", "Test ETF"],
+            "Emittententicker": ["AAPL", "MSFT"],
+            "Name": ["Apple Inc.", "Microsoft Corp."],
+            "Gewichtung (%)": [60.0, 40.0],
+            "Sektor": ["Technologie", "Technologie"],
+            "Standort": ["USA", "USA"],
+        }
+    )
+
+
+def _write_depot(path, cash=100):
+    pd.DataFrame(
+        {
+            "Ticker": ["TST", "BTC", "-"],
+            "Art": ["ETF", "Krypto", "Cash"],
+            "Position": ["Test ETF", "Bitcoin", "Cash"],
+            "Sektor": ["-", "Krypto", "Cash und/oder Derivate"],
+            "Standort": ["-", "Krypto", "Cash (Euro)"],
+            "Anteile": [10, 1, cash],
+        }
+    ).to_excel(path, index=False)
+    return str(path)
+
+
+_PRICES = pd.DataFrame({"Ticker": ["TST", "BTC", "-"], "Kurs": [50.0, 400.0, 1.0]})
+
+
+# ---------------------------------------------------------------------------
+# Tests: run_batch
+# ---------------------------------------------------------------------------
+
+
+class TestRunBatch:
+    def test_schreibt_ausgaben_je_depot_und_zusammenfassung(self, tmp_path):
+        files = [_write_depot(tmp_path / "kunde_a.xlsx"), _write_depot(tmp_path / "kunde_b.xlsx", cash=900)]
+        out = tmp_path / "batch"
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])) as mock_prices:
+            summary = run_batch(files, _etf_data(), str(out), max_workers=1)
+
+        mock_prices.assert_called_once()  # Kurse nur einmal für alle Depots
+        assert list(summary["Depot"]) == ["kunde_a", "kunde_b"]
+        assert (summary["Status"] == "OK").all()
+        assert (out / "kunde_a" / "kunde_a.xlsx").exists()
+        assert (out / "kunde_b" / "portfolio_report.html").exists()
+        assert (out / "batch_summary.xlsx").exists()
+        assert summary.loc[1, "Cash-Anteil (%)"] == pytest.approx(50.0)
+
+    def test_sequentiell_gibt_universum_wieder_frei(self, tmp_path):
+        files = [_write_depot(tmp_path / "a.xlsx")]
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])):
+            run_batch(files, _etf_data(), str(tmp_path / "batch"), max_workers=1)
+        assert batch._UNIVERSE is None
+
+        with patch("scripts.batch.download_stock_price", side_effect=RuntimeError("Netz")), pytest.raises(RuntimeError):
+            run_batch(files, _etf_data(), str(tmp_path / "batch"), max_workers=1)
+        assert batch._UNIVERSE is None
+
+    def test_fehlerhaftes_depot_wird_protokolliert(self, tmp_path):
+        files = [_write_depot(tmp_path / "ok.xlsx"), str(tmp_path / "fehlt.xlsx")]
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])):
+            summary = run_batch(files, _etf_data(), str(tmp_path / "batch"), max_workers=1)
+        assert list(summary["Status"]) == ["OK", "Fehler"]
+        assert "nicht gefunden" in summary.loc[1, "Fehler"]
+
+    def test_fallback_kurse_je_depot(self, tmp_path):
+        files = [_write_depot(tmp_path / "a.xlsx")]
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, ["BTC", "ETH"])):
+            summary = run_batch(files, _etf_data(), str(tmp_path / "batch"), max_workers=1)
+        assert summary.loc[0, "Fallback-Kurse"] == "BTC"
+
+    def test_zeitbudget_markiert_jeden_depot_report(self, tmp_path):
+        from scripts.deadline import run_budget, within_budget
+
+        files = [_write_depot(tmp_path / "a.xlsx"), _write_depot(tmp_path / "b.xlsx")]
+        with (
+            patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])),
+            patch("scripts.batch.export_results") as export,
+            run_budget(0),
+        ):
+            within_budget("Kursabruf", lambda: None)  # Budget bereits abgelaufen → Stufe weicht aus
+            run_batch(files, _etf_data(), str(tmp_path / "batch"), max_workers=1)
+        assert export.call_count == 2
+        for call in export.call_args_list:
+            assert "Kursabruf" in call.args[0]["depot_summary"]["⚠️ Zeitbudget"]
+
+    def test_prozess_pool_liefert_gleiches_ergebnis(self, tmp_path):
+        files = [_write_depot(tmp_path / f"d{i}.xlsx", cash=100 * (i + 1)) for i in range(3)]
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])):
+            seq = run_batch(files, _etf_data(), str(tmp_path / "seq"), max_workers=1)
+            par = run_batch(files, _etf_data(), str(tmp_path / "par"), max_workers=2)
+        cols = ["Depot", "Gesamtwert (€)", "HHI (0–100)", "Cash-Anteil (%)"]
+        pd.testing.assert_frame_equal(seq[cols], par[cols])
+
+    def test_shared_plotlyjs_einmal_fuer_alle_depots(self, tmp_path):
+        files = [_write_depot(tmp_path / "a.xlsx"), _write_depot(tmp_path / "b.xlsx")]
+        out = tmp_path / "batch"
+        with patch("scripts.batch.download_stock_price", return_value=(_PRICES, [])):
+            run_batch(files, _etf_data(), str(out), max_workers=1, excel=False, plotlyjs="shared")
+        assets = list(out.glob("plotly-*.min.js"))
+        assert len(assets) == 1
+        for name in ("a", "b"):
+            html = (out / name / "portfolio_report.html").read_text(encoding="utf-8")
+            assert f'src="../{assets[0].name}"' in html
+
+
+class TestPortfolioNames:
+    def test_namensgleiche_dateien_werden_nummeriert(self):
+        assert portfolio_names(["a/depot.xlsx", "b/depot.xlsx", "c/x.xlsx"]) == ["depot", "depot_2", "x"]
@@ -0,0 +1,137 @@
+# tests/test_benchmarks.py
+"""
+Unit Tests für benchmarks/synthetic.py und benchmarks/run.py
+
+Getestet werden:
+- generate_universe: CSVs im iShares-Format, lesbar mit read_etf_data, Artefakte durch clean_etf_data aufgelöst
+- generate_depot: Depot-Excel lesbar mit load_depot, Kurse decken alle Positionen ab
+- run_benchmarks: Ergebnis-JSON je Skala und Stufe, Depots mit vielen Direktpositionen
+- compare_results: Abweichung und Regressions-Markierung
+"""
+
+import json
+import os
+
+import pytest
+
+from benchmarks.run import DIRECT_POSITIONS, compare_results, format_results, latest_result, run_benchmarks
+from benchmarks.synthetic import generate_depot, generate_fund, generate_universe
+from scripts.analysis import load_depot, price_depot
+from scripts.data_processing import LOCATION_MAPPING, SECTOR_MAPPING, clean_etf_data
+from scripts.file_handling import read_etf_data
+
+# ---------------------------------------------------------------------------
+# Tests: Datengenerator
+# ---------------------------------------------------------------------------
+
+
+class TestGenerateUniverse:
+    def test_csvs_lesbar_und_bereinigbar(self, tmp_path):
+        files = generate_universe(str(tmp_path), funds=3, holdings_per_fund=200, seed=1)
+        assert len(files) == 3
+
+        raw = read_etf_data(os.path.join(tmp_path, files[0]))
+        assert raw["ETF"].iloc[0] == "Synthetic ETF 000"
+        assert len(raw) == 204  # 200 Aktien + 4 Cash-/Derivate-Zeilen
+
+        clean = clean_etf_data(raw)
+        assert len(clean) == 200
+        assert not clean["Sektor"].isin(SECTOR_MAPPING.keys() - set(SECTOR_MAPPING.values())).any()
+        assert not clean["Standort"].isin(LOCATION_MAPPING.keys() - set(LOCATION_MAPPING.values())).any()
+        assert not clean["Name"].str.contains("\xa0|​").any()
+
+    def test_gleicher_seed_gleiche_daten(self):
+        a = generate_fund(50, seed=7)
+        b = generate_fund(50, seed=7)
+        assert a.equals(b)
+        assert not a.equals(generate_fund(50, seed=8))
+
+    def test_fonds_ueberschneiden_sich(self, tmp_path):
+        files = generate_universe(str(tmp_path), funds=2, holdings_per_fund=100, overlap=1.0)
+        names = [set(read_etf_data(os.path.join(tmp_path, f))["Emittententicker"]) for f in files]
+        assert names[0] == names[1]
+
+    def test_eigene_verteilung(self):
+        df = generate_fund(30, sector_distribution={"Energy": 1.0}, non_equity_rows=0)
+        assert set(df["Sektor"]) == {"Energy"}
+
+
+class TestGenerateDepot:
+    def test_depot_excel_und_kurse(self, tmp_path):
+        files = generate_universe(str(tmp_path), funds=2, holdings_per_fund=10)
+        path = os.path.join(tmp_path, "depot.xlsx")
+        _, prices = generate_depot(files, path=path, stocks=3, crypto=1)
+
+        depot = load_depot(path)
+        assert list(depot["Art"].value_counts().sort_index().items()) == [
+            ("Aktie", 3),
+            ("Cash", 1),
+            ("ETF", 2),
+            ("Krypto", 1),
+        ]
+        priced, vollstaendig = price_depot(depot, prices)
+        assert vollstaendig
+        assert priced["Marktwert (%)"].sum() == pytest.approx(100.0)
+
+
+# ---------------------------------------------------------------------------
+# Tests: Benchmark-Runner
+# ---------------------------------------------------------------------------
+
+
+class TestRunBenchmarks:
+    def test_ergebnis_json_je_stufe(self, tmp_path):
+        report, path = run_benchmarks(["xs"], repeat=1, output_dir=str(tmp_path))
+        results = report["scales"]["xs"]["results"]
+        assert {"read_etf_data", "clean_etf_data", "build_aggregations", "export_html_report"} <= set(results)
+        assert any(name.startswith("figure:") for name in results)
+        assert all(r["median_s"] >= 0 for r in results.values())
+        assert {"export_html_report:gzip", "first_chart:json", "first_chart:gzip"} <= set(results)
+        sizes = report["scales"]["xs"]["report_bytes"]
+        assert 0 < sizes["gzip"] < sizes["json"]
+
+        with open(path, encoding="utf-8") as f:
+            assert json.load(f)["scales"]["xs"]["funds"] == 1
+        assert latest_result(str(tmp_path)) == path
+        assert latest_result(str(tmp_path), exclude=path) is None
+
+    def test_only_misst_nur_ausgewaehlte_stufen(self, tmp_path):
+        report, _ = run_benchmarks(["xs"], repeat=1, only={"clean_etf_data"}, output_dir=None)
+        assert set(report["scales"]["xs"]["results"]) == {"clean_etf_data"}
+
+    def test_direktpositionen_je_skala(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(DIRECT_POSITIONS, "xs", (300, 50))
+        report, _ = run_benchmarks(["xs"], repeat=1, only={"build_depot_data", "direct_chart_rows"}, output_dir=None)
+        data = report["scales"]["xs"]
+        assert (data["stocks"], data["crypto"]) == (300, 50)
+        assert set(data["results"]) == {"build_depot_data", "direct_chart_rows"}
+        assert "300 Aktien, 50 Krypto" in format_results(report)
+
+    def test_unbekannte_skala(self):
+        with pytest.raises(ValueError, match="Skala"):
+            run_benchmarks(["riesig"], output_dir=None)
+
+
+class TestCompareResults:
+    def test_regression_ueber_schwelle(self):
+        def _report(read_s, clean_s):
+            return {
+                "scales": {
+                    "xs": {
+                        "results": {
+                            "read_etf_data": {"median_s": read_s},
+                            "clean_etf_data": {"median_s": clean_s},
+                        }
+                    }
+                }
+            }
+
+        rows = compare_results(_report(0.13, 0.09), _report(0.10, 0.10), threshold=20.0)
+        by_name = {r["benchmark"]: r for r in rows}
+        assert by_name["read_etf_data"]["delta_pct"] == 30.0
+        assert by_name["read_etf_data"]["regression"]
+        assert not by_name["clean_etf_data"]["regression"]
+
+    def test_fehlende_stufe_im_vergleichslauf_ignoriert(self):
+        current = {"scales": {"xs": {"results": {"neu": {"median_s": 1.0}}}}}
+        assert compare_results(current, {"scales": {}}) == []
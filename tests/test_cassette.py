@@ -0,0 +1,154 @@
+# tests/test_cassette.py
+"""
+Unit Tests für scripts/cassette.py
+
+Getestet werden:
+- use_cassette: Record schreibt die Kassette, Replay bedient ohne Netzwerk, ungültiger Modus, parallele Aufnahmen
+- http_get / download_csv_if_old: CSV-Mitschnitt und -Wiedergabe, fehlender Mitschnitt
+- yf_download / download_stock_price: identische Kurse im Replay, simulierte Latenz
+"""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from scripts.cassette import CassetteMiss, _frame_from_dict, _frame_to_dict, http_get, use_cassette, yf_download
+from scripts.data_download import download_csv_if_old, download_stock_price
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _session(text="csv inhalt"):
+    response = MagicMock()
+    response.status_code = 200
+    response.text = text
+    session = MagicMock()
+    session.get.return_value = response
+    return session
+
+
+def _yf_frame(tickers):
+    """yfinance-typisches Ergebnis: DatetimeIndex, MultiIndex-Spalten (Price, Ticker)."""
+    columns = pd.MultiIndex.from_product([["Close", "Open"], tickers], names=["Price", "Ticker"])
+    index = pd.DatetimeIndex(["2025-01-02", "2025-01-03"], name="Date")
+    data = [[100.0 + i for i in range(len(columns))], [float("nan")] + [110.0] * (len(columns) - 1)]
+    return pd.DataFrame(data, index=index, columns=columns)
+
+
+def _depot():
+    return pd.DataFrame({"Ticker": ["SAP.DE", "EUNL.DE", "BTC-EUR"], "Art": ["Aktie", "ETF", "Krypto"]})
+
+
+# ---------------------------------------------------------------------------
+# Tests: use_cassette / http_get
+# ---------------------------------------------------------------------------
+
+
+class TestHttpCassette:
+    def test_record_und_replay(self, tmp_path):
+        path = str(tmp_path / "cassette.json")
+        with use_cassette(path, "record") as stats:
+            assert http_get(_session("a,b\n1,2"), "https://example.com/etf.csv").text == "a,b\n1,2"
+        assert stats["recorded"] == 1
+
+        offline = MagicMock()
+        offline.get.side_effect = AssertionError("Netzwerkaufruf im Replay")
+        with use_cassette(path, "replay") as stats:
+            response = http_get(offline, "https://example.com/etf.csv")
+            response.raise_for_status()
+        assert response.text == "a,b\n1,2"
+        assert stats == {"hits": 1, "misses": 0, "recorded": 0}
+
+    def test_parallele_aufnahmen_gehen_nicht_verloren(self, tmp_path):
+        path = str(tmp_path / "cassette.json")
+        with use_cassette(path, "record"):  # Lauf A
+            http_get(_session("a"), "https://example.com/a.csv")
+            with use_cassette(path, "record"):  # Lauf B startet vor dem Speichern von A
+                http_get(_session("b"), "https://example.com/b.csv")
+        with use_cassette(path, "replay") as stats:
+            assert http_get(MagicMock(), "https://example.com/a.csv").text == "a"
+            assert http_get(MagicMock(), "https://example.com/b.csv").text == "b"
+        assert stats["hits"] == 2
+        assert sorted(os.listdir(tmp_path)) == ["cassette.json", "cassette.json.lock"]
+
+    def test_fehlender_mitschnitt(self, tmp_path):
+        with use_cassette(str(tmp_path / "leer.json"), "replay"), pytest.raises(CassetteMiss):
+            http_get(MagicMock(), "https://example.com/unbekannt.csv")
+
+    def test_ohne_kassette_direkter_aufruf(self):
+        session = _session()
+        http_get(session, "https://example.com/x.csv", timeout=5)
+        session.get.assert_called_once_with("https://example.com/x.csv", timeout=5)
+
+    def test_ungueltiger_modus(self, tmp_path):
+        with pytest.raises(ValueError, match="Kassetten-Modus"), use_cassette(str(tmp_path / "c.json"), "live"):
+            pass
+
+    def test_download_csv_replay_ueberschreibt_aktuelle_datei(self, tmp_path):
+        path = str(tmp_path / "cassette.json")
+        csv_dir = tmp_path / "csv"
+        csv_dir.mkdir()
+        with (
+            patch("scripts.data_download._create_retry_session", return_value=_session("mitschnitt")),
+            use_cassette(path, "record"),
+        ):
+            download_csv_if_old(["https://example.com/etf.csv"], str(csv_dir), ["ETF.csv"])
+
+        (csv_dir / "ETF.csv").write_text("lokal geändert", encoding="utf-8")
+        with (
+            patch("scripts.data_download._create_retry_session") as mock_session,
+            use_cassette(path, "replay"),
+        ):
+            download_csv_if_old(["https://example.com/etf.csv"], str(csv_dir), ["ETF.csv"])
+        mock_session.return_value.get.assert_not_called()
+        assert (csv_dir / "ETF.csv").read_text(encoding="utf-8") == "mitschnitt"
+
+
+# ---------------------------------------------------------------------------
+# Tests: yf_download / download_stock_price
+# ---------------------------------------------------------------------------
+
+
+class TestYfinanceCassette:
+    def test_frame_round_trip(self):
+        df = _yf_frame(["SAP.DE", "EUNL.DE"])
+        pd.testing.assert_frame_equal(_frame_from_dict(_frame_to_dict(df)), df)
+
+    def test_replay_identische_kurse(self, tmp_path):
+        path = str(tmp_path / "cassette.json")
+        fallback = str(tmp_path / "fallback.json")
+
+        def _download(tickers, **kwargs):
+            return _yf_frame(tickers if isinstance(tickers, list) else [tickers])
+
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", fallback),
+            patch("scripts.data_download.yf.download", side_effect=_download),
+            use_cassette(path, "record"),
+        ):
+            recorded, _ = download_stock_price(_depot(), [".DE"], ["-EUR"])
+
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", fallback),
+            patch("scripts.data_download.yf.download", side_effect=AssertionError("Netzwerkaufruf im Replay")),
+            use_cassette(path, "replay") as stats,
+        ):
+            replayed, fallback_used = download_stock_price(_depot(), [".DE"], ["-EUR"])
+
+        pd.testing.assert_frame_equal(replayed, recorded)
+        assert fallback_used == []
+        assert stats["misses"] == 0
+
+    @pytest.mark.parametrize("latency, expected", [(0.25, 0.25), ("recorded", 1.5)])
+    def test_simulierte_latenz(self, tmp_path, latency, expected):
+        path = str(tmp_path / "cassette.json")
+        with patch("scripts.cassette.time.perf_counter", side_effect=[10.0, 11.5]), use_cassette(path, "record"):
+            yf_download(lambda t, **kw: _yf_frame([t]), "SAP.DE")
+
+        with patch("scripts.cassette.time.sleep") as sleep, use_cassette(path, "replay", latency=latency):
+            yf_download(MagicMock(), "SAP.DE")
+        sleep.assert_called_once_with(expected)
@@ -5,18 +5,31 @@ Unit Tests für scripts/data_download.py
 Getestet werden:
 - _load_fallback / _save_fallback: JSON-Persistenz
 - download_stock_price: Fallback-Logik (gemockt, kein echter Netzwerkaufruf)
+- load_fallback_prices: Offline-Kurse ohne yFinance
 - download_csv_if_old: Alter-Check und Verzeichnis-Validierung
+- Zeitbudget: hängender Kursabruf bzw. CSV-Download weicht auf Fallback-Kurse bzw. vorhandene Dateien aus
+- Parallele Läufe: ein Download je CSV bzw. Kursabruf (Single-Flight), atomare Fallback-JSON,
+  gleichzeitiger Abruf disjunkter Ticker
 """
 
 import json
 import logging
 import os
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pandas as pd
 import pytest
 
-from scripts.data_download import _load_fallback, _save_fallback, download_csv_if_old, download_stock_price
+from scripts.data_download import (
+    _load_fallback,
+    _save_fallback,
+    download_csv_if_old,
+    download_stock_price,
+    load_fallback_prices,
+)
+from scripts.deadline import degraded_stages, run_budget
 
 # ---------------------------------------------------------------------------
 # Tests: _load_fallback / _save_fallback
@@ -204,3 +217,163 @@ class TestDownloadStockPriceFallback:
             saved = json.load(f)
         # Mindestens eine der Positionen sollte gespeichert sein (je nach yf-Response-Format)
         assert isinstance(saved, dict)
+
+
+# ---------------------------------------------------------------------------
+# Tests: load_fallback_prices (Offline-Modus)
+# ---------------------------------------------------------------------------
+
+
+class TestLoadFallbackPrices:
+    def test_kurse_nur_aus_fallback_json(self, tmp_path):
+        json_path = str(tmp_path / "fallback.json")
+        depot = pd.DataFrame({"Art": ["Aktie", "Krypto", "Aktie"], "Ticker": ["AAPL.DE", "BTC-EUR", "NEU"]})
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", json_path),
+            patch("scripts.data_download.yf.download", side_effect=AssertionError("Netzwerkaufruf offline")),
+        ):
+            _save_fallback({"AAPL": 150.0, "BTC": 45000.0})
+            prices, fallback_used = load_fallback_prices(depot)
+
+        assert fallback_used == ["AAPL", "BTC"]
+        kurse = dict(zip(prices["Ticker"], prices["Kurs"], strict=True))
+        assert kurse["AAPL"] == 150.0
+        assert kurse["-"] == 1.0  # Cash
+        assert pd.isna(kurse["NEU"])
+
+
+# ---------------------------------------------------------------------------
+# Tests: Zeitbudget (run_budget)
+# ---------------------------------------------------------------------------
+
+
+class TestZeitbudget:
+    def test_haengender_kursabruf_nutzt_fallback(self, tmp_path):
+        json_path = str(tmp_path / "fallback.json")
+        depot = pd.DataFrame({"Art": ["Aktie", "Krypto"], "Ticker": ["AAPL", "BTC"]})
+
+        def _haengt(*args, **kwargs):
+            time.sleep(2)
+            return pd.DataFrame()
+
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", json_path),
+            patch("scripts.data_download.yf.download", side_effect=_haengt),
+            run_budget(0.2),
+        ):
+            _save_fallback({"AAPL": 150.0, "BTC": 45000.0})
+            t0 = time.monotonic()
+            prices, fallback_used = download_stock_price(depot)
+            elapsed = time.monotonic() - t0
+            stages = degraded_stages()
+
+        assert elapsed < 1.5
+        assert fallback_used == ["AAPL", "BTC"]
+        assert stages == ["Kursabruf"]
+        assert dict(zip(prices["Ticker"], prices["Kurs"], strict=True))["AAPL"] == 150.0
+
+    def test_abgelaufenes_budget_behaelt_vorhandene_csv(self, tmp_path, caplog):
+        csv_file = tmp_path / "test.csv"
+        csv_file.write_text("alt")
+        os.utime(csv_file, (0, 0))  # veraltet → würde normalerweise neu geladen
+        mock_session = MagicMock()
+        with (
+            patch("scripts.data_download._create_retry_session", return_value=mock_session),
+            caplog.at_level(logging.WARNING),
+            run_budget(0),
+        ):
+            download_csv_if_old(["https://example.com/test.csv"], str(tmp_path), ["test.csv"])
+            stages = degraded_stages()
+
+        mock_session.get.assert_not_called()
+        assert csv_file.read_text() == "alt"
+        assert stages == ["CSV-Download"]
+        assert "Zeitbudget" in caplog.text
+
+
+# ---------------------------------------------------------------------------
+# Tests: parallele Läufe (Sperren, Single-Flight)
+# ---------------------------------------------------------------------------
+
+
+def _parallel(fn, n=3):
+    """Startet fn n-mal gleichzeitig in Threads (eigene Sperr-Handles wie getrennte Prozesse)."""
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class TestParalleleLaeufe:
+    def test_csv_wird_nur_einmal_geladen(self, tmp_path):
+        def _get(*args, **kwargs):
+            time.sleep(0.2)
+            return MagicMock(text="Inhalt", raise_for_status=MagicMock())
+
+        mock_session = MagicMock()
+        mock_session.get.side_effect = _get
+        with patch("scripts.data_download._create_retry_session", return_value=mock_session):
+            _parallel(lambda: download_csv_if_old(["https://example.com/a.csv"], str(tmp_path), ["a.csv"]))
+
+        assert mock_session.get.call_count == 1
+        assert (tmp_path / "a.csv").read_text(encoding="utf-8") == "Inhalt"
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_kurse_werden_nur_einmal_abgerufen(self, tmp_path):
+        json_path = str(tmp_path / "fallback.json")
+        depot = pd.DataFrame({"Art": ["Aktie", "Aktie"], "Ticker": ["AAPL", "MSFT"]})
+        close = pd.DataFrame({"AAPL.DE": [155.0], "MSFT.DE": [400.0]}, index=[pd.Timestamp("2024-01-15")])
+        close.columns = pd.MultiIndex.from_tuples([("Close", "AAPL.DE"), ("Close", "MSFT.DE")])
+        calls = []
+
+        def _download(*args, **kwargs):
+            calls.append(args)
+            time.sleep(0.2)
+            return close
+
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", json_path),
+            patch("scripts.data_download.yf.download", side_effect=_download),
+        ):
+            results = _parallel(lambda: download_stock_price(depot))
+            # späterer Lauf übernimmt keine alten Kurse, sondern fragt erneut an
+            download_stock_price(depot)
+
+        assert len(calls) == 2
+        for prices, fallback_used in results:
+            assert dict(zip(prices["Ticker"], prices["Kurs"], strict=True)) == {"AAPL": 155.0, "MSFT": 400.0, "-": 1.0}
+            assert fallback_used == []
+        with open(json_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert (saved["AAPL"], saved["MSFT"]) == (155.0, 400.0)
+
+    def test_disjunkte_ticker_werden_gleichzeitig_abgerufen(self, tmp_path):
+        json_path = str(tmp_path / "fallback.json")
+        started = {"AAPL.DE": threading.Event(), "MSFT.DE": threading.Event()}
+        overlapped = []
+
+        def _download(tickers, *args, **kwargs):
+            ticker = tickers[0]
+            started[ticker].set()
+            other = next(e for t, e in started.items() if t != ticker)
+            # Mit einer gemeinsamen Sperre käme der zweite Abruf erst nach dem ersten an
+            overlapped.append(other.wait(timeout=2))
+            close = pd.DataFrame({ticker: [100.0]}, index=[pd.Timestamp("2024-01-15")])
+            close.columns = pd.MultiIndex.from_tuples([("Close", ticker)])
+            return close
+
+        depots = iter([pd.DataFrame({"Art": ["Aktie"], "Ticker": [t]}) for t in ("AAPL", "MSFT")])
+        with (
+            patch("scripts.data_download._FALLBACK_JSON", json_path),
+            patch("scripts.data_download.yf.download", side_effect=_download),
+        ):
+            results = _parallel(lambda: download_stock_price(next(depots)), n=2)
+
+        assert overlapped == [True, True]
+        assert all(fallback_used == [] for _, fallback_used in results)
+        with open(json_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        assert (saved["AAPL"], saved["MSFT"]) == (100.0, 100.0)
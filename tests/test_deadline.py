@@ -0,0 +1,60 @@
+# tests/test_deadline.py
+"""
+Unit Tests für scripts/deadline.py
+
+Getestet werden:
+- within_budget ohne Budget, innerhalb des Budgets, bei Zeitüberschreitung und nach Ablauf
+- Exceptions aus dem Aufruf, Zurücksetzen des Budgets nach run_budget
+"""
+
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from scripts.deadline import degraded_stages, remaining, run_budget, within_budget
+
+# ---------------------------------------------------------------------------
+# Tests: within_budget
+# ---------------------------------------------------------------------------
+
+
+class TestWithinBudget:
+    def test_ohne_budget_direkter_aufruf(self):
+        assert remaining() is None
+        assert within_budget("Kursabruf", lambda x: x * 2, 21) == 42
+        assert degraded_stages() == []
+
+    def test_innerhalb_des_budgets(self):
+        with run_budget(5):
+            assert within_budget("Kursabruf", lambda: "live", default="fallback") == "live"
+            assert degraded_stages() == []
+
+    def test_zeitueberschreitung_liefert_default(self):
+        with run_budget(0.1):
+            t0 = time.monotonic()
+            value = within_budget("Kursabruf", time.sleep, 2, default="fallback")
+            assert time.monotonic() - t0 < 1
+            assert value == "fallback"
+            assert degraded_stages() == ["Kursabruf"]
+
+    def test_abgelaufenes_budget_ruft_nicht_mehr_auf(self):
+        fn = MagicMock()
+        with run_budget(0):
+            assert within_budget("CSV-Download", fn, default=None) is None
+            assert within_budget("CSV-Download", fn, default=None) is None
+            assert degraded_stages() == ["CSV-Download"]
+        fn.assert_not_called()
+
+    def test_exception_wird_weitergereicht(self):
+        def _fehler():
+            raise ConnectionError("Netz weg")
+
+        with run_budget(5), pytest.raises(ConnectionError, match="Netz weg"):
+            within_budget("Kursabruf", _fehler)
+
+    def test_budget_wird_zurueckgesetzt(self):
+        with run_budget(0):
+            within_budget("Kursabruf", lambda: None)
+        assert remaining() is None
+        assert degraded_stages() == []
@@ -0,0 +1,121 @@
+# tests/test_file_lock.py
+"""
+Unit Tests für scripts/file_lock.py
+
+Getestet werden:
+- file_lock: Ausschluss zwischen Prozessen und Threads, Timeout, Freigabe
+- atomic_write_text / atomic_writer: keine halben Dateien, keine Reste bei Fehlern, Schreiben in Teilen, binär
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from scripts.file_lock import LockTimeout, atomic_write_text, atomic_writer, file_lock
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_HOLD_SCRIPT = """
+import sys, time
+from scripts.file_lock import file_lock
+with file_lock(sys.argv[1]):
+    print("gesperrt", flush=True)
+    time.sleep(float(sys.argv[2]))
+"""
+
+# ---------------------------------------------------------------------------
+# Tests: file_lock
+# ---------------------------------------------------------------------------
+
+
+class TestFileLock:
+    def test_anderer_prozess_haelt_sperre(self, tmp_path):
+        lock = str(tmp_path / "csv" / "etf.csv.lock")
+        proc = subprocess.Popen(
+            [sys.executable, "-c", _HOLD_SCRIPT, lock, "1.0"],
+            env={**os.environ, "PYTHONPATH": PROJECT_ROOT},
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            assert proc.stdout.readline().strip() == "gesperrt"
+            with pytest.raises(LockTimeout), file_lock(lock, timeout=0.1):
+                pass
+            t0 = time.monotonic()
+            with file_lock(lock, timeout=10):
+                waited = time.monotonic() - t0
+        finally:
+            proc.wait(timeout=10)
+        assert waited > 0.3  # erst nach Ende des anderen Prozesses frei
+
+    def test_threads_schliessen_sich_aus(self, tmp_path):
+        lock = str(tmp_path / "x.lock")
+        active, overlaps = [], []
+
+        def _worker():
+            with file_lock(lock):
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.02)
+                active.pop()
+
+        threads = [threading.Thread(target=_worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert overlaps == [1, 1, 1, 1]
+
+    def test_freigabe_nach_exception(self, tmp_path):
+        lock = str(tmp_path / "x.lock")
+        with pytest.raises(RuntimeError), file_lock(lock):
+            raise RuntimeError("Fehler im Block")
+        with file_lock(lock, timeout=0):
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Tests: atomic_write_text / atomic_writer
+# ---------------------------------------------------------------------------
+
+
+class TestAtomicWriteText:
+    def test_schreibt_und_ersetzt(self, tmp_path):
+        path = tmp_path / "a.json"
+        atomic_write_text(str(path), "alt")
+        atomic_write_text(str(path), "neu")
+        assert path.read_text(encoding="utf-8") == "neu"
+        assert os.listdir(tmp_path) == ["a.json"]
+
+    def test_fehler_laesst_original_und_keine_reste(self, tmp_path):
+        path = tmp_path / "a.json"
+        path.write_text("alt", encoding="utf-8")
+        with pytest.raises(UnicodeEncodeError):
+            atomic_write_text(str(path), "\udcff", encoding="utf-8")
+        assert path.read_text(encoding="utf-8") == "alt"
+        assert os.listdir(tmp_path) == ["a.json"]
+
+    def test_in_teilen_erst_am_ende_sichtbar(self, tmp_path):
+        path = tmp_path / "r.html"
+        path.write_text("alt", encoding="utf-8")
+        with atomic_writer(str(path)) as f:
+            f.write("<html>")
+            assert path.read_text(encoding="utf-8") == "alt"
+            f.write("</html>")
+        assert path.read_text(encoding="utf-8") == "<html></html>"
+        with pytest.raises(RuntimeError), atomic_writer(str(path)) as f:
+            f.write("halb")
+            raise RuntimeError("Abbruch")
+        assert path.read_text(encoding="utf-8") == "<html></html>"
+        assert os.listdir(tmp_path) == ["r.html"]
+
+    def test_binaer_ohne_encoding(self, tmp_path):
+        path = tmp_path / "a.pkl"
+        with atomic_writer(str(path), encoding=None) as f:
+            f.write(b"\x80\x05")
+        assert path.read_bytes() == b"\x80\x05"
+        assert os.listdir(tmp_path) == ["a.pkl"]
@@ -0,0 +1,87 @@
+# tests/test_import_time.py
+"""
+Unit Tests für benchmarks/import_time.py und scripts/lazy_import.py
+
+Getestet werden:
+- parse_importtime: Auswertung der `python -X importtime`-Ausgabe
+- Import-Budgets: main.py startet ohne pandas/plotly/yfinance und innerhalb von IMPORT_BUDGETS_MS
+- Pipeline-Module laden yfinance, plotly.express und requests erst in der Stufe, die sie braucht
+- lazy_module: verzögerter Import, patch-Fähigkeit, fehlende Module
+"""
+
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks.import_time import HEAVY_MODULES, IMPORT_BUDGETS_MS, heavy_imports, measure_import, parse_importtime
+from scripts.lazy_import import lazy_module
+
+# ---------------------------------------------------------------------------
+# Tests: parse_importtime
+# ---------------------------------------------------------------------------
+
+
+class TestParseImporttime:
+    def test_eigen_und_kumulierte_zeit(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   json.decoder\n"
+            "import time:       300 |        420 | json\n"
+            "irgendeine andere Ausgabe\n"
+        )
+        assert parse_importtime(stderr) == {"json.decoder": (120, 120), "json": (300, 420)}
+
+
+# ---------------------------------------------------------------------------
+# Tests: Import-Budgets (frischer Interpreter je Messung)
+# ---------------------------------------------------------------------------
+
+
+class TestImportBudgets:
+    @pytest.mark.parametrize("module", list(IMPORT_BUDGETS_MS))
+    def test_innerhalb_des_budgets_ohne_schwere_bibliotheken(self, module):
+        result = measure_import(module, repeat=3)
+        assert heavy_imports(result) == []
+        assert result["total_ms"] <= IMPORT_BUDGETS_MS[module], (
+            f"{module}: {result['total_ms']} ms > Budget {IMPORT_BUDGETS_MS[module]} ms"
+        )
+
+    @pytest.mark.parametrize("module", ["scripts.analysis", "scripts.data_download", "scripts.batch"])
+    def test_pipeline_module_laden_stufenspezifische_bibliotheken_verzoegert(self, module):
+        result = measure_import(module, repeat=1)
+        assert {"yfinance", "plotly.express", "requests"}.isdisjoint(result["imports"])
+
+    def test_schwere_bibliotheken_bekannt(self):
+        assert {"pandas", "plotly.express", "yfinance"} <= set(HEAVY_MODULES)
+
+
+# ---------------------------------------------------------------------------
+# Tests: lazy_module
+# ---------------------------------------------------------------------------
+
+
+class TestLazyModule:
+    def test_bereits_geladenes_modul_unveraendert(self):
+        import json
+
+        assert lazy_module("json") is json
+
+    def test_import_erst_beim_attributzugriff(self):
+        sys.modules.pop("colorsys", None)
+        with patch.dict(sys.modules):
+            module = lazy_module("colorsys")
+            assert type(module).__name__ == "_LazyModule"
+            assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+            assert type(module).__name__ == "module"
+
+    def test_patch_auf_lazy_modul(self):
+        from scripts import data_download
+
+        with patch("scripts.data_download.yf.download", return_value="gemockt"):
+            assert data_download.yf.download() == "gemockt"
+        assert data_download.yf.download != "gemockt"
+
+    def test_fehlendes_modul(self):
+        with pytest.raises(ModuleNotFoundError):
+            lazy_module("gibt_es_nicht_123")
@@ -0,0 +1,134 @@
+# tests/test_incremental.py
+"""
+Unit Tests für scripts/incremental.py
+
+Getestet werden:
+- depot_structure_digest: Anteile ändern den Fingerprint nicht, Positionen schon
+- apply_look_through: identische Tabellen wie build_depot_data bei geänderten Kursen
+- analyze_depot_incremental: Universum wird nur bei Cache-Miss geladen, Ergebnis wie analyze_depot
+"""
+
+import pandas as pd
+import pytest
+
+from scripts.analysis import analyze_depot, build_depot_data, price_depot
+from scripts.incremental import (
+    analyze_depot_incremental,
+    apply_look_through,
+    build_look_through,
+    depot_structure_digest,
+)
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _etf_data():
+    return pd.DataFrame(
+        {
+            "ETF": ["Test ETF", "Test ETF", "Anderer ETF"],
+            "Emittententicker": ["AAPL", "MSFT", "NVDA"],
+            "Name": ["Apple Inc.", "Microsoft Corp.", "NVIDIA Corp."],
+            "Gewichtung (%)": [60.0, 40.0, 100.0],
+            "Sektor": ["Technologie", "Technologie", "Technologie"],
+            "Standort": ["USA", "USA", "USA"],
+        }
+    )
+
+
+def _depot():
+    return pd.DataFrame(
+        {
+            "Ticker": ["TST.DE", "SAP", "BTC", "-"],
+            "Art": ["ETF", "Aktie", "Krypto", "Cash"],
+            "Position": ["Test ETF", "SAP SE", "Bitcoin", "Cash"],
+            "Sektor": ["-", "Technologie", "Krypto", "Cash und/oder Derivate"],
+            "Standort": ["-", "Deutschland", "Krypto", "Cash (Euro)"],
+            "Anteile": [10, 1, 1, 100],
+        }
+    )
+
+
+def _prices(**kurse):
+    prices = {"TST": 50.0, "SAP": 200.0, "BTC": 200.0, "-": 1.0, **kurse}
+    return pd.DataFrame({"Ticker": list(prices), "Kurs": list(prices.values())})
+
+
+# ---------------------------------------------------------------------------
+# Tests: depot_structure_digest
+# ---------------------------------------------------------------------------
+
+
+class TestDepotStructureDigest:
+    def test_anteile_aendern_fingerprint_nicht(self):
+        assert depot_structure_digest(_depot()) == depot_structure_digest(_depot().assign(Anteile=[1, 2, 3, 4]))
+
+    def test_neue_position_aendert_fingerprint(self):
+        depot = _depot()
+        depot.loc[1, "Position"] = "Siemens AG"
+        assert depot_structure_digest(depot) != depot_structure_digest(_depot())
+
+
+# ---------------------------------------------------------------------------
+# Tests: build_look_through / apply_look_through
+# ---------------------------------------------------------------------------
+
+
+class TestApplyLookThrough:
+    @pytest.mark.parametrize(
+        "kurse",
+        [{}, {"TST": 80.0, "SAP": 150.0}, {"BTC": 0.0}, {"-": 0.0}],
+        ids=["unveraendert", "kursaenderung", "krypto_ohne_wert", "cash_ohne_wert"],
+    )
+    def test_identisch_zu_build_depot_data(self, kurse):
+        model_depot, _ = price_depot(_depot(), _prices())
+        model = build_look_through(_etf_data(), model_depot)
+
+        depot, _ = price_depot(_depot(), _prices(**kurse))
+        expected = build_depot_data(_etf_data(), depot)
+        actual = apply_look_through(model, depot)
+        for exp, act in zip(expected, actual, strict=True):
+            pd.testing.assert_frame_equal(act, exp)
+
+    def test_etf_ausserhalb_des_depots_bleibt_bei_null(self):
+        depot, _ = price_depot(_depot(), _prices())
+        depot_data, _ = apply_look_through(build_look_through(_etf_data(), depot), depot)
+        assert depot_data.loc[depot_data["ETF"] == "Anderer ETF", "relative Gewichtung (%)"].iloc[0] == 0.0
+
+
+# ---------------------------------------------------------------------------
+# Tests: analyze_depot_incremental
+# ---------------------------------------------------------------------------
+
+
+class TestAnalyzeDepotIncremental:
+    def test_universum_nur_bei_cache_miss_geladen(self, tmp_path):
+        calls = []
+
+        def _load():
+            calls.append(1)
+            return _etf_data()
+
+        analyze_depot_incremental(str(tmp_path), "u1", _load, _depot(), _prices())
+        result = analyze_depot_incremental(str(tmp_path), "u1", _load, _depot(), _prices(TST=70.0))
+        assert len(calls) == 1
+
+        expected = analyze_depot(_etf_data(), _depot(), _prices(TST=70.0))
+        pd.testing.assert_frame_equal(result["depot_data_stocks"], expected["depot_data_stocks"])
+        assert result["depot_summary"] == expected["depot_summary"]
+
+    def test_neues_universum_erzwingt_neuberechnung(self, tmp_path):
+        calls = []
+
+        def _load():
+            calls.append(1)
+            return _etf_data()
+
+        analyze_depot_incremental(str(tmp_path), "u1", _load, _depot(), _prices())
+        analyze_depot_incremental(str(tmp_path), "u2", _load, _depot(), _prices())
+        assert len(calls) == 2
+
+    def test_fehlendes_universum_wirft_fehler(self, tmp_path):
+        with pytest.raises(ValueError, match="Universum"):
+            analyze_depot_incremental(str(tmp_path), "u1", lambda: None, _depot(), _prices())
@@ -0,0 +1,102 @@
+# tests/test_instrumentation.py
+"""
+Unit Tests für scripts/instrumentation.py
+
+Getestet werden:
+- span: ohne aktiven Lauf wirkungslos, Verschachtelung, Speicher-Peak mit tracemalloc
+- timed_run: JSON-Timing-Report je Lauf, Report auch bei Abbruch, cProfile-Modus
+- write_timing_report: Aufräumen alter Reports je Lauf-Name
+"""
+
+import json
+
+import pytest
+
+from scripts import instrumentation
+from scripts.instrumentation import finish_run, span, start_run, timed_run, write_timing_report
+
+# ---------------------------------------------------------------------------
+# Tests: span
+# ---------------------------------------------------------------------------
+
+
+class TestSpan:
+    def test_ohne_lauf_wird_nichts_aufgezeichnet(self):
+        with span("clean", rows=3) as meta:
+            meta["ok"] = True
+        assert instrumentation._RUN is None
+
+    def test_verschachtelte_spans(self):
+        start_run("test")
+        with span("aussen"), span("innen", rows=5):
+            pass
+        report = finish_run()
+        spans = {s["name"]: s for s in report["spans"]}
+        assert spans["innen"]["parent"] == "aussen"
+        assert spans["innen"]["depth"] == 1
+        assert spans["innen"]["meta"] == {"rows": 5}
+        assert spans["aussen"]["wall_s"] >= spans["innen"]["wall_s"]
+        assert spans["aussen"]["peak_mb"] is None  # ohne tracemalloc
+
+    def test_speicher_peak_wird_an_eltern_weitergegeben(self):
+        start_run("test", trace_memory=True)
+        with span("aussen"), span("innen"):
+            block = bytearray(8 * 1024 * 1024)
+            del block
+        report = finish_run()
+        spans = {s["name"]: s for s in report["spans"]}
+        assert spans["innen"]["peak_increase_mb"] >= 8
+        assert spans["aussen"]["peak_mb"] >= spans["innen"]["peak_mb"]
+
+
+# ---------------------------------------------------------------------------
+# Tests: timed_run
+# ---------------------------------------------------------------------------
+
+
+class TestTimedRun:
+    def test_schreibt_json_report(self, tmp_path):
+        with timed_run("main", report_dir=str(tmp_path)) as run, span("csv_download"):
+            pass
+        with open(run["path"], encoding="utf-8") as f:
+            report = json.load(f)
+        assert report["run"] == "main"
+        assert [s["name"] for s in report["spans"]] == ["csv_download"]
+        assert {"wall_s", "cpu_s", "max_rss_mb"} <= set(report)
+
+    def test_report_auch_bei_abbruch(self, tmp_path):
+        with pytest.raises(SystemExit), timed_run("main", report_dir=str(tmp_path)), span("price_fetch"):
+            raise SystemExit(1)
+        assert len(list(tmp_path.glob("timing-main-*.json"))) == 1
+        assert instrumentation._RUN is None
+
+    def test_cprofile_modus(self, tmp_path):
+        with timed_run("main", report_dir=str(tmp_path), profile="cprofile"):
+            sum(range(1000))
+        assert len(list(tmp_path.glob("profile-main-*.prof"))) == 1
+        assert len(list(tmp_path.glob("profile-main-*.txt"))) == 1
+
+    def test_unbekannter_profiler_wird_ignoriert(self, tmp_path):
+        with timed_run("main", report_dir=str(tmp_path), profile="xyz"):
+            pass
+        assert not list(tmp_path.glob("profile-*"))
+
+
+# ---------------------------------------------------------------------------
+# Tests: write_timing_report
+# ---------------------------------------------------------------------------
+
+
+class TestWriteTimingReport:
+    def test_behaelt_nur_die_neuesten_je_lauf(self, tmp_path):
+        paths = [write_timing_report({"run": "watch", "i": i}, str(tmp_path), keep=3) for i in range(5)]
+        write_timing_report({"run": "main"}, str(tmp_path), keep=3)
+        write_timing_report({"run": "watch-x"}, str(tmp_path), keep=1)
+        assert sorted(str(p) for p in tmp_path.glob("timing-watch-2*.json")) == sorted(paths[-3:])
+        assert len(list(tmp_path.glob("timing-main-*.json"))) == 1
+        assert len(list(tmp_path.glob("timing-watch-x-*.json"))) == 1
+
+    def test_keep_null_raeumt_nicht_auf(self, tmp_path):
+        for _ in range(3):
+            write_timing_report({"run": "main"}, str(tmp_path), keep=0)
+        assert len(list(tmp_path.glob("timing-main-*.json"))) == 3
@@ -0,0 +1,340 @@
+# tests/test_main.py
+"""
+Unit Tests für die Kommandozeile in main.py
+
+Getestet werden:
+- build_parser / parse_options: Defaults, Stufen-Optionen, --sections, --detail-top/--detail-min-weight, --render-workers, Optionen vor und nach 'batch', 'watch', 'serve', 'report'
+- _run: übersprungene Stufen (Download, Excel, Report) werden nicht ausgeführt, --offline nutzt Fallback-Kurse
+- main_report: Excel/HTML aus dem jüngsten Snapshot ohne Neuberechnung
+- Ende-zu-Ende: reiner Excel-Lauf offline ohne Plotly-Import (frischer Interpreter)
+"""
+
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_depot, generate_universe
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def main_module(tmp_path_factory):
+    """Importiert main.py in einem temporären Arbeitsordner, damit die Logdateien nicht im Projekt landen."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("main"))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+def _config(tmp_path, incremental=True):
+    return {
+        "DOWNLOAD_PATH": str(tmp_path),
+        "SAVE_PATH": str(tmp_path),
+        "INPUT_FILE": str(tmp_path / "depot.xlsx"),
+        "OUTPUT_FILE": str(tmp_path / "out.xlsx"),
+        "CSV_URL": ["https://example.com/etf.csv"],
+        "ETF_CSV_FILE": ["ETF.csv"],
+        "STOCK_TICKER_SUFFIXES": [".DE"],
+        "CRYPTO_TICKER_SUFFIXES": ["-EUR"],
+        "CACHE_PATH": str(tmp_path / ".cache"),
+        "INCREMENTAL": incremental,
+        "SNAPSHOT": False,
+        "SNAPSHOT_PATH": str(tmp_path / "snapshots"),
+        "TIMING_REPORT": False,
+        "TIMING_PATH": None,
+        "TIMING_MEMORY": False,
+        "PROFILE": None,
+        "RUN_BUDGET": None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Tests: build_parser / parse_options
+# ---------------------------------------------------------------------------
+
+
+class TestParser:
+    def test_defaults_entsprechen_allen_stufen(self, main_module):
+        args = main_module.build_parser().parse_args([])
+        assert args.command is None
+        assert main_module.parse_options(args) == main_module.DEFAULT_OPTIONS
+
+    def test_stufen_optionen(self, main_module):
+        args = main_module.build_parser().parse_args(["--no-excel", "--no-open", "--sections", "top20, laender"])
+        options = main_module.parse_options(args)
+        assert options["excel"] is False
+        assert options["open_browser"] is False
+        assert options["sections"] == ["top20", "laender"]
+        assert options["download"] is True
+        assert options["plotlyjs"] == "inline"
+
+    def test_plotlyjs_shared(self, main_module):
+        args = main_module.build_parser().parse_args(["batch", "depots/", "--plotlyjs", "shared"])
+        assert main_module.parse_options(args)["plotlyjs"] == "shared"
+
+    def test_chart_payload_gzip(self, main_module):
+        args = main_module.build_parser().parse_args(["--chart-payload", "gzip", "--no-open"])
+        assert main_module.parse_options(args)["chart_payload"] == "gzip"
+        with pytest.raises(SystemExit):
+            main_module.build_parser().parse_args(["--chart-payload", "brotli"])
+
+    def test_detail_stufe(self, main_module):
+        args = main_module.build_parser().parse_args(["batch", "depots/", "--detail-top", "5"])
+        assert main_module.parse_options(args)["detail"] == {"top_n": 5, "min_weight": None}
+        args = main_module.build_parser().parse_args(["--detail-min-weight", "0,5"])
+        assert main_module.parse_options(args)["detail"] == {"top_n": None, "min_weight": 0.5}
+        for argv in (["--detail-top", "0"], ["--detail-min-weight", "-1"]):
+            with pytest.raises(SystemExit):
+                main_module.build_parser().parse_args(argv)
+
+    def test_render_workers(self, main_module):
+        args = main_module.build_parser().parse_args(["report", "--render-workers", "4"])
+        assert main_module.parse_options(args)["render_workers"] == 4
+        with pytest.raises(SystemExit):
+            main_module.build_parser().parse_args(["--render-workers", "0"])
+
+    def test_offline_impliziert_kein_download(self, main_module):
+        options = main_module.parse_options(main_module.build_parser().parse_args(["--offline"]))
+        assert options["offline"] is True
+        assert options["download"] is False
+
+    @pytest.mark.parametrize("value, expected", [("all", None), ("none", []), ("NONE", [])])
+    def test_sections_all_und_none(self, main_module, value, expected):
+        assert main_module.build_parser().parse_args(["--sections", value]).sections == expected
+
+    def test_unbekannter_abschnitt(self, main_module, capsys):
+        with pytest.raises(SystemExit):
+            main_module.build_parser().parse_args(["--sections", "tabelle,kuchen"])
+        assert "kuchen" in capsys.readouterr().err
+
+    @pytest.mark.parametrize(
+        "argv",
+        [
+            ["--no-excel", "batch", "depots/", "--workers", "2"],
+            ["batch", "depots/", "--no-excel", "--workers", "2"],
+        ],
+    )
+    def test_batch_optionen_vor_und_nach_subcommand(self, main_module, argv):
+        args = main_module.build_parser().parse_args(argv)
+        assert args.command == "batch"
+        assert args.inputs == ["depots/"]
+        assert args.workers == 2
+        assert main_module.parse_options(args)["excel"] is False
+
+    def test_main_batch_erhaelt_optionen(self, main_module):
+        with patch.object(main_module, "main_batch") as main_batch:
+            main_module.main(["batch", "a.xlsx", "b.xlsx", "--offline", "--sections", "none"])
+        main_batch.assert_called_once()
+        assert main_batch.call_args.args == (["a.xlsx", "b.xlsx"],)
+        options = main_batch.call_args.kwargs["options"]
+        assert options["offline"] is True
+        assert options["sections"] == []
+
+    def test_watch_mit_intervallen(self, main_module):
+        with patch.object(main_module, "main_watch") as main_watch:
+            main_module.main(["watch", "--interval", "2", "--price-interval", "120", "--no-excel"])
+        kwargs = main_watch.call_args.kwargs
+        assert kwargs["interval"] == 2.0
+        assert kwargs["price_interval"] == 120.0
+        assert kwargs["options"]["excel"] is False
+
+    def test_budget(self, main_module):
+        assert main_module.build_parser().parse_args(["--budget", "90"]).budget == 90.0
+        assert main_module.build_parser().parse_args([]).budget is None
+
+    @pytest.mark.parametrize("value", ["0", "-5", "bald"])
+    def test_ungueltiges_budget(self, main_module, value, capsys):
+        with pytest.raises(SystemExit):
+            main_module.build_parser().parse_args(["--budget", value])
+        assert "positive Zahl" in capsys.readouterr().err
+
+    def test_budget_im_batch_modus(self, main_module):
+        with patch.object(main_module, "main_batch") as main_batch:
+            main_module.main(["--budget", "60", "batch", "depots/"])
+        assert main_batch.call_args.kwargs["budget"] == 60.0
+
+    @pytest.mark.parametrize("command", ["watch", "serve", "report"])
+    def test_budget_ohne_wirkung_wird_abgelehnt(self, main_module, command, capsys):
+        with patch.object(main_module, f"main_{command}") as mode, pytest.raises(SystemExit):
+            main_module.main(["--budget", "60", command])
+        mode.assert_not_called()
+        assert "--budget gilt nur" in capsys.readouterr().err
+
+    def test_serve_mit_host_und_port(self, main_module):
+        with patch.object(main_module, "main_serve") as main_serve:
+            main_module.main(["serve", "depots/", "--port", "9000", "--offline"])
+        assert main_serve.call_args.args == (["depots/"],)
+        kwargs = main_serve.call_args.kwargs
+        assert (kwargs["host"], kwargs["port"]) == ("127.0.0.1", 9000)
+        assert kwargs["options"]["download"] is False
+
+
+# ---------------------------------------------------------------------------
+# Tests: _run – übersprungene Stufen
+# ---------------------------------------------------------------------------
+
+
+class TestRunStages:
+    def _run(self, main_module, config, options, result=None):
+        prices = pd.DataFrame({"Ticker": ["X"], "Kurs": [1.0]})
+        with (
+            patch("scripts.analysis.load_depot", return_value=pd.DataFrame({"Ticker": ["X"]})),
+            patch.object(main_module, "_download_csvs") as download,
+            patch.object(main_module, "_analyze_incremental", return_value=result or {}),
+            patch("scripts.data_download.download_stock_price", return_value=(prices, [])) as online,
+            patch("scripts.data_download.load_fallback_prices", return_value=(prices, ["X"])) as offline,
+            patch("scripts.analysis.export_results", return_value=None) as export,
+        ):
+            main_module._run(config, options)
+        return download, online, offline, export
+
+    def test_alle_stufen(self, main_module, tmp_path):
+        config = _config(tmp_path)
+        download, online, offline, export = self._run(main_module, config, None)
+        download.assert_called_once()
+        online.assert_called_once()
+        offline.assert_not_called()
+        assert export.call_args.args[1] == config["OUTPUT_FILE"]
+        assert export.call_args.kwargs["sections"] is None
+        assert export.call_args.kwargs["open_browser"] is True
+
+    def test_offline_ohne_excel_und_report(self, main_module, tmp_path):
+        options = {**main_module.DEFAULT_OPTIONS, "download": False, "offline": True, "excel": False, "sections": []}
+        download, online, offline, export = self._run(main_module, _config(tmp_path), options)
+        download.assert_not_called()
+        online.assert_not_called()
+        offline.assert_called_once()
+        assert export.call_args.args[1] is None
+        assert export.call_args.kwargs["sections"] == []
+
+    def test_profil_ohne_timing_report_im_timing_ordner(self, main_module, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        config = {**_config(tmp_path), "TIMING_PATH": str(tmp_path / "timings"), "PROFILE": "cprofile"}
+        with main_module._timed_run(config, "main"):
+            pass
+        assert len(list((tmp_path / "timings").glob("profile-main-*.prof"))) == 1
+        assert not list(tmp_path.glob("profile-*"))
+        assert not list((tmp_path / "timings").glob("timing-*.json"))  # TIMING_REPORT=false
+
+    def test_zeitbudget_markiert_kpi_cards(self, main_module, tmp_path):
+        from scripts.deadline import run_budget, within_budget
+
+        result = {"depot_summary": {"Gesamtwert": "1,00 €"}}
+        with run_budget(0):
+            within_budget("Kursabruf", lambda: None)  # Budget bereits abgelaufen → Stufe weicht aus
+            *_, export = self._run(main_module, _config(tmp_path), None, result=result)
+        assert "Kursabruf" in export.call_args.args[0]["depot_summary"]["⚠️ Zeitbudget"]
+
+    def test_no_download_ohne_inkrementellen_modus(self, main_module, tmp_path):
+        options = {**main_module.DEFAULT_OPTIONS, "download": False}
+        with (
+            patch("scripts.analysis.load_etf_universe", return_value=MagicMock()),
+            patch("scripts.analysis.analyze_depot", return_value={}),
+        ):
+            download, *_ = self._run(main_module, _config(tmp_path, incremental=False), options)
+        download.assert_not_called()
+
+
+# ---------------------------------------------------------------------------
+# Tests: Snapshot & Report-Modus
+# ---------------------------------------------------------------------------
+
+
+class TestReportMode:
+    def _result(self):
+        from scripts.snapshot import SNAPSHOT_KEYS
+
+        result = {key: pd.DataFrame({"Wert": [1.0, 2.0]}) for key in SNAPSHOT_KEYS}
+        result["depot_summary"] = {"Gesamtwert": "3,00 €"}
+        return result
+
+    def test_report_aus_snapshot_ohne_neuberechnung(self, main_module, tmp_path):
+        config = {**_config(tmp_path), "SNAPSHOT": True}
+        TestRunStages()._run(main_module, config, None, result=self._result())
+        assert len(os.listdir(config["SNAPSHOT_PATH"])) == 1
+
+        options = {**main_module.DEFAULT_OPTIONS, "open_browser": False}
+        with (
+            patch.object(main_module, "load_config", return_value=config),
+            patch.object(main_module, "_analyze_incremental") as analyze,
+            patch("scripts.analysis.export_results", return_value=None) as export,
+        ):
+            main_module.main_report(options=options)
+        analyze.assert_not_called()
+        result = export.call_args.args[0]
+        pd.testing.assert_frame_equal(result["depot_data_chart"], self._result()["depot_data_chart"])
+        assert result["depot_summary"] == {"Gesamtwert": "3,00 €"}
+        assert export.call_args.kwargs["open_browser"] is False
+
+    def test_ohne_snapshot_abbruch(self, main_module, tmp_path):
+        with patch.object(main_module, "load_config", return_value=_config(tmp_path)), pytest.raises(SystemExit):
+            main_module.main_report()
+
+    def test_run_budget_wird_ignoriert_mit_warnung(self, main_module, tmp_path, caplog):
+        config = {**_config(tmp_path), "RUN_BUDGET": 60.0}
+        with patch.object(main_module, "load_config", return_value=config), pytest.raises(SystemExit):
+            main_module.main_report()
+        assert "RUN_BUDGET gilt nur für Einzel- und Batch-Läufe" in caplog.text
+
+    def test_report_subcommand(self, main_module):
+        with patch.object(main_module, "main_report") as main_report:
+            main_module.main(["report", "alt.pkl", "--no-excel", "--sections", "top20"])
+        assert main_report.call_args.args == ("alt.pkl",)
+        options = main_report.call_args.kwargs["options"]
+        assert options["excel"] is False
+        assert options["sections"] == ["top20"]
+
+
+# ---------------------------------------------------------------------------
+# Tests: Ende-zu-Ende (frischer Interpreter)
+# ---------------------------------------------------------------------------
+
+_E2E_SCRIPT = """
+import json, sys
+import scripts.data_download
+scripts.data_download._FALLBACK_JSON = sys.argv[1]
+import main
+main.main(sys.argv[2:])
+print(json.dumps(sorted(m for m in sys.modules if m == "scripts.plotting" or m.split(".")[0] == "plotly")))
+"""
+
+
+class TestEndToEnd:
+    def test_nur_excel_offline_ohne_plotly(self, tmp_path):
+        csv_dir = tmp_path / "csv"
+        files = generate_universe(str(csv_dir), funds=2, holdings_per_fund=30)
+        depot, prices = generate_depot(files, path=str(tmp_path / "depot.xlsx"), stocks=3, crypto=1)
+        fallback = tmp_path / "fallback.json"
+        fallback.write_text(json.dumps(dict(zip(prices["Ticker"], prices["Kurs"], strict=True))), encoding="utf-8")
+
+        env = {
+            **os.environ,
+            "PYTHONPATH": PROJECT_ROOT,
+            "DOWNLOAD_PATH": str(csv_dir),
+            "SAVE_PATH": str(tmp_path / "charts"),
+            "INPUT_FILE": str(tmp_path / "depot.xlsx"),
+            "OUTPUT_FILE": str(tmp_path / "out.xlsx"),
+            "CSV_URL": ",".join(f"https://example.invalid/{i}.csv" for i in range(len(files))),
+            "ETF_CSV_FILE": ",".join(files),
+            "TIMING_REPORT": "false",
+        }
+        proc = subprocess.run(
+            [sys.executable, "-c", _E2E_SCRIPT, str(fallback), "--offline", "--sections", "none"],
+            cwd=tmp_path,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        assert proc.returncode == 0, proc.stderr[-2000:] + proc.stdout[-2000:]
+        assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+        assert (tmp_path / "out.xlsx").exists()
+        assert not (tmp_path / "charts" / "portfolio_report.html").exists()
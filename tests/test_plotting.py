@@ -4,20 +4,53 @@ Unit Tests für scripts/plotting.py
 
 Getestet werden:
 - _de: Deutsches Zahlenformat
+- _de_array / _eur_array / _pct_array: vektorisiert für Series und Matrizen, gleiche Ausgabe wie die Skalar-Varianten
 - build_depot_table: HTML-Ausgabe, Spalten, Sortierung
 - build_pie_chart / build_bar_chart / build_treemap / build_heatmap: Figure-Struktur
+- pie_chart_spec / bar_chart_spec / treemap_spec: gleiche Figures wie plotly.express, figure_json direkt aus der Spec
+- treemap_hierarchy: Knoten, Elternindex, Teilbaum-Summen und Anteile bei beliebiger Tiefe
+- treemap_detail / drilldown_json: kleine Blätter als 'Sonstige', Nachladen und Aufklappen im Report-JavaScript
+- export_html_report: Plotly.js inline bzw. als gemeinsame Datei, Cache je Prozess
+- encode_chart_payload / decode_chart_payload: Chart-Daten als JSON bzw. gzip+base64
+- section_digest / Report-Fragmente: nur geänderte Abschnitte neu kodieren, Report in Teilen schreiben
+- figure_json / inflate_figure: Typed Arrays, deduplizierte Beschriftungen, Entpacken im Report-JavaScript
 """
 
+import json
+import re
+import shutil
+import subprocess
+from unittest.mock import patch
+
+import numpy as np
 import pandas as pd
+import plotly.express as px
 import plotly.graph_objects as go
+import pytest
 
+from scripts import plotting
+from scripts.formatting import _de_array, _eur, _eur_array, _pct, _pct_array
 from scripts.plotting import (
     _de,
+    _typed_array,
+    bar_chart_spec,
     build_bar_chart,
     build_depot_table,
     build_heatmap,
     build_pie_chart,
     build_treemap,
+    decode_chart_payload,
+    drilldown_json,
+    encode_chart_payload,
+    export_html_report,
+    figure_json,
+    inflate_figure,
+    pie_chart_spec,
+    plotlyjs_asset_name,
+    plotlyjs_source,
+    treemap_detail,
+    treemap_hierarchy,
+    treemap_spec,
 )
 
 # ---------------------------------------------------------------------------
@@ -72,6 +105,43 @@ class TestDeFormat:
         assert "1.000.000" in result
 
 
+# ---------------------------------------------------------------------------
+# Tests: _de_array / _eur_array / _pct_array (vektorisiertes Zahlenformat)
+# ---------------------------------------------------------------------------
+
+
+class TestDeArray:
+    def _values(self):
+        rng = np.random.default_rng(0)
+        random = rng.lognormal(0, 4, 5000) * rng.choice([-1, 1], 5000)
+        # halbe Stellen, negative Null, Rundung auf 1.000, sehr große und unendliche Werte
+        edge = [0.125, 2.675, 1.005, 0.5, 2.5, -0.0, -0.001, 0.045, 999.995, 999_999.995, 1e17, np.inf, np.nan]
+        return np.concatenate([random, np.round(random, 3), edge])
+
+    @pytest.mark.parametrize("decimals", [0, 1, 2, 4])
+    def test_gleiche_ausgabe_wie_skalar(self, decimals):
+        values = self._values()
+        assert _de_array(values, decimals, "%").tolist() == [_de(v, decimals, "%") for v in values.tolist()]
+
+    def test_eur_und_pct(self):
+        values = pd.Series(self._values())
+        assert _eur_array(values).tolist() == [_eur(v) for v in values.tolist()]
+        assert _pct_array(values).tolist() == [_pct(v) for v in values.tolist()]
+        assert _pct_array([0.05, 5.0], decimals=2, small_decimals=4).tolist() == ["0,0500 %", "5,00 %"]
+
+    def test_gemischte_und_ganzzahlige_werte(self):
+        mixed = np.array([1, 2**60, None, "5", pd.NA, 3.5, np.nan, True, -12_345_678], dtype=object)
+        assert _de_array(mixed).tolist() == [_de(v) for v in mixed]
+        ints = pd.Series([0, 5, -5, 123_456_789])
+        assert _de_array(ints, 4).tolist() == [_de(v, 4) for v in ints.tolist()]
+        assert _de_array(pd.Series(["a", "b"])).tolist() == ["–", "–"]
+        assert _de_array([]).tolist() == []
+
+    def test_matrix_behaelt_form(self):
+        result = _de_array(np.array([[1.0, np.nan], [1234.5, -2.0]]), 2, "%")
+        assert result.tolist() == [["1,00 %", "–"], ["1.234,50 %", "-2,00 %"]]
+
+
 # ---------------------------------------------------------------------------
 # Tests: build_depot_table
 # ---------------------------------------------------------------------------
@@ -251,6 +321,260 @@ class TestBuildTreemap:
         assert fig is not None
 
 
+# ---------------------------------------------------------------------------
+# Tests: Figure-Specs (ohne plotly.express) – Referenz ist die frühere px-Figure
+# ---------------------------------------------------------------------------
+
+
+def _plain(fig):
+    """Figure bzw. Spec → Dict mit Listen statt Arrays (wie Plotly.js es im Browser sieht)."""
+    return inflate_figure(json.loads(figure_json(fig) if isinstance(fig, dict) else fig.to_json()))
+
+
+class TestFigureSpecs:
+    def _holdings(self):
+        return pd.DataFrame(
+            {
+                "Standort": ["USA", "USA", "Japan", "USA", "Deutschland", "Japan"] * 4,
+                "Sektor": ["IT", "Finanzen", "IT", "IT", "Industrie", "Finanzen"] * 4,
+                "Name": [f"Aktie {i % 17}" for i in range(24)],
+                "Gewichtung (%)": [5.0, 4.0, 3.0, 0.0, 2.5, None] * 4,
+            }
+        )
+
+    def test_pie_wie_plotly_express(self):
+        df = self._holdings().drop_duplicates("Name")
+        expected = px.pie(df.dropna().query("`Gewichtung (%)` > 0"), values="Gewichtung (%)", names="Name", title="T")
+        expected.update_traces(
+            customdata=[_de(v, 2, "%") for v in expected.data[0]["values"]],
+            texttemplate="%{label}<br>%{customdata}",
+            textposition="inside",
+            hovertemplate="<b>%{label}</b><br>Depotanteil: %{customdata}<extra></extra>",
+        )
+        expected.update_layout(
+            showlegend=True, title_font_size=18, height=650, width=900, margin={"t": 60, "b": 20, "l": 20, "r": 20}
+        )
+        assert _plain(pie_chart_spec(df, "Gewichtung (%)", "Name", "T")) == _plain(expected)
+
+    def test_bar_wie_plotly_express(self):
+        df = self._holdings()
+        df_top = df.nlargest(5, "Gewichtung (%)").assign(
+            _label=lambda d: d["Gewichtung (%)"].map(lambda v: _de(v, 2, "%"))
+        )
+        expected = px.bar(
+            df_top,
+            x="Gewichtung (%)",
+            y="Name",
+            orientation="h",
+            title="T",
+            text="_label",
+            hover_data={"Gewichtung (%)": ":.2f", "_label": False},
+        )
+        expected.update_traces(
+            textposition="outside", hovertemplate="<b>%{y}</b><br>Gewichtung: %{text}<extra></extra>"
+        )
+        expected.update_layout(
+            yaxis={
+                "categoryorder": "total ascending",
+                "tickmode": "linear",
+                "automargin": True,
+                "tickfont": {"size": 12},
+            },
+            xaxis={"ticksuffix": " %"},
+            margin={"l": 120, "r": 80, "t": 60, "b": 40},
+            title_font_size=18,
+            height=400,
+        )
+        assert _plain(bar_chart_spec(df, "Gewichtung (%)", "Name", "T", top_n=5)) == _plain(expected)
+
+    @pytest.mark.parametrize("path", [["Name"], ["Sektor", "Name"], ["Standort", "Sektor", "Name"]])
+    def test_treemap_knoten_wie_plotly_express(self, path):
+        df = self._holdings()
+        expected = px.treemap(df, path=path, values="Gewichtung (%)", title="T").to_plotly_json()["data"][0]
+        trace = _plain(treemap_spec(df, path, "Gewichtung (%)", "T"))["data"][0]
+        for key in ("ids", "parents", "labels", "values", "branchvalues", "domain", "name"):
+            assert trace[key] == _plain({"data": [expected]})["data"][0][key], key
+        assert [row[0] for row in trace["customdata"]] == trace["values"]
+
+    def test_figure_json_spec_gleich_figure(self):
+        spec = treemap_spec(self._holdings(), ["Sektor", "Name"], "Gewichtung (%)", "T")
+        assert _plain(spec) == _plain(go.Figure(spec))
+
+    def test_figure_json_veraendert_spec_nicht(self):
+        spec = bar_chart_spec(self._holdings(), "Gewichtung (%)", "Name", "T")
+        before = _plain(go.Figure(spec))
+        figure_json(spec)
+        assert isinstance(spec["data"][0]["x"], np.ndarray)
+        assert _plain(go.Figure(spec)) == before
+
+    def test_fehlende_namen_als_null(self):
+        df = pd.DataFrame({"Name": ["A", None], "Wert": [2.0, 1.0]})
+        assert _plain(bar_chart_spec(df, "Wert", "Name", "T"))["data"][0]["y"] == ["A", None]
+
+    def test_none_mit_unterebene_ist_fehler(self):
+        df = pd.DataFrame({"Sektor": [None], "Name": ["A"], "Wert": [1.0]})
+        with pytest.raises(ValueError, match="None entries"):
+            treemap_spec(df, ["Sektor", "Name"], "Wert", "T")
+
+
+# ---------------------------------------------------------------------------
+# Tests: treemap_hierarchy (vektorisierte Hierarchie beliebiger Tiefe)
+# ---------------------------------------------------------------------------
+
+
+class TestTreemapHierarchy:
+    def _tree(self):
+        df = pd.DataFrame(
+            {
+                "Region": ["Europa", "Europa", "Amerika", "Europa"],
+                "Land": ["DE", "FR", "USA", "DE"],
+                "Sektor": ["IT", "IT", "IT", "Finanzen"],
+                "Name": ["SAP", "Capgemini", "Apple", "Allianz"],
+                "Wert": [30.0, 10.0, 50.0, 10.0],
+            }
+        )
+        return treemap_hierarchy(df, ["Region", "Land", "Sektor", "Name"], "Wert")
+
+    def _tree_df(self):
+        return pd.DataFrame({"Sektor": ["IT", "IT", "Cash"], "Name": ["SAP", "Apple", "Euro"], "Wert": [1.0, 2.0, 0.0]})
+
+    def test_vier_ebenen_mit_elternindex(self):
+        tree = self._tree()
+        ids = tree["ids"].tolist()
+        assert ids[:4] == [
+            "Europa/DE/IT/SAP",
+            "Europa/FR/IT/Capgemini",
+            "Amerika/USA/IT/Apple",
+            "Europa/DE/Finanzen/Allianz",
+        ]
+        assert ids[-2:] == ["Europa", "Amerika"]
+        assert tree["depth"].tolist() == [4, 4, 4, 4, 3, 3, 3, 3, 2, 2, 2, 1, 1]
+        for i, parent in enumerate(tree["parent_index"].tolist()):
+            assert tree["parents"][i] == (ids[parent] if parent >= 0 else "")
+
+    def test_teilbaum_summen_und_anteil_am_elternknoten(self):
+        tree = self._tree()
+        values = dict(zip(tree["ids"].tolist(), tree["values"].tolist(), strict=True))
+        assert values["Europa"] == 50.0
+        assert values["Europa/DE"] == 40.0
+        share = dict(zip(tree["ids"].tolist(), tree["share"].tolist(), strict=True))
+        assert share["Europa/DE"] == 80.0
+        assert share["Europa/DE/IT/SAP"] == 100.0
+        assert np.isnan(share["Amerika"])
+
+    def test_blaetter(self):
+        tree = self._tree()
+        assert tree["is_leaf"].tolist() == [True] * 4 + [False] * 9
+
+    def test_fehlendes_blatt_zaehlt_fuer_den_elternknoten(self):
+        df = pd.DataFrame({"Sektor": ["IT", "IT", "Cash"], "Name": ["SAP", "Apple", None], "Wert": [1.0, 2.0, 3.0]})
+        tree = treemap_hierarchy(df, ["Sektor", "Name"], "Wert")
+        assert tree["ids"].tolist() == ["IT/SAP", "IT/Apple", "IT", "Cash"]
+        assert tree["values"].tolist() == [1.0, 2.0, 3.0, 3.0]
+        assert tree["is_leaf"].tolist() == [True, True, False, True]
+
+    def test_kategorie_anteil_nur_fuer_blaetter(self):
+        trace = _plain(treemap_spec(self._tree_df(), ["Sektor", "Name"], "Wert", "T"))["data"][0]
+        assert trace["customdata"] == [[1.0, "33.33 %"], [2.0, "66.67 %"], [0.0, "–"], [3.0, "–"], [0.0, "–"]]
+
+
+# ---------------------------------------------------------------------------
+# Tests: treemap_detail (Level of Detail – kleine Blätter als 'Sonstige', Nachladen im Report)
+# ---------------------------------------------------------------------------
+
+# Führt expandNode aus dem Report-JavaScript in Node aus: stdin = [Figure-Tag, Drill-Tag, Sammelknoten-ID]
+_NODE_EXPAND = """
+%s
+const [fig, drill, id] = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+Promise.all([loadSpec({dataset: {}, textContent: fig}), loadSpec({dataset: {}, textContent: drill})])
+  .then(([spec, parts]) => {
+    const trace = expandNode(inflateTrace(spec.data[0]), id, inflateTrace(parts[id]));
+    console.log(JSON.stringify(trace, (k, v) => ArrayBuffer.isView(v) ? Array.from(v) : v));
+  });
+"""
+
+
+class TestTreemapDetail:
+    def _df(self):
+        return pd.DataFrame(
+            {
+                "Sektor": ["IT"] * 5 + ["Cash"],
+                "Name": ["SAP", "Apple", "Nvidia", "Adobe", "Intel", "Euro"],
+                "Wert": [40.0, 30.0, 5.0, 3.0, 2.0, 20.0],
+            }
+        )
+
+    def _tree(self):
+        return treemap_hierarchy(self._df(), ["Sektor", "Name"], "Wert")
+
+    def test_top_n_fasst_rest_zusammen(self):
+        reduced, tails = treemap_detail(self._tree(), top_n=2)
+        assert reduced["ids"].tolist() == ["IT/SAP", "IT/Apple", "Cash/Euro", "IT", "Cash", "IT/Sonstige (3 weitere)"]
+        assert reduced["parents"][-1] == "IT"
+        assert reduced["values"][-1] == 10.0
+        assert reduced["share"][-1] == pytest.approx(12.5)
+        assert reduced["is_leaf"].tolist() == [True, True, True, False, False, True]
+        for i, parent in enumerate(reduced["parent_index"].tolist()):
+            assert reduced["parents"][i] == (reduced["ids"][parent] if parent >= 0 else "")
+        assert self._tree()["ids"][tails["IT/Sonstige (3 weitere)"]].tolist() == ["IT/Nvidia", "IT/Adobe", "IT/Intel"]
+
+    def test_mindestgewicht(self):
+        reduced, tails = treemap_detail(self._tree(), min_weight=4)
+        assert list(tails) == ["IT/Sonstige (2 weitere)"]
+        assert reduced["values"][-1] == 5.0
+
+    def test_einzelnes_blatt_bleibt_stehen(self):
+        tree = self._tree()
+        reduced, tails = treemap_detail(tree, top_n=4)
+        assert reduced is tree
+        assert tails == {}
+
+    def test_spec_mit_drilldown(self):
+        spec = treemap_spec(self._df(), ["Sektor", "Name"], "Wert", "T", detail={"top_n": 2, "min_weight": None})
+        trace = _plain(spec)["data"][0]
+        assert trace["meta"] == {"drilldown": ["IT/Sonstige (3 weitere)"]}
+        assert trace["customdata"][-1] == [10.0, "12.50 %"]
+        assert "drilldown" not in json.loads(figure_json(spec))
+
+        parts = json.loads(drilldown_json(spec))
+        part = inflate_figure({"data": [parts["IT/Sonstige (3 weitere)"]]})["data"][0]
+        assert part["labels"] == ["Nvidia", "Adobe", "Intel"]
+        assert part["customdata"] == [[5.0, "6.25 %"], [3.0, "3.75 %"], [2.0, "2.50 %"]]  # Anteil an 'IT'
+        assert drilldown_json(treemap_spec(self._df(), ["Sektor", "Name"], "Wert", "T")) is None
+
+    def test_report_mit_drilldown_tag(self, tmp_path):
+        spec = treemap_spec(self._df(), ["Sektor", "Name"], "Wert", "T", detail={"top_n": 2, "min_weight": None})
+        report = tmp_path / "r.html"
+        export_html_report([{"title": "T", "fig": spec}], str(report), open_browser=False)
+        html = report.read_text(encoding="utf-8")
+        assert '<script type="application/json" id="drill-plotly-chart-0">' in html
+        assert "plotly_treemapclick" in html
+
+    @pytest.mark.skipif(shutil.which("node") is None, reason="Node.js nicht installiert")
+    def test_aufgeklappter_knoten_im_javascript(self, tmp_path):
+        spec = treemap_spec(self._df(), ["Sektor", "Name"], "Wert", "T", detail={"top_n": 2, "min_weight": None})
+        report = tmp_path / "r.html"
+        export_html_report([{"title": "T", "fig": spec}], str(report), open_browser=False)
+        html = report.read_text(encoding="utf-8")
+
+        functions = html[html.index("var _TYPED") : html.index("function renderChart")]
+        tags = dict(re.findall(r'<script type="application/json" id="(\w+)-plotly-chart-0">([^<]*)</script>', html))
+        proc = subprocess.run(
+            ["node", "-e", _NODE_EXPAND % functions],
+            input=json.dumps([tags["data"], tags["drill"], "IT/Sonstige (3 weitere)"]),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        trace = json.loads(proc.stdout)
+        assert trace["level"] == "IT/Sonstige (3 weitere)"
+        assert trace["meta"] == {"drilldown": []}
+        assert trace["ids"][-3:] == [f"IT/Sonstige (3 weitere)/{name}" for name in ("Nvidia", "Adobe", "Intel")]
+        assert trace["parents"][-3:] == ["IT/Sonstige (3 weitere)"] * 3
+        assert trace["values"][-3:] == [5.0, 3.0, 2.0]
+        assert trace["customdata"][-1] == [2.0, "2.50 %"]
+
+
 # ---------------------------------------------------------------------------
 # Tests: build_heatmap
 # ---------------------------------------------------------------------------
@@ -290,3 +614,250 @@ class TestBuildHeatmap:
         fig = build_heatmap(pivot, "Test")
         assert fig.data[0]["z"].shape == (2, 3)
         assert fig.data[0]["z"].shape == (2, 3)
+
+
+# ---------------------------------------------------------------------------
+# Tests: export_html_report (Plotly.js inline / gemeinsame Datei)
+# ---------------------------------------------------------------------------
+
+
+def _sections():
+    return [{"title": "Test", "fig": build_bar_chart(pd.DataFrame({"A": ["x"], "B": [1.0]}), "B", "A", "Test")}]
+
+
+class TestPlotlyJs:
+    def test_inline_bettet_plotlyjs_ein(self, tmp_path):
+        report = tmp_path / "r.html"
+        export_html_report(_sections(), str(report), open_browser=False)
+        html = report.read_text(encoding="utf-8")
+        assert plotlyjs_source() in html
+        assert not list(tmp_path.glob("plotly-*.min.js"))
+
+    def test_plotlyjs_wird_nur_einmal_gelesen(self, tmp_path):
+        plotlyjs_source.cache_clear()
+        try:
+            with patch.object(plotting.Path, "read_text", autospec=True, side_effect=lambda *a, **k: "/*js*/") as read:
+                for i in range(3):
+                    export_html_report(_sections(), str(tmp_path / f"r{i}.html"), open_browser=False)
+            assert read.call_count == 1
+        finally:
+            plotlyjs_source.cache_clear()
+
+    def test_shared_schreibt_datei_einmal_und_verweist_relativ(self, tmp_path):
+        assets = tmp_path / "batch"
+        for name in ("a", "b"):
+            (assets / name).mkdir(parents=True)
+            export_html_report(
+                _sections(), str(assets / name / "r.html"), open_browser=False, plotlyjs="shared", asset_dir=str(assets)
+            )
+        asset = assets / plotlyjs_asset_name()
+        assert [p.name for p in assets.glob("plotly-*.min.js")] == [asset.name]
+        assert asset.read_text(encoding="utf-8") == plotlyjs_source()
+        html = (assets / "a" / "r.html").read_text(encoding="utf-8")
+        assert f'<script src="../{asset.name}"></script>' in html
+        assert plotlyjs_source() not in html
+
+    def test_shared_ohne_asset_dir_neben_dem_report(self, tmp_path):
+        export_html_report(_sections(), str(tmp_path / "r.html"), open_browser=False, plotlyjs="shared")
+        assert (tmp_path / plotlyjs_asset_name()).exists()
+        assert f'<script src="{plotlyjs_asset_name()}"></script>' in (tmp_path / "r.html").read_text(encoding="utf-8")
+
+    def test_unbekannter_modus(self, tmp_path):
+        with pytest.raises(ValueError, match="cdn"):
+            export_html_report(_sections(), str(tmp_path / "r.html"), open_browser=False, plotlyjs="cdn")
+
+
+# ---------------------------------------------------------------------------
+# Tests: encode_chart_payload / decode_chart_payload (komprimierte Chart-Daten)
+# ---------------------------------------------------------------------------
+
+
+def _big_treemap():
+    df = pd.DataFrame(
+        {
+            "Sektor": [f"Sektor {i % 11}" for i in range(600)],
+            "Name": [f"Position {i}" for i in range(600)],
+            "Gewichtung": [1.0 + i % 7 for i in range(600)],
+        }
+    )
+    return build_treemap(df, ["Sektor", "Name"], "Gewichtung", "Treemap")
+
+
+class TestChartPayload:
+    def test_gzip_round_trip_und_kleiner(self):
+        fig_json = _big_treemap().to_json()
+        payload, encoding = encode_chart_payload(fig_json, "gzip")
+        assert encoding == "gzip"
+        assert len(payload) < len(fig_json) / 3
+        assert decode_chart_payload(payload, encoding) == decode_chart_payload(fig_json)
+
+    def test_gzip_ist_reproduzierbar(self):
+        fig_json = _big_treemap().to_json()
+        assert encode_chart_payload(fig_json, "gzip") == encode_chart_payload(fig_json, "gzip")
+
+    def test_kleine_charts_und_json_modus_bleiben_klartext(self):
+        small = '{"data": [], "layout": {}}'
+        assert encode_chart_payload(small, "gzip") == (small, "json")
+        big = _big_treemap().to_json()
+        assert encode_chart_payload(big, "json") == (big, "json")
+
+    def test_unbekannte_kodierung(self):
+        with pytest.raises(ValueError, match="brotli"):
+            encode_chart_payload("{}", "brotli")
+
+    def test_report_mit_gzip_und_json_fallback(self, tmp_path):
+        fig = _big_treemap()
+        sections = [{"title": "Groß", "fig": fig}, {"title": "Klein", "fig_json": '{"data": [], "layout": {}}'}]
+        report = tmp_path / "r.html"
+        export_html_report(sections, str(report), open_browser=False, chart_payload="gzip")
+        html = report.read_text(encoding="utf-8")
+
+        packed = re.search(r'data-encoding="gzip" id="data-plotly-chart-0">([^<]+)</script>', html)
+        unpacked = inflate_figure(decode_chart_payload(packed.group(1), "gzip"))
+        assert unpacked == inflate_figure(decode_chart_payload(fig.to_json()))
+        assert '<script type="application/json" id="data-plotly-chart-1">' in html  # kleiner Chart: Klartext
+        assert "DecompressionStream" in html
+
+
+# ---------------------------------------------------------------------------
+# Tests: Report-Fragmente (Inhalts-Hash je Abschnitt) und gestreamtes Schreiben
+# ---------------------------------------------------------------------------
+
+
+class _ChunkFile:
+    """Datei-Ersatz, der jeden write-Aufruf einzeln festhält."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, text):
+        self.chunks.append(text)
+
+
+class TestReportFragments:
+    def _serialized(self):
+        return [
+            {"title": "Groß", **plotting.serialize_figure(_big_treemap())},
+            {"title": "Tabelle", "html": "<table></table>", "description": "Alle Positionen"},
+        ]
+
+    def _without_timestamp(self, path):
+        return re.sub(r"\d{2}\.\d{2}\.\d{4} \d{2}:\d{2} Uhr", "", path.read_text(encoding="utf-8"))
+
+    def test_digest_haengt_vom_inhalt_ab(self):
+        first, second = self._serialized(), self._serialized()
+        assert plotting.section_digest(first[0]) == plotting.section_digest(second[0])
+        assert plotting.section_digest(first[0]) != plotting.section_digest({**first[0], "title": "Anders"})
+        assert plotting.section_digest({"title": "a", "html": "b"}) != plotting.section_digest({"title": "ab"})
+
+    def test_nur_geaenderte_abschnitte_werden_neu_kodiert(self, tmp_path):
+        sections, cache = self._serialized(), str(tmp_path / "cache")
+        plain, cached = tmp_path / "plain.html", tmp_path / "cached.html"
+        export_html_report(sections, str(plain), open_browser=False, chart_payload="gzip")
+        export_html_report(sections, str(cached), open_browser=False, chart_payload="gzip", cache_dir=cache)
+        with patch("scripts.plotting.encode_chart_payload", wraps=encode_chart_payload) as encode:
+            export_html_report(sections, str(cached), open_browser=False, chart_payload="gzip", cache_dir=cache)
+            encode.assert_not_called()
+            sections[1]["html"] = "<table><tr></tr></table>"
+            export_html_report(sections, str(cached), open_browser=False, chart_payload="gzip", cache_dir=cache)
+            encode.assert_not_called()  # nur die Tabelle hat sich geändert
+        sections[1]["html"] = "<table></table>"
+        export_html_report(sections, str(cached), open_browser=False, chart_payload="gzip", cache_dir=cache)
+        assert self._without_timestamp(cached) == self._without_timestamp(plain)
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["cache", "cached.html", "plain.html"]
+
+    def test_report_wird_in_teilen_geschrieben(self):
+        fragments = plotting._report_fragments(self._serialized(), "json")
+        fields = {
+            "now": "heute",
+            "nav_items": "<li></li>",
+            "summary_html": "",
+            "sections_html": [fragment["html"] for fragment in fragments],
+            "chart_data_tags": [tag for fragment in fragments for tag in fragment["data_tags"]],
+            "plotlyjs_tag": "<script></script>",
+            "chart_div_ids": '["plotly-chart-0"]',
+        }
+        f = _ChunkFile()
+        plotting._write_report(f, {**fields, "chart_data_tags": plotting._joined(fields["chart_data_tags"], "\n    ")})
+        joined = {k: v if isinstance(v, str) else "" for k, v in fields.items()}
+        joined["sections_html"] = "".join(fields["sections_html"])
+        joined["chart_data_tags"] = "\n    ".join(fields["chart_data_tags"])
+        assert "".join(f.chunks) == plotting._REPORT_TEMPLATE.format(**joined)
+        # Abschnitte und Daten-Tags gehen einzeln in die Datei, ohne vorher zusammengefügt zu werden
+        assert set(fields["sections_html"] + fields["chart_data_tags"]) <= set(f.chunks)
+
+
+# ---------------------------------------------------------------------------
+# Tests: figure_json / inflate_figure (Typed Arrays, deduplizierte Beschriftungen)
+# ---------------------------------------------------------------------------
+
+# Führt die Entpack-Funktionen aus dem Report-JavaScript in Node aus: stdin = [[Kodierung, Tag-Inhalt], …]
+_NODE_SCRIPT = """
+%s
+const tags = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+Promise.all(tags.map(([encoding, text]) => loadSpec({dataset: {encoding}, textContent: text})
+    .then(spec => { spec.data.forEach(inflateTrace); return spec; })))
+  .then(specs => console.log(JSON.stringify(specs, (k, v) => ArrayBuffer.isView(v) ? Array.from(v) : v)));
+"""
+
+
+class TestFigureJson:
+    def test_round_trip_und_deutlich_kleiner(self):
+        fig = _big_treemap()
+        plain, compact = fig.to_json(), figure_json(fig)
+        assert inflate_figure(json.loads(compact)) == inflate_figure(json.loads(plain))
+        assert len(compact) < len(plain) / 2
+
+    def test_treemap_kodierung(self):
+        trace = json.loads(figure_json(_big_treemap()))["data"][0]
+        assert trace["ids"] == {"$join": "/"}  # ids = parents + '/' + labels
+        assert trace["parents"]["$dict"][:2] == ["Sektor 0", "Sektor 1"]
+        assert trace["parents"]["codes"]["dtype"] == "u1"
+        values_column, share_column = trace["customdata"]["$columns"]
+        assert values_column == {"$ref": "values"}  # customdata[0] ist dasselbe Array wie values
+        assert "$dict" in share_column
+
+    @pytest.mark.parametrize(
+        "values, dtype",
+        [([0, 1, 255], "u1"), ([-1, 100], "i1"), ([0, 300], "u2"), ([1.0, 2.0], "u1"), ([0.5, 1], "f8")],
+    )
+    def test_kleinster_verlustfreier_typ(self, values, dtype):
+        assert _typed_array(values)["dtype"] == dtype
+
+    def test_kurze_und_gemischte_arrays_bleiben_listen(self):
+        fig = go.Figure(go.Bar(x=["a", "b"], y=[1, 2], text=[None] * 20, hovertext=[f"h{i}" for i in range(20)]))
+        trace = json.loads(figure_json(fig))["data"][0]
+        assert trace["x"] == ["a", "b"]
+        assert trace["text"] == [None] * 20
+        assert trace["hovertext"] == [f"h{i}" for i in range(20)]
+
+    def test_kein_script_ende_im_json(self):
+        fig = go.Figure(layout={"title": {"text": "</script><b>x</b>"}})
+        compact = figure_json(fig)
+        assert "</script>" not in compact
+        assert json.loads(compact)["layout"]["title"]["text"] == "</script><b>x</b>"
+
+    @pytest.mark.skipif(shutil.which("node") is None, reason="Node.js nicht installiert")
+    @pytest.mark.parametrize("chart_payload", ["json", "gzip"])
+    def test_report_javascript_entpackt_wie_python(self, tmp_path, chart_payload):
+        figs = [_big_treemap(), build_heatmap(TestBuildHeatmap()._sample_pivot(), "Heatmap")]
+        report = tmp_path / "r.html"
+        sections = [{"title": f"C{i}", "fig": fig} for i, fig in enumerate(figs)]
+        export_html_report(sections, str(report), open_browser=False, chart_payload=chart_payload)
+        html = report.read_text(encoding="utf-8")
+
+        functions = html[html.index("var _TYPED") : html.index("function renderChart")]
+        tags = re.findall(
+            r'<script type="application/[a-z-]+"(?: data-encoding="(\w+)")? id="data-[^"]+">([^<]*)</script>', html
+        )
+        proc = subprocess.run(
+            ["node", "-e", _NODE_SCRIPT % functions],
+            input=json.dumps([[encoding or "json", text] for encoding, text in tags]),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        specs = json.loads(proc.stdout)
+        assert len(specs) == 2
+        for spec, fig in zip(specs, figs, strict=True):
+            assert inflate_figure(spec) == inflate_figure(json.loads(fig.to_json()))
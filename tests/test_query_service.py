@@ -0,0 +1,233 @@
+# tests/test_query_service.py
+"""
+Unit Tests für scripts/query_service.py
+
+Getestet werden:
+- query: Depots, Kennzahlen, Top-Positionen, Wertpapier mit Herkunft, Sektoren/Länder, 'welche Fonds halten X'
+- handle_request: Antwort-Cache (Treffer, Größenbegrenzung), Fehlerstatus, unerwartete Fehler (500), /health
+- create_server: echte HTTP-Anfragen über localhost (Keep-Alive)
+- load_portfolios: Kurse einmal für alle Depots, unlesbare und nicht bewertbare Depots werden übersprungen
+"""
+
+import http.client
+import json
+import threading
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+from scripts.analysis import analyze_depot
+from scripts.query_service import QueryError, create_server, create_service, handle_request, load_portfolios, query
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _etf_data():
+    return pd.DataFrame(
+        {
+            "ETF": ["Test ETF", "Test ETF", "Anderer ETF", "Anderer ETF"],
+            "Emittententicker": ["AAPL", "MSFT", "NVDA", "AAPL"],
+            "Name": ["Apple Inc.", "Microsoft Corp.", "NVIDIA Corp.", "Apple Inc."],
+            "Gewichtung (%)": [60.0, 40.0, 70.0, 30.0],
+            "Sektor": ["Technologie", "Technologie", "Technologie", "Technologie"],
+            "Standort": ["USA", "USA", "USA", "USA"],
+        }
+    )
+
+
+def _depot():
+    return pd.DataFrame(
+        {
+            "Ticker": ["TETF.DE", "SAP", "-"],
+            "Art": ["ETF", "Aktie", "Cash"],
+            "Position": ["Test ETF", "SAP SE", "Cash"],
+            "Sektor": ["-", "Technologie", "Cash"],
+            "Standort": ["-", "Deutschland", "Cash (Euro)"],
+            "Anteile": [10, 2, 100],
+        }
+    )
+
+
+def _prices():
+    return pd.DataFrame({"Ticker": ["TETF", "SAP", "-"], "Kurs": [60.0, 150.0, 1.0]})
+
+
+@pytest.fixture
+def service():
+    result = analyze_depot(_etf_data(), _depot(), _prices())
+    return create_service({"depot": result}, _etf_data(), cache_size=3)
+
+
+def _json(response):
+    status, body = response
+    return status, json.loads(body)
+
+
+# ---------------------------------------------------------------------------
+# Tests: query
+# ---------------------------------------------------------------------------
+
+
+class TestQuery:
+    def test_depots_und_kennzahlen(self, service):
+        assert query(service, "/portfolios") == [
+            {
+                "Depot": "depot",
+                "Gesamtwert (€)": 1000.0,
+                "HHI (0–100)": pytest.approx(28.72, abs=0.01),
+                "Diversifikation": "Hoch konzentriert",
+            }
+        ]
+        summary = query(service, "/portfolios/depot", {"top": ["2"]})
+        assert summary["Cash-Anteil (%)"] == 10.0
+        assert [p["Name"] for p in summary["Top-Positionen"]] == ["Apple Inc.", "SAP SE"]
+        assert "Diversifikation" in summary["KPI-Cards"]
+
+    def test_wertpapier_nach_ticker_und_name_mit_herkunft(self, service):
+        by_ticker = query(service, "/portfolios/depot/securities/aapl")
+        by_name = query(service, "/portfolios/depot/securities/Apple Inc.")
+        assert by_ticker == by_name
+        assert by_ticker["Gesamtgewichtung (%)"] == 36.0
+        assert by_ticker["Rang"] == 1
+        assert by_ticker["Herkunft"] == [
+            {"Quelle": "Test ETF", "Gewichtung im Fonds (%)": 60.0, "Depotanteil (%)": 36.0}
+        ]
+
+    def test_sektoren_und_laender(self, service):
+        sectors = query(service, "/portfolios/depot/sectors")
+        assert sectors[0] == {"Sektor": "Technologie", "Sektorgewichtung (%)": 90.0}
+        tech = query(service, "/portfolios/depot/sectors/technologie")
+        assert {p["Name"] for p in tech["Positionen"]} == {"Apple Inc.", "Microsoft Corp.", "SAP SE"}
+        assert tech["Anzahl Positionen"] == 3
+        assert len(query(service, "/portfolios/depot/sectors/technologie", {"top": ["1"]})["Positionen"]) == 1
+        assert query(service, "/portfolios/depot/countries/Deutschland")["Ländergewichtung (%)"] == 30.0
+
+    def test_welche_fonds_halten(self, service):
+        holders = query(service, "/holders/AAPL")
+        assert [f["ETF"] for f in holders["Fonds"]] == ["Test ETF", "Anderer ETF"]
+        assert holders["Depotanteil (%) je Depot"] == {"depot": 36.0}
+
+    @pytest.mark.parametrize(
+        "path, status",
+        [
+            ("/portfolios/fremd", 404),
+            ("/portfolios/depot/securities/XYZ", 404),
+            ("/unbekannt", 404),
+            ("/portfolios/depot/positions/zuviel/teile", 404),
+        ],
+    )
+    def test_unbekannte_pfade(self, service, path, status):
+        with pytest.raises(QueryError) as e:
+            query(service, path)
+        assert e.value.status == status
+
+    def test_vorschlaege_bei_tippfehler(self, service):
+        with pytest.raises(QueryError, match="Meinten Sie"):
+            query(service, "/portfolios/depot/securities/apple")
+
+
+# ---------------------------------------------------------------------------
+# Tests: handle_request (Antwort-Cache)
+# ---------------------------------------------------------------------------
+
+
+class TestHandleRequest:
+    def test_cache_treffer(self, service):
+        first = handle_request(service, "/portfolios/depot/positions?top=1")
+        second = handle_request(service, "/portfolios/depot/positions?top=1")
+        assert first is second
+        assert service["stats"] == {"requests": 2, "hits": 1, "misses": 1}
+
+    def test_cache_groesse_begrenzt(self, service):
+        for top in range(1, 6):
+            handle_request(service, f"/portfolios/depot/positions?top={top}")
+        assert len(service["cache"]) == 3
+        assert "/portfolios/depot/positions?top=1" not in service["cache"]
+
+    def test_fehlerstatus_und_ungueltiger_parameter(self, service):
+        assert _json(handle_request(service, "/portfolios/fremd"))[0] == 404
+        status, body = _json(handle_request(service, "/portfolios/depot/positions?top=x"))
+        assert status == 400
+        assert "top" in body["error"]
+
+    def test_health_wird_nicht_gecacht(self, service):
+        handle_request(service, "/health")
+        status, body = _json(handle_request(service, "/health"))
+        assert status == 200
+        assert body["requests"] == 2
+        assert "/health" not in service["cache"]
+
+    def test_unerwarteter_fehler_liefert_500_ohne_cache(self, service):
+        del service["portfolios"]["depot"]["positions"]  # kaputter Index → KeyError in query
+        status, body = _json(handle_request(service, "/portfolios/depot/positions"))
+        assert status == 500
+        assert "Interner Fehler" in body["error"]
+        assert "/portfolios/depot/positions" not in service["cache"]
+
+    def test_url_kodierte_pfade(self, service):
+        status, body = _json(handle_request(service, "/portfolios/depot/securities/Apple%20Inc."))
+        assert status == 200
+        assert body["Emittententicker"] == "AAPL"
+
+
+# ---------------------------------------------------------------------------
+# Tests: HTTP-Server
+# ---------------------------------------------------------------------------
+
+
+class TestServer:
+    def test_anfragen_ueber_localhost(self, service):
+        server = create_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            conn = http.client.HTTPConnection(*server.server_address[:2], timeout=5)
+            for path in ("/portfolios", "/holders/MSFT"):  # zwei Anfragen über eine Verbindung
+                conn.request("GET", path)
+                response = conn.getresponse()
+                body = json.loads(response.read())
+                assert response.status == 200
+                assert response.getheader("Content-Type").startswith("application/json")
+            assert body["Fonds"][0]["ETF"] == "Test ETF"
+            conn.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+# ---------------------------------------------------------------------------
+# Tests: load_portfolios
+# ---------------------------------------------------------------------------
+
+
+class TestLoadPortfolios:
+    def test_kurse_einmal_fuer_alle_depots(self, tmp_path):
+        _depot().to_excel(tmp_path / "a.xlsx", index=False)
+        _depot().to_excel(tmp_path / "b.xlsx", index=False)
+        load_prices = MagicMock(return_value=(_prices(), []))
+        files = [str(tmp_path / "a.xlsx"), str(tmp_path / "b.xlsx"), str(tmp_path / "fehlt.xlsx")]
+        results = load_portfolios(files, _etf_data(), load_prices)
+        assert list(results) == ["a", "b"]
+        load_prices.assert_called_once()
+        assert results["a"]["kpis"]["gesamtwert"] == 1000.0
+
+    def test_depot_ohne_gueltigen_kurs_wird_uebersprungen(self, tmp_path, caplog):
+        _depot().to_excel(tmp_path / "a.xlsx", index=False)
+        ohne_kurs = pd.DataFrame(
+            {
+                "Ticker": ["XYZ"],
+                "Art": ["Aktie"],
+                "Position": ["Ohne Kurs AG"],
+                "Sektor": ["Technologie"],
+                "Standort": ["Deutschland"],
+                "Anteile": [5],
+            }
+        )
+        ohne_kurs.to_excel(tmp_path / "b.xlsx", index=False)
+        load_prices = MagicMock(return_value=(_prices(), []))
+        results = load_portfolios([str(tmp_path / "a.xlsx"), str(tmp_path / "b.xlsx")], _etf_data(), load_prices)
+        assert list(results) == ["a"]
+        assert "Depot 'b' übersprungen" in caplog.text
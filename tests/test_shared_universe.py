@@ -0,0 +1,75 @@
+# tests/test_shared_universe.py
+"""
+Unit Tests für scripts/shared_universe.py
+
+Getestet werden:
+- publish_universe / attach_universe: Round-Trip, Zero-Copy-Views, Kategorie-Dictionaries, NaN-Werte
+- shared_universe: Freigabe des Blocks nach dem Context-Manager
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.shared_universe import attach_universe, publish_universe, release_universe, shared_universe
+
+
+def _etf_data():
+    return pd.DataFrame(
+        {
+            "ETF": ["ETF A", "ETF A", "ETF B"],
+            "Name": ["Apple", "Microsoft", None],
+            "Gewichtung (%)": [5.5, 3.25, np.nan],
+            "Sektor": ["Technologie", "Technologie", "Finanzen"],
+            "Anzahl": [1, 2, 3],
+        },
+        index=[3, 7, 9],
+    )
+
+
+class TestSharedUniverse:
+    def test_round_trip_werte_bleiben_erhalten(self):
+        shm, handle = publish_universe(_etf_data())
+        try:
+            attached_shm, df = attach_universe(handle)
+            expected = _etf_data().reset_index(drop=True)
+            assert list(df.columns) == list(expected.columns)
+            np.testing.assert_array_equal(df["Gewichtung (%)"].to_numpy(), expected["Gewichtung (%)"].to_numpy())
+            assert df["Name"].tolist()[:2] == ["Apple", "Microsoft"]
+            assert pd.isna(df["Name"].iloc[2])
+            assert df["Anzahl"].tolist() == [1, 2, 3]
+            del df
+            attached_shm.close()
+        finally:
+            release_universe(shm)
+
+    def test_textspalten_als_kategorien(self):
+        shm, handle = publish_universe(_etf_data())
+        try:
+            etf_col = next(c for c in handle["columns"] if c["name"] == "ETF")
+            assert etf_col["kind"] == "cat"
+            assert etf_col["categories"] == ["ETF A", "ETF B"]
+            attached_shm, df = attach_universe(handle)
+            assert isinstance(df["Sektor"].dtype, pd.CategoricalDtype)
+            del df
+            attached_shm.close()
+        finally:
+            release_universe(shm)
+
+    def test_numerische_spalten_ohne_kopie(self):
+        shm, handle = publish_universe(_etf_data())
+        try:
+            attached_shm, df = attach_universe(handle)
+            block = np.frombuffer(attached_shm.buf, dtype=np.uint8)
+            assert np.shares_memory(df["Gewichtung (%)"].to_numpy(), block)
+            assert np.shares_memory(df["ETF"].array.codes, block)
+            del df, block
+            attached_shm.close()
+        finally:
+            release_universe(shm)
+
+    def test_context_manager_gibt_block_frei(self):
+        with shared_universe(_etf_data()) as handle:
+            name = handle["name"]
+        with pytest.raises(FileNotFoundError):
+            attach_universe({"name": name, "nrows": 0, "columns": []})
@@ -0,0 +1,126 @@
+# tests/test_snapshot.py
+"""
+Unit Tests für scripts/snapshot.py
+
+Getestet werden:
+- save_snapshot / load_snapshot: Round-Trip des kompletten Ergebnisses aus analyze_depot
+- Format-Version, unvollständige (auch fehlende Report-Daten) und unlesbare Snapshots
+- latest_snapshot und Aufräumen alter Snapshots
+"""
+
+import pandas as pd
+import pytest
+
+from scripts.analysis import analyze_depot
+from scripts.snapshot import (
+    SNAPSHOT_KEYS,
+    SNAPSHOT_VERSION,
+    SnapshotError,
+    latest_snapshot,
+    load_snapshot,
+    save_snapshot,
+)
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+def _result():
+    etf_data = pd.DataFrame(
+        {
+            "ETF": ["Test ETF", "Test ETF"],
+            "Emittententicker": ["AAPL", "MSFT"],
+            "Name": ["Apple Inc.", "Microsoft Corp."],
+            "Gewichtung (%)": [60.0, 40.0],
+            "Sektor": ["Technologie", "Technologie"],
+            "Standort": ["USA", "USA"],
+        }
+    )
+    depot = pd.DataFrame(
+        {
+            "Ticker": ["TETF.DE", "SAP", "-"],
+            "Art": ["ETF", "Aktie", "Cash"],
+            "Position": ["Test ETF", "SAP SE", "Cash"],
+            "Sektor": ["-", "Technologie", "Cash"],
+            "Standort": ["-", "Deutschland", "Cash (Euro)"],
+            "Anteile": [10, 2, 100],
+        }
+    )
+    prices = pd.DataFrame({"Ticker": ["TETF", "SAP", "-"], "Kurs": [60.0, 150.0, 1.0]})
+    return analyze_depot(etf_data, depot, prices, ["SAP"])
+
+
+# ---------------------------------------------------------------------------
+# Tests: save_snapshot / load_snapshot
+# ---------------------------------------------------------------------------
+
+
+class TestSnapshot:
+    def test_round_trip(self, tmp_path):
+        result = _result()
+        path = save_snapshot(result, str(tmp_path), meta={"input_file": "depot.xlsx"})
+        payload = load_snapshot(path)
+
+        assert payload["version"] == SNAPSHOT_VERSION
+        assert payload["meta"] == {"input_file": "depot.xlsx"}
+        loaded = payload["result"]
+        assert loaded.keys() == result.keys()
+        for key, value in result.items():
+            if isinstance(value, pd.DataFrame):
+                pd.testing.assert_frame_equal(loaded[key], value)
+            else:
+                assert loaded[key] == value
+
+    def test_andere_version(self, tmp_path):
+        path = tmp_path / "snapshot-alt.pkl"
+        pd.to_pickle({"version": SNAPSHOT_VERSION + 1, "result": _result()}, path)
+        with pytest.raises(SnapshotError, match="Format-Version"):
+            load_snapshot(str(path))
+
+    def test_unvollstaendig(self, tmp_path):
+        result = _result()
+        del result["depot_data_chart"]
+        path = save_snapshot(result, str(tmp_path))
+        with pytest.raises(SnapshotError, match="depot_data_chart"):
+            load_snapshot(path)
+
+    @pytest.mark.parametrize("key", ["sector_pivot", "country_treemap_data", "sector_treemap_data", "kpis"])
+    def test_fehlende_report_daten(self, tmp_path, key):
+        result = _result()
+        del result[key]
+        path = save_snapshot(result, str(tmp_path))
+        with pytest.raises(SnapshotError, match=key):
+            load_snapshot(path)
+
+    def test_alle_schluessel_aus_analyze_depot(self):
+        assert set(SNAPSHOT_KEYS) == set(_result())
+
+    @pytest.mark.parametrize("content", [None, b"kein pickle"])
+    def test_fehlend_oder_unlesbar(self, tmp_path, content):
+        path = tmp_path / "snapshot-x.pkl"
+        if content is not None:
+            path.write_bytes(content)
+        with pytest.raises(SnapshotError):
+            load_snapshot(str(path))
+
+    def test_speicherfehler_ist_nicht_fatal(self, tmp_path):
+        blocker = tmp_path / "datei"
+        blocker.write_text("kein Ordner")
+        assert save_snapshot(_result(), str(blocker / "snapshots")) is None
+
+
+# ---------------------------------------------------------------------------
+# Tests: latest_snapshot / Aufräumen
+# ---------------------------------------------------------------------------
+
+
+class TestLatestSnapshot:
+    def test_juengster_und_aufraeumen(self, tmp_path):
+        result = _result()
+        paths = [save_snapshot(result, str(tmp_path), keep=2) for _ in range(3)]
+        assert latest_snapshot(str(tmp_path)) == paths[-1]
+        assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.split("/")[-1] for p in paths[1:])
+
+    def test_ohne_ordner(self, tmp_path):
+        assert latest_snapshot(str(tmp_path / "fehlt")) is None
@@ -0,0 +1,274 @@
+# tests/test_watch.py
+"""
+Unit Tests für scripts/watch.py
+
+Getestet werden:
+- watch_cycle: erster Zyklus wie ein Einzellauf, keine Arbeit ohne Änderungen, Kurse nur im Takt
+- Änderungen: nur Anteile (Durchblick bleibt), neue Struktur, geänderte ETF-CSVs, unlesbares Depot
+- Report: unveränderte Abschnitte werden nicht neu gebaut, HTML nur bei Änderungen geschrieben
+- run_watch: Zyklen mit Wartezeit, Fehler beenden den Modus nicht
+"""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_depot, generate_universe
+from scripts.analysis import analyze_depot, load_depot, load_etf_universe
+from scripts.watch import file_signature, new_state, run_watch, watch_cycle
+
+OPTIONS = {
+    "excel": True,
+    "sections": None,
+    "open_browser": False,
+    "plotlyjs": "inline",
+    "chart_payload": "json",
+    "detail": None,
+}
+
+# ---------------------------------------------------------------------------
+# Hilfsfunktionen
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def setup(tmp_path):
+    csv_dir = tmp_path / "csv"
+    files = generate_universe(str(csv_dir), funds=2, holdings_per_fund=40)
+    depot, prices = generate_depot(files, path=str(tmp_path / "depot.xlsx"), stocks=3, crypto=1)
+    config = {
+        "DOWNLOAD_PATH": str(csv_dir),
+        "ETF_CSV_FILE": files,
+        "INPUT_FILE": str(tmp_path / "depot.xlsx"),
+        "OUTPUT_FILE": str(tmp_path / "out.xlsx"),
+        "SAVE_PATH": str(tmp_path),
+        "CACHE_PATH": None,
+        "INCREMENTAL": False,
+    }
+    return config, prices
+
+
+def _touch(path, depot=None):
+    """Schreibt das Depot neu (optional geändert) und stellt sicher, dass sich der Zeitstempel ändert."""
+    if depot is not None:
+        depot.to_excel(path, index=False)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _cycle(state, config, load_prices, now, options=OPTIONS):
+    with (
+        patch("scripts.watch.export_excel") as excel,
+        patch("scripts.plotting.export_html_report") as html,
+    ):
+        changes = watch_cycle(state, config, options, load_prices, price_interval=60, now=now)
+    return changes, excel, html
+
+
+# ---------------------------------------------------------------------------
+# Tests: watch_cycle
+# ---------------------------------------------------------------------------
+
+
+class TestWatchCycle:
+    def test_erster_zyklus_wie_einzellauf(self, setup):
+        config, prices = setup
+        state = new_state()
+        changes, excel, html = _cycle(state, config, lambda depot: (prices, []), now=0)
+
+        assert changes["universe"] and changes["depot"] and changes["prices"]
+        excel.assert_called_once()
+        html.assert_called_once()
+        assert len(html.call_args.args[0]) == 7
+
+        etf_data = load_etf_universe(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"])
+        expected = analyze_depot(etf_data, load_depot(config["INPUT_FILE"]), prices, [])
+        for key in ("depot_data", "depot_data_stocks", "depot_data_sectors", "depot_data_locations"):
+            pd.testing.assert_frame_equal(state["result"][key], expected[key], check_dtype=False)
+        assert state["result"]["depot_summary"] == expected["depot_summary"]
+
+    def test_ohne_aenderungen_keine_arbeit(self, setup):
+        config, prices = setup
+        load_prices = MagicMock(return_value=(prices, []))
+        state = new_state()
+        _cycle(state, config, load_prices, now=0)
+        changes, excel, html = _cycle(state, config, load_prices, now=30)  # Kurse erst nach 60 s fällig
+
+        assert changes == {"universe": False, "depot": False, "prices": False, "report": None}
+        assert load_prices.call_count == 1
+        excel.assert_not_called()
+        html.assert_not_called()
+
+    def test_unveraenderte_kurse_schreiben_nichts(self, setup):
+        config, prices = setup
+        load_prices = MagicMock(return_value=(prices, []))
+        state = new_state()
+        _cycle(state, config, load_prices, now=0)
+        changes, excel, html = _cycle(state, config, load_prices, now=60)
+
+        assert load_prices.call_count == 2
+        assert not changes["prices"]
+        excel.assert_not_called()
+        html.assert_not_called()
+
+    def test_neue_kurse_behalten_durchblick(self, setup):
+        config, prices = setup
+        state = new_state()
+        _cycle(state, config, lambda depot: (prices, []), now=0)
+        model = state["model"]
+
+        changed = prices.copy()
+        changed.loc[changed["Ticker"] == "A000", "Kurs"] *= 2
+        with patch("scripts.watch.load_etf_universe") as load_universe:
+            changes, excel, html = _cycle(state, config, lambda depot: (changed, []), now=60)
+
+        assert changes["prices"]
+        assert state["model"] is model
+        load_universe.assert_not_called()
+        excel.assert_called_once()
+        html.assert_called_once()
+        assert changes["report"].endswith("portfolio_report.html")
+
+    def test_nur_kpi_cards_geaendert_baut_keine_abschnitte(self, setup):
+        config, prices = setup
+        state = new_state()
+        _cycle(state, config, lambda depot: (prices, []), now=0)
+        sections = state["sections"]
+
+        # gleiche Kurse, aber jetzt als Fallback markiert → nur die KPI-Cards ändern sich
+        with patch("scripts.watch.render_serialized") as render:
+            changes, _, html = _cycle(state, config, lambda depot: (prices, ["A000"]), now=60)
+
+        assert changes["prices"]
+        render.assert_not_called()
+        assert state["sections"].keys() == sections.keys()
+        html.assert_called_once()
+        assert "A000" in html.call_args.kwargs["depot_summary"]["⚠️ Fallback-Kurse"]
+
+    def test_nur_anteile_geaendert_behaelt_durchblick(self, setup):
+        config, prices = setup
+        state = new_state()
+        load_prices = MagicMock(return_value=(prices, []))
+        _cycle(state, config, load_prices, now=0)
+        model = state["model"]
+
+        depot = load_depot(config["INPUT_FILE"])
+        depot.loc[0, "Anteile"] += 10
+        _touch(config["INPUT_FILE"], depot)
+        with patch("scripts.watch.load_etf_universe") as load_universe:
+            changes, excel, _ = _cycle(state, config, load_prices, now=10)
+
+        assert changes["depot"] and not changes["prices"]
+        assert state["model"] is model
+        assert load_prices.call_count == 1  # gleiche Ticker → kein außerplanmäßiger Kursabruf
+        load_universe.assert_not_called()
+        excel.assert_called_once()
+
+    def test_neue_struktur_laedt_kurse_und_durchblick(self, setup):
+        config, prices = setup
+        state = new_state()
+        load_prices = MagicMock(return_value=(prices, []))
+        _cycle(state, config, load_prices, now=0)
+        model = state["model"]
+
+        depot = load_depot(config["INPUT_FILE"])
+        _touch(config["INPUT_FILE"], depot.drop(index=len(depot) - 2))  # letzte Krypto-Position verkauft
+        changes, *_ = _cycle(state, config, load_prices, now=10)
+
+        assert changes["depot"]
+        assert load_prices.call_count == 2
+        assert state["model"] is not model
+
+    def test_geaenderte_csv_baut_universum_neu(self, setup):
+        config, prices = setup
+        state = new_state()
+        _cycle(state, config, lambda depot: (prices, []), now=0)
+        universe_key = state["universe_key"]
+
+        # Berühren allein ändert den Inhalt nicht → kein Neuaufbau
+        csv_path = os.path.join(config["DOWNLOAD_PATH"], config["ETF_CSV_FILE"][0])
+        _touch(csv_path)
+        changes, *_ = _cycle(state, config, lambda depot: (prices, []), now=10)
+        assert not changes["universe"]
+
+        with open(csv_path, encoding="utf-8") as f:
+            lines = f.readlines()
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.writelines(lines[:-5])
+        _touch(csv_path)
+        changes, excel, _ = _cycle(state, config, lambda depot: (prices, []), now=20)
+        assert changes["universe"]
+        assert state["universe_key"] != universe_key
+        assert state["etf_data"] is not None
+        excel.assert_called_once()
+
+    def test_unlesbares_depot_wird_erneut_versucht(self, setup, caplog):
+        config, prices = setup
+        state = new_state()
+        _cycle(state, config, lambda depot: (prices, []), now=0)
+        depot = load_depot(config["INPUT_FILE"])
+
+        with open(config["INPUT_FILE"], "wb") as f:
+            f.write(b"halb gespeichert")
+        changes, excel, _ = _cycle(state, config, lambda depot: (prices, []), now=10)
+        assert not changes["depot"]
+        assert "Depot nicht lesbar" in caplog.text
+        excel.assert_not_called()
+
+        depot.loc[0, "Anteile"] += 1
+        _touch(config["INPUT_FILE"], depot)
+        changes, excel, _ = _cycle(state, config, lambda depot: (prices, []), now=20)
+        assert changes["depot"]
+        excel.assert_called_once()
+
+    def test_ohne_report(self, setup):
+        config, prices = setup
+        state = new_state()
+        changes, excel, html = _cycle(
+            state, config, lambda depot: (prices, []), now=0, options={**OPTIONS, "sections": []}
+        )
+        excel.assert_called_once()
+        html.assert_not_called()
+        assert changes["report"] is None
+
+    def test_file_signature_fehlende_datei(self, tmp_path):
+        assert file_signature([str(tmp_path / "fehlt.csv")]) == (None,)
+
+
+# ---------------------------------------------------------------------------
+# Tests: run_watch
+# ---------------------------------------------------------------------------
+
+
+class TestRunWatch:
+    def test_zyklen_und_wartezeit(self, setup):
+        config, prices = setup
+        sleep = MagicMock()
+        with patch("scripts.watch.watch_cycle") as cycle:
+            run_watch(config, OPTIONS, lambda d: (prices, []), interval=5, price_interval=60, max_cycles=3, sleep=sleep)
+        assert cycle.call_count == 3
+        assert sleep.call_count == 2
+        sleep.assert_called_with(5)
+
+    def test_fehler_beendet_watch_nicht(self, setup, caplog):
+        config, prices = setup
+        with patch("scripts.watch.watch_cycle", side_effect=[RuntimeError("kaputt"), None]) as cycle:
+            run_watch(config, OPTIONS, lambda d: (prices, []), 5, 60, max_cycles=2, sleep=lambda s: None)
+        assert cycle.call_count == 2
+        assert "kaputt" in caplog.text
+
+    def test_fehlgeschlagene_ausgabe_wird_wiederholt(self, setup):
+        config, prices = setup
+        state = new_state()
+        with (
+            patch("scripts.watch.export_excel", side_effect=PermissionError("Datei geöffnet")),
+            pytest.raises(PermissionError),
+        ):
+            watch_cycle(state, config, {**OPTIONS, "sections": []}, lambda d: (prices, []), 60, now=0)
+        assert state["dirty"]
+
+        _, excel, _ = _cycle(state, config, lambda depot: (prices, []), now=10)
+        excel.assert_called_once()
+        assert not state["dirty"]